@@ -15,7 +15,10 @@ import json
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 # ThreadPoolExecutor removed - now using sequential execution with accumulated context
-from shared.api_cost_tracker import track_openai_request, reset_cost_tracking, get_total_estimated_cost
+from shared.api_cost_tracker import track_openai_request, reset_cost_tracking, get_total_estimated_cost, record_response_usage
+from shared.llm_request import hedged_request
+from shared.deidentification import deidentify_parties
+from shared.party_detection import detect_parties
 
 logger = logging.getLogger(__name__)
 
@@ -122,6 +125,11 @@ Respond with ONLY the customer name, nothing else."""
         try:
             logger.info("🔒 Extracting both party names for de-identification...")
             
+            # Deterministic fast path - most contracts name both parties in the preamble
+            detected = detect_parties(contract_text, "ASC 606")
+            if detected:
+                return {"vendor": detected['first'], "customer": detected['second']}
+            
             messages = [
                 {
                     "role": "system",
@@ -206,7 +214,7 @@ Respond with ONLY a JSON object in this exact format:
         Replace both party names with generic terms for privacy.
         Handles whitespace variations, line breaks, hyphenated line wraps, and punctuation differences.
         
-        Strategy: Normalize both text and party names consistently, then do pattern matching.
+        Names, base names and aliases are replaced in a single pass by the shared engine.
         
         Args:
             contract_text: Original contract text
@@ -220,267 +228,22 @@ Respond with ONLY a JSON object in this exact format:
                 - vendor_name (str): Original vendor name
                 - customer_name (str): Original customer name
                 - replacements (list): List of replacement descriptions
+                - deidentification_map (dict): Offset/token map for re-identification (None if failed)
                 - error (str): Error message if failed, None otherwise
         """
-        if not vendor_name and not customer_name:
-            logger.warning("⚠️ No party names to de-identify, returning original text")
-            return {
-                "success": False,
-                "text": contract_text,
-                "vendor_name": vendor_name,
-                "customer_name": customer_name,
-                "replacements": [],
-                "error": "No party names were extracted for de-identification"
-            }
-        
-        # Helper function for text normalization
-        def normalize_text(text: str) -> str:
-            """
-            Normalize text to handle PDF/Word extraction artifacts.
-            - Removes soft hyphens (Unicode U+00AD)
-            - Converts smart quotes to ASCII quotes
-            - Collapses hyphen + newline (line wraps) into space
-            - Normalizes multiple whitespace to single space
-            """
-            # Remove Unicode soft hyphen character
-            text = text.replace('\u00AD', '')
-            
-            # Convert smart quotes (Word/PDF) to regular ASCII quotes
-            # Opening/closing double quotes → "
-            text = text.replace('\u201C', '"').replace('\u201D', '"')
-            # Opening/closing single quotes → '
-            text = text.replace('\u2018', "'").replace('\u2019', "'")
-            
-            # Replace hyphen + newline/whitespace with single space
-            # This handles line-wrapped text like "Smith-\nJones LLC" → "Smith Jones LLC"
-            text = re.sub(r'-\s*\n\s*', ' ', text)
-            
-            # Normalize multiple whitespace to single space
-            text = re.sub(r'\s+', ' ', text)
-            
-            return text
-        
-        # STEP 1: Normalize contract text
-        normalized_text = normalize_text(contract_text)
-        
-        # STEP 2: Normalize extracted party names
-        normalized_vendor = normalize_text(vendor_name) if vendor_name else None
-        normalized_customer = normalize_text(customer_name) if customer_name else None
-        
-        deidentified_text = normalized_text
-        replacements_made = []
-        replacement_count = {}
-        
-        # Helper function to create flexible pattern
-        def create_flexible_pattern(name: str) -> str:
-            """
-            Create regex pattern that handles:
-            - Whitespace variations (spaces, tabs, newlines)
-            - Hyphen/space equivalence (handles line-wrapped hyphenated names)
-            - Punctuation variations (periods, commas)
-            """
-            # Escape the name
-            escaped = re.escape(name)
-            
-            # Replace escaped hyphens with pattern matching hyphen OR space
-            # This handles: "Smith-Jones" matching "Smith Jones" or "Smith-Jones"
-            escaped = escaped.replace(r'\-', r'(?:-|\s)')
-            
-            # Replace escaped spaces with pattern matching space OR hyphen
-            # This handles: "Smith Jones" matching "Smith-Jones" or "Smith Jones"
-            escaped = escaped.replace(r'\ ', r'(?:\s+|-)')
-            
-            # Make periods optional (handles "Inc." vs "Inc")
-            escaped = escaped.replace(r'\.', r'\.?')
-            
-            # Make commas optional (handles "Corp," vs "Corp")
-            escaped = escaped.replace(r'\,', r'\,?\s*')
-            
-            # Word boundary at start and end
-            return r'\b' + escaped + r'\b'
-        
-        # Helper function to extract aliases from text patterns
-        def extract_aliases_from_text(company_name: str, text: str) -> list:
-            """
-            Find actual aliases used in the text for this company.
-            Looks for patterns like: 
-            - Company Name Inc. ("ShortName")
-            - Company Name Inc. ('ShortName')
-            - Company Name Inc. ("Alias1" or "Alias2")
-            """
-            aliases = []
-            
-            # Escape company name for regex
-            escaped_name = re.escape(company_name)
-            
-            # More specific pattern for parenthetical aliases
-            # Allow optional punctuation (commas, periods) between company name and parenthesis
-            paren_pattern = escaped_name + r'[,\.\s]*\(([^)]{2,200})\)'
-            
-            matches = re.finditer(paren_pattern, text, flags=re.IGNORECASE)
-            for match in matches:
-                content = match.group(1).strip()
-                
-                # Extract all quoted strings from the parenthetical content
-                # This focuses on actual aliases and avoids false positives from descriptive clauses
-                quoted_aliases = re.findall(r'["\']([A-Za-z0-9\s\-&]{2,50})["\']', content)
-                
-                for alias in quoted_aliases:
-                    alias = alias.strip()
-                    # Only accept if it looks like an alias (not numbers-only)
-                    if alias and 2 <= len(alias) <= 50:
-                        if re.match(r'^[A-Za-z0-9\s\-&]+$', alias) and not re.match(r'^\d+$', alias):
-                            aliases.append(alias)
-            
-            return list(set(aliases))  # Remove duplicates
-        
-        # Helper function to extract base company name
-        def extract_base_company_name(company_name: str) -> str | None:
-            """
-            Extract base company name by removing legal suffixes.
-            Examples:
-            - "Netflix, Inc." → "Netflix"
-            - "Acme Corporation" → "Acme"
-            - "Smith & Associates LLC" → "Smith & Associates"
-            
-            Returns None if base name would be too short/generic or same as input.
-            """
-            # Common legal suffixes (case-insensitive)
-            suffixes = [
-                r',?\s+Inc\.?',
-                r',?\s+LLC\.?',
-                r',?\s+L\.?L\.?C\.?',
-                r',?\s+Corp\.?',
-                r',?\s+Corporation',
-                r',?\s+Ltd\.?',
-                r',?\s+Limited',
-                r',?\s+Co\.?',
-                r',?\s+Company',
-                r',?\s+L\.?P\.?',
-                r',?\s+LLP\.?',
-                r',?\s+P\.?L\.?L\.?C\.?',
-                r',?\s+S\.?A\.?',
-                r',?\s+N\.?V\.?',
-                r',?\s+A\.?G\.?',
-                r',?\s+GmbH',
-                r',?\s+PLC'
-            ]
-            
-            base_name = company_name
-            
-            # Try removing each suffix
-            for suffix_pattern in suffixes:
-                # Match suffix at end of string
-                pattern = suffix_pattern + r'$'
-                base_name = re.sub(pattern, '', base_name, flags=re.IGNORECASE).strip()
-            
-            # Also remove trailing commas/periods if left over
-            base_name = base_name.rstrip('.,').strip()
-            
-            # Only return if:
-            # 1. It's different from original (we actually removed something)
-            # 2. It's at least 3 characters (avoid overly generic like "A", "XY")
-            # 3. It contains at least one letter (not just numbers/symbols)
-            if (base_name != company_name and 
-                len(base_name) >= 3 and 
-                re.search(r'[A-Za-z]', base_name)):
-                return base_name
-            
-            return None
-        
-        # Replace vendor with "the Company"
-        if normalized_vendor:
-            # First replace the full name
-            pattern = create_flexible_pattern(normalized_vendor)
-            matches = list(re.finditer(pattern, deidentified_text, flags=re.IGNORECASE))
-            match_count = len(matches)
-            
-            if match_count > 0:
-                deidentified_text = re.sub(pattern, "the Company", deidentified_text, flags=re.IGNORECASE)
-                replacements_made.append(f"vendor '{vendor_name}' → 'the Company' ({match_count} occurrences)")
-                replacement_count['vendor'] = match_count
-            else:
-                logger.warning(f"⚠️ Vendor name '{vendor_name}' (normalized: '{normalized_vendor}') not found in contract text")
-                replacement_count['vendor'] = 0
-            
-            # Also replace base company name (e.g., "Netflix" from "Netflix, Inc.")
-            base_vendor_name = extract_base_company_name(normalized_vendor)
-            if base_vendor_name:
-                base_pattern = create_flexible_pattern(base_vendor_name)
-                base_matches = list(re.finditer(base_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(base_matches) > 0:
-                    deidentified_text = re.sub(base_pattern, "the Company", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced vendor base name '{base_vendor_name}' ({len(base_matches)} occurrences)")
-            
-            # Also replace aliases found in the text (e.g., "InnovateTech" from "InnovateTech Solutions Inc. ('InnovateTech')")
-            aliases = extract_aliases_from_text(normalized_vendor, normalized_text)
-            for alias in aliases:
-                alias_pattern = create_flexible_pattern(alias)
-                alias_matches = list(re.finditer(alias_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(alias_matches) > 0:
-                    deidentified_text = re.sub(alias_pattern, "the Company", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced vendor alias '{alias}' ({len(alias_matches)} occurrences)")
-        
-        # Replace customer with "the Customer"
-        if normalized_customer:
-            # First replace the full name
-            pattern = create_flexible_pattern(normalized_customer)
-            matches = list(re.finditer(pattern, deidentified_text, flags=re.IGNORECASE))
-            match_count = len(matches)
-            
-            if match_count > 0:
-                deidentified_text = re.sub(pattern, "the Customer", deidentified_text, flags=re.IGNORECASE)
-                replacements_made.append(f"customer '{customer_name}' → 'the Customer' ({match_count} occurrences)")
-                replacement_count['customer'] = match_count
-            else:
-                logger.warning(f"⚠️ Customer name '{customer_name}' (normalized: '{normalized_customer}') not found in contract text")
-                replacement_count['customer'] = 0
-            
-            # Also replace base company name (e.g., "Martin" from "Martin, LLC")
-            base_customer_name = extract_base_company_name(normalized_customer)
-            if base_customer_name:
-                base_pattern = create_flexible_pattern(base_customer_name)
-                base_matches = list(re.finditer(base_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(base_matches) > 0:
-                    deidentified_text = re.sub(base_pattern, "the Customer", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced customer base name '{base_customer_name}' ({len(base_matches)} occurrences)")
-            
-            # Also replace aliases found in the text
-            aliases = extract_aliases_from_text(normalized_customer, normalized_text)
-            for alias in aliases:
-                alias_pattern = create_flexible_pattern(alias)
-                alias_matches = list(re.finditer(alias_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(alias_matches) > 0:
-                    deidentified_text = re.sub(alias_pattern, "the Customer", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced customer alias '{alias}' ({len(alias_matches)} occurrences)")
-        
-        # Check if de-identification succeeded
-        if not replacements_made:
-            error_msg = (
-                f"Privacy extraction did not detect party names in the contract text. "
-                f"Extracted names (vendor: '{vendor_name}', customer: '{customer_name}') "
-                f"were not found in the contract."
-            )
-            logger.warning(f"⚠️ {error_msg}")
-            return {
-                "success": False,
-                "text": contract_text,  # Return original text
-                "vendor_name": vendor_name,
-                "customer_name": customer_name,
-                "replacements": [],
-                "error": error_msg
-            }
-        
-        # Log success
-        logger.info(f"✓ De-identification complete: {', '.join(replacements_made)}")
+        result = deidentify_parties(contract_text, [
+            {'key': 'vendor', 'label': 'vendor', 'name': vendor_name, 'replacement': 'the Company'},
+            {'key': 'customer', 'label': 'customer', 'name': customer_name, 'replacement': 'the Customer'}
+        ])
         
         return {
-            "success": True,
-            "text": deidentified_text,
+            "success": result["success"],
+            "text": result["text"],
             "vendor_name": vendor_name,
             "customer_name": customer_name,
-            "replacements": replacements_made,
-            "error": None
+            "replacements": result["replacements"],
+            "deidentification_map": result["deidentification_map"],
+            "error": result["error"]
         }
     
     def _is_gpt5_model(self, model_name=None):
@@ -520,30 +283,41 @@ Respond with ONLY a JSON object in this exact format:
             }
             return {"max_tokens": token_limits.get(request_type, 2000)}
     
-    def _make_llm_request(self, messages, model=None, request_type="default"):
-        """Helper method to route between Responses API (GPT-5) and Chat Completions API (GPT-4o)."""
+    def _make_llm_request(self, messages, model=None, request_type="default", accept=None):
+        """Helper method to route between Responses API (GPT-5) and Chat Completions API (GPT-4o).
+        
+        Calls go through the shared hedging layer, which sends a second request
+        (optionally to a fallback model) when a call passes the rolling p95 latency
+        or returns a response that `accept` rejects (default: empty text).
+        """
         target_model = model or self.model
         
-        if self._is_gpt5_model(target_model):
-            # Use Responses API for GPT-5 models
-            response = self.client.responses.create(
-                model=target_model,
-                input=messages,
-                max_output_tokens=10000,  # GPT-5 uses max_output_tokens
-                reasoning={"effort": "medium"}
-            )
-            # Access response content from Responses API format
-            return response.output_text
-        else:
-            # Use Chat Completions API for GPT-4o models
-            request_params = {
-                "model": target_model,
-                "messages": messages,
-                "temperature": self._get_temperature(target_model),
-                **self._get_max_tokens_param(request_type, target_model)
-            }
-            response = self.client.chat.completions.create(**request_params)
-            return response.choices[0].message.content
+        def send(request_model):
+            if self._is_gpt5_model(request_model):
+                # Use Responses API for GPT-5 models
+                response = self.client.responses.create(
+                    model=request_model,
+                    input=messages,
+                    max_output_tokens=10000,  # GPT-5 uses max_output_tokens
+                    reasoning={"effort": "medium"}
+                )
+                record_response_usage(response, request_model)
+                # Access response content from Responses API format
+                return response.output_text
+            else:
+                # Use Chat Completions API for GPT-4o models
+                request_params = {
+                    "model": request_model,
+                    "messages": messages,
+                    "temperature": self._get_temperature(request_model),
+                    **self._get_max_tokens_param(request_type, request_model)
+                }
+                response = self.client.chat.completions.create(**request_params)
+                record_response_usage(response, request_params['model'])
+                return response.choices[0].message.content
+        
+        content, _ = hedged_request(send, target_model, request_type, accept)
+        return content
     
     def analyze_contract(self, 
                         contract_text: str,
@@ -782,7 +556,11 @@ Respond with ONLY a JSON object in this exact format:
             ]
             
             # Use helper method that properly routes between Responses API (GPT-5) and Chat Completions API (GPT-4o)
-            markdown_content = self._make_llm_request(messages, self.model, "step_analysis")
+            # An empty, truncated or conclusion-less response sends the hedge request at once
+            def usable(text):
+                return bool(text) and len(text.strip()) >= 50 and "**Conclusion:**" in text
+            
+            markdown_content = self._make_llm_request(messages, self.model, "step_analysis", accept=usable)
             
             # Track API cost for step analysis
             track_openai_request(
@@ -792,28 +570,10 @@ Respond with ONLY a JSON object in this exact format:
                 request_type=f"step_{step_num}_analysis"
             )
             
-            if markdown_content is None or (markdown_content and len(markdown_content.strip()) < 50):
-                # Handle empty or very short response - retry once
-                logger.warning(f"⚠️ Step {step_num}: Received empty/short response ({len(markdown_content) if markdown_content else 0} chars). Retrying...")
-                
-                # Retry the API call once
-                time.sleep(2)  # Brief pause before retry
-                markdown_content = self._make_llm_request(messages, self.model, "step_analysis")
-                
-                # Track retry API cost
-                track_openai_request(
-                    messages=messages,
-                    response_text=markdown_content or "",
-                    model=self.model,
-                    request_type=f"step_{step_num}_analysis_retry"
-                )
-                
-                if markdown_content is None or (markdown_content and len(markdown_content.strip()) < 50):
-                    # Retry also failed - generate error message
-                    logger.error(f"ERROR: Step {step_num} - Both attempts returned empty/short response")
-                    markdown_content = f"## Step {step_num}: Analysis Error\n\n**Error:** The AI model returned an empty response after multiple attempts. This is a known intermittent issue with GPT-5.\n\n**Recommended Action:** Please retry this analysis or switch to GPT-4o model.\n\n**Issues or Uncertainties:** Analysis could not be completed due to model response failure."
-                else:
-                    logger.info(f"✓ Step {step_num}: Retry successful, received {len(markdown_content)} chars")
+            if not markdown_content or len(markdown_content.strip()) < 50:
+                # The hedge also came back empty/short - generate error message
+                logger.error(f"ERROR: Step {step_num} - Both attempts returned empty/short response")
+                markdown_content = f"## Step {step_num}: Analysis Error\n\n**Error:** The AI model returned an empty response after multiple attempts. This is a known intermittent issue with GPT-5.\n\n**Recommended Action:** Please retry this analysis or switch to GPT-4o model.\n\n**Issues or Uncertainties:** Analysis could not be completed due to model response failure."
             
             # ONLY strip whitespace - NO OTHER PROCESSING
             markdown_content = markdown_content.strip()
@@ -823,27 +583,7 @@ Respond with ONLY a JSON object in this exact format:
             if not validation_result["valid"]:
                 logger.warning(f"Step {step_num} validation issues: {validation_result['issues']}")
                 
-                # Check if missing Conclusion section - this is critical, retry once
-                if "**Conclusion:**" not in markdown_content:
-                    logger.warning(f"⚠️ Step {step_num}: Missing **Conclusion:** section - retrying with explicit format instruction...")
-                    time.sleep(1)
-                    
-                    # Add explicit format reminder to prompt for retry
-                    retry_prompt = prompt + "\n\nIMPORTANT REMINDER: You MUST include a **Conclusion:** section (bold with colon). This is required."
-                    retry_messages = [
-                        {"role": "system", "content": self._get_markdown_system_prompt()},
-                        {"role": "user", "content": retry_prompt}
-                    ]
-                    
-                    retry_content = self._make_llm_request(retry_messages, self.model, "step_analysis_conclusion_retry")
-                    if retry_content and "**Conclusion:**" in retry_content:
-                        logger.info(f"✓ Step {step_num}: Retry successful - Conclusion section now present")
-                        markdown_content = retry_content.strip()
-                        validation_result = self.validate_step_output(markdown_content, step_num)
-                    else:
-                        logger.warning(f"Step {step_num}: Retry still missing Conclusion - using original content")
-                
-                # Append validation issues to the Issues section if still invalid
+                # Append validation issues to the Issues section
                 if not validation_result["valid"] and "**Issues or Uncertainties:**" in markdown_content:
                     issues_section = "\n\n**Validation Notes:** " + "; ".join(validation_result["issues"])
                     markdown_content = markdown_content.replace(
@@ -1212,6 +952,7 @@ Requirements:
             params.update(self._get_max_tokens_param("executive_summary"))
             
             response = self.client.chat.completions.create(**params)
+            record_response_usage(response, params['model'])
             
             content = response.choices[0].message.content
             if content:
@@ -1254,6 +995,7 @@ Instructions:
             params.update(self._get_max_tokens_param("background"))
             
             response = self.client.chat.completions.create(**params)
+            record_response_usage(response, params['model'])
             
             content = response.choices[0].message.content
             if content:
@@ -1311,6 +1053,7 @@ Instructions:
             }
             
             response = self.client.chat.completions.create(**request_params)
+            record_response_usage(response, request_params['model'])
             conclusion = response.choices[0].message.content.strip()
             logger.info(f"✓ Final conclusion generated ({len(conclusion)} chars)")
             return conclusion
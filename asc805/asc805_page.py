@@ -280,18 +280,8 @@ def render_asc805_page():
         if cached_text_key not in st.session_state:
             with st.spinner("📄 Extracting and processing transaction documents..."):
                 try:
-                    extractor = DocumentExtractor()
-                    all_texts = []
-                    failed_files = []
-                    
-                    for uploaded_file in uploaded_files:
-                        uploaded_file.seek(0)
-                        result = extractor.extract_text(uploaded_file)
-                        # Check if extraction succeeded (no error and has text)
-                        if result and isinstance(result, dict) and not result.get('error') and result.get('text'):
-                            all_texts.append(result['text'])
-                        else:
-                            failed_files.append(uploaded_file.name)
+                    # Files are extracted concurrently and listed as each one finishes
+                    all_texts, failed_files = SharedUIComponents.extract_uploaded_files(uploaded_files)
                     
                     # Check if we have any successfully extracted text
                     if not all_texts:
@@ -652,70 +642,6 @@ def _upload_and_process_asc805():
         st.error(f"❌ Error processing files: {str(e)}")
         return None, None
 
-def _extract_customer_name(contract_text: str) -> str:
-    """Extract entity name from business combination documents."""
-    try:
-        import re
-        
-        if not contract_text:
-            return "Entity"
-
-        # Normalize quotes and whitespace
-        sample = contract_text[:6000].replace(""", '"').replace(""", '"').replace("'", "'")
-        sample = re.sub(r'[ \t]+', ' ', sample)
-
-        def clean_name(name: str) -> str:
-            n = name.strip().strip(' "').strip()
-            n = re.sub(r'\s+', ' ', n)
-            n = re.sub(r'[\s\.,;:)\]]+$', '', n)
-            if len(n) < 3 or len(n) > 120:
-                return ""
-            return n
-
-        def plausible_company(name: str) -> bool:
-            if not name:
-                return False
-            addr_tokens = {"street", "st.", "road", "rd.", "avenue", "ave.", "suite", "ste.", "floor", "fl.", "drive", "dr.", "blvd", "boulevard", "lane", "ln.", "way", "p.o.", "po box", "box"}
-            lname = name.lower()
-            if any(t in lname for t in addr_tokens):
-                return False
-            if not re.search(r'[A-Za-z]', name):
-                return False
-            return True
-
-        # Look for acquiring/target company patterns
-        target_patterns = [
-            r'\b(?:target|acquired|acquisition)\s+(?:company|entity|corporation|corp|inc|llc)[\s:]*([A-Za-z0-9\.\,&\-\s]{3,120})',
-            r'\b([A-Za-z0-9\.\,&\-\s]{3,120})\s+\((?:the\s+)?["\']?(?:target|acquired|acquisition)["\']?\s*\)',
-            r'\bbetween\s+([^,\n;]+?)\s+and\s+([^,\n;]+)',
-        ]
-        
-        for pattern in target_patterns:
-            matches = re.finditer(pattern, sample, re.IGNORECASE)
-            for match in matches:
-                for group in match.groups():
-                    name = clean_name(group)
-                    if name and plausible_company(name):
-                        return name
-
-        # Company suffix fallback
-        company_suffix = re.compile(
-            r'([A-Z][A-Za-z0-9&\.\- ]{2,80}?\s(?:Inc\.?|Incorporated|LLC|L\.L\.C\.|Ltd\.?|Limited|Corp\.?|Corporation|PLC|LP|LLP|GmbH|S\.?A\.?R\.?L\.?|S\.?A\.?|SAS|BV|NV|Pty\.?\s?Ltd\.?|Co\.?))\b'
-        )
-        matches = company_suffix.findall(sample)
-        if matches:
-            for name in matches:
-                if plausible_company(clean_name(name)):
-                    return clean_name(name)
-
-        return "Entity"
-
-    except Exception as e:
-        if 'logger' in globals():
-            logger.error(f"Error extracting entity name: {str(e)}")
-        return "Entity"
-
-
 def _generate_analysis_title() -> str:
     """Generate analysis title with timestamp."""
     return f"ASC805_Analysis_{datetime.now().strftime('%m%d_%H%M%S')}"
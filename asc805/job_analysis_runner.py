@@ -12,10 +12,15 @@ from datetime import datetime
 
 from shared.job_manager import job_manager
 from shared.analysis_manager import analysis_manager
-from shared.job_progress_monitor import monitor_job_progress
+from shared.job_progress_monitor import monitor_job_progress, follow_inflight_analysis
 
 logger = logging.getLogger(__name__)
 
+def _get_deidentification_map(session_id: str) -> Optional[Dict[str, Any]]:
+    """Get the de-identification map cached by the page, stored with the analysis for re-identification"""
+    deidentify_result = st.session_state.get(f'asc805_cached_deidentify_{session_id}') or {}
+    return deidentify_result.get('deidentification_map') if deidentify_result.get('success') else None
+
 def submit_and_monitor_asc805_job(
     allowance_result: Dict[str, Any],
     additional_context: str,
@@ -47,6 +52,14 @@ def submit_and_monitor_asc805_job(
             st.error("❌ User authentication failed. Please refresh and log in again.")
             return
         
+        # Same contract, standard and context already queued or running for this user
+        # (double-click, reload, second tab) - follow that job instead of starting and billing another
+        # Otherwise this submission is claimed, so a concurrent duplicate follows it instead
+        inflight = job_manager.find_inflight_analysis('ASC 805', user_id, cached_combined_text, additional_context)
+        if inflight:
+            follow_inflight_analysis('ASC 805', inflight, session_id, user_token)
+            return
+        
         # CRITICAL: Create analysis record FIRST with status='processing'
         # This stores authoritative pricing info that backend will use for billing
         # Backend will generate the database INTEGER analysis_id
@@ -67,6 +80,7 @@ def submit_and_monitor_asc805_job(
         
         if not create_response.ok:
             st.error(f"❌ Failed to create analysis record: {create_response.text}")
+            job_manager.release_inflight_claim('ASC 805', user_id, cached_combined_text, additional_context)
             return
         
         # Extract database analysis_id (INTEGER) and service token from response
@@ -76,6 +90,7 @@ def submit_and_monitor_asc805_job(
         
         if not service_token:
             st.error("❌ Failed to generate service token for background worker")
+            job_manager.release_inflight_claim('ASC 805', user_id, cached_combined_text, additional_context)
             return
         
         logger.info(f"✓ Analysis record created with database ID: {db_analysis_id}")
@@ -93,7 +108,8 @@ def submit_and_monitor_asc805_job(
                 combined_text=cached_combined_text,
                 uploaded_filenames=uploaded_filenames,
                 org_id=org_id,  # For word deduction
-                total_words=total_words  # For word deduction
+                total_words=total_words,  # For word deduction
+                deidentification_map=_get_deidentification_map(session_id)
             )
             
             logger.info(f"Job submitted: {job_id}")
@@ -133,4 +149,5 @@ def submit_and_monitor_asc805_job(
         
     except Exception as e:
         logger.error(f"Error in job submission: {str(e)}")
+        job_manager.release_inflight_claim('ASC 805', user_id, cached_combined_text, additional_context)  # Let a retry claim the submission again
         st.error(f"❌ **Error**: {str(e)}")
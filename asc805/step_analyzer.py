@@ -14,6 +14,10 @@ import random
 import json
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+from shared.llm_request import hedged_request
+from shared.api_cost_tracker import record_response_usage
+from shared.deidentification import deidentify_parties
+from shared.party_detection import detect_parties
 # ThreadPoolExecutor removed - now using sequential execution with accumulated context
 
 logger = logging.getLogger(__name__)
@@ -122,6 +126,11 @@ Respond with ONLY the target company name, nothing else."""
         try:
             logger.info("🔒 Extracting both party names for de-identification...")
             
+            # Deterministic fast path - most contracts name both parties in the preamble
+            detected = detect_parties(contract_text, "ASC 805")
+            if detected:
+                return {"acquirer": detected['first'], "target": detected['second']}
+            
             messages = [
                 {
                     "role": "system",
@@ -207,7 +216,7 @@ Respond with ONLY a JSON object in this exact format:
         Replace both party names with generic terms for privacy.
         Handles whitespace variations, line breaks, hyphenated line wraps, and punctuation differences.
         
-        Strategy: Normalize both text and party names consistently, then do pattern matching.
+        Names, base names and aliases are replaced in a single pass by the shared engine.
         
         Args:
             contract_text: Original contract text
@@ -221,267 +230,23 @@ Respond with ONLY a JSON object in this exact format:
                 - acquirer_name (str): Original acquirer name
                 - target_name (str): Original target name
                 - replacements (list): List of replacement descriptions
+                - deidentification_map (dict): Offset/token map for re-identification (None if failed)
                 - error (str): Error message if failed, None otherwise
         """
-        if not acquirer_name and not target_name:
-            logger.warning("⚠️ No party names to de-identify, returning original text")
-            return {
-                "success": False,
-                "text": contract_text,
-                "acquirer_name": acquirer_name,
-                "target_name": target_name,
-                "replacements": [],
-                "error": "No party names were extracted for de-identification"
-            }
-        
-        # Helper function for text normalization
-        def normalize_text(text: str) -> str:
-            """
-            Normalize text to handle PDF/Word extraction artifacts.
-            - Removes soft hyphens (Unicode U+00AD)
-            - Converts smart quotes to ASCII quotes
-            - Collapses hyphen + newline (line wraps) into space
-            - Normalizes multiple whitespace to single space
-            """
-            # Remove Unicode soft hyphen character
-            text = text.replace('\u00AD', '')
-            
-            # Convert smart quotes (Word/PDF) to regular ASCII quotes
-            # Opening/closing double quotes → "
-            text = text.replace('\u201C', '"').replace('\u201D', '"')
-            # Opening/closing single quotes → '
-            text = text.replace('\u2018', "'").replace('\u2019', "'")
-            
-            # Replace hyphen + newline/whitespace with single space
-            # This handles line-wrapped text like "Smith-\nJones LLC" → "Smith Jones LLC"
-            text = re.sub(r'-\s*\n\s*', ' ', text)
-            
-            # Normalize multiple whitespace to single space
-            text = re.sub(r'\s+', ' ', text)
-            
-            return text
-        
-        # STEP 1: Normalize contract text
-        normalized_text = normalize_text(contract_text)
-        
-        # STEP 2: Normalize extracted party names
-        normalized_acquirer = normalize_text(acquirer_name) if acquirer_name else None
-        normalized_target = normalize_text(target_name) if target_name else None
-        
-        deidentified_text = normalized_text
-        replacements_made = []
-        replacement_count = {}
-        
-        # Helper function to create flexible pattern
-        def create_flexible_pattern(name: str) -> str:
-            """
-            Create regex pattern that handles:
-            - Whitespace variations (spaces, tabs, newlines)
-            - Hyphen/space equivalence (handles line-wrapped hyphenated names)
-            - Punctuation variations (periods, commas)
-            """
-            # Escape the name
-            escaped = re.escape(name)
-            
-            # Replace escaped hyphens with pattern matching hyphen OR space
-            # This handles: "Smith-Jones" matching "Smith Jones" or "Smith-Jones"
-            escaped = escaped.replace(r'\-', r'(?:-|\s)')
-            
-            # Replace escaped spaces with pattern matching space OR hyphen
-            # This handles: "Smith Jones" matching "Smith-Jones" or "Smith Jones"
-            escaped = escaped.replace(r'\ ', r'(?:\s+|-)')
-            
-            # Make periods optional (handles "Inc." vs "Inc")
-            escaped = escaped.replace(r'\.', r'\.?')
-            
-            # Make commas optional (handles "Corp," vs "Corp")
-            escaped = escaped.replace(r'\,', r'\,?\s*')
-            
-            # Word boundary at start and end
-            return r'\b' + escaped + r'\b'
-        
-        # Helper function to extract aliases from text patterns
-        def extract_aliases_from_text(company_name: str, text: str) -> list:
-            """
-            Find actual aliases used in the text for this company.
-            Looks for patterns like: 
-            - Company Name Inc. ("ShortName")
-            - Company Name Inc. ('ShortName')
-            - Company Name Inc. ("Alias1" or "Alias2")
-            """
-            aliases = []
-            
-            # Escape company name for regex
-            escaped_name = re.escape(company_name)
-            
-            # More specific pattern for parenthetical aliases
-            # Allow optional punctuation (commas, periods) between company name and parenthesis
-            paren_pattern = escaped_name + r'[,\.\s]*\(([^)]{2,200})\)'
-            
-            matches = re.finditer(paren_pattern, text, flags=re.IGNORECASE)
-            for match in matches:
-                content = match.group(1).strip()
-                
-                # Extract all quoted strings from the parenthetical content
-                # This focuses on actual aliases and avoids false positives from descriptive clauses
-                quoted_aliases = re.findall(r'["\']([A-Za-z0-9\s\-&]{2,50})["\']', content)
-                
-                for alias in quoted_aliases:
-                    alias = alias.strip()
-                    # Only accept if it looks like an alias (not numbers-only)
-                    if alias and 2 <= len(alias) <= 50:
-                        if re.match(r'^[A-Za-z0-9\s\-&]+$', alias) and not re.match(r'^\d+$', alias):
-                            aliases.append(alias)
-            
-            return list(set(aliases))  # Remove duplicates
-        
-        # Helper function to extract base company name
-        def extract_base_company_name(company_name: str) -> str | None:
-            """
-            Extract base company name by removing legal suffixes.
-            Examples:
-            - "Netflix, Inc." → "Netflix"
-            - "Acme Corporation" → "Acme"
-            - "Smith & Associates LLC" → "Smith & Associates"
-            
-            Returns None if base name would be too short/generic or same as input.
-            """
-            # Common legal suffixes (case-insensitive)
-            suffixes = [
-                r',?\s+Inc\.?',
-                r',?\s+LLC\.?',
-                r',?\s+L\.?L\.?C\.?',
-                r',?\s+Corp\.?',
-                r',?\s+Corporation',
-                r',?\s+Ltd\.?',
-                r',?\s+Limited',
-                r',?\s+Co\.?',
-                r',?\s+Company',
-                r',?\s+L\.?P\.?',
-                r',?\s+LLP\.?',
-                r',?\s+P\.?L\.?L\.?C\.?',
-                r',?\s+S\.?A\.?',
-                r',?\s+N\.?V\.?',
-                r',?\s+A\.?G\.?',
-                r',?\s+GmbH',
-                r',?\s+PLC'
-            ]
-            
-            base_name = company_name
-            
-            # Try removing each suffix
-            for suffix_pattern in suffixes:
-                # Match suffix at end of string
-                pattern = suffix_pattern + r'$'
-                base_name = re.sub(pattern, '', base_name, flags=re.IGNORECASE).strip()
-            
-            # Also remove trailing commas/periods if left over
-            base_name = base_name.rstrip('.,').strip()
-            
-            # Only return if:
-            # 1. It's different from original (we actually removed something)
-            # 2. It's at least 3 characters (avoid overly generic like "A", "XY")
-            # 3. It contains at least one letter (not just numbers/symbols)
-            if (base_name != company_name and 
-                len(base_name) >= 3 and 
-                re.search(r'[A-Za-z]', base_name)):
-                return base_name
-            
-            return None
-        
-        # Replace acquirer with "the Company"
-        if normalized_acquirer:
-            # First replace the full name
-            pattern = create_flexible_pattern(normalized_acquirer)
-            matches = list(re.finditer(pattern, deidentified_text, flags=re.IGNORECASE))
-            match_count = len(matches)
-            
-            if match_count > 0:
-                deidentified_text = re.sub(pattern, "the Company", deidentified_text, flags=re.IGNORECASE)
-                replacements_made.append(f"acquirer '{acquirer_name}' → 'the Company' ({match_count} occurrences)")
-                replacement_count['acquirer'] = match_count
-            else:
-                logger.warning(f"⚠️ Acquirer name '{acquirer_name}' (normalized: '{normalized_acquirer}') not found in contract text")
-                replacement_count['acquirer'] = 0
-            
-            # Also replace base company name (e.g., "Netflix" from "Netflix, Inc.")
-            base_acquirer_name = extract_base_company_name(normalized_acquirer)
-            if base_acquirer_name:
-                base_pattern = create_flexible_pattern(base_acquirer_name)
-                base_matches = list(re.finditer(base_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(base_matches) > 0:
-                    deidentified_text = re.sub(base_pattern, "the Company", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced acquirer base name '{base_acquirer_name}' ({len(base_matches)} occurrences)")
-            
-            # Also replace aliases found in the text (e.g., "InnovateTech" from "InnovateTech Solutions Inc. ('InnovateTech')")
-            aliases = extract_aliases_from_text(normalized_acquirer, normalized_text)
-            for alias in aliases:
-                alias_pattern = create_flexible_pattern(alias)
-                alias_matches = list(re.finditer(alias_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(alias_matches) > 0:
-                    deidentified_text = re.sub(alias_pattern, "the Company", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced acquirer alias '{alias}' ({len(alias_matches)} occurrences)")
-        
-        # Replace target with "the Target"
-        if normalized_target:
-            # First replace the full name
-            pattern = create_flexible_pattern(normalized_target)
-            matches = list(re.finditer(pattern, deidentified_text, flags=re.IGNORECASE))
-            match_count = len(matches)
-            
-            if match_count > 0:
-                deidentified_text = re.sub(pattern, "the Target", deidentified_text, flags=re.IGNORECASE)
-                replacements_made.append(f"target '{target_name}' → 'the Target' ({match_count} occurrences)")
-                replacement_count['target'] = match_count
-            else:
-                logger.warning(f"⚠️ Target name '{target_name}' (normalized: '{normalized_target}') not found in contract text")
-                replacement_count['target'] = 0
-            
-            # Also replace base company name (e.g., "Martin" from "Martin, LLC")
-            base_target_name = extract_base_company_name(normalized_target)
-            if base_target_name:
-                base_pattern = create_flexible_pattern(base_target_name)
-                base_matches = list(re.finditer(base_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(base_matches) > 0:
-                    deidentified_text = re.sub(base_pattern, "the Target", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced target base name '{base_target_name}' ({len(base_matches)} occurrences)")
-            
-            # Also replace aliases found in the text
-            aliases = extract_aliases_from_text(normalized_target, normalized_text)
-            for alias in aliases:
-                alias_pattern = create_flexible_pattern(alias)
-                alias_matches = list(re.finditer(alias_pattern, deidentified_text, flags=re.IGNORECASE))
-                if len(alias_matches) > 0:
-                    deidentified_text = re.sub(alias_pattern, "the Target", deidentified_text, flags=re.IGNORECASE)
-                    logger.info(f"  → Also replaced target alias '{alias}' ({len(alias_matches)} occurrences)")
-        
-        # Check if de-identification succeeded
-        if not replacements_made:
-            error_msg = (
-                f"Privacy extraction did not detect party names in the transaction document text. "
-                f"Extracted names (acquirer: '{acquirer_name}', target: '{target_name}') "
-                f"were not found in the contract."
-            )
-            logger.warning(f"⚠️ {error_msg}")
-            return {
-                "success": False,
-                "text": contract_text,  # Return original text
-                "acquirer_name": acquirer_name,
-                "target_name": target_name,
-                "replacements": [],
-                "error": error_msg
-            }
-        
-        # Log success
-        logger.info(f"✓ De-identification complete: {', '.join(replacements_made)}")
+        result = deidentify_parties(contract_text, [
+            {'key': 'acquirer', 'label': 'acquirer', 'name': acquirer_name, 'replacement': 'the Company'},
+            {'key': 'target', 'label': 'target', 'name': target_name, 'replacement': 'the Target'}
+        ],
+            document_description="transaction document text")
         
         return {
-            "success": True,
-            "text": deidentified_text,
+            "success": result["success"],
+            "text": result["text"],
             "acquirer_name": acquirer_name,
             "target_name": target_name,
-            "replacements": replacements_made,
-            "error": None
+            "replacements": result["replacements"],
+            "deidentification_map": result["deidentification_map"],
+            "error": result["error"]
         }
     
     def _is_gpt5_model(self, model_name=None):
@@ -522,29 +287,39 @@ Respond with ONLY a JSON object in this exact format:
             return {"max_tokens": token_limits.get(request_type, 2000)}
     
     def _make_llm_request(self, messages, model=None, request_type="default"):
-        """Helper method to route between Responses API (GPT-5) and Chat Completions API (GPT-4o)."""
+        """Helper method to route between Responses API (GPT-5) and Chat Completions API (GPT-4o).
+        
+        Calls go through the shared hedging layer, which sends a second request
+        (optionally to a fallback model) when a call passes the rolling p95 latency.
+        """
         target_model = model or self.model
         
-        if self._is_gpt5_model(target_model):
-            # Use Responses API for GPT-5 models
-            response = self.client.responses.create(
-                model=target_model,
-                input=messages,
-                max_output_tokens=10000,  # GPT-5 uses max_output_tokens
-                reasoning={"effort": "medium"}
-            )
-            # Access response content from Responses API format
-            return response.output_text
-        else:
-            # Use Chat Completions API for GPT-4o models
-            request_params = {
-                "model": target_model,
-                "messages": messages,
-                "temperature": self._get_temperature(target_model),
-                **self._get_max_tokens_param(request_type, target_model)
-            }
-            response = self.client.chat.completions.create(**request_params)
-            return response.choices[0].message.content
+        def send(request_model):
+            if self._is_gpt5_model(request_model):
+                # Use Responses API for GPT-5 models
+                response = self.client.responses.create(
+                    model=request_model,
+                    input=messages,
+                    max_output_tokens=10000,  # GPT-5 uses max_output_tokens
+                    reasoning={"effort": "medium"}
+                )
+                record_response_usage(response, request_model)
+                # Access response content from Responses API format
+                return response.output_text
+            else:
+                # Use Chat Completions API for GPT-4o models
+                request_params = {
+                    "model": request_model,
+                    "messages": messages,
+                    "temperature": self._get_temperature(request_model),
+                    **self._get_max_tokens_param(request_type, request_model)
+                }
+                response = self.client.chat.completions.create(**request_params)
+                record_response_usage(response, request_params['model'])
+                return response.choices[0].message.content
+        
+        content, _ = hedged_request(send, target_model, request_type)
+        return content
     
     def analyze_contract(self, 
                         contract_text: str,
@@ -785,19 +560,38 @@ Respond with ONLY a JSON object in this exact format:
             if self._is_gpt5_model(self.model):
                 request_params["response_format"] = {"type": "text"}
             
-            response = self.client.chat.completions.create(**request_params)
+            def send(request_model):
+                # Rebuild model-specific parameters so a hedge can target a fallback model
+                params = {k: v for k, v in request_params.items()
+                          if k not in ("max_tokens", "max_completion_tokens", "response_format")}
+                params["model"] = request_model
+                params["temperature"] = self._get_temperature(request_model)
+                params.update(self._get_max_tokens_param("step_analysis", request_model))
+                if self._is_gpt5_model(request_model):
+                    params["response_format"] = {"type": "text"}
+                response = self.client.chat.completions.create(**params)
+                record_response_usage(response, params['model'])
+                return response.choices[0].message.content
+            
+            # Hedged call - a second request goes out if this one passes the rolling p95 latency,
+            # or at once if it comes back empty, truncated or without its Analysis/Conclusion sections
+            def usable(text):
+                if not text or len(text.strip()) < 100:
+                    return False
+                issues = self.validate_step_output(text.strip(), step_num)['issues']
+                return not any(issue.startswith('Missing ') for issue in issues)
+            
+            markdown_content, _ = hedged_request(send, self.model, "step_analysis", accept=usable)
             
             # Track API cost for this request
             from shared.api_cost_tracker import track_openai_request
             track_openai_request(
                 messages=request_params["messages"],
-                response_text=response.choices[0].message.content or "",
+                response_text=markdown_content or "",
                 model=self.model,
                 request_type=f"step_{step_num}_analysis"
             )
             
-            markdown_content = response.choices[0].message.content
-            
             if markdown_content is None or not markdown_content.strip():
                 error_msg = f"GPT-5 returned empty/None content for Step {step_num}"
                 logger.error(f"ERROR: {error_msg}")
@@ -1104,6 +898,7 @@ Format as clean markdown - no headers, just paragraphs and bullet points."""
                 request_params["response_format"] = {"type": "text"}
             
             response = self.client.chat.completions.create(**request_params)
+            record_response_usage(response, request_params['model'])
             
             # Track API cost for executive summary
             from shared.api_cost_tracker import track_openai_request
@@ -1168,6 +963,7 @@ Format as clean markdown - no headers, just paragraphs."""
                 request_params["response_format"] = {"type": "text"}
             
             response = self.client.chat.completions.create(**request_params)
+            record_response_usage(response, request_params['model'])
             
             # Track API cost for background section
             from shared.api_cost_tracker import track_openai_request
@@ -1235,6 +1031,7 @@ Format as clean markdown - no headers, just paragraphs."""
             }
 
             response = self.client.chat.completions.create(**request_params)
+            record_response_usage(response, request_params['model'])
             conclusion = response.choices[0].message.content.strip()
             logger.info(f"✓ Final conclusion generated ({len(conclusion)} chars)")
             return conclusion
@@ -12,6 +12,7 @@ from shared.ui_components import SharedUIComponents
 from shared.auth_utils import require_authentication, show_credits_warning, auth_manager
 from shared.billing_manager import billing_manager
 from shared.preflight_pricing import preflight_pricing
+from shared.extraction_cache import get_file_text
 from shared.analysis_manager import analysis_manager
 # CleanMemoGenerator import moved to initialization section
 import tempfile
@@ -313,18 +314,8 @@ def render_asc842_page():
         if cached_text_key not in st.session_state:
             with st.spinner("📄 Extracting and processing lease agreement text..."):
                 try:
-                    extractor = DocumentExtractor()
-                    all_texts = []
-                    failed_files = []
-                    
-                    for uploaded_file in uploaded_files:
-                        uploaded_file.seek(0)
-                        result = extractor.extract_text(uploaded_file)
-                        # Check if extraction succeeded (no error and has text)
-                        if result and isinstance(result, dict) and not result.get('error') and result.get('text'):
-                            all_texts.append(result['text'])
-                        else:
-                            failed_files.append(uploaded_file.name)
+                    # Files are extracted concurrently and listed as each one finishes
+                    all_texts, failed_files = SharedUIComponents.extract_uploaded_files(uploaded_files)
                     
                     # Check if we have any successfully extracted text
                     if not all_texts:
@@ -675,8 +666,9 @@ def perform_asc842_analysis_new(allowance_result: dict, additional_context: str,
             filename_list = []
             
             for file_detail in allowance_result.get('file_details', []):
-                if 'text_content' in file_detail and file_detail['text_content'].strip():
-                    combined_text += f"\n\n=== {file_detail['filename']} ===\n\n{file_detail['text_content']}"
+                file_text = get_file_text(file_detail)
+                if file_text.strip():
+                    combined_text += f"\n\n=== {file_detail['filename']} ===\n\n{file_text}"
                     filename_list.append(file_detail['filename'])
             
             filename_string = ", ".join(filename_list)
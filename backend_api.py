@@ -3,7 +3,7 @@ VeritasLogic Backend API
 Handles user registration, authentication, and billing
 """
 
-from flask import Flask, request, jsonify, render_template_string, send_from_directory, redirect, url_for, Response
+from flask import Flask, request, jsonify, render_template_string, send_from_directory, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
 import psycopg2
 import psycopg2.extras
@@ -23,6 +23,7 @@ import requests
 from shared.pricing_config import is_business_email
 from shared.postmark_client import PostmarkClient
 from shared.log_sanitizer import sanitize_for_log, sanitize_exception_for_db
+from shared.analysis_persistence import persist_analysis_result, decode_save_payload
 from shared.trial_protection import (
     verify_recaptcha,
     check_rate_limit,
@@ -2053,191 +2054,56 @@ def save_worker_analysis():
             return jsonify({'error': payload['error']}), 401
         
         user_id = payload['user_id']
-        data = request.get_json()
+        # Workers send gzip-compressed bodies (Content-Encoding: gzip)
+        try:
+            data = decode_save_payload(request.get_data(), request.headers.get('Content-Encoding'))
+        except (OSError, ValueError):
+            return jsonify({'error': 'Invalid request body'}), 400
         
         # Extract minimal data from worker (analysis_id is database INTEGER)
         try:
             analysis_id = int(data.get('analysis_id', 0))  # Database INTEGER id
         except (ValueError, TypeError):
             return jsonify({'error': 'analysis_id must be a valid integer'}), 400
-            
-        memo_content = data.get('memo_content', '')  # Full memo text
-        api_cost = Decimal(str(data.get('api_cost', 0)))  # For logging only
-        success = data.get('success', False)
-        error_message = sanitize_string(data.get('error_message', ''), 500) if data.get('error_message') else None
-        org_id = data.get('org_id')  # For subscription word deduction
-        total_words = data.get('total_words')  # For subscription word deduction
         
         if not analysis_id or analysis_id <= 0:
             return jsonify({'error': 'Valid analysis_id required'}), 400
         
+        save_data = dict(data)
+        if data.get('error_message'):
+            save_data['error_message'] = sanitize_string(data.get('error_message'), 500)
+        
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Database connection failed'}), 500
         
-        cursor = conn.cursor()
-        
         try:
-            # CRITICAL: Retrieve AUTHORITATIVE pricing from existing analysis record
-            # This record was created with server-validated pricing BEFORE job submission
-            # Look up by analysis_id (database INTEGER) with user scoping for security
-            cursor.execute("""
-                SELECT analysis_id, user_id, memo_uuid, asc_standard, words_count, tier_name, 
-                       file_count, final_charged_credits, billed_credits, status
-                FROM analyses 
-                WHERE analysis_id = %s
-                AND user_id = %s
-            """, (analysis_id, user_id))
-            
-            existing_record = cursor.fetchone()
-            
-            if not existing_record:
-                logger.error(f"No pending analysis found for user {user_id}")
-                return jsonify({'error': 'Analysis record not found'}), 404
-            
-            # Verify user owns this analysis
-            if existing_record['user_id'] != user_id:
-                logger.error(f"User {user_id} attempted to save analysis for user {existing_record['user_id']}")
-                return jsonify({'error': 'Unauthorized'}), 403
-            
-            # Check if already completed (idempotency)
-            if existing_record['status'] in ['completed', 'failed']:
-                logger.warning(f"Duplicate save attempt for analysis {existing_record['analysis_id']}")
-                
-                # Get current balance
-                cursor.execute("SELECT credits_balance FROM users WHERE id = %s", (user_id,))
-                current_balance = cursor.fetchone()['credits_balance']
-                
-                return jsonify({
-                    'message': 'Analysis already saved (idempotent)',
-                    'analysis_id': existing_record['analysis_id'],
-                    'memo_uuid': existing_record['memo_uuid'],
-                    'balance_remaining': float(current_balance)
-                }), 200
-            
-            # Use AUTHORITATIVE pricing from database (created at job submission time)
-            db_analysis_id = existing_record['analysis_id']
-            memo_uuid = existing_record['memo_uuid']
-            cost_charged = existing_record['final_charged_credits']  # Server-validated price
-            asc_standard = existing_record['asc_standard']
-            words_count = existing_record['words_count']
-            tier_name = existing_record['tier_name']
-            file_count = existing_record['file_count']
-            
-            analysis_status = 'completed' if success else 'failed'
-            
-            # Get current balance and verification status
-            cursor.execute("SELECT email_verified, credits_balance FROM users WHERE id = %s", (user_id,))
-            user_check = cursor.fetchone()
-            
-            # CRITICAL: If unverified, still persist failure status but don't charge
-            if not user_check or not user_check['email_verified']:
-                logger.warning(f"Unverified user {user_id} attempted to complete analysis")
-                
-                # Mark analysis as failed with clear error message
-                cursor.execute("""
-                    UPDATE analyses 
-                    SET status = 'failed',
-                        completed_at = NOW(),
-                        error_message = 'Email verification required. Please verify your email and try again.'
-                    WHERE analysis_id = %s AND user_id = %s
-                """, (db_analysis_id, user_id))
-                
-                conn.commit()
-                
-                return jsonify({
-                    'error': 'Email verification required',
-                    'message': 'Analysis marked as failed. No credits charged.'
-                }), 403
-            
-            current_balance = user_check['credits_balance']
-            
-            # Update analysis record with completion data
-            cursor.execute("""
-                UPDATE analyses 
-                SET status = %s,
-                    completed_at = NOW(),
-                    est_api_cost = %s,
-                    memo_content = %s,
-                    error_message = %s,
-                    final_charged_credits = %s,
-                    billed_credits = %s
-                WHERE analysis_id = %s AND user_id = %s
-            """, (analysis_status, api_cost, 
-                  memo_content if success else None,
-                  error_message,
-                  cost_charged if success else 0,
-                  cost_charged if success else 0,
-                  db_analysis_id, user_id))
-            
-            logger.info(f"Analysis updated: {db_analysis_id}, status: {analysis_status}")
-            
-            # Subscription-based word deduction (new system)
-            if success and org_id and total_words:
-                try:
-                    from shared.subscription_manager import SubscriptionManager
-                    subscription_manager = SubscriptionManager(conn)
-                    
-                    # Deduct words from subscription allowance
-                    deduction_result = subscription_manager.deduct_words(
-                        org_id=org_id,
-                        words_used=total_words,
-                        analysis_id=db_analysis_id
-                    )
-                    
-                    logger.info(
-                        f"✓ Word deduction successful for org {org_id}: {total_words} words, "
-                        f"breakdown: {deduction_result['from_allowance']} from allowance, "
-                        f"{deduction_result['from_rollover']} from rollover"
-                    )
-                    balance_after = 0  # Not used in subscription system, but keep for response consistency
-                    
-                except Exception as e:
-                    # Log error but don't fail the analysis save
-                    logger.error(f"Word deduction failed for org {org_id}, analysis {db_analysis_id}: {str(e)}")
-                    # Rollback to preserve transaction consistency
-                    conn.rollback()
-                    raise e
-            
-            # Legacy credit-based billing (for backwards compatibility during migration)
-            elif success and cost_charged and cost_charged > 0:
-                balance_after = max(current_balance - cost_charged, 0)
-                
-                # Deduct credits
-                cursor.execute("""
-                    UPDATE users 
-                    SET credits_balance = %s
-                    WHERE id = %s
-                """, (balance_after, user_id))
-                
-                # Record transaction
-                cursor.execute("""
-                    INSERT INTO credit_transactions (user_id, analysis_id, amount, reason,
-                                                   balance_after, memo_uuid, metadata, created_at)
-                    VALUES (%s, %s, %s, 'analysis_charge', %s, %s, %s, NOW())
-                """, (user_id, db_analysis_id, -cost_charged, balance_after, memo_uuid,
-                      json.dumps({'est_api_cost': float(api_cost), 'worker_job': analysis_id})))
-                
-                logger.info(f"Credits charged: {cost_charged}, new balance: {balance_after}")
-            else:
-                balance_after = current_balance if 'balance_after' not in locals() else balance_after
-                logger.info(f"No billing applied (success={success}, org_id={org_id}, total_words={total_words})")
-            
+            # CRITICAL: Pricing comes from the analysis record created with server-validated
+            # pricing BEFORE job submission, looked up by analysis_id with user scoping
+            result = persist_analysis_result(conn, user_id, save_data)
             conn.commit()
-            
-            return jsonify({
-                'message': 'Analysis saved successfully',
-                'analysis_id': db_analysis_id,
-                'memo_uuid': memo_uuid,
-                'balance_remaining': float(balance_after)
-            }), 200
-            
         except Exception as e:
             conn.rollback()
             logger.error(f"Failed to save analysis: {sanitize_for_log(e)}")
             raise e
         finally:
             conn.close()
+        
+        if result is None:
+            return jsonify({'error': 'Analysis record not found'}), 404
+        
+        if result['outcome'] == 'unverified':
+            return jsonify({
+                'error': 'Email verification required',
+                'message': 'Analysis marked as failed. No credits charged.'
+            }), 403
+        
+        return jsonify({
+            'message': 'Analysis already saved (idempotent)' if result['outcome'] == 'duplicate' else 'Analysis saved successfully',
+            'analysis_id': result['analysis_id'],
+            'memo_uuid': result['memo_uuid'],
+            'balance_remaining': result['balance_remaining']
+        }), 200
             
     except Exception as e:
         logger.error(f"Save analysis error: {sanitize_for_log(e)}")
@@ -2309,6 +2175,112 @@ def get_analysis_status(analysis_id):
         logger.error(f"Get analysis status error: {sanitize_for_log(e)}")
         return jsonify({'error': 'Failed to retrieve analysis status'}), 500
 
+@app.route('/api/analysis/<int:analysis_id>/reidentified', methods=['GET'])
+def get_reidentified_memo(analysis_id):
+    """Get a completed memo with party placeholders restored to the real names (client delivery)"""
+    try:
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        if not token:
+            return jsonify({'error': 'Authorization token required'}), 401
+        
+        # Verify token and get user
+        payload = verify_token(token)
+        if 'error' in payload:
+            return jsonify({'error': payload['error']}), 401
+        
+        user_id = payload['user_id']
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Database connection failed'}), 500
+        
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("""
+                SELECT status, memo_content, deidentification_map
+                FROM analyses 
+                WHERE analysis_id = %s
+                AND user_id = %s
+            """, (analysis_id, user_id))
+            
+            analysis = cursor.fetchone()
+            
+            if not analysis:
+                return jsonify({'error': 'Analysis not found'}), 404
+            
+            if analysis['status'] != 'completed' or not analysis['memo_content']:
+                return jsonify({'error': 'Analysis is not completed'}), 409
+            
+            if not analysis['deidentification_map']:
+                return jsonify({'error': 'No de-identification map stored for this analysis'}), 404
+            
+            from shared.deidentification import reidentify_memo
+            return jsonify({
+                'memo_content': reidentify_memo(analysis['memo_content'], analysis['deidentification_map'])
+            }), 200
+            
+        finally:
+            conn.close()
+            
+    except Exception as e:
+        logger.error(f"Get re-identified memo error: {sanitize_for_log(e)}")
+        return jsonify({'error': 'Failed to re-identify memo'}), 500
+
+@app.route('/api/analysis/<int:analysis_id>/events', methods=['GET'])
+def stream_analysis_events(analysis_id):
+    """Server-sent events for a running analysis: progress updates, then finished/failed/stopped"""
+    try:
+        # EventSource cannot set headers, so browsers pass the token as a query parameter
+        token = request.headers.get('Authorization', '').replace('Bearer ', '') or request.args.get('token', '')
+        if not token:
+            return jsonify({'error': 'Authorization token required'}), 401
+
+        # Verify token and get user
+        payload = verify_token(token)
+        if 'error' in payload:
+            return jsonify({'error': payload['error']}), 401
+
+        user_id = payload['user_id']
+
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT analysis_id FROM analyses
+                WHERE analysis_id = %s
+                AND user_id = %s
+            """, (analysis_id, user_id))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Analysis not found'}), 404
+        finally:
+            conn.close()
+
+        from shared.redis_connection import get_redis_connection
+        from shared.job_events import iter_job_events, format_sse
+
+        redis_conn = get_redis_connection()
+        # Reconnecting clients resume after the last event they received
+        last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id') or '0-0'
+
+        def generate():
+            # Each connection holds a gunicorn thread, so end it after a few minutes;
+            # EventSource reconnects on its own and resumes from Last-Event-ID
+            for event in iter_job_events(redis_conn, str(analysis_id), last_id=last_id, timeout=5 * 60):
+                yield format_sse(event)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop nginx/proxies from buffering the stream
+        })
+
+    except Exception as e:
+        logger.error(f"Stream analysis events error: {sanitize_for_log(e)}")
+        return jsonify({'error': 'Failed to stream analysis events'}), 500
+
 @app.route('/api/analysis/recent/<asc_standard>', methods=['GET'])
 def get_recent_analysis(asc_standard):
     """Get user's most recent completed analysis for a specific ASC standard (within 24 hours)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Document Extraction Benchmark
+Generates a fixture corpus (text PDFs from 1 to 500 pages, table-heavy DOCX, scanned-like
+and garbled PDFs) and runs DocumentExtractor over it once per extraction backend.
+
+Each fixture/backend case runs in a fresh process and reports pages per second, peak RSS,
+word-count stability (across repeats, against the generated text and across backends) and
+the quality state. Results are written as JSON. Expectation failures (wrong quality state,
+unstable or disagreeing word counts) are reported; with --baseline, an earlier report is
+compared and regressions fail the run (--strict also fails on expectation failures).
+
+Usage:
+    python benchmark_extraction.py
+    python benchmark_extraction.py --quick --output extraction_benchmark.json --baseline previous.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PDF_BACKENDS = ['pymupdf', 'pymupdf-parallel', 'pdfplumber']
+DOCX_BACKENDS = ['docx-stream', 'python-docx']
+
+# Regression tolerances against a baseline report
+SPEED_TOLERANCE = 0.25  # Pages/second may drop by up to 25%
+RSS_TOLERANCE = 0.25    # Peak RSS may grow by up to 25%
+
+CLAUSE = "The Licensor shall provide the Services to the Licensee in accordance with Schedule {n}."
+GARBLED = "Th e Li cen sor sh a ll pro vi de ~ the Ser- vi ces Ã© Ã¨ Ã¢ Â§ to th e Li cen see {n}"
+
+
+def count_words(text: str) -> int:
+    """Word count as DocumentExtractor counts it"""
+    return len(re.findall(r'\b\w+\b', text))
+
+
+# ----------------------------------------------------------------------------
+# Corpus generation
+# ----------------------------------------------------------------------------
+
+def _write_text_pdf(path: str, page_count: int, template: str, lines_per_page: int = 40) -> int:
+    import fitz
+    doc = fitz.open()
+    words = 0
+    for page_number in range(page_count):
+        lines = [template.format(n=page_number * lines_per_page + i) for i in range(lines_per_page)]
+        doc.new_page().insert_text((40, 50), lines, fontsize=9)
+        words += sum(count_words(line) for line in lines)
+    doc.save(path)
+    doc.close()
+    return words
+
+
+def _write_scanned_pdf(path: str, page_count: int) -> int:
+    import fitz
+    doc = fitz.open()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 400, 560), 0)
+    pixmap.clear_with(230)
+    for _ in range(page_count):
+        doc.new_page().insert_image(fitz.Rect(20, 20, 590, 820), pixmap=pixmap)
+    doc.save(path)
+    doc.close()
+    return 0
+
+
+def _write_table_docx(path: str, rows: int, cols: int = 6, paragraphs: int = 200) -> int:
+    import docx
+    document = docx.Document()
+    words = 0
+    for i in range(paragraphs):
+        text = CLAUSE.format(n=i)
+        document.add_paragraph(text)
+        words += count_words(text)
+    table = document.add_table(rows=rows, cols=cols)
+    for i, tr in enumerate(table._tbl.tr_lst):
+        for j, tc in enumerate(tr.tc_lst):
+            text = f"Fee {i}-{j} USD 1,250.00"
+            tc.p_lst[0].add_r().text = text
+            words += count_words(text)
+    document.save(path)
+    return words
+
+
+def build_corpus(corpus_dir: str, quick: bool = False) -> List[Dict[str, Any]]:
+    """
+    Write the fixture corpus and describe each fixture
+
+    Returns:
+        List of fixture dicts (name, path, kind, pages, expected_words, expected_state)
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    page_counts = [1, 10, 50] if quick else [1, 10, 100, 500]
+    fixtures = []
+
+    for pages in page_counts:
+        path = os.path.join(corpus_dir, f"text_{pages}p.pdf")
+        fixtures.append({'name': f"text_{pages}p", 'path': path, 'kind': 'pdf', 'pages': pages,
+                         'expected_words': _write_text_pdf(path, pages, CLAUSE), 'expected_state': 'good'})
+
+    rows = 300 if quick else 3000
+    path = os.path.join(corpus_dir, f"tables_{rows}r.docx")
+    fixtures.append({'name': f"tables_{rows}r", 'path': path, 'kind': 'docx', 'pages': None,
+                     'expected_words': _write_table_docx(path, rows), 'expected_state': 'good'})
+
+    pages = 20 if quick else 200
+    path = os.path.join(corpus_dir, f"scanned_{pages}p.pdf")
+    fixtures.append({'name': f"scanned_{pages}p", 'path': path, 'kind': 'pdf', 'pages': pages,
+                     'expected_words': _write_scanned_pdf(path, pages), 'expected_state': 'blocked'})
+
+    pages = 5 if quick else 20
+    path = os.path.join(corpus_dir, f"garbled_{pages}p.pdf")
+    fixtures.append({'name': f"garbled_{pages}p", 'path': path, 'kind': 'pdf', 'pages': pages,
+                     'expected_words': _write_text_pdf(path, pages, GARBLED), 'expected_state': 'blocked'})
+
+    return fixtures
+
+
+# ----------------------------------------------------------------------------
+# Case execution (one fresh process per fixture/backend)
+# ----------------------------------------------------------------------------
+
+def _current_rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB elsewhere
+
+
+def _quiet_logging():
+    logging.disable(logging.WARNING)  # Scanned/garbled fixtures log expected warnings
+
+
+def _disabled(*args, **kwargs):
+    raise RuntimeError("backend disabled for benchmark")
+
+
+def _make_extractor(backend: str):
+    """DocumentExtractor configured for one backend (module switches only affect this process)"""
+    import utils.document_extractor as document_extractor
+    from utils.document_extractor import DocumentExtractor, get_pdf_extraction_workers
+
+    if backend == 'pdfplumber':
+        document_extractor.fitz = None
+    elif backend == 'python-docx':
+        document_extractor.iter_docx_blocks = _disabled
+
+    if backend == 'pymupdf-parallel':
+        return DocumentExtractor(pdf_workers=max(2, get_pdf_extraction_workers()), parallel_min_pages=2,
+                                 use_cache=False, ocr_enabled=False)
+    return DocumentExtractor(pdf_workers=1, use_cache=False, ocr_enabled=False)
+
+
+def run_case(fixture: Dict[str, Any], backend: str, repeats: int = 2) -> Dict[str, Any]:
+    """Extract one fixture with one backend and collect timing, memory and quality"""
+    extractor = _make_extractor(backend)
+    rss_before = _current_rss_mb()
+
+    timings = []
+    word_counts = []
+    result = {}
+    try:
+        for _ in range(repeats):
+            with open(fixture['path'], 'rb') as upload:
+                start = time.perf_counter()
+                result = extractor.extract_text(upload)
+                timings.append(time.perf_counter() - start)
+            word_counts.append(result.get('word_count', 0))
+    finally:
+        # A live page pool would keep this case's process from exiting
+        from utils.document_extractor import _reset_pdf_pool
+        _reset_pdf_pool()
+
+    seconds = min(timings)
+    pages = result.get('pages') or fixture['pages'] or result.get('estimated_pages', 1)
+    expected_words = fixture['expected_words']
+    return {
+        'fixture': fixture['name'],
+        'backend': backend,
+        'seconds': round(seconds, 4),
+        'pages': pages,
+        'pages_per_second': round(pages / seconds, 2) if seconds > 0 else None,
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'rss_growth_mb': round(max(0.0, _peak_rss_mb() - rss_before), 1),
+        'word_count': word_counts[-1],
+        'word_count_stable': len(set(word_counts)) == 1,
+        'word_count_error_pct': (round(abs(word_counts[-1] - expected_words) / expected_words * 100, 2)
+                                 if expected_words else None),
+        'quality_state': result.get('quality_state'),
+        'expected_state': fixture['expected_state'],
+        'error': result.get('error'),
+        'extraction_method': result.get('extraction_method')
+    }
+
+
+def run_benchmark(fixtures: List[Dict[str, Any]], repeats: int = 2, isolate: bool = True) -> List[Dict[str, Any]]:
+    """Run every fixture with each backend for its kind, in a fresh process per case when isolate is set"""
+    cases = [(fixture, backend) for fixture in fixtures
+             for backend in (PDF_BACKENDS if fixture['kind'] == 'pdf' else DOCX_BACKENDS)]
+    results = []
+    for fixture, backend in cases:
+        if isolate:
+            # spawn + one task per child: peak RSS and module switches never leak between cases
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_quiet_logging) as pool:
+                case = pool.submit(run_case, fixture, backend, repeats).result()
+        else:
+            case = run_case(fixture, backend, repeats)
+        logger.info(f"{case['fixture']:<16} {case['backend']:<17} {case['seconds']:>8.3f}s "
+                    f"{case['pages_per_second'] or 0:>9.1f} pages/s {case['peak_rss_mb']:>7.1f} MB "
+                    f"{case['word_count']:>8} words  {case['quality_state']}")
+        results.append(case)
+    return results
+
+
+# ----------------------------------------------------------------------------
+# Checks and regressions
+# ----------------------------------------------------------------------------
+
+def check_results(results: List[Dict[str, Any]]) -> List[str]:
+    """Expectation failures: quality state, unstable word counts, backends disagreeing"""
+    failures = []
+    by_fixture: Dict[str, List[Dict[str, Any]]] = {}
+    for case in results:
+        label = f"{case['fixture']}/{case['backend']}"
+        if case['quality_state'] != case['expected_state']:
+            failures.append(f"{label}: quality state {case['quality_state']} (expected {case['expected_state']})")
+        if not case['word_count_stable']:
+            failures.append(f"{label}: word count changed between repeats")
+        by_fixture.setdefault(case['fixture'], []).append(case)
+
+    for fixture, cases in by_fixture.items():
+        if cases[0]['expected_state'] != 'good':
+            continue
+        counts = {case['backend']: case['word_count'] for case in cases}
+        if len(set(counts.values())) > 1:
+            failures.append(f"{fixture}: backends disagree on word count {counts}")
+    return failures
+
+
+def compare_with_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any]) -> List[str]:
+    """Regressions against an earlier report for matching fixture/backend cases"""
+    previous = {(case['fixture'], case['backend']): case for case in baseline.get('results', [])}
+    regressions = []
+    for case in results:
+        old = previous.get((case['fixture'], case['backend']))
+        if not old:
+            continue
+        label = f"{case['fixture']}/{case['backend']}"
+        if old.get('pages_per_second') and case['pages_per_second'] is not None \
+                and case['pages_per_second'] < old['pages_per_second'] * (1 - SPEED_TOLERANCE):
+            regressions.append(f"{label}: {case['pages_per_second']} pages/s (was {old['pages_per_second']})")
+        if old.get('peak_rss_mb') and case['peak_rss_mb'] > old['peak_rss_mb'] * (1 + RSS_TOLERANCE):
+            regressions.append(f"{label}: peak RSS {case['peak_rss_mb']} MB (was {old['peak_rss_mb']} MB)")
+        if case['word_count'] != old.get('word_count'):
+            regressions.append(f"{label}: word count {case['word_count']} (was {old.get('word_count')})")
+        if case['quality_state'] != old.get('quality_state'):
+            regressions.append(f"{label}: quality state {case['quality_state']} (was {old.get('quality_state')})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DocumentExtractor across backends")
+    parser.add_argument('--output', default='extraction_benchmark.json', help="JSON report path")
+    parser.add_argument('--baseline', help="Earlier JSON report to compare against")
+    parser.add_argument('--corpus-dir', help="Where to write fixtures (default: a temporary directory)")
+    parser.add_argument('--quick', action='store_true', help="Smaller corpus (text PDFs up to 50 pages)")
+    parser.add_argument('--repeats', type=int, default=2, help="Extractions per case (best time is kept)")
+    parser.add_argument('--strict', action='store_true', help="Fail on expectation failures as well")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixtures = build_corpus(args.corpus_dir or tmp_dir, quick=args.quick)
+        logger.info(f"Corpus: {len(fixtures)} fixtures in {args.corpus_dir or tmp_dir}")
+        results = run_benchmark(fixtures, repeats=args.repeats)
+
+    failures = check_results(results)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f))
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'quick': args.quick,
+        'fixtures': [{k: v for k, v in fixture.items() if k != 'path'} for fixture in fixtures],
+        'results': results,
+        'failures': failures,
+        'regressions': regressions
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Report written to {args.output}")
+
+    for failure in failures:
+        logger.warning(f"⚠️ {failure}")
+    for regression in regressions:
+        logger.error(f"❌ {regression}")
+    return 1 if regressions or (args.strict and failures) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
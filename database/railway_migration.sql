@@ -171,6 +171,11 @@ BEGIN
     IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='analyses' AND column_name='error_message') THEN
         ALTER TABLE analyses ADD COLUMN error_message TEXT;
     END IF;
+    
+    -- Add deidentification_map column (party token/offset map for re-identifying memos)
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='analyses' AND column_name='deidentification_map') THEN
+        ALTER TABLE analyses ADD COLUMN deidentification_map JSONB;
+    END IF;
 END $$;
 
 -- ==========================================
@@ -9,6 +9,7 @@ import streamlit as st
 import logging
 import os
 import uuid
+import hashlib
 from typing import Dict, Any, Optional
 from datetime import datetime
 
@@ -16,6 +17,7 @@ from shared.auth_utils import require_authentication, auth_manager, WEBSITE_URL
 from shared.job_progress_monitor import check_and_resume_polling, resume_job_from_url, get_job_from_url
 from shared.subscription_manager import SubscriptionManager
 from utils.document_extractor import DocumentExtractor
+from shared.deidentification import deidentify_with_map
 
 from asc606.step_analyzer import ASC606StepAnalyzer
 from asc606.clean_memo_generator import CleanMemoGenerator as ASC606CleanMemoGenerator
@@ -110,9 +112,14 @@ def get_analyzer_for_standard(standard_key: str):
     return analyzer_class()
 
 
-def deidentify_with_known_parties(text: str, vendor_name: str, customer_name: str, standard_key: str) -> str:
-    """Apply de-identification using already-known party names."""
+def deidentify_with_known_parties(text: str, vendor_name: str, customer_name: str, standard_key: str,
+                                  deidentification_map: Optional[Dict[str, Any]] = None) -> str:
+    """Apply de-identification using already-known party names (or the contract's map)."""
     try:
+        if deidentification_map:
+            # Reuse the name variants found in the contract - no alias rescans
+            return deidentify_with_map(text, deidentification_map)['text']
+        
         analyzer = get_analyzer_for_standard(standard_key)
         result = analyzer.deidentify_contract_text(text, vendor_name, customer_name)
         if result.get('success'):
@@ -125,6 +132,19 @@ def deidentify_with_known_parties(text: str, vendor_name: str, customer_name: st
 
 def deidentify_text(contract_text: str, standard_key: str) -> Dict[str, Any]:
     """Apply de-identification to contract text using the appropriate analyzer."""
+    # Streamlit reruns the page on every interaction - reuse the result (and its map)
+    # instead of repeating the LLM party extraction for the same contract
+    cache_key = f"memo_review_deidentify_{standard_key}_{hashlib.sha256(contract_text.encode('utf-8')).hexdigest()[:16]}"
+    if cache_key in st.session_state:
+        return st.session_state[cache_key]
+    
+    result = _deidentify_text_uncached(contract_text, standard_key)
+    if result.get('success'):
+        st.session_state[cache_key] = result
+    return result
+
+
+def _deidentify_text_uncached(contract_text: str, standard_key: str) -> Dict[str, Any]:
     try:
         analyzer = get_analyzer_for_standard(standard_key)
         parties = analyzer.extract_party_names_llm(contract_text)
@@ -679,6 +699,7 @@ def render_page():
     memo_word_count = 0
     detected_vendor = None
     detected_customer = None
+    deidentification_map = None
     
     if contract_files:
         st.markdown("---")
@@ -709,6 +730,7 @@ def render_page():
                 contract_text = deidentify_result['text']
                 detected_vendor = deidentify_result.get('vendor_name')
                 detected_customer = deidentify_result.get('customer_name')
+                deidentification_map = deidentify_result.get('deidentification_map')
                 st.success("Privacy protection applied successfully")
                 
                 with st.container(border=True):
@@ -739,7 +761,8 @@ def render_page():
                     raw_memo_text, 
                     detected_vendor, 
                     detected_customer, 
-                    standard_config['key']
+                    standard_config['key'],
+                    deidentification_map
                 )
                 st.caption("Privacy protection applied using party names from contract")
             else:
@@ -807,7 +830,8 @@ def render_page():
                 contract_filenames=contract_filenames,
                 session_id=session_id,
                 org_id=org_id,
-                total_words=total_words_to_charge
+                total_words=total_words_to_charge,
+                deidentification_map=deidentification_map
             )
 
 
@@ -12,7 +12,7 @@ from datetime import datetime
 
 from shared.job_manager import job_manager
 from shared.analysis_manager import analysis_manager
-from shared.job_progress_monitor import monitor_job_progress
+from shared.job_progress_monitor import monitor_job_progress, follow_inflight_analysis
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +26,8 @@ def submit_and_monitor_memo_review_job(
     contract_filenames: List[str],
     session_id: str,
     org_id: int,
-    total_words: int
+    total_words: int,
+    deidentification_map: Optional[Dict[str, Any]] = None
 ):
     """
     Submit Memo Review analysis job to background queue and monitor progress
@@ -42,6 +43,7 @@ def submit_and_monitor_memo_review_job(
         session_id: Session ID for caching results
         org_id: Organization ID for word deduction
         total_words: Total words used for this analysis
+        deidentification_map: Contract de-identification map, saved with the analysis
     """
     try:
         user_data = st.session_state.get('user_data', {})
@@ -50,6 +52,14 @@ def submit_and_monitor_memo_review_job(
             st.error("User authentication failed. Please refresh and log in again.")
             return
         
+        # Same memo, contract and standard already queued or running for this user - follow that job
+        # Otherwise this submission is claimed, so a concurrent duplicate follows it instead
+        inflight = job_manager.find_inflight_analysis(asc_standard, user_id, contract_text, '', source_memo_text)
+        if inflight:
+            st.session_state['memo_review_source_memo'] = source_memo_text
+            follow_inflight_analysis(asc_standard, inflight, session_id, user_token, analysis_type='review')
+            return
+        
         import requests
         from shared.auth_utils import WEBSITE_URL
         
@@ -69,6 +79,7 @@ def submit_and_monitor_memo_review_job(
         
         if not create_response.ok:
             st.error(f"Failed to create analysis record: {create_response.text}")
+            job_manager.release_inflight_claim(asc_standard, user_id, contract_text, '', source_memo_text)
             return
         
         create_data = create_response.json()
@@ -77,6 +88,7 @@ def submit_and_monitor_memo_review_job(
         
         if not service_token:
             st.error("Failed to generate service token for background worker")
+            job_manager.release_inflight_claim(asc_standard, user_id, contract_text, '', source_memo_text)
             return
         
         logger.info(f"Memo Review analysis record created with database ID: {db_analysis_id}")
@@ -94,7 +106,8 @@ def submit_and_monitor_memo_review_job(
                 org_id=org_id,
                 total_words=total_words,
                 source_memo_text=source_memo_text,
-                source_memo_filename=source_memo_filename
+                source_memo_filename=source_memo_filename,
+                deidentification_map=deidentification_map
             )
             
             logger.info(f"Memo Review job submitted: {job_id}")
@@ -134,4 +147,5 @@ def submit_and_monitor_memo_review_job(
         
     except Exception as e:
         logger.error(f"Error in Memo Review job submission: {str(e)}")
+        job_manager.release_inflight_claim(asc_standard, user_id, contract_text, '', source_memo_text)  # Let a retry claim the submission again
         st.error(f"Error: {str(e)}")
@@ -0,0 +1,275 @@
+"""
+Analysis Result Persistence
+Saves a finished or failed analysis - memo, status and billing - in one Postgres
+transaction. The /api/analysis/save endpoint uses it, and so do workers when
+ANALYSIS_DIRECT_SAVE is on and DATABASE_URL is set: they write straight to the
+database, skipping the second network hop, the JWT check and a fresh connection per
+job. The HTTP endpoint stays as the worker's fallback, with gzip-compressed bodies.
+
+Saves are idempotent by analysis_id: the analysis row is locked (SELECT ... FOR UPDATE)
+and one already 'completed' or 'failed' is returned unchanged, so a retried save, or a
+direct save racing its HTTP fallback, never bills twice.
+"""
+
+import os
+import json
+import gzip
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+UNVERIFIED_EMAIL_MESSAGE = 'Email verification required. Please verify your email and try again.'
+
+
+def encode_save_payload(save_data: Dict[str, Any]) -> bytes:
+    """Gzip-compressed JSON body for POST /api/analysis/save"""
+    return gzip.compress(json.dumps(save_data, default=str).encode('utf-8'))
+
+
+def decode_save_payload(body: bytes, content_encoding: Optional[str] = None) -> Dict[str, Any]:
+    """Save request body, decompressed when sent with Content-Encoding: gzip"""
+    if (content_encoding or '').lower() == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body or b'{}')
+
+
+def persist_analysis_result(conn, user_id: int, save_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Write a worker's result to the analysis record, without committing
+
+    Pricing comes from the record created at submission (server-validated), never from
+    save_data. The caller commits, or rolls back if this raises.
+
+    Args:
+        conn: psycopg2 connection with RealDictCursor rows
+        user_id: Owner of the analysis
+        save_data: analysis_id, success, memo_content, api_cost, error_message,
+                   deidentification_map, and org_id / total_words for word deduction
+
+    Returns:
+        None if the user has no such analysis, else a dict with 'outcome'
+        ('saved', 'duplicate' or 'unverified'), analysis_id, memo_uuid and balance_remaining
+    """
+    analysis_id = int(save_data.get('analysis_id') or 0)  # Database INTEGER id
+    success = bool(save_data.get('success', False))
+    memo_content = save_data.get('memo_content', '')
+    api_cost = Decimal(str(save_data.get('api_cost') or 0))  # For logging only
+    error_message = str(save_data['error_message'])[:500] if save_data.get('error_message') else None
+    org_id = save_data.get('org_id')
+    total_words = save_data.get('total_words')
+    deidentification_map = save_data.get('deidentification_map')
+
+    cursor = conn.cursor()
+
+    # Lock the record so concurrent saves of the same analysis serialize
+    cursor.execute("""
+        SELECT analysis_id, user_id, memo_uuid, asc_standard, words_count, tier_name,
+               file_count, final_charged_credits, billed_credits, status
+        FROM analyses
+        WHERE analysis_id = %s
+        AND user_id = %s
+        FOR UPDATE
+    """, (analysis_id, user_id))
+    existing_record = cursor.fetchone()
+
+    if not existing_record:
+        logger.error(f"No pending analysis {analysis_id} found for user {user_id}")
+        return None
+
+    cursor.execute("SELECT email_verified, credits_balance FROM users WHERE id = %s", (user_id,))
+    user_check = cursor.fetchone()
+    current_balance = user_check['credits_balance'] if user_check else 0
+
+    # Idempotency: a finished analysis is never updated or billed again
+    if existing_record['status'] in ['completed', 'failed']:
+        logger.warning(f"Duplicate save attempt for analysis {analysis_id}")
+        return {
+            'outcome': 'duplicate',
+            'analysis_id': analysis_id,
+            'memo_uuid': existing_record['memo_uuid'],
+            'balance_remaining': float(current_balance)
+        }
+
+    memo_uuid = existing_record['memo_uuid']
+    cost_charged = existing_record['final_charged_credits']  # Server-validated price
+
+    # CRITICAL: If unverified, still persist failure status but don't charge
+    if not user_check or not user_check['email_verified']:
+        logger.warning(f"Unverified user {user_id} attempted to complete analysis")
+        cursor.execute("""
+            UPDATE analyses
+            SET status = 'failed',
+                completed_at = NOW(),
+                error_message = %s
+            WHERE analysis_id = %s AND user_id = %s
+        """, (UNVERIFIED_EMAIL_MESSAGE, analysis_id, user_id))
+        return {
+            'outcome': 'unverified',
+            'analysis_id': analysis_id,
+            'memo_uuid': memo_uuid,
+            'balance_remaining': float(current_balance)
+        }
+
+    analysis_status = 'completed' if success else 'failed'
+    cursor.execute("""
+        UPDATE analyses
+        SET status = %s,
+            completed_at = NOW(),
+            est_api_cost = %s,
+            memo_content = %s,
+            error_message = %s,
+            final_charged_credits = %s,
+            billed_credits = %s,
+            deidentification_map = %s
+        WHERE analysis_id = %s AND user_id = %s
+    """, (analysis_status, api_cost,
+          memo_content if success else None,
+          error_message,
+          cost_charged if success else 0,
+          cost_charged if success else 0,
+          json.dumps(deidentification_map) if success and deidentification_map else None,
+          analysis_id, user_id))
+    logger.info(f"Analysis updated: {analysis_id}, status: {analysis_status}")
+
+    balance_after = current_balance
+
+    # Subscription-based word deduction, on the same connection so it shares the transaction
+    if success and org_id and total_words:
+        from shared.subscription_manager import SubscriptionManager
+        try:
+            deduction_result = SubscriptionManager(conn).deduct_words(
+                org_id=org_id,
+                words_used=total_words,
+                analysis_id=analysis_id
+            )
+        except Exception as e:
+            logger.error(f"Word deduction failed for org {org_id}, analysis {analysis_id}: {str(e)}")
+            raise
+        logger.info(
+            f"✓ Word deduction successful for org {org_id}: {total_words} words, "
+            f"breakdown: {deduction_result['from_allowance']} from allowance, "
+            f"{deduction_result['from_rollover']} from rollover"
+        )
+        balance_after = 0  # Not used in subscription system, but keep for response consistency
+
+    # Legacy credit-based billing (for backwards compatibility during migration)
+    elif success and cost_charged and cost_charged > 0:
+        balance_after = max(current_balance - cost_charged, 0)
+        cursor.execute("""
+            UPDATE users
+            SET credits_balance = %s
+            WHERE id = %s
+        """, (balance_after, user_id))
+        cursor.execute("""
+            INSERT INTO credit_transactions (user_id, analysis_id, amount, reason,
+                                           balance_after, memo_uuid, metadata, created_at)
+            VALUES (%s, %s, %s, 'analysis_charge', %s, %s, %s, NOW())
+        """, (user_id, analysis_id, -cost_charged, balance_after, memo_uuid,
+              json.dumps({'est_api_cost': float(api_cost), 'worker_job': analysis_id})))
+        logger.info(f"Credits charged: {cost_charged}, new balance: {balance_after}")
+    else:
+        logger.info(f"No billing applied (success={success}, org_id={org_id}, total_words={total_words})")
+
+    return {
+        'outcome': 'saved',
+        'analysis_id': analysis_id,
+        'memo_uuid': memo_uuid,
+        'balance_remaining': float(balance_after)
+    }
+
+
+class DirectResultStore:
+    """
+    Worker-side persistence straight to Postgres
+
+    Keeps one connection per worker process (reopened after errors). save_many writes
+    a batch or portfolio in one transaction with a savepoint per analysis, so one bad
+    result is reported on its own without undoing the others.
+    """
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            import psycopg2
+            import psycopg2.extras
+            self._conn = psycopg2.connect(self.database_url, cursor_factory=psycopg2.extras.RealDictCursor)
+        return self._conn
+
+    def _discard_connection(self):
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def save(self, user_id: int, save_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Persist one result in its own transaction (see persist_analysis_result); raises on error"""
+        result = self.save_many(user_id, [save_data])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def save_many(self, user_id: int, items: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Persist several results in one transaction
+
+        Returns:
+            One entry per item: the persist_analysis_result dict, or the exception that
+            item raised (its changes rolled back to its savepoint)
+        """
+        conn = self._connection()
+        results: List[Any] = []
+        try:
+            cursor = conn.cursor()
+            for save_data in items:
+                cursor.execute("SAVEPOINT analysis_save")
+                try:
+                    results.append(persist_analysis_result(conn, user_id, save_data))
+                    cursor.execute("RELEASE SAVEPOINT analysis_save")
+                except Exception as e:
+                    logger.error(f"Direct save failed for analysis {save_data.get('analysis_id')}: {str(e)}")
+                    cursor.execute("ROLLBACK TO SAVEPOINT analysis_save")
+                    results.append(e)
+            conn.commit()
+            return results
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._discard_connection()
+            raise
+
+
+_result_store: Optional[DirectResultStore] = None
+
+
+def direct_save_enabled() -> bool:
+    """Whether direct saves are configured (ANALYSIS_DIRECT_SAVE on and DATABASE_URL set)"""
+    return (os.getenv('ANALYSIS_DIRECT_SAVE', 'false').lower() in ('1', 'true', 'yes')
+            and bool(os.getenv('DATABASE_URL')))
+
+
+def get_result_store() -> Optional[DirectResultStore]:
+    """
+    The process-wide DirectResultStore, or None when direct saves are off
+    (ANALYSIS_DIRECT_SAVE unset/false, no DATABASE_URL, or psycopg2 not installed)
+    """
+    global _result_store
+    if not direct_save_enabled():
+        return None
+    database_url = os.getenv('DATABASE_URL')
+    try:
+        import psycopg2  # noqa: F401
+    except ImportError:
+        logger.warning("ANALYSIS_DIRECT_SAVE is set but psycopg2 is not installed; using the HTTP save endpoint")
+        return None
+    if _result_store is None or _result_store.database_url != database_url:
+        _result_store = DirectResultStore(database_url)
+    return _result_store
@@ -0,0 +1,247 @@
+"""
+Analysis Pipeline Engine
+Every background analysis runs as a list of named stages over one context, configured
+per standard from the standard registry:
+
+    setup -> retrieve_1 -> analyze_1 -> ... -> retrieve_N -> analyze_N -> finalize -> render -> save
+
+(memo reviews add de-identification and review-comment stages). Stages are plain
+functions of the context; callers add their own (component setup, saving, review
+comments) around the shared ones built here.
+
+Each stage is timed and records the API cost, tokens and requests it used, in
+context.metrics and through hooks. A hook is any object with optional
+on_stage_start(context, stage) / on_stage_end(context, stage, metrics) methods (job
+progress, logging). Hook errors are logged and never fail the analysis.
+"""
+
+import time
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from shared.standard_registry import get_standard_config
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    A named pipeline step
+
+    Args:
+        name: Stage name in metrics and logs ('retrieve_2', 'render', ...)
+        run: Function of the AnalysisContext
+        progress: (current_step, total_steps, step_name) to show while it runs
+    """
+
+    def __init__(self, name: str, run: Callable[['AnalysisContext'], None], progress: Optional[tuple] = None):
+        self.name = name
+        self.run = run
+        self.progress = progress
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+class AnalysisContext:
+    """State passed through a pipeline's stages"""
+
+    def __init__(self,
+                 asc_standard: str,
+                 analysis_id: Any,
+                 combined_text: str,
+                 additional_context: str = '',
+                 uploaded_filenames: Optional[List[str]] = None,
+                 party_name: Optional[str] = None,
+                 results: Optional[Dict[str, Any]] = None):
+        self.asc_standard = asc_standard
+        self.config = get_standard_config(asc_standard)
+        self.analysis_id = analysis_id
+        self.combined_text = combined_text
+        self.additional_context = additional_context or ''
+        self.uploaded_filenames = uploaded_filenames or []
+        self.party_name = party_name or self.config['party_name']
+
+        # Components, set by a setup stage
+        self.analyzer = None
+        self.knowledge_search = None
+        self.memo_generator_class = None
+
+        # Results structure read by the standard's memo generator
+        if results is None:
+            results = {
+                'steps': {},
+                self.config['results_party_key']: self.party_name,
+                'analysis_title': self.config['analysis_title'],
+                'analysis_date': datetime.now().strftime("%B %d, %Y")
+            }
+        self.results = results
+        self.authoritative_context: Dict[int, str] = {}
+        self.prior_steps: List[str] = []
+        self.memo_content: Optional[str] = None
+        self.save_result: Optional[Dict[str, Any]] = None
+        self.metrics: List[Dict[str, Any]] = []
+
+
+def _no_usage() -> Dict[str, Any]:
+    return {}
+
+
+class AnalysisPipeline:
+    """Runs stages in order, timing each one and notifying hooks"""
+
+    def __init__(self, stages: List[Stage], hooks: Optional[list] = None,
+                 usage: Optional[Callable[[], Dict[str, Any]]] = None):
+        """
+        Args:
+            stages: Stages in run order
+            hooks: Objects with optional on_stage_start / on_stage_end methods
+            usage: Returns running cost/token totals (api_cost_tracker.get_usage_totals);
+                   None records durations only
+        """
+        self.stages = stages
+        self.hooks = hooks or []
+        self.usage = usage or _no_usage
+
+    def _notify(self, method: str, *args):
+        for hook in self.hooks:
+            callback = getattr(hook, method, None)
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.warning(f"Pipeline hook {type(hook).__name__}.{method} failed: {e}")
+
+    def run(self, context: AnalysisContext) -> AnalysisContext:
+        """
+        Run every stage; a failing stage is recorded with status 'failed' and its
+        exception propagates
+        """
+        for stage in self.stages:
+            self._notify('on_stage_start', context, stage)
+            before = self.usage()
+            started_at = time.time()
+            start = time.perf_counter()
+            status = 'failed'
+            try:
+                stage.run(context)
+                status = 'completed'
+            finally:
+                metrics = {
+                    'stage': stage.name,
+                    'status': status,
+                    'started_at': round(started_at, 3),
+                    'seconds': round(time.perf_counter() - start, 4)
+                }
+                after = self.usage()
+                for key, value in after.items():
+                    metrics[key] = round(value - before.get(key, 0), 6)
+                context.metrics.append(metrics)
+                self._notify('on_stage_end', context, stage, metrics)
+        return context
+
+
+class LoggingHook:
+    """Logs each stage's duration and usage"""
+
+    def on_stage_end(self, context: AnalysisContext, stage: Stage, metrics: Dict[str, Any]):
+        usage = ''
+        if 'input_tokens' in metrics:
+            usage = (f", {metrics['input_tokens']:,} in / {metrics['output_tokens']:,} out tokens"
+                     f", ${metrics.get('cost', 0):.4f}")
+        logger.info(f"⏱️ {context.asc_standard} {context.analysis_id} {stage.name}: "
+                    f"{metrics['seconds']:.2f}s{usage} ({metrics['status']})")
+
+
+def stage_summary(metrics: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Metrics totalled per stage type ('analyze_1', 'analyze_2' -> 'analyze'), for where a job's time went"""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for entry in metrics:
+        kind = entry['stage'].rsplit('_', 1)[0] if entry['stage'][-1:].isdigit() else entry['stage']
+        totals = summary.setdefault(kind, {'count': 0})
+        totals['count'] += 1
+        for key, value in entry.items():
+            if key not in ('stage', 'status', 'started_at'):
+                totals[key] = round(totals.get(key, 0) + value, 6)
+    return summary
+
+
+# Shared stages
+
+def _retrieve(step_num: int) -> Callable[[AnalysisContext], None]:
+    def run(context: AnalysisContext):
+        try:
+            context.authoritative_context[step_num] = context.knowledge_search.search_for_step(
+                step_num, context.combined_text)
+        except Exception as e:
+            logger.error(f"Error in Step {step_num}: {str(e)}")
+            raise Exception(f"Step {step_num} failed: {str(e)}")
+    return run
+
+
+def _analyze(step_num: int, chain_prior_steps: bool) -> Callable[[AnalysisContext], None]:
+    def run(context: AnalysisContext):
+        try:
+            step_kwargs = {
+                'step_num': step_num,
+                'contract_text': context.combined_text,
+                'authoritative_context': context.authoritative_context.get(step_num),
+                'additional_context': context.additional_context,
+                context.config['party_kwarg']: context.party_name
+            }
+            if chain_prior_steps and context.prior_steps:
+                # Later steps see the full output of earlier ones
+                step_kwargs['prior_steps_context'] = "\n\n".join(context.prior_steps)
+                logger.info(f"   Passing {len(context.prior_steps)} prior step(s) context "
+                            f"({len(step_kwargs['prior_steps_context'])} chars)")
+
+            step_result = context.analyzer._analyze_step_with_retry(**step_kwargs)
+            context.results['steps'][f'step_{step_num}'] = step_result
+            if 'markdown_content' in step_result:
+                context.prior_steps.append(step_result['markdown_content'])
+            logger.info(f"✓ Completed Step {step_num}")
+        except Exception as e:
+            logger.error(f"Error in Step {step_num}: {str(e)}")
+            raise Exception(f"Step {step_num} failed: {str(e)}")
+    return run
+
+
+def build_step_stages(step_count: int, chain_prior_steps: bool = True,
+                      progress: Optional[Callable[[int], Optional[tuple]]] = None) -> List[Stage]:
+    """
+    retrieve_N / analyze_N stages for steps 1..step_count
+
+    Args:
+        chain_prior_steps: Pass earlier steps' markdown output to later steps
+        progress: step_num -> progress tuple shown while the step runs
+                  (default: (step_num, step_count, 'Step N'))
+    """
+    if progress is None:
+        progress = lambda step_num: (step_num, step_count, f'Step {step_num}')
+    stages = []
+    for step_num in range(1, step_count + 1):
+        stages.append(Stage(f'retrieve_{step_num}', _retrieve(step_num), progress(step_num)))
+        stages.append(Stage(f'analyze_{step_num}', _analyze(step_num, chain_prior_steps)))
+    return stages
+
+
+def finalize(context: AnalysisContext):
+    """Executive summary, background and conclusion from the step results"""
+    analyzer = context.analyzer
+    results = context.results
+    logger.info("→ Generating executive summary, background, and conclusion...")
+    conclusions_text = analyzer._extract_conclusions_from_steps(results['steps'])
+    results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, context.party_name)
+    results['background'] = analyzer.generate_background_section(conclusions_text, context.party_name)
+    results['conclusion'] = analyzer.generate_final_conclusion(results['steps'])
+    results['filename'] = ", ".join(context.uploaded_filenames) if context.uploaded_filenames else "Uploaded Documents"
+
+
+def render(context: AnalysisContext):
+    """Memo content from the results, by the standard's memo generator"""
+    context.memo_content = context.memo_generator_class().combine_clean_steps(
+        context.results,
+        analysis_id=context.analysis_id
+    )
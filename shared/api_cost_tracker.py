@@ -1,153 +1,334 @@
 """
-API Cost Tracker - Accurate OpenAI API cost estimation using token counting
+API Cost Tracker - OpenAI API cost estimation from reported token usage
+
+Costs come from the `usage` each API response reports (input, cached input, output
+and reasoning tokens): analyzers pass every response to record_response_usage, and
+the following track_openai_request call attributes that cost to its request type.
+Only requests without reported usage are estimated by tokenizing the prompt and
+response, with one cached encoder per model.
+
+The current tracker lives in a contextvars context, so concurrent analyses in one
+process (worker jobs, portfolio contracts, hedged requests) never mix costs. In the
+Streamlit app it is kept in st.session_state so it survives reruns.
 """
 
-import tiktoken
+import threading
+import contextvars
 import logging
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
-import json
 
 logger = logging.getLogger(__name__)
 
+
+def _field(obj: Any, name: str) -> Any:
+    """Attribute of an SDK usage object, or key of a usage dict"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_tokens(usage: Any) -> Dict[str, int]:
+    """
+    Token counts from a Responses or Chat Completions `usage` (object or dict)
+
+    output_tokens includes reasoning_tokens and input_tokens includes cached_tokens,
+    as billed by OpenAI.
+    """
+    input_tokens = _field(usage, 'input_tokens')
+    if input_tokens is None:
+        input_tokens = _field(usage, 'prompt_tokens')
+    output_tokens = _field(usage, 'output_tokens')
+    if output_tokens is None:
+        output_tokens = _field(usage, 'completion_tokens')
+    input_details = _field(usage, 'input_tokens_details') or _field(usage, 'prompt_tokens_details')
+    output_details = _field(usage, 'output_tokens_details') or _field(usage, 'completion_tokens_details')
+    return {
+        'input_tokens': int(input_tokens or 0),
+        'cached_tokens': int(_field(input_details, 'cached_tokens') or 0),
+        'output_tokens': int(output_tokens or 0),
+        'reasoning_tokens': int(_field(output_details, 'reasoning_tokens') or 0)
+    }
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """tiktoken encoder for a model, built once per model"""
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        logger.warning(f"Failed to get encoding for model {model}, using default: {e}")
+        # Fallback to cl100k_base encoding (used by most OpenAI models)
+        return tiktoken.get_encoding("cl100k_base")
+
+
 class APITracker:
-    """Tracks OpenAI API costs using accurate token counting and current pricing"""
-    
+    """Tracks OpenAI API costs from reported usage and current pricing"""
+
     # Current OpenAI pricing (as of September 2024)
     # Prices in USD per 1M tokens
     MODEL_PRICING = {
         # GPT-4o models
         "gpt-4o": {
             "input_per_1m": 5.00,
+            "cached_input_per_1m": 2.50,
             "output_per_1m": 15.00
         },
         "gpt-4o-mini": {
             "input_per_1m": 0.15,
+            "cached_input_per_1m": 0.075,
             "output_per_1m": 0.60
         },
         # GPT-5 models (estimated pricing)
         "gpt-5": {
             "input_per_1m": 10.00,
+            "cached_input_per_1m": 1.00,
             "output_per_1m": 30.00
         },
         "gpt-5-mini": {
             "input_per_1m": 1.00,
+            "cached_input_per_1m": 0.10,
             "output_per_1m": 3.00
         }
     }
-    
+
     def __init__(self):
-        self.total_cost = 0.0
-        self.cost_breakdown = {}
-        
+        self._lock = threading.Lock()
+        self.reset(log=False)
+
+    @classmethod
+    def pricing_for(cls, model: str) -> Dict[str, float]:
+        """Pricing for a model, matching dated or point releases by prefix (gpt-5.1 -> gpt-5)"""
+        return _pricing_for(model or '')
+
+    @classmethod
+    def usage_cost(cls, model: str, usage: Any) -> float:
+        """Cost of one request from its reported usage"""
+        tokens = usage_tokens(usage)
+        pricing = cls.pricing_for(model)
+        cached = min(tokens['cached_tokens'], tokens['input_tokens'])
+        return ((tokens['input_tokens'] - cached) / 1_000_000 * pricing["input_per_1m"]
+                + cached / 1_000_000 * pricing.get("cached_input_per_1m", pricing["input_per_1m"])
+                + tokens['output_tokens'] / 1_000_000 * pricing["output_per_1m"])
+
     def calculate_tokens(self, text: str, model: str) -> int:
-        """Calculate exact token count for given text and model"""
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-            return len(encoding.encode(text))
-        except Exception as e:
-            logger.warning(f"Failed to get encoding for model {model}, using default: {e}")
-            # Fallback to cl100k_base encoding (used by most OpenAI models)
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
-    
+        """Calculate token count for given text and model"""
+        return len(_encoding(model).encode(text))
+
     def calculate_request_cost(self, messages: List[Dict[str, str]], response_text: str, model: str) -> float:
-        """Calculate cost for a single API request"""
-        
-        if model not in self.MODEL_PRICING:
-            logger.warning(f"Unknown model {model}, using gpt-4o pricing")
-            model = "gpt-4o"
-        
-        # Calculate input tokens (all messages)
-        input_text = ""
-        for message in messages:
-            input_text += message.get('content', '') + " "
-        
+        """Estimate the cost of a single API request by tokenizing it"""
+        return self._estimated_usage(messages, response_text, model)[2]
+
+    def _estimated_usage(self, messages: List[Dict[str, str]], response_text: str, model: str):
+        """Input tokens, output tokens and cost of a request without reported usage"""
+        input_text = " ".join(message.get('content', '') for message in messages)
         input_tokens = self.calculate_tokens(input_text, model)
         output_tokens = self.calculate_tokens(response_text, model)
-        
-        # Calculate costs
-        pricing = self.MODEL_PRICING[model]
-        input_cost = (input_tokens / 1_000_000) * pricing["input_per_1m"]
-        output_cost = (output_tokens / 1_000_000) * pricing["output_per_1m"]
-        
-        total_cost = input_cost + output_cost
-        
-        # Log detailed breakdown
-        logger.info(f"API Cost - Model: {model}, Input tokens: {input_tokens}, Output tokens: {output_tokens}, Cost: ${total_cost:.4f}")
-        
-        return total_cost
-    
-    def track_request(self, messages: List[Dict[str, str]], response_text: str, model: str, request_type: str = "analysis") -> float:
-        """Track a single API request and add to running total"""
-        
-        cost = self.calculate_request_cost(messages, response_text, model)
+        cost = self.usage_cost(model, {'input_tokens': input_tokens, 'output_tokens': output_tokens})
+        return input_tokens, output_tokens, cost
+
+    def _add(self, tokens: Dict[str, int], cost: float):
         self.total_cost += cost
-        
-        # Track breakdown by request type
-        if request_type not in self.cost_breakdown:
-            self.cost_breakdown[request_type] = 0.0
-        self.cost_breakdown[request_type] += cost
-        
+        self.input_tokens += tokens['input_tokens']
+        self.cached_tokens += tokens.get('cached_tokens', 0)
+        self.output_tokens += tokens['output_tokens']
+        self.reasoning_tokens += tokens.get('reasoning_tokens', 0)
+        self.request_count += 1
+
+    def record_usage(self, usage: Any, model: str) -> float:
+        """Add a response's reported usage; the next track_request attributes its cost"""
+        tokens = usage_tokens(usage)
+        cost = self.usage_cost(model, usage)
+        with self._lock:
+            self._add(tokens, cost)
+            self._unclaimed_cost += cost
+            self._unclaimed_requests += 1
+        logger.info(f"API Cost - Model: {model}, Input tokens: {tokens['input_tokens']} "
+                    f"({tokens['cached_tokens']} cached), Output tokens: {tokens['output_tokens']} "
+                    f"({tokens['reasoning_tokens']} reasoning), Cost: ${cost:.4f}")
+        return cost
+
+    def track_request(self, messages: List[Dict[str, str]], response_text: str, model: str, request_type: str = "analysis") -> float:
+        """
+        Attribute a request's cost to request_type and return it
+
+        Uses the usage recorded since the last call (a hedged or retried request may
+        have several responses); tokenizes the prompt and response only without it.
+        """
+        with self._lock:
+            if self._unclaimed_requests:
+                cost = self._unclaimed_cost
+                self._unclaimed_cost = 0.0
+                self._unclaimed_requests = 0
+            else:
+                cost = None
+
+        if cost is None:
+            input_tokens, output_tokens, cost = self._estimated_usage(messages, response_text, model)
+            with self._lock:
+                self._add({'input_tokens': input_tokens, 'output_tokens': output_tokens}, cost)
+            logger.info(f"API Cost (estimated) - Model: {model}, Input tokens: {input_tokens}, "
+                        f"Output tokens: {output_tokens}, Cost: ${cost:.4f}")
+
+        with self._lock:
+            self.cost_breakdown[request_type] = self.cost_breakdown.get(request_type, 0.0) + cost
+
         logger.info(f"Tracked {request_type} request: ${cost:.4f} (Total: ${self.total_cost:.4f})")
-        
+
         return cost
-    
+
     def get_total_cost(self) -> float:
         """Get total accumulated cost"""
         return self.total_cost
-    
+
     def get_cost_breakdown(self) -> Dict[str, float]:
         """Get detailed cost breakdown by request type"""
-        return self.cost_breakdown.copy()
-    
-    def reset(self):
+        breakdown = self.cost_breakdown.copy()
+        if self._unclaimed_cost:
+            breakdown['other'] = breakdown.get('other', 0.0) + self._unclaimed_cost
+        return breakdown
+
+    def get_usage(self) -> Dict[str, Any]:
+        """Running totals of cost, tokens and requests (pipeline stages diff two of these)"""
+        return {
+            "cost": self.total_cost,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+            "requests": self.request_count
+        }
+
+    def reset(self, log: bool = True):
         """Reset cost tracking for new analysis"""
         self.total_cost = 0.0
         self.cost_breakdown = {}
-        logger.info("API cost tracker reset")
-    
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.reasoning_tokens = 0
+        self.request_count = 0
+        self._unclaimed_cost = 0.0
+        self._unclaimed_requests = 0
+        if log:
+            logger.info("API cost tracker reset")
+
     def get_summary(self) -> Dict[str, Any]:
         """Get comprehensive cost summary"""
         return {
             "total_cost": round(self.total_cost, 4),
-            "breakdown": {k: round(v, 4) for k, v in self.cost_breakdown.items()},
+            "breakdown": {k: round(v, 4) for k, v in self.get_cost_breakdown().items()},
             "formatted_total": f"${self.total_cost:.4f}"
         }
 
-def get_session_tracker() -> APITracker:
-    """Get session-scoped API tracker to prevent cross-user cost leakage"""
-    import streamlit as st
-    if "api_cost_tracker" not in st.session_state:
-        st.session_state.api_cost_tracker = APITracker()
-    return st.session_state.api_cost_tracker
+
+@lru_cache(maxsize=None)
+def _pricing_for(model: str) -> Dict[str, float]:
+    pricing = APITracker.MODEL_PRICING
+    if model in pricing:
+        return pricing[model]
+    matches = [name for name in pricing if model.startswith(name)]
+    if matches:
+        return pricing[max(matches, key=len)]
+    logger.warning(f"Unknown model {model}, using gpt-4o pricing")
+    return pricing["gpt-4o"]
+
+
+_current_tracker: contextvars.ContextVar[Optional[APITracker]] = contextvars.ContextVar('api_cost_tracker', default=None)
+
+
+def _streamlit_session_state():
+    """st.session_state when running inside a Streamlit script, else None (workers, threads)"""
+    import sys
+    if 'streamlit' not in sys.modules:
+        return None
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        if get_script_run_ctx(suppress_warning=True) is None:
+            return None
+        import streamlit as st
+        return st.session_state
+    except Exception:
+        return None
+
+
+def get_current_tracker() -> APITracker:
+    """Tracker of the current context (job, contract, Streamlit session)"""
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        return tracker
+    session_state = _streamlit_session_state()
+    if session_state is not None:
+        if "api_cost_tracker" not in session_state:
+            session_state.api_cost_tracker = APITracker()
+        tracker = session_state.api_cost_tracker
+    else:
+        tracker = APITracker()
+    _current_tracker.set(tracker)
+    return tracker
+
+
+@contextmanager
+def cost_tracking_scope(tracker: Optional[APITracker] = None):
+    """Track API costs in a separate tracker until the block exits (e.g. one portfolio contract)"""
+    tracker = tracker or APITracker()
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
 
 def reset_cost_tracking():
-    """Reset cost tracking for current session"""
-    tracker = get_session_tracker()
-    tracker.reset()
+    """Start a fresh tracker for the current context (and Streamlit session)"""
+    tracker = APITracker()
+    session_state = _streamlit_session_state()
+    if session_state is not None:
+        session_state.api_cost_tracker = tracker
+    _current_tracker.set(tracker)
+    logger.info("API cost tracker reset")
+
+def record_response_usage(response: Any, model: str) -> float:
+    """
+    Record the usage an API response reports (Responses or Chat Completions)
+
+    Call with every raw response; the cost is attributed by the next track_openai_request.
+
+    Returns:
+        Cost in USD, or 0.0 if the response reports no usage
+    """
+    usage = _field(response, 'usage')
+    if usage is None:
+        return 0.0
+    return get_current_tracker().record_usage(usage, _field(response, 'model') or model)
 
 def track_openai_request(messages: List[Dict[str, str]], response_text: str, model: str, request_type: str = "analysis") -> float:
     """
     Track an OpenAI API request and return the estimated cost
-    
+
     Args:
         messages: List of messages sent to API
         response_text: Response text from API
         model: Model name used
         request_type: Type of request (e.g., "entity_extraction", "step_analysis", "memo_generation")
-    
+
     Returns:
-        Estimated cost in USD for this request
+        Cost in USD for this request, from reported usage when recorded
     """
-    tracker = get_session_tracker()
-    return tracker.track_request(messages, response_text, model, request_type)
+    return get_current_tracker().track_request(messages, response_text, model, request_type)
 
 def get_total_estimated_cost() -> float:
-    """Get total estimated API cost for current analysis session"""
-    tracker = get_session_tracker()
-    return tracker.get_total_cost()
+    """Get total estimated API cost for the current analysis"""
+    return get_current_tracker().get_total_cost()
 
 def get_cost_summary() -> Dict[str, Any]:
-    """Get comprehensive cost summary for current analysis session"""
-    tracker = get_session_tracker()
-    return tracker.get_summary()
\ No newline at end of file
+    """Get comprehensive cost summary for the current analysis"""
+    return get_current_tracker().get_summary()
+
+def get_usage_totals() -> Dict[str, Any]:
+    """Get running cost, token and request totals for the current analysis"""
+    return get_current_tracker().get_usage()
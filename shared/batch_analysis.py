@@ -0,0 +1,484 @@
+"""
+Offline Batch Analysis using the OpenAI Batch API
+
+Month-end and audit-prep uploads don't need interactive turnaround. This module runs
+many analyses for one ASC standard through the Batch API instead of real-time calls:
+
+- Step requests for every analysis are written to a JSONL batch file, submitted and
+  parsed back by custom_id. Standards whose steps are independent send all steps in a
+  single batch; standards with chain_prior_steps (step N's prompt includes steps
+  1..N-1) need one batch round per step.
+- Polling never blocks a worker: the run state (batch id, round, step results) is
+  JSON-safe, and the worker re-enqueues a follow-up job every BATCH_POLL_INTERVAL
+  seconds until the round finishes (see workers.analysis_worker.run_batch_analysis).
+  A round still pending after BATCH_MAX_WAIT uses its partial results.
+- Requests missing from a round (failed, expired or empty) fall back to the
+  real-time step call, so a partial batch never fails the whole run.
+- Executive summary, background and conclusion are short light calls and run in
+  real time before the memo is stitched together by the standard's CleanMemoGenerator.
+- Each analysis's real-time calls run in its own cost-tracking scope, so its api_cost
+  is its discounted batch usage plus its own real-time requests.
+
+Batch jobs can outlive the submitting user's session, so their results are saved
+through the worker's direct database path (ANALYSIS_DIRECT_SAVE); batch submission
+requires it (see JobManager.submit_batch_analysis_job).
+
+Set OPENAI_BATCH_BACKEND=stub to use LocalBatchStub, which answers batch files locally
+in the Batch API output format (for testing without the OpenAI endpoint).
+"""
+
+import io
+import os
+import json
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from shared.api_cost_tracker import APITracker, cost_tracking_scope
+from shared.standard_registry import get_standard_config, load_component, get_shared_component
+
+logger = logging.getLogger(__name__)
+
+# Batch API requests are billed at 50% of real-time pricing
+BATCH_DISCOUNT = 0.5
+
+TERMINAL_BATCH_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+# RQ timeout for one batch job stage: a status check plus, at most, one round's
+# real-time fallbacks and the final memo sections
+BATCH_STAGE_TIMEOUT = os.getenv('BATCH_STAGE_TIMEOUT', '2h')
+
+
+def build_batch_request(analyzer, messages: List[Dict[str, str]], model: str, request_type: str = "step_analysis") -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the batch endpoint and request body for one call, mirroring the analyzer's
+    real-time routing (Responses API for GPT-5, Chat Completions for GPT-4o).
+
+    Returns:
+        Tuple of (endpoint url, request body)
+    """
+    if analyzer._is_gpt5_model(model):
+        return "/v1/responses", {
+            "model": model,
+            "input": messages,
+            "max_output_tokens": 10000,
+            "reasoning": {"effort": "medium"}
+        }
+    return "/v1/chat/completions", {
+        "model": model,
+        "messages": messages,
+        "temperature": analyzer._get_temperature(model),
+        **analyzer._get_max_tokens_param(request_type, model)
+    }
+
+
+def extract_output_text(body: Dict[str, Any]) -> str:
+    """Extract response text from a Responses API or Chat Completions response body"""
+    if not body:
+        return ""
+    if 'choices' in body:
+        choices = body.get('choices') or []
+        if choices:
+            return (choices[0].get('message') or {}).get('content') or ""
+        return ""
+    if body.get('output_text'):
+        return body['output_text']
+    parts = []
+    for item in body.get('output') or []:
+        if item.get('type') != 'message':
+            continue
+        for content in item.get('content') or []:
+            if content.get('type') == 'output_text':
+                parts.append(content.get('text', ''))
+    return "".join(parts)
+
+
+def estimate_batch_cost(model: str, usage: Optional[Dict[str, Any]]) -> float:
+    """Estimate the cost of one batch request from its reported usage"""
+    if not usage:
+        return 0.0
+    return APITracker.usage_cost(model, usage) * BATCH_DISCOUNT
+
+
+class OpenAIBatchBackend:
+    """Submits batch files to the OpenAI Batch API"""
+
+    def __init__(self, client=None, completion_window: str = "24h"):
+        if client is None:
+            import openai
+            if not os.getenv("OPENAI_API_KEY"):
+                raise ValueError("OPENAI_API_KEY environment variable not set")
+            client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, lines: List[Dict[str, Any]], endpoint: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        """Upload a JSONL batch file and create the batch. Returns the batch ID."""
+        payload = "\n".join(json.dumps(line) for line in lines).encode('utf-8')
+        batch_file = self.client.files.create(file=("batch.jsonl", io.BytesIO(payload)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=endpoint,
+            completion_window=self.completion_window,
+            metadata=metadata or {}
+        )
+        logger.info(f"📦 Submitted batch {batch.id} ({len(lines)} requests, {len(payload) / 1024:.0f} KB)")
+        return batch.id
+
+    def status(self, batch_id: str) -> Dict[str, Any]:
+        """Get batch status and output file IDs"""
+        batch = self.client.batches.retrieve(batch_id)
+        counts = getattr(batch, 'request_counts', None)
+        return {
+            'status': batch.status,
+            'output_file_id': batch.output_file_id,
+            'error_file_id': batch.error_file_id,
+            'completed': getattr(counts, 'completed', 0) if counts else 0,
+            'failed': getattr(counts, 'failed', 0) if counts else 0,
+            'total': getattr(counts, 'total', 0) if counts else 0
+        }
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Download and parse output (and error) lines for a finished batch"""
+        info = self.status(batch_id)
+        lines = []
+        for file_id in (info.get('output_file_id'), info.get('error_file_id')):
+            if not file_id:
+                continue
+            content = self.client.files.content(file_id).text
+            lines.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return lines
+
+
+class LocalBatchStub:
+    """
+    Local stand-in for the Batch API endpoint (testing only).
+
+    Answers every request immediately with responder(custom_id, endpoint, body) and
+    returns output lines in the same format as the Batch API output file.
+    """
+
+    def __init__(self, responder: Optional[Callable[[str, str, Dict[str, Any]], str]] = None):
+        self.responder = responder or self._default_responder
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _default_responder(custom_id: str, endpoint: str, body: Dict[str, Any]) -> str:
+        return (f"### {custom_id}\n\n**Analysis:** Stub batch analysis for {custom_id}.\n\n"
+                f"**Conclusion:** Stub conclusion for {custom_id}.\n\n"
+                f"**Issues or Uncertainties:** None identified.")
+
+    def submit(self, lines: List[Dict[str, Any]], endpoint: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        batch_id = f"batch_stub_{len(self.batches) + 1}"
+        output = []
+        for line in lines:
+            body = line['body']
+            try:
+                text = self.responder(line['custom_id'], endpoint, body)
+                usage = {'input_tokens': len(json.dumps(body)) // 4, 'output_tokens': len(text or '') // 4}
+                if endpoint == "/v1/chat/completions":
+                    response_body = {'choices': [{'message': {'content': text}}], 'usage': usage}
+                else:
+                    response_body = {'output': [{'type': 'message', 'content': [{'type': 'output_text', 'text': text}]}], 'usage': usage}
+                output.append({'custom_id': line['custom_id'], 'response': {'status_code': 200, 'body': response_body}, 'error': None})
+            except Exception as e:
+                output.append({'custom_id': line['custom_id'], 'response': None, 'error': {'message': str(e)}})
+        self.batches[batch_id] = {'status': 'completed', 'output': output, 'metadata': metadata or {}}
+        return batch_id
+
+    def status(self, batch_id: str) -> Dict[str, Any]:
+        batch = self.batches[batch_id]
+        return {'status': batch['status'], 'total': len(batch['output'])}
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        return list(self.batches[batch_id]['output'])
+
+
+def get_batch_backend():
+    """Get the configured batch backend (OPENAI_BATCH_BACKEND=openai|stub)"""
+    if os.getenv('OPENAI_BATCH_BACKEND', 'openai').lower() == 'stub':
+        logger.warning("⚠️ Using LocalBatchStub - batch requests are answered locally")
+        return LocalBatchStub()
+    return OpenAIBatchBackend()
+
+
+class BatchAnalysisRunner:
+    """Runs many analyses for one ASC standard through batch rounds"""
+
+    def __init__(self,
+                 asc_standard: str,
+                 backend=None,
+                 analyzer=None,
+                 knowledge_search=None,
+                 memo_generator=None,
+                 poll_interval: Optional[float] = None,
+                 max_wait: Optional[float] = None,
+                 progress_callback: Optional[Callable[[int, int, str], None]] = None):
+        self.asc_standard = asc_standard
+        self.config = get_standard_config(asc_standard)
+        self.backend = backend or get_batch_backend()
+        self.analyzer = analyzer or get_shared_component(asc_standard, 'analyzer')
+        self.knowledge_search = knowledge_search or get_shared_component(asc_standard, 'knowledge')
+        self.memo_generator = memo_generator or load_component(asc_standard, 'memo')()
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('BATCH_POLL_INTERVAL', '60'))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('BATCH_MAX_WAIT', str(25 * 3600)))
+        self.progress_callback = progress_callback
+
+    def _report(self, current: int, total: int, name: str):
+        if self.progress_callback:
+            try:
+                self.progress_callback(current, total, name)
+            except Exception as e:
+                logger.warning(f"Batch progress callback failed: {e}")
+
+    def _rounds(self) -> List[List[int]]:
+        """Steps per batch round: one round per step when steps are chained, else a single round"""
+        steps = list(range(1, self.config['step_count'] + 1))
+        if self.config.get('chain_prior_steps', False):
+            return [[step_num] for step_num in steps]
+        return [steps]
+
+    def _step_kwargs(self, item: Dict[str, Any], entry: Dict[str, Any], step_num: int) -> Dict[str, Any]:
+        """Arguments for one step, as the real-time pipeline would pass them"""
+        prior_steps_context = None
+        if self.config.get('chain_prior_steps', False):
+            prior_steps_context = "\n\n".join(
+                entry['steps'][f'step_{n}']['markdown_content'] for n in range(1, step_num)
+                if 'markdown_content' in entry['steps'].get(f'step_{n}', {})
+            ) or None
+        return {
+            'step_num': step_num,
+            'contract_text': item['combined_text'],
+            'authoritative_context': self.knowledge_search.search_for_step(step_num, item['combined_text']),
+            'additional_context': item.get('additional_context', ''),
+            'prior_steps_context': prior_steps_context,
+            self.config['party_kwarg']: self.config['party_name']
+        }
+
+    def _submit_round(self, items: Dict[str, Dict[str, Any]], state: Dict[str, Any]):
+        """Write and submit the current round's batch for every analysis still running"""
+        analyzer = self.analyzer
+        round_index = state['round']
+        step_nums = state['rounds'][round_index]
+        self._report(round_index + 1, len(state['rounds']) + 1, f"Batch round {round_index + 1}")
+
+        lines = []
+        requests = {}
+        endpoint = None
+        for key, entry in state['entries'].items():
+            for step_num in step_nums:
+                if entry['error']:
+                    break
+                try:
+                    step_kwargs = self._step_kwargs(items[key], entry, step_num)
+                    messages = [
+                        {"role": "system", "content": analyzer._get_markdown_system_prompt()},
+                        {"role": "user", "content": analyzer._get_step_markdown_prompt(**step_kwargs)}
+                    ]
+                    endpoint, body = build_batch_request(analyzer, messages, analyzer.main_model)
+                    custom_id = f"{key}:step_{step_num}"
+                    lines.append({"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body})
+                    requests[custom_id] = [key, step_num]
+                except Exception as e:
+                    logger.error(f"Failed to build Step {step_num} request for analysis {key}: {e}")
+                    entry['error'] = f"Step {step_num} failed: {e}"
+
+        batch_id = None
+        if lines:
+            try:
+                batch_id = self.backend.submit(lines, endpoint, metadata={
+                    'asc_standard': self.asc_standard,
+                    'steps': ",".join(str(n) for n in step_nums)
+                })
+            except Exception as e:
+                logger.error(f"Batch submission failed for steps {step_nums}: {e} - running them in real time")
+        state['batch'] = {'id': batch_id, 'submitted_at': time.time(), 'requests': requests}
+
+    def _batch_outputs(self, batch: Dict[str, Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Output lines keyed by custom_id once the batch is done (or past max_wait), else None"""
+        batch_id = batch['id']
+        if batch_id is None:
+            return {}
+        info = self.backend.status(batch_id)
+        status = info.get('status')
+        if status in TERMINAL_BATCH_STATUSES:
+            if status != 'completed':
+                logger.warning(f"⚠️ Batch {batch_id} ended with status '{status}' - missing requests will run in real time")
+        elif time.time() - batch['submitted_at'] > self.max_wait:
+            logger.error(f"Batch {batch_id} still '{status}' after {self.max_wait:.0f}s - using partial results")
+        else:
+            logger.info(f"⏳ Batch {batch_id}: {status} ({info.get('completed', 0)}/{info.get('total', 0)} done)")
+            return None
+
+        try:
+            lines = self.backend.results(batch_id)
+        except Exception as e:
+            logger.error(f"Failed to download results for batch {batch_id}: {e}")
+            lines = []
+        return {line.get('custom_id'): line for line in lines if line.get('custom_id')}
+
+    def _collect_round(self, items: Dict[str, Dict[str, Any]], state: Dict[str, Any],
+                       outputs: Dict[str, Dict[str, Any]]):
+        """Store the round's step results, running missing or empty ones in real time"""
+        analyzer = self.analyzer
+        model = analyzer.main_model
+        # Step order per analysis, so a real-time fallback sees the steps before it
+        for custom_id, (key, step_num) in sorted(state['batch']['requests'].items(), key=lambda r: (r[1][0], r[1][1])):
+            entry = state['entries'][key]
+            if entry['error']:
+                continue
+            line = outputs.get(custom_id) or {}
+            response = line.get('response') or {}
+            body = response.get('body') or {}
+            content = extract_output_text(body) if response.get('status_code') == 200 else ""
+
+            if content and content.strip():
+                entry['api_cost'] += estimate_batch_cost(model, body.get('usage'))
+                step_result = {
+                    'title': analyzer._get_step_title(step_num),
+                    'markdown_content': content.strip(),
+                    'step_num': str(step_num)
+                }
+            else:
+                # Missing, failed or empty batch response - fall back to the real-time call
+                logger.warning(f"⚠️ {custom_id}: no usable batch response ({line.get('error') or 'empty'}), running in real time")
+                tracker = APITracker()
+                try:
+                    with cost_tracking_scope(tracker):
+                        step_result = analyzer._analyze_step_with_retry(**self._step_kwargs(items[key], entry, step_num))
+                except Exception as e:
+                    entry['error'] = f"Step {step_num} failed: {e}"
+                    continue
+                finally:
+                    entry['realtime_cost'] += tracker.get_total_cost()
+
+            entry['steps'][f'step_{step_num}'] = step_result
+
+    @staticmethod
+    def _items_by_key(analyses: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {str(item['analysis_id']): item for item in analyses}
+
+    def start(self, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Submit the first batch round
+
+        Returns:
+            JSON-safe run state for advance() and finish(); it holds no contract text,
+            so a follow-up job can carry it alongside the analyses' blob references
+        """
+        rounds = self._rounds()
+        state = {
+            'entries': {
+                str(item['analysis_id']): {
+                    'steps': {},
+                    'api_cost': 0.0,       # Batch usage at the discount
+                    'realtime_cost': 0.0,  # Real-time fallbacks and final sections
+                    'error': None
+                } for item in analyses
+            },
+            'rounds': rounds,
+            'round': 0,
+            'batch': None
+        }
+        logger.info(f"🚀 Batch analysis: {len(analyses)} {self.asc_standard} analyses, {len(rounds)} batch round(s)")
+        self._submit_round(self._items_by_key(analyses), state)
+        return state
+
+    def advance(self, analyses: List[Dict[str, Any]], state: Dict[str, Any]) -> bool:
+        """
+        Check the pending batch once, without waiting; collect finished rounds and
+        submit the next one
+
+        Returns:
+            True when every round is done and finish() can render the memos
+        """
+        items = self._items_by_key(analyses)
+        while state['round'] < len(state['rounds']):
+            outputs = self._batch_outputs(state['batch'])
+            if outputs is None:
+                return False
+            self._collect_round(items, state, outputs)
+            state['round'] += 1
+            state['batch'] = None
+            if state['round'] < len(state['rounds']):
+                if all(entry['error'] for entry in state['entries'].values()):
+                    state['round'] = len(state['rounds'])
+                    break
+                self._submit_round(items, state)
+        return True
+
+    def finish(self, analyses: List[Dict[str, Any]], state: Dict[str, Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Final sections and memo rendering
+
+        Returns:
+            Dict keyed by analysis_id with success, memo_content, api_cost and error
+        """
+        rounds = len(state['rounds'])
+        self._report(rounds + 1, rounds + 1, 'Generating memos')
+        results = {}
+        for item in analyses:
+            analysis_id = item['analysis_id']
+            entry = state['entries'][str(analysis_id)]
+            if entry['error']:
+                results[analysis_id] = {'success': False, 'error': entry['error'], 'api_cost': self._analysis_cost(entry)}
+                continue
+            tracker = APITracker()
+            try:
+                with cost_tracking_scope(tracker):
+                    memo_content = self._render_memo(analysis_id, item, entry)
+                entry['realtime_cost'] += tracker.get_total_cost()
+                results[analysis_id] = {
+                    'success': True,
+                    'memo_content': memo_content,
+                    'api_cost': self._analysis_cost(entry),
+                    'error': None
+                }
+            except Exception as e:
+                entry['realtime_cost'] += tracker.get_total_cost()
+                logger.error(f"Memo generation failed for analysis {analysis_id}: {e}")
+                results[analysis_id] = {'success': False, 'error': f"Memo generation failed: {e}", 'api_cost': self._analysis_cost(entry)}
+
+        succeeded = sum(1 for r in results.values() if r['success'])
+        logger.info(f"✓ Batch analysis complete: {succeeded}/{len(results)} succeeded")
+        return results
+
+    def run(self, analyses: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Run all analyses in this process, sleeping between batch status checks
+        (workers use start/advance/finish across follow-up jobs instead)
+
+        Args:
+            analyses: List of dicts with analysis_id, combined_text, additional_context
+                      and uploaded_filenames
+
+        Returns:
+            Dict keyed by analysis_id with success, memo_content, api_cost and error
+        """
+        state = self.start(analyses)
+        while not self.advance(analyses, state):
+            time.sleep(self.poll_interval)
+        return self.finish(analyses, state)
+
+    @staticmethod
+    def _analysis_cost(entry: Dict[str, Any]) -> float:
+        return entry['api_cost'] + entry['realtime_cost']
+
+    def _render_memo(self, analysis_id, item: Dict[str, Any], entry: Dict[str, Any]) -> str:
+        """Final sections (real-time calls) and the stitched memo for one analysis"""
+        analyzer = self.analyzer
+        party_name = self.config['party_name']
+        analysis_results = {
+            'steps': entry['steps'],
+            self.config['results_party_key']: party_name,
+            'analysis_title': self.config['analysis_title'],
+            'analysis_date': time.strftime("%B %d, %Y")
+        }
+        conclusions_text = analyzer._extract_conclusions_from_steps(entry['steps'])
+        analysis_results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, party_name)
+        analysis_results['background'] = analyzer.generate_background_section(conclusions_text, party_name)
+        analysis_results['conclusion'] = analyzer.generate_final_conclusion(entry['steps'])
+        filenames = item.get('uploaded_filenames') or []
+        analysis_results['filename'] = ", ".join(filenames) if filenames else "Uploaded Documents"
+
+        return self.memo_generator.combine_clean_steps(analysis_results, analysis_id=analysis_id)
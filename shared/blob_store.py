@@ -0,0 +1,182 @@
+"""
+Blob Store for large job inputs
+Contract text and uploaded memos are stored once, compressed and keyed by their SHA-256,
+and jobs carry a small reference instead of the text. RQ then pickles kilobytes instead
+of megabytes into Redis per job, status polls (Job.fetch) stop loading the text, and the
+worker fetches each input only when it runs. Resubmitting identical text (reruns,
+portfolios sharing a contract) reuses the stored blob.
+
+Backends (BLOB_STORE_BACKEND):
+- redis (default): the job queue's Redis, entries expire BLOB_STORE_TTL seconds after
+  their last store
+- disk: compressed files in BLOB_STORE_DIR (workers must share the filesystem),
+  expired by modification time
+- off: inputs stay inline in the job payload
+
+Texts shorter than BLOB_STORE_MIN_BYTES stay inline either way.
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marker key of a blob reference in a job payload
+BLOB_REF_KEY = 'blob_sha256'
+
+
+class DiskBlobStore:
+    """Compressed files named by content hash, expired by modification time"""
+
+    def __init__(self, directory: str, ttl_seconds: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._last_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.gz")
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path)  # Same content - restart its TTL
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=5))
+            os.replace(tmp_path, path)
+        self._sweep()
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with open(path, 'rb') as f:
+                return gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _sweep(self):
+        """Delete expired blobs, at most once a minute"""
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.gz') and now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class RedisBlobStore:
+    """Compressed blobs in Redis with a TTL refreshed on every store"""
+
+    def __init__(self, redis_conn, ttl_seconds: int, prefix: str = 'blob:'):
+        self.redis_conn = redis_conn
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def put(self, key: str, data: bytes):
+        # Already stored - only extend its lifetime instead of uploading it again
+        if not self.redis_conn.expire(self.prefix + key, self.ttl_seconds):
+            self.redis_conn.set(self.prefix + key, gzip.compress(data, compresslevel=5), ex=self.ttl_seconds)
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.redis_conn.get(self.prefix + key)
+        return None if data is None else gzip.decompress(data)
+
+
+_store = None
+_store_backend = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store(redis_conn=None):
+    """
+    Blob store for the configured backend (None when disabled)
+
+    Args:
+        redis_conn: Connection for the redis backend (default: shared connection)
+    """
+    global _store, _store_backend
+    backend = os.getenv('BLOB_STORE_BACKEND', 'redis').lower()
+    ttl_seconds = int(os.getenv('BLOB_STORE_TTL', str(3 * 24 * 3600)))
+    if backend == 'redis' and redis_conn is not None:
+        return RedisBlobStore(redis_conn, ttl_seconds)
+    with _store_lock:
+        if backend == _store_backend:
+            return _store
+        try:
+            if backend == 'redis':
+                from shared.redis_connection import get_redis_connection
+                _store = RedisBlobStore(get_redis_connection(), ttl_seconds)
+            elif backend == 'disk':
+                directory = os.getenv('BLOB_STORE_DIR', os.path.join(tempfile.gettempdir(), 'veritaslogic_blobs'))
+                _store = DiskBlobStore(directory, ttl_seconds)
+            else:
+                _store = None
+        except Exception as e:
+            logger.warning(f"Blob store unavailable ({backend}): {e}")
+            _store = None
+        _store_backend = backend
+        return _store
+
+
+def store_job_text(text: Optional[str], store) -> Any:
+    """
+    Reference to a stored copy of a large text, or the text itself when it is small,
+    the store is disabled, or storing fails (the job still runs with the text inline).
+    """
+    if not text or store is None:
+        return text
+    data = text.encode('utf-8')
+    if len(data) < int(os.getenv('BLOB_STORE_MIN_BYTES', '16384')):
+        return text
+    key = hashlib.sha256(data).hexdigest()
+    try:
+        store.put(key, data)
+    except Exception as e:
+        logger.warning(f"Blob store write failed, keeping {len(data):,} bytes inline: {e}")
+        return text
+    return {BLOB_REF_KEY: key, 'bytes': len(data)}
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and BLOB_REF_KEY in value
+
+
+def load_job_text(value: Any, store) -> Any:
+    """
+    Text for a job payload value from store_job_text (inline values pass through)
+
+    Raises:
+        RuntimeError: If the blob expired or the store is unavailable
+    """
+    if not is_blob_ref(value):
+        return value
+    key = value[BLOB_REF_KEY]
+    data = store.get(key) if store is not None else None
+    if data is None:
+        raise RuntimeError(f"Job input {key[:12]} is no longer available (blob store expired or disabled)")
+    return data.decode('utf-8')
+
+
+def store_job_texts(items: list, store, field: str = 'combined_text') -> list:
+    """Copies of batch/portfolio items with one text field replaced by blob references"""
+    return [{**item, field: store_job_text(item.get(field), store)} for item in items]
+
+
+def load_job_texts(items: list, store, field: str = 'combined_text') -> list:
+    """Copies of batch/portfolio items with their blob references loaded"""
+    return [{**item, field: load_job_text(item.get(field), store)} for item in items]
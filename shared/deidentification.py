@@ -0,0 +1,508 @@
+"""
+Shared De-identification Engine
+
+Replaces contracting party names with generic terms ("the Company", "the Customer", ...)
+before any text is sent to the LLM.
+
+All name variants for all parties - full names, base names without legal suffixes, and
+aliases defined in the text - are compiled into a single alternation pattern ordered
+longest first, and the text is rewritten in one pass with a callback that counts
+replacements per party. Scrubbing is therefore a single linear scan regardless of how
+many parties or aliases there are, and a longer name always wins over a shorter one
+that it contains (e.g. "Acme Holdings LLC" is not partially consumed by base name "Acme").
+"""
+
+import re
+import logging
+import functools
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Soft hyphens removed, smart quotes (Word/PDF) converted to ASCII quotes
+_NORMALIZE_TRANSLATION = str.maketrans({
+    '\u00AD': None,
+    '\u201C': '"',
+    '\u201D': '"',
+    '\u2018': "'",
+    '\u2019': "'"
+})
+_HYPHEN_LINE_WRAP = re.compile(r'-\s*\n\s*')
+_WHITESPACE = re.compile(r'\s+')
+
+# Common legal suffixes, matched at the end of a company name
+_LEGAL_SUFFIX = re.compile(
+    r'(?:,?\s+(?:Inc\.?|LLC\.?|L\.?L\.?C\.?|Corp\.?|Corporation|Ltd\.?|Limited|Co\.?|Company|'
+    r'L\.?P\.?|LLP\.?|P\.?L\.?L\.?C\.?|S\.?A\.?|N\.?V\.?|A\.?G\.?|GmbH|PLC))+$',
+    re.IGNORECASE
+)
+_QUOTED_ALIAS = re.compile(r'["\']([A-Za-z0-9\s\-&]{2,50})["\']')
+_ALIAS_CHARS = re.compile(r'^[A-Za-z0-9\s\-&]+$')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text to handle PDF/Word extraction artifacts.
+    - Removes soft hyphens (Unicode U+00AD)
+    - Converts smart quotes to ASCII quotes
+    - Collapses hyphen + newline (line wraps) into space
+    - Normalizes multiple whitespace to single space
+    """
+    text = text.translate(_NORMALIZE_TRANSLATION)
+    # This handles line-wrapped text like "Smith-\nJones LLC" → "Smith Jones LLC"
+    text = _HYPHEN_LINE_WRAP.sub(' ', text)
+    return _WHITESPACE.sub(' ', text)
+
+
+def create_flexible_pattern(name: str) -> str:
+    """
+    Create regex pattern that handles:
+    - Whitespace variations (spaces, tabs, newlines)
+    - Hyphen/space equivalence (handles line-wrapped hyphenated names)
+    - Punctuation variations (periods, commas)
+
+    Only non-capturing groups are used so patterns can be combined into one alternation.
+    """
+    escaped = re.escape(name)
+    # "Smith-Jones" matches "Smith Jones" or "Smith-Jones" and vice versa
+    escaped = escaped.replace(r'\-', r'(?:-|\s)')
+    escaped = escaped.replace(r'\ ', r'(?:\s+|-)')
+    # Optional periods ("Inc." vs "Inc") and commas ("Corp," vs "Corp")
+    escaped = escaped.replace(r'\.', r'\.?')
+    escaped = escaped.replace(r'\,', r'\,?\s*')
+    return r'\b' + escaped + r'\b'
+
+
+def extract_aliases_from_text(company_name: str, text: str) -> List[str]:
+    """
+    Find actual aliases used in the text for this company.
+    Looks for patterns like:
+    - Company Name Inc. ("ShortName")
+    - Company Name Inc. ('ShortName')
+    - Company Name Inc. ("Alias1" or "Alias2")
+    """
+    aliases = set()
+    # Allow optional punctuation (commas, periods) between company name and parenthesis
+    paren_pattern = re.escape(company_name) + r'[,\.\s]*\(([^)]{2,200})\)'
+
+    for match in re.finditer(paren_pattern, text, flags=re.IGNORECASE):
+        # Only quoted strings count - avoids false positives from descriptive clauses
+        for alias in _QUOTED_ALIAS.findall(match.group(1).strip()):
+            alias = alias.strip()
+            if alias and 2 <= len(alias) <= 50 and _ALIAS_CHARS.match(alias) and not alias.isdigit():
+                aliases.add(alias)
+
+    return list(aliases)
+
+
+def extract_base_company_name(company_name: str) -> Optional[str]:
+    """
+    Extract base company name by removing legal suffixes.
+    Examples:
+    - "Netflix, Inc." → "Netflix"
+    - "Acme Corporation" → "Acme"
+    - "Smith & Associates LLC" → "Smith & Associates"
+
+    Returns None if base name would be too short/generic or same as input.
+    """
+    base_name = _LEGAL_SUFFIX.sub('', company_name).strip()
+    base_name = base_name.rstrip('.,').strip()
+
+    if base_name != company_name and len(base_name) >= 3 and re.search(r'[A-Za-z]', base_name):
+        return base_name
+    return None
+
+
+class DeidentificationEngine:
+    """
+    Compiled name variants for a set of parties.
+
+    Every variant is one capturing group in a single alternation (longest first), so
+    match.lastindex identifies the variant and its party without a second lookup.
+    """
+
+    def __init__(self, entities: List[Dict[str, Any]], variants: List[tuple]):
+        """
+        Args:
+            entities: Party dicts with key, label, name and replacement
+            variants: (entity_index, kind, value) tuples; kind is 'name', 'base name' or 'alias'
+        """
+        self.entities = entities
+        # Longest first, so a longer variant always wins at the same position
+        self.variants = sorted(variants, key=lambda v: len(v[2]), reverse=True)
+        # Lookahead on the possible first characters lets the scan skip most positions cheaply
+        first_chars = re.escape(''.join(sorted({v[2][0] for v in self.variants})))
+        self.pattern = re.compile(
+            f"(?=[{first_chars}])(?:" + '|'.join(f"({create_flexible_pattern(v[2])})" for v in self.variants) + ")",
+            flags=re.IGNORECASE
+        )
+        self.max_variant_length = max(len(v[2]) for v in self.variants)
+
+    @classmethod
+    def for_parties(cls, parties: List[Dict[str, Any]], text: str = "") -> 'DeidentificationEngine':
+        """Build an engine from party specs, discovering aliases defined in (normalized) text"""
+        entities = []
+        variants = []
+        seen = set()
+        for party in parties:
+            if not party.get('name'):
+                continue
+            entity_index = len(entities)
+            entities.append(party)
+            normalized_name = normalize_text(party['name'])
+            candidates = [('name', normalized_name)]
+            if party.get('include_base_name', True):
+                candidates.append(('base name', extract_base_company_name(normalized_name)))
+            if party.get('include_aliases', True) and text:
+                candidates.extend(('alias', alias) for alias in extract_aliases_from_text(normalized_name, text))
+            # The first party to claim a variant keeps it
+            for kind, value in candidates:
+                if value and value.lower() not in seen:
+                    seen.add(value.lower())
+                    variants.append((entity_index, kind, value))
+        return cls(entities, variants)
+
+    @classmethod
+    def from_map(cls, deidentification_map: Dict[str, Any]) -> 'DeidentificationEngine':
+        """Rebuild the engine stored in a de-identification map (no alias or LLM rescans)"""
+        return _engine_from_map(
+            tuple(tuple(e) for e in deidentification_map['entities']),
+            tuple(tuple(v) for v in deidentification_map['variants'])
+        )
+
+    def scrub(self, text: str, pos: int, limit: int, counts: List[int],
+              recorder: Optional['_SpanRecorder'] = None, output_offset: int = 0) -> tuple:
+        """
+        Replace matches in text that start in [pos, limit).
+
+        A match starting before limit is always completed, so the returned end can be
+        past limit. Matching looks at text[pos - 1] for word boundaries.
+
+        Returns:
+            Tuple of (de-identified text for text[pos:end], end)
+        """
+        pieces = []
+        last = pos
+        for match in self.pattern.finditer(text, pos):
+            start = match.start()
+            if start >= limit:
+                break
+            index = match.lastindex - 1
+            entity_index = self.variants[index][0]
+            replacement = self.entities[entity_index]['replacement']
+            pieces.append(text[last:start])
+            output_offset += start - last
+            if recorder is not None:
+                recorder.record(output_offset, entity_index, match.group())
+            counts[index] += 1
+            pieces.append(replacement)
+            output_offset += len(replacement)
+            last = match.end()
+        end = max(last, limit)
+        pieces.append(text[last:end])
+        return ''.join(pieces), end
+
+    def to_map(self, recorder: '_SpanRecorder') -> Dict[str, Any]:
+        """
+        Compact, JSON-serializable map for re-identification and repeat scrubbing.
+
+        - entities: [key, label, name, replacement] per party
+        - variants: [entity_index, kind, value] compiled into the engine
+        - originals: [entity_index, source text] for each distinct replaced string
+        - spans: flat [offset_delta, original_index, ...] with start offsets in the
+          de-identified text, delta-encoded so the list stays small
+        """
+        return {
+            'version': 1,
+            'entities': [[e['key'], e['label'], e['name'], e['replacement']] for e in self.entities],
+            'variants': [list(v) for v in self.variants],
+            'originals': recorder.originals,
+            'spans': recorder.spans
+        }
+
+
+@functools.lru_cache(maxsize=32)
+def _engine_from_map(entities: tuple, variants: tuple) -> DeidentificationEngine:
+    return DeidentificationEngine(
+        [{'key': key, 'label': label, 'name': name, 'replacement': replacement}
+         for key, label, name, replacement in entities],
+        list(variants)
+    )
+
+
+class _SpanRecorder:
+    """Collects replacement offsets and distinct original strings for the map"""
+
+    def __init__(self):
+        self.originals: List[list] = []
+        self.spans: List[int] = []
+        self._index: Dict[tuple, int] = {}
+        self._last_offset = 0
+
+    def record(self, offset: int, entity_index: int, original: str):
+        key = (entity_index, original)
+        original_index = self._index.get(key)
+        if original_index is None:
+            original_index = self._index[key] = len(self.originals)
+            self.originals.append([entity_index, original])
+        self.spans.append(offset - self._last_offset)
+        self.spans.append(original_index)
+        self._last_offset = offset
+
+
+def _summarize(engine: DeidentificationEngine, counts: List[int]) -> tuple:
+    """Log per-variant results; return (replacements_made, replacement_count)"""
+    replacements_made = []
+    replacement_count = {}
+    for entity_index, party in enumerate(engine.entities):
+        party_variants = [(v, c) for v, c in zip(engine.variants, counts) if v[0] == entity_index]
+        name_count = sum(c for v, c in party_variants if v[1] == 'name')
+        replacement_count[party['key']] = name_count
+
+        if name_count > 0:
+            replacements_made.append(f"{party['label']} '{party['name']}' → '{party['replacement']}' ({name_count} occurrences)")
+        else:
+            logger.warning(f"⚠️ {party['label'].capitalize()} name '{party['name']}' "
+                           f"(normalized: '{normalize_text(party['name'])}') not found in contract text")
+
+        for (_, kind, value), count in party_variants:
+            if kind != 'name' and count > 0:
+                logger.info(f"  → Also replaced {party['label']} {kind} '{value}' ({count} occurrences)")
+    return replacements_made, replacement_count
+
+
+def deidentify_parties(contract_text: str,
+                       parties: List[Dict[str, Any]],
+                       document_description: str = "contract text") -> Dict[str, Any]:
+    """
+    Replace party names (and their base names and aliases) in a single pass.
+
+    Args:
+        contract_text: Original contract text
+        parties: Ordered list of party specs, each a dict with:
+            - key: Key used in replacement_count (e.g., 'vendor')
+            - label: Human-readable role used in messages (e.g., 'vendor')
+            - name: Party name as extracted (may be None)
+            - replacement: Generic term (e.g., 'the Company')
+            - include_base_name: Also replace the name without legal suffixes (default True)
+            - include_aliases: Also replace quoted aliases defined in the text (default True)
+            Earlier parties win when two parties share a variant.
+        document_description: Used in the error message (e.g., 'lease agreement text')
+
+    Returns:
+        Dict with keys:
+            - success (bool): Whether de-identification succeeded
+            - text (str): De-identified text (or original if failed)
+            - replacements (list): List of replacement descriptions
+            - replacement_count (dict): Full-name occurrences replaced per party key
+            - deidentification_map (dict): Map for re-identification (None if failed)
+            - error (str): Error message if failed, None otherwise
+    """
+    if not any(p.get('name') for p in parties):
+        logger.warning("⚠️ No party names to de-identify, returning original text")
+        return {
+            "success": False,
+            "text": contract_text,
+            "replacements": [],
+            "replacement_count": {},
+            "deidentification_map": None,
+            "error": "No party names were extracted for de-identification"
+        }
+
+    normalized_text = normalize_text(contract_text)
+    engine = DeidentificationEngine.for_parties(parties, normalized_text)
+    counts = [0] * len(engine.variants)
+    recorder = _SpanRecorder()
+    deidentified_text, _ = engine.scrub(normalized_text, 0, len(normalized_text), counts, recorder)
+
+    replacements_made, replacement_count = _summarize(engine, counts)
+
+    # Success requires at least one full party name to have been found
+    if not replacements_made:
+        extracted = ", ".join(f"{p['label']}: '{p.get('name')}'" for p in parties)
+        error_msg = (
+            f"Privacy extraction did not detect party names in the {document_description}. "
+            f"Extracted names ({extracted}) "
+            f"were not found in the contract."
+        )
+        logger.warning(f"⚠️ {error_msg}")
+        return {
+            "success": False,
+            "text": contract_text,  # Return original text
+            "replacements": [],
+            "replacement_count": replacement_count,
+            "deidentification_map": None,
+            "error": error_msg
+        }
+
+    logger.info(f"✓ De-identification complete: {', '.join(replacements_made)}")
+
+    return {
+        "success": True,
+        "text": deidentified_text,
+        "replacements": replacements_made,
+        "replacement_count": replacement_count,
+        "deidentification_map": engine.to_map(recorder),
+        "error": None
+    }
+
+
+def deidentify_with_map(text: str, deidentification_map: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Scrub another document (e.g., a memo about the same contract) with the name variants
+    stored in a de-identification map - no party extraction or alias rescans needed.
+
+    Returns:
+        Dict with text, replacement_count (all variants, per party key) and
+        deidentification_map for this text
+    """
+    engine = DeidentificationEngine.from_map(deidentification_map)
+    normalized_text = normalize_text(text)
+    counts = [0] * len(engine.variants)
+    recorder = _SpanRecorder()
+    deidentified_text, _ = engine.scrub(normalized_text, 0, len(normalized_text), counts, recorder)
+
+    replacement_count = {e['key']: 0 for e in engine.entities}
+    for (entity_index, _, _), count in zip(engine.variants, counts):
+        replacement_count[engine.entities[entity_index]['key']] += count
+
+    return {
+        "text": deidentified_text,
+        "replacement_count": replacement_count,
+        "deidentification_map": engine.to_map(recorder)
+    }
+
+
+def reidentify_text(deidentified_text: str, deidentification_map: Dict[str, Any]) -> str:
+    """
+    Restore the exact original (normalized) text from the de-identified text and its map.
+
+    Raises:
+        ValueError: If the text does not match the map
+    """
+    entities = deidentification_map['entities']
+    originals = deidentification_map['originals']
+    spans = deidentification_map['spans']
+
+    pieces = []
+    last = 0
+    offset = 0
+    for i in range(0, len(spans), 2):
+        offset += spans[i]
+        entity_index, original = originals[spans[i + 1]]
+        replacement = entities[entity_index][3]
+        if deidentified_text[offset:offset + len(replacement)] != replacement:
+            raise ValueError(f"De-identified text does not match map at offset {offset}")
+        pieces.append(deidentified_text[last:offset])
+        pieces.append(original)
+        last = offset + len(replacement)
+    pieces.append(deidentified_text[last:])
+    return ''.join(pieces)
+
+
+def reidentify_memo(memo_text: str, deidentification_map: Dict[str, Any]) -> str:
+    """
+    Put real party names back into generated text (memos) for client delivery.
+
+    Generated text has no offsets into the source, so each generic term ("the Company")
+    is replaced by the party's full name.
+    """
+    names = {}
+    for _, _, name, replacement in deidentification_map['entities']:
+        names.setdefault(replacement.lower(), name)
+    if not names:
+        return memo_text
+
+    tokens = sorted(names, key=len, reverse=True)
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(t) for t in tokens) + r')\b', re.IGNORECASE)
+    return pattern.sub(lambda m: names[m.group().lower()], memo_text)
+
+
+class StreamingDeidentifier:
+    """
+    De-identify text arriving in chunks (e.g., page by page) without holding both the
+    original and de-identified document in memory.
+
+    Usage:
+        stream = StreamingDeidentifier(parties=parties)   # or deidentification_map=...
+        for chunk in chunks:
+            output.write(stream.feed(chunk))
+        output.write(stream.close())
+        deid_map = stream.deidentification_map
+
+    Output matches deidentify_parties on the joined text, except that aliases are learned
+    as their definitions stream past - an alias used before its definition is not replaced.
+    """
+
+    # Trailing whitespace / hyphen that may join with the next chunk during normalization
+    _OPEN_TAIL = re.compile(r'\s*-?\s*$')
+    # Window kept for parenthetical alias definitions after a name
+    _ALIAS_WINDOW = 256
+
+    def __init__(self, parties: Optional[List[Dict[str, Any]]] = None,
+                 deidentification_map: Optional[Dict[str, Any]] = None):
+        if deidentification_map:
+            self.engine = DeidentificationEngine.from_map(deidentification_map)
+            self._parties = []
+        elif parties and any(p.get('name') for p in parties):
+            self.engine = DeidentificationEngine.for_parties(parties)
+            self._parties = [p for p in self.engine.entities if p.get('include_aliases', True)]
+        else:
+            raise ValueError("Party names or a de-identification map are required")
+
+        self.counts = [0] * len(self.engine.variants)
+        self._recorder = _SpanRecorder()
+        self._raw_tail = ''
+        self._buffer = ''
+        self._pos = 0
+        self._output_offset = 0
+
+    def _learn_aliases(self):
+        """Recompile when new alias definitions appear in the buffer"""
+        known = {v[2].lower() for v in self.engine.variants}
+        new_variants = []
+        for entity_index, party in enumerate(self.engine.entities):
+            if party not in self._parties:
+                continue
+            for alias in extract_aliases_from_text(normalize_text(party['name']), self._buffer):
+                if alias.lower() not in known:
+                    known.add(alias.lower())
+                    new_variants.append((entity_index, 'alias', alias))
+        if new_variants:
+            old_counts = dict(zip(self.engine.variants, self.counts))
+            self.engine = DeidentificationEngine(self.engine.entities, self.engine.variants + new_variants)
+            self.counts = [old_counts.get(v, 0) for v in self.engine.variants]
+
+    def _drain(self, final: bool) -> str:
+        if self._parties:
+            self._learn_aliases()
+        holdback = 0 if final else 2 * self.engine.max_variant_length + self._ALIAS_WINDOW
+        limit = len(self._buffer) - holdback
+        if limit <= self._pos:
+            return ''
+        output, end = self.engine.scrub(self._buffer, self._pos, limit, self.counts,
+                                        self._recorder, self._output_offset)
+        self._output_offset += len(output)
+        # Keep one character of context for the next word-boundary check
+        keep_from = max(end - 1, 0)
+        self._buffer = self._buffer[keep_from:]
+        self._pos = end - keep_from
+        return output
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk; returns the de-identified text that is now final"""
+        raw = self._raw_tail + chunk
+        hold = self._OPEN_TAIL.search(raw).start()
+        self._raw_tail = raw[hold:]
+        self._buffer += normalize_text(raw[:hold])
+        return self._drain(final=False)
+
+    def close(self) -> str:
+        """Flush the remaining text"""
+        self._buffer += normalize_text(self._raw_tail)
+        self._raw_tail = ''
+        return self._drain(final=True)
+
+    @property
+    def deidentification_map(self) -> Dict[str, Any]:
+        return self.engine.to_map(self._recorder)
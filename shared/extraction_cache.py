@@ -0,0 +1,174 @@
+"""
+Extraction Cache for uploaded documents
+Keyed by a SHA-256 of the file bytes, so Streamlit reruns, repeat uploads and later
+steps (preflight, de-identification preview, memo review) reuse one extraction.
+
+Backends (EXTRACTION_CACHE_BACKEND):
+- disk (default): compressed JSON files in EXTRACTION_CACHE_DIR, least recently used
+  entries evicted beyond EXTRACTION_CACHE_MAX_MB
+- redis: shared across processes, entries expire EXTRACTION_CACHE_TTL seconds after
+  their last use (configure Redis with an LRU maxmemory-policy for size limits)
+- off: no caching
+"""
+
+import os
+import json
+import gzip
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when extraction output changes so stale entries are ignored
+EXTRACTION_CACHE_VERSION = 2
+
+# Result fields worth caching (filename and size are per upload)
+_CACHED_FIELDS = (
+    'text', 'pages', 'word_count', 'estimated_pages', 'extraction_method', 'is_likely_scanned',
+    'quality_state', 'error', 'user_message', 'detection_reasons', 'detection_metrics', 'page_details', 'ocr',
+    'span_index'
+)
+
+
+def content_hash(file_bytes: bytes) -> str:
+    """SHA-256 hex digest of the file content"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def cache_key(file_hash: str, file_extension: str) -> str:
+    return f"v{EXTRACTION_CACHE_VERSION}-{file_extension}-{file_hash}"
+
+
+def _encode(result: Dict[str, Any]) -> bytes:
+    return gzip.compress(json.dumps({k: result.get(k) for k in _CACHED_FIELDS}).encode('utf-8'), compresslevel=5)
+
+
+def _decode(data: bytes) -> Dict[str, Any]:
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+class DiskExtractionCache:
+    """Compressed JSON files with least-recently-used eviction by modification time"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = _decode(f.read())
+            os.utime(path)  # Mark as recently used
+            return result
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed for {key}: {e}")
+            return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_encode(result))
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed for {key}: {e}")
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.json.gz'):
+                    stat = os.stat(os.path.join(self.directory, name))
+                    entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+class RedisExtractionCache:
+    """Shared cache in Redis; reads refresh the TTL so unused entries expire first"""
+
+    def __init__(self, redis_conn, ttl_seconds: int, prefix: str = 'extraction:'):
+        self.redis_conn = redis_conn
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            data = self.redis_conn.get(self.prefix + key)
+            if data is None:
+                return None
+            self.redis_conn.expire(self.prefix + key, self.ttl_seconds)
+            return _decode(data)
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed for {key}: {e}")
+            return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        try:
+            self.redis_conn.set(self.prefix + key, _encode(result), ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed for {key}: {e}")
+
+
+_cache = None
+_cache_backend = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Process-wide extraction cache for the configured backend (None when disabled)"""
+    global _cache, _cache_backend
+    backend = os.getenv('EXTRACTION_CACHE_BACKEND', 'disk').lower()
+    with _cache_lock:
+        if backend == _cache_backend:
+            return _cache
+        try:
+            if backend == 'redis':
+                from shared.redis_connection import get_redis_connection
+                _cache = RedisExtractionCache(get_redis_connection(),
+                                              int(os.getenv('EXTRACTION_CACHE_TTL', str(7 * 24 * 3600))))
+            elif backend == 'disk':
+                directory = os.getenv('EXTRACTION_CACHE_DIR',
+                                      os.path.join(tempfile.gettempdir(), 'veritaslogic_extraction_cache'))
+                _cache = DiskExtractionCache(directory, int(os.getenv('EXTRACTION_CACHE_MAX_MB', '512')) * 1024 * 1024)
+            else:
+                _cache = None
+        except Exception as e:
+            logger.warning(f"Extraction cache unavailable ({backend}): {e}")
+            _cache = None
+        _cache_backend = backend
+        return _cache
+
+
+def _cached_result(file_detail: Dict[str, Any]) -> Dict[str, Any]:
+    cache = get_extraction_cache()
+    if not cache or not file_detail.get('content_hash'):
+        return {}
+    return cache.get(cache_key(file_detail['content_hash'], file_detail.get('file_extension', ''))) or {}
+
+
+def get_file_text(file_detail: Dict[str, Any]) -> str:
+    """Extracted text for a preflight file detail (inline, or from the cache by content hash)"""
+    if file_detail.get('text_content'):
+        return file_detail['text_content']
+    return _cached_result(file_detail).get('text') or ''
+
@@ -0,0 +1,157 @@
+"""
+In-flight Job Coalescing for analysis submissions
+A double-click, page reload or second tab submitting the same analysis attaches to the
+job already queued or running instead of creating (and billing) a second one.
+
+Submissions are fingerprinted by user, standard, de-identified contract text, additional
+context, source memo (reviews) and ANALYSIS_PIPELINE_VERSION. The fingerprint maps to
+the running job in Redis for JOB_COALESCE_TTL seconds (0 disables coalescing); an entry
+whose job is no longer queued or running is ignored, so a finished or failed analysis
+can always be resubmitted.
+
+The check and the submission are made atomic by claiming the fingerprint first (SET NX
+with a placeholder, JOB_COALESCE_CLAIM_TTL seconds) before the analysis record is
+created. A concurrent duplicate that finds the placeholder waits up to
+JOB_COALESCE_CLAIM_WAIT seconds for the winner to register its job, then attaches to it.
+A claimant that fails before submitting releases the placeholder.
+
+Fingerprints are per user: the attached session reads the memo through the status API,
+which only returns the submitting user's analyses, and only the original submission is
+ever charged.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+from redis.exceptions import WatchError
+
+logger = logging.getLogger(__name__)
+
+# Bump when prompts or analysis steps change, so new submissions never attach to old jobs
+ANALYSIS_PIPELINE_VERSION = 1
+
+# RQ statuses of a job that will still produce a result
+_INFLIGHT_STATUSES = ('queued', 'started', 'deferred', 'scheduled')
+
+# Value held under a fingerprint between its claim and the job's registration
+_PLACEHOLDER = json.dumps({'pending': True})
+
+
+def submission_fingerprint(user_id: Any, asc_standard: str, combined_text: str,
+                           additional_context: Optional[str] = None,
+                           source_memo_text: Optional[str] = None) -> str:
+    """SHA-256 over everything that determines an analysis' output"""
+    digest = hashlib.sha256()
+    for part in (str(ANALYSIS_PIPELINE_VERSION), str(user_id), asc_standard, combined_text or '',
+                 (additional_context or '').strip(), source_memo_text or ''):
+        data = part.encode('utf-8')
+        # Length-prefixed so adjacent fields cannot run into each other
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class JobCoalescer:
+    """Fingerprint -> in-flight analysis job, kept in Redis with a TTL"""
+
+    def __init__(self, redis_conn, prefix: str = 'coalesce:'):
+        self.redis_conn = redis_conn
+        self.prefix = prefix
+        self.ttl_seconds = int(os.getenv('JOB_COALESCE_TTL', '3600'))
+        self.claim_ttl = int(os.getenv('JOB_COALESCE_CLAIM_TTL', '60'))
+        self.claim_wait = float(os.getenv('JOB_COALESCE_CLAIM_WAIT', '15'))
+
+    def register(self, fingerprint: str, job_id: str, **details):
+        """
+        Record the job running a submission
+
+        Args:
+            details: What an attaching session needs to follow the job (db_analysis_id, ...)
+        """
+        if self.ttl_seconds <= 0:
+            return
+        try:
+            self.redis_conn.set(self.prefix + fingerprint, json.dumps({'job_id': job_id, **details}, default=str),
+                                ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to register fingerprint for job {job_id}: {e}")
+
+    def find(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Details of the matching job if it is still queued or running, else None
+        ({'pending': True} while a claimant has not registered its job yet)
+        """
+        if self.ttl_seconds <= 0:
+            return None
+        try:
+            raw = self.redis_conn.get(self.prefix + fingerprint)
+            if raw is None:
+                return None
+            entry = json.loads(raw)
+            if entry.get('pending'):
+                return entry
+            try:
+                status = Job.fetch(entry['job_id'], connection=self.redis_conn).get_status()
+            except NoSuchJobError:
+                status = None
+            if status not in _INFLIGHT_STATUSES:
+                self.redis_conn.delete(self.prefix + fingerprint)
+                return None
+            return entry
+        except Exception as e:
+            # Worst case the duplicate runs as its own job, as before coalescing
+            logger.warning(f"Fingerprint lookup failed: {e}")
+            return None
+
+    def claim(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim a submission, or find the job already running it
+
+        Returns:
+            None if the caller now holds the fingerprint and should submit (register, or
+            release on failure), else the in-flight job's details to attach to
+        """
+        if self.ttl_seconds <= 0:
+            return None
+        key = self.prefix + fingerprint
+        deadline = time.monotonic() + self.claim_wait
+        try:
+            while True:
+                if self.redis_conn.set(key, _PLACEHOLDER, nx=True, ex=self.claim_ttl):
+                    return None
+                entry = self.find(fingerprint)  # Drops the entry of a job that is no longer running
+                if entry and not entry.get('pending'):
+                    return entry
+                if time.monotonic() > deadline:
+                    # The claimant is stuck; worst case the duplicate runs as its own job
+                    logger.warning(f"Fingerprint claim not registered after {self.claim_wait}s, submitting anyway")
+                    return None
+                if entry:
+                    time.sleep(0.2)  # Claimed - wait for the job to be registered
+        except Exception as e:
+            logger.warning(f"Fingerprint claim failed: {e}")
+            return None
+
+    def release(self, fingerprint: str):
+        """Give up a claim that never became a job, so a retry does not wait on it"""
+        if self.ttl_seconds <= 0:
+            return
+        key = self.prefix + fingerprint
+        try:
+            with self.redis_conn.pipeline() as pipe:
+                try:
+                    # Delete only the placeholder - a registered job stays attachable
+                    pipe.watch(key)
+                    if pipe.get(key) == _PLACEHOLDER.encode():
+                        pipe.multi()
+                        pipe.delete(key)
+                        pipe.execute()
+                except WatchError:
+                    pass
+        except Exception as e:
+            logger.warning(f"Failed to release fingerprint claim: {e}")
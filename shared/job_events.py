@@ -0,0 +1,100 @@
+"""
+Job Events for pushed analysis progress
+Workers append progress and completion events to a short Redis stream per job, and
+readers (the SSE endpoint in backend_api.py, the progress fragment in
+shared/job_progress_monitor.py) pick up new entries by ID instead of polling Job.fetch
+and the status API.
+
+A stream rather than pub/sub so a reader that connects late, reconnects (SSE
+Last-Event-ID) or reruns between reads still receives every event since the last ID
+it saw. Streams are capped and expire a day after the last event.
+"""
+
+import json
+import time
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = ('finished', 'failed', 'stopped')
+
+_STREAM_MAXLEN = 200
+_STREAM_TTL_SECONDS = 24 * 3600
+
+
+def job_events_key(job_id: str) -> str:
+    return f"job:events:{job_id}"
+
+
+def publish_job_event(redis_conn, job_id: str, event: str, **data):
+    """
+    Append an event ('progress', 'finished', 'failed', ...) to a job's stream
+
+    Never raises - a missed event only delays the reader's fallback status check.
+    """
+    try:
+        key = job_events_key(job_id)
+        pipe = redis_conn.pipeline()
+        pipe.xadd(key, {'event': event, 'data': json.dumps(data, default=str), 'ts': f"{time.time():.3f}"},
+                  maxlen=_STREAM_MAXLEN, approximate=True)
+        pipe.expire(key, _STREAM_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish {event} event for job {job_id}: {e}")
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def read_job_events(redis_conn, job_id: str, last_id: str = '0-0',
+                    block_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Events after last_id, oldest first
+
+    Args:
+        last_id: Stream ID of the last event already seen ('0-0' for all)
+        block_ms: Wait up to this long for a new event when there is none (None = don't wait)
+
+    Returns:
+        Dicts with 'id', 'event', 'ts' and the event's data fields
+    """
+    response = redis_conn.xread({job_events_key(job_id): last_id}, block=block_ms)
+    events = []
+    for _, entries in response or []:
+        for entry_id, fields in entries:
+            fields = {_decode(k): _decode(v) for k, v in fields.items()}
+            event = json.loads(fields.get('data') or '{}')
+            event.update({'id': _decode(entry_id), 'event': fields.get('event'), 'ts': float(fields.get('ts', 0))})
+            events.append(event)
+    return events
+
+
+def iter_job_events(redis_conn, job_id: str, last_id: str = '0-0', timeout: float = 35 * 60,
+                    heartbeat: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Follow a job's events until a terminal event or the timeout
+
+    Yields:
+        Events as they arrive, and None every `heartbeat` seconds without one
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events = read_job_events(redis_conn, job_id, last_id, block_ms=int(heartbeat * 1000))
+        if not events:
+            yield None
+            continue
+        for event in events:
+            last_id = event['id']
+            yield event
+            if event['event'] in TERMINAL_EVENTS:
+                return
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """Server-sent events wire format (None becomes a keep-alive comment)"""
+    if event is None:
+        return ": keep-alive\n\n"
+    data = {k: v for k, v in event.items() if k not in ('id', 'event')}
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -2,6 +2,7 @@
 Job Manager for Background Analysis Processing
 Handles job submission, status checking, and result retrieval using Redis Queue (RQ)
 Auto-detects environment: uses fakeredis locally, real Redis in production
+Analysis jobs go through the fair scheduler (shared/job_scheduler.py) before reaching RQ
 """
 
 import os
@@ -11,6 +12,11 @@ from datetime import datetime
 from rq import Queue
 from rq.job import Job
 from shared.redis_connection import get_redis_connection
+from shared.blob_store import get_blob_store, store_job_text, store_job_texts
+from shared.job_scheduler import FairScheduler
+from shared.job_events import read_job_events
+from shared.job_coalescing import JobCoalescer, submission_fingerprint
+from shared.job_watchdog import JobWatchdog
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +27,9 @@ class JobManager:
         """Initialize Redis connection and job queue"""
         try:
             self.redis_conn = get_redis_connection()
-            self.queue = Queue('analysis', connection=self.redis_conn)
+            self.scheduler = FairScheduler(self.redis_conn)
+            self.coalescer = JobCoalescer(self.redis_conn)
+            self.watchdog = JobWatchdog(self.redis_conn)
             logger.info("Job manager initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize job manager: {e}")
@@ -40,7 +48,8 @@ class JobManager:
                            org_id: Optional[int] = None,
                            total_words: Optional[int] = None,
                            source_memo_text: Optional[str] = None,
-                           source_memo_filename: Optional[str] = None) -> str:
+                           source_memo_filename: Optional[str] = None,
+                           deidentification_map: Optional[Dict[str, Any]] = None) -> str:
         """
         Submit an analysis job to the background queue
         
@@ -56,6 +65,12 @@ class JobManager:
             pricing_result: Pricing calculation result (legacy)
             org_id: Organization ID for word deduction (subscription system)
             total_words: Total words used for this analysis (subscription system)
+            deidentification_map: Offset/token map from de-identification, saved with the
+                                  analysis so memos can be re-identified for client delivery
+            
+        Large texts (combined_text, source_memo_text) go to the blob store and the job
+        carries references that the worker loads when it runs. The job is registered under
+        the submission's fingerprint so duplicates can attach (find_inflight_analysis).
             
         Returns:
             Job ID for tracking (string representation of analysis_id)
@@ -89,6 +104,7 @@ class JobManager:
                 if not worker_function:
                     raise ValueError(f"Unknown ASC standard: {asc_standard}")
             
+            blob_store = get_blob_store(self.redis_conn)
             job_data = {
                 'analysis_id': analysis_id,
                 'user_id': user_id,
@@ -96,31 +112,201 @@ class JobManager:
                 'allowance_result': allowance_result,
                 'pricing_result': pricing_result,
                 'additional_context': additional_context,
-                'combined_text': combined_text,
+                'combined_text': store_job_text(combined_text, blob_store),
                 'uploaded_filenames': uploaded_filenames,
                 'org_id': org_id,
                 'total_words': total_words,
                 'asc_standard': asc_standard,
-                'source_memo_text': source_memo_text,
-                'source_memo_filename': source_memo_filename
+                'source_memo_text': store_job_text(source_memo_text, blob_store),
+                'source_memo_filename': source_memo_filename,
+                'deidentification_map': deidentification_map
             }
             
-            job = self.queue.enqueue(
+            job_class = self.scheduler.classify(total_words, memo_review=bool(source_memo_text))
+            job = self.scheduler.submit(
                 worker_function,
                 job_data,
-                job_timeout='30m',
+                job_class,
+                FairScheduler.tenant_for(org_id, user_id),
+                total_words=total_words,
+                timeout='30m',
                 result_ttl=86400,
                 failure_ttl=86400,
                 job_id=str(analysis_id)
             )
             
-            logger.info(f"✓ Job submitted for {asc_standard}: {job.id} (analysis {analysis_id})")
+            self.coalescer.register(
+                submission_fingerprint(user_id, asc_standard, combined_text, additional_context, source_memo_text),
+                job.id,
+                db_analysis_id=analysis_id,
+                total_words=total_words,
+                file_count=len(uploaded_filenames or []),
+                source_memo_filename=source_memo_filename
+            )
+            
+            logger.info(f"✓ Job submitted for {asc_standard}: {job.id} (analysis {analysis_id}, {job_class} lane)")
             return job.id
             
         except Exception as e:
             logger.error(f"Failed to submit job for {asc_standard}: {e}")
+            self.release_inflight_claim(asc_standard, user_id, combined_text, additional_context, source_memo_text)
             raise
+
+    def find_inflight_analysis(self,
+                               asc_standard: str,
+                               user_id: int,
+                               combined_text: str,
+                               additional_context: Optional[str] = None,
+                               source_memo_text: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        The user's queued or running job for an identical submission, if any
+        
+        Call before creating the analysis record: a duplicate that attaches never gets a
+        record of its own, so it is neither checked against nor charged to the allowance.
+        When there is none, the submission is claimed so a concurrent duplicate waits for
+        this one's job; submit_analysis_job completes the claim, and a caller that stops
+        before submitting must call release_inflight_claim.
+        
+        Returns:
+            Dict with job_id, db_analysis_id, total_words, file_count and
+            source_memo_filename, or None
+        """
+        fingerprint = submission_fingerprint(user_id, asc_standard, combined_text, additional_context, source_memo_text)
+        inflight = self.coalescer.claim(fingerprint)
+        if inflight:
+            logger.info(f"Duplicate {asc_standard} submission attaches to job {inflight['job_id']}")
+        return inflight
+    
+    def release_inflight_claim(self,
+                               asc_standard: str,
+                               user_id: int,
+                               combined_text: str,
+                               additional_context: Optional[str] = None,
+                               source_memo_text: Optional[str] = None):
+        """Drop the claim taken by find_inflight_analysis for a submission that was not submitted"""
+        self.coalescer.release(
+            submission_fingerprint(user_id, asc_standard, combined_text, additional_context, source_memo_text)
+        )
     
+    def submit_batch_analysis_job(self,
+                                  asc_standard: str,
+                                  user_id: int,
+                                  user_token: str,
+                                  analyses: list) -> str:
+        """
+        Submit an offline batch of analyses to the low-priority 'batch' queue
+
+        Batch jobs go through the OpenAI Batch API (up to 24h turnaround, lower cost) on a
+        separate queue. Each job only checks the pending batch and re-enqueues itself while
+        it runs, so no worker sits waiting on the turnaround (see run_batch_analysis).
+        They finish long after the user's session token expires, so they require direct
+        result saves (ANALYSIS_DIRECT_SAVE with DATABASE_URL) instead of the save endpoint.
+
+        Args:
+            asc_standard: ASC standard (e.g., "ASC 606")
+            user_id: User ID for authentication
+            user_token: JWT token for API calls
+            analyses: List of dicts with analysis_id, combined_text, additional_context,
+                      uploaded_filenames, org_id and total_words
+
+        Returns:
+            Job ID for tracking
+
+        Raises:
+            ValueError: If direct result saves are not configured
+        """
+        try:
+            from workers.analysis_worker import run_batch_analysis
+            from shared.batch_analysis import BATCH_STAGE_TIMEOUT
+            from shared.standard_registry import get_standard_config
+            from shared.analysis_persistence import direct_save_enabled
+
+            get_standard_config(asc_standard)  # Validate standard up front
+            if not direct_save_enabled():
+                raise ValueError("Batch analysis requires direct result saves "
+                                 "(set ANALYSIS_DIRECT_SAVE=true and DATABASE_URL)")
+
+            job_data = {
+                'asc_standard': asc_standard,
+                'user_id': user_id,
+                'user_token': user_token,
+                'analyses': store_job_texts(analyses, get_blob_store(self.redis_conn))
+            }
+
+            batch_queue = Queue('batch', connection=self.redis_conn)
+            job = batch_queue.enqueue(
+                run_batch_analysis,
+                job_data,
+                job_timeout=BATCH_STAGE_TIMEOUT,
+                result_ttl=86400,
+                failure_ttl=86400
+            )
+
+            logger.info(f"✓ Batch job submitted for {asc_standard}: {job.id} ({len(analyses)} analyses)")
+            return job.id
+
+        except Exception as e:
+            logger.error(f"Failed to submit batch job for {asc_standard}: {e}")
+            raise
+
+    def submit_portfolio_job(self,
+                             asc_standard: str,
+                             user_id: int,
+                             user_token: str,
+                             contracts: list) -> str:
+        """
+        Submit a portfolio of contracts for one ASC standard as a single job
+
+        The worker shares one analyzer, knowledge base and retrieval cache across
+        all contracts and runs them concurrently (PORTFOLIO_MAX_CONCURRENCY).
+
+        Args:
+            asc_standard: ASC standard (e.g., "ASC 842")
+            user_id: User ID for authentication
+            user_token: JWT token for API calls
+            contracts: List of dicts with analysis_id, combined_text, additional_context,
+                       uploaded_filenames, org_id and total_words
+
+        Returns:
+            Job ID for tracking
+        """
+        try:
+            from workers.analysis_worker import run_portfolio_analysis
+            from shared.standard_registry import get_standard_config
+
+            get_standard_config(asc_standard)  # Validate standard up front
+
+            job_data = {
+                'asc_standard': asc_standard,
+                'user_id': user_id,
+                'user_token': user_token,
+                'contracts': store_job_texts(contracts, get_blob_store(self.redis_conn))
+            }
+
+            # Scale the timeout with portfolio size, assuming the concurrency limit holds
+            concurrency = max(1, int(os.getenv('PORTFOLIO_MAX_CONCURRENCY', '4')))
+            rounds = -(-len(contracts) // concurrency)
+            job_timeout = max(30, rounds * 30) * 60
+
+            org_id = next((item.get('org_id') for item in contracts if item.get('org_id') is not None), None)
+            job = self.scheduler.submit(
+                run_portfolio_analysis,
+                job_data,
+                'standard',
+                FairScheduler.tenant_for(org_id, user_id),
+                total_words=sum(item.get('total_words') or 0 for item in contracts),
+                timeout=job_timeout,
+                result_ttl=86400,
+                failure_ttl=86400
+            )
+
+            logger.info(f"✓ Portfolio job submitted for {asc_standard}: {job.id} ({len(contracts)} contracts)")
+            return job.id
+
+        except Exception as e:
+            logger.error(f"Failed to submit portfolio job for {asc_standard}: {e}")
+            raise
+
     def get_job_status(self, job_id: str) -> Dict[str, Any]:
         """
         Get current status of a job
@@ -133,10 +319,20 @@ class JobManager:
             
             meta = job.meta or {}
             
+            # Waiting for a fair turn - let the poll release jobs if a slot has freed up
+            if job.get_status() == 'queued' and self.scheduler.is_pending(job_id):
+                self.scheduler.dispatch()
+            
+            # Running with no recent heartbeat - its worker died; requeue or fail it now
+            if job.get_status() == 'started' and self.watchdog.check(job_id):
+                job.refresh()
+                meta = job.meta or {}
+            
             status_info = {
                 'job_id': job_id,
                 'status': job.get_status(),
                 'progress': meta.get('progress', {}),
+                'contracts': meta.get('contracts', {}),  # Per-contract progress for portfolio jobs
                 'error': None,
                 'result': None
             }
@@ -159,17 +355,33 @@ class JobManager:
                 'result': None
             }
     
+    def get_job_events(self, job_id: str, last_id: str = '0-0') -> list:
+        """
+        Progress and completion events pushed by the worker after last_id, without
+        waiting (empty list if there are none or Redis failed)
+        """
+        try:
+            return read_job_events(self.redis_conn, job_id, last_id)
+        except Exception as e:
+            logger.warning(f"Failed to read events for job {job_id}: {e}")
+            return []
+    
     def cancel_job(self, job_id: str) -> bool:
         """Cancel a running or queued job"""
         try:
             job = Job.fetch(job_id, connection=self.redis_conn)
             job.cancel()
+            self.scheduler.cancel(job_id)
             logger.info(f"✓ Job cancelled: {job_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to cancel job {job_id}: {e}")
             return False
     
+    def get_queue_wait_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue wait percentiles and backlog per scheduling class (fast, memo_review, standard)"""
+        return self.scheduler.wait_stats()
+    
     def update_job_progress(self, job_id: str, step_num: int, step_name: str):
         """
         Update job progress (called from within worker)
@@ -1,6 +1,8 @@
 """
 Shared Job Progress Monitor for VeritasLogic Analysis Platform
-Provides reusable polling logic for all ASC standards
+Provides reusable progress tracking for all ASC standards: a self-refreshing fragment
+reads the job's pushed events (shared/job_events.py) and checks job status only when
+none arrive
 """
 
 import streamlit as st
@@ -13,6 +15,10 @@ from shared.analysis_manager import analysis_manager
 
 logger = logging.getLogger(__name__)
 
+PROGRESS_REFRESH_SECONDS = 2   # How often the progress fragment checks for pushed events
+STATUS_CHECK_SECONDS = 10      # Fall back to a job status check after this long without events
+MONITOR_TIMEOUT_SECONDS = 30 * 60
+
 
 def persist_job_to_url(job_id: str, db_analysis_id: int, analysis_type: str = 'standard'):
     """
@@ -171,6 +177,157 @@ def check_and_resume_polling(asc_standard: str, session_id: str, analysis_type:
         # Don't show error to user - just log it and continue page rendering
 
 
+def follow_inflight_analysis(
+    asc_standard: str,
+    inflight: Dict[str, Any],
+    session_id: str,
+    user_token: str,
+    analysis_type: str = 'standard'
+):
+    """
+    Track and monitor an identical analysis that is already queued or running
+    (from JobManager.find_inflight_analysis) instead of submitting a new one
+    
+    Args:
+        asc_standard: ASC standard name (e.g., 'ASC 606')
+        inflight: job_id, db_analysis_id and size details of the running job
+        session_id: Session ID for caching results
+        user_token: User authentication token
+        analysis_type: Type of analysis ('standard' or 'review')
+    """
+    st.info("ℹ️ **This analysis is already running** (submitted from another tab or an earlier click). "
+            "Showing its progress - you will not be charged twice.")
+    
+    ui_analysis_id = analysis_manager.start_analysis({
+        'asc_standard': asc_standard,
+        'analysis_type': analysis_type,
+        'total_words': inflight.get('total_words') or 0,
+        'file_count': inflight.get('file_count') or 0,
+        'cost_charged': 0.0,
+        'job_id': inflight['job_id'],
+        'db_analysis_id': inflight['db_analysis_id'],
+        'service_token': None,  # The original submission's token stays with its session
+        'source_memo_filename': inflight.get('source_memo_filename')
+    })
+    
+    st.session_state['current_ui_analysis_id'] = ui_analysis_id
+    st.session_state['current_db_analysis_id'] = inflight['db_analysis_id']
+    
+    logger.info(f"✓ Attached to in-flight analysis: UI ID={ui_analysis_id}, DB ID={inflight['db_analysis_id']}, Job ID={inflight['job_id']}")
+    
+    monitor_job_progress(
+        asc_standard=asc_standard,
+        job_id=inflight['job_id'],
+        db_analysis_id=inflight['db_analysis_id'],
+        session_id=session_id,
+        user_token=user_token,
+        analysis_type=analysis_type
+    )
+
+
+def _apply_job_events(status_info: Dict[str, Any], events: list) -> Dict[str, Any]:
+    """Job status after the events pushed by the worker (shared/job_events.py), in order"""
+    status_info = dict(status_info)
+    for event in events:
+        if event['event'] == 'progress':
+            status_info['status'] = 'started'
+            status_info['progress'] = event.get('progress') or {}
+            status_info['contracts'] = event.get('contracts') or status_info.get('contracts', {})
+        elif event['event'] == 'requeued':
+            # Worker died mid-run; the watchdog put the job back in its queue
+            status_info['status'] = 'queued'
+            status_info['progress'] = {'current_step': 0, 'step_name': 'Restarting after a worker interruption'}
+        elif event['event'] in ('finished', 'failed', 'stopped'):
+            status_info['status'] = event['event']
+            status_info['error'] = event.get('error')
+    return status_info
+
+
+def _handle_job_finished(db_analysis_id: int, session_id: str, auth_token: str, asc_prefix: str,
+                         analysis_type: str) -> Optional[str]:
+    """
+    Fetch the completed memo from the backend, store it for the page and rerun the app
+    
+    Returns:
+        Error message if the memo could not be retrieved (the analysis is marked failed)
+    """
+    # Fetch memo from database via backend API
+    st.info("📥 Retrieving completed analysis...")
+    
+    try:
+        from shared.auth_utils import WEBSITE_URL
+        import requests
+        
+        status_response = requests.get(
+            f'{WEBSITE_URL}/api/analysis/status/{db_analysis_id}',
+            headers={'Authorization': f'Bearer {auth_token}'},
+            timeout=10
+        )
+        
+        if status_response.ok:
+            analysis_data = status_response.json()
+            logger.info(f"✓ Status API response: status={analysis_data.get('status')}, has_memo={bool(analysis_data.get('memo_content'))}")
+            
+            if analysis_data['status'] == 'completed' and analysis_data.get('memo_content'):
+                st.success("🎉 **Analysis completed successfully!**")
+                
+                # Store memo in session state for display
+                analysis_key = f'{asc_prefix}_analysis_complete_{session_id}'
+                memo_key = f'{asc_prefix}_memo_data_{session_id}'
+                
+                logger.info(f"✓ Storing memo in session state: session_id={session_id}, analysis_key={analysis_key}")
+                
+                st.session_state[analysis_key] = True
+                st.session_state[memo_key] = {
+                    'memo_content': analysis_data['memo_content'],
+                    'analysis_id': db_analysis_id,
+                    'memo_uuid': analysis_data.get('memo_uuid'),
+                    'completion_timestamp': analysis_data.get('completed_at'),
+                    'source_memo_filename': analysis_data.get('source_memo_filename'),
+                    'analysis_type': analysis_type
+                }
+                
+                logger.info(f"✓ Session state stored. Keys in session: {list(st.session_state.keys())}")
+                
+                # Mark analysis as complete before rerun
+                ui_analysis_id = st.session_state.get('current_ui_analysis_id')
+                if ui_analysis_id:
+                    analysis_manager.complete_analysis(ui_analysis_id, success=True)
+                    logger.info(f"✓ Marked analysis {ui_analysis_id} as complete")
+                
+                st.info("📄 **Memo ready!** Refreshing page to display results...")
+                clear_job_from_url()
+                st.rerun()
+            else:
+                st.error("❌ Analysis completed but memo not available.")
+                logger.error(f"Analysis status: {analysis_data.get('status')}, memo length: {len(analysis_data.get('memo_content', ''))}")
+                # Mark analysis as failed (memo not available)
+                ui_analysis_id = st.session_state.get('current_ui_analysis_id')
+                if ui_analysis_id:
+                    analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message="Memo not available after completion")
+                clear_job_from_url()
+                return "Analysis completed but memo not available."
+        else:
+            st.error(f"❌ Failed to retrieve analysis: {status_response.text}")
+            logger.error(f"Status fetch failed: {status_response.status_code}")
+            # Mark analysis as failed (status fetch failed)
+            ui_analysis_id = st.session_state.get('current_ui_analysis_id')
+            if ui_analysis_id:
+                analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message=f"Status fetch failed: {status_response.status_code}")
+            clear_job_from_url()
+            return f"Failed to retrieve analysis: {status_response.text}"
+            
+    except Exception as e:
+        st.error(f"❌ Error retrieving analysis: {str(e)}")
+        logger.error(f"Failed to fetch analysis status: {str(e)}")
+        # Mark analysis as failed (exception during status fetch)
+        ui_analysis_id = st.session_state.get('current_ui_analysis_id')
+        if ui_analysis_id:
+            analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message=str(e))
+        clear_job_from_url()
+        return f"Error retrieving analysis: {str(e)}"
+
+
 def monitor_job_progress(
     asc_standard: str,
     job_id: str,
@@ -183,6 +340,10 @@ def monitor_job_progress(
     """
     Monitor analysis job progress and handle completion
     
+    Renders the progress header, then a fragment that reruns on its own every
+    PROGRESS_REFRESH_SECONDS, so the page script returns right away instead of
+    holding the session for the life of the job.
+    
     Args:
         asc_standard: ASC standard name (e.g., 'ASC 606')
         job_id: Redis job ID for polling
@@ -213,7 +374,6 @@ def monitor_job_progress(
         # Use different prefix for review vs standard analysis to prevent cross-contamination
         asc_prefix = f'review_{base_prefix}' if analysis_type == 'review' else base_prefix
         
-        # Poll for job completion
         st.markdown("### 🔄 Analysis Progress")
         if analysis_type == 'review':
             st.info("""
@@ -224,164 +384,7 @@ def monitor_job_progress(
             ✅ **Your analysis is running. Upon completion, the page will refresh with your memo.**
             """)
         
-        # Create progress display components
-        progress_bar = st.progress(0)
-        status_container = st.empty()
-        
-        # Polling loop
-        max_polls = 180  # 30 minutes max (10 second intervals)
-        poll_count = 0
-        
-        while poll_count < max_polls:
-            # Check job status
-            status_info = job_manager.get_job_status(job_id)
-            job_status = status_info['status']
-            
-            logger.info(f"Job {job_id} status: {job_status}")
-            
-            if job_status == 'finished':
-                # Job completed successfully!
-                progress_bar.progress(100)
-                status_container.success("✅ Analysis complete!")
-                
-                # Fetch memo from database via backend API
-                st.info("📥 Retrieving completed analysis...")
-                
-                try:
-                    from shared.auth_utils import WEBSITE_URL
-                    import requests
-                    
-                    status_response = requests.get(
-                        f'{WEBSITE_URL}/api/analysis/status/{db_analysis_id}',
-                        headers={'Authorization': f'Bearer {auth_token}'},
-                        timeout=10
-                    )
-                    
-                    if status_response.ok:
-                        analysis_data = status_response.json()
-                        logger.info(f"✓ Status API response: status={analysis_data.get('status')}, has_memo={bool(analysis_data.get('memo_content'))}")
-                        
-                        if analysis_data['status'] == 'completed' and analysis_data.get('memo_content'):
-                            st.success("🎉 **Analysis completed successfully!**")
-                            
-                            # Store memo in session state for display
-                            analysis_key = f'{asc_prefix}_analysis_complete_{session_id}'
-                            memo_key = f'{asc_prefix}_memo_data_{session_id}'
-                            
-                            logger.info(f"✓ Storing memo in session state: session_id={session_id}, analysis_key={analysis_key}")
-                            
-                            st.session_state[analysis_key] = True
-                            st.session_state[memo_key] = {
-                                'memo_content': analysis_data['memo_content'],
-                                'analysis_id': db_analysis_id,
-                                'memo_uuid': analysis_data.get('memo_uuid'),
-                                'completion_timestamp': analysis_data.get('completed_at'),
-                                'source_memo_filename': analysis_data.get('source_memo_filename'),
-                                'analysis_type': analysis_type
-                            }
-                            
-                            logger.info(f"✓ Session state stored. Keys in session: {list(st.session_state.keys())}")
-                            
-                            # Mark analysis as complete before rerun
-                            ui_analysis_id = st.session_state.get('current_ui_analysis_id')
-                            if ui_analysis_id:
-                                analysis_manager.complete_analysis(ui_analysis_id, success=True)
-                                logger.info(f"✓ Marked analysis {ui_analysis_id} as complete")
-                            
-                            st.info("📄 **Memo ready!** Refreshing page to display results...")
-                            clear_job_from_url()
-                            time.sleep(2)
-                            st.rerun()
-                        else:
-                            st.error("❌ Analysis completed but memo not available.")
-                            logger.error(f"Analysis status: {analysis_data.get('status')}, memo length: {len(analysis_data.get('memo_content', ''))}")
-                            # Mark analysis as failed (memo not available)
-                            ui_analysis_id = st.session_state.get('current_ui_analysis_id')
-                            if ui_analysis_id:
-                                analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message="Memo not available after completion")
-                            clear_job_from_url()
-                    else:
-                        st.error(f"❌ Failed to retrieve analysis: {status_response.text}")
-                        logger.error(f"Status fetch failed: {status_response.status_code}")
-                        # Mark analysis as failed (status fetch failed)
-                        ui_analysis_id = st.session_state.get('current_ui_analysis_id')
-                        if ui_analysis_id:
-                            analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message=f"Status fetch failed: {status_response.status_code}")
-                        clear_job_from_url()
-                        
-                except Exception as e:
-                    st.error(f"❌ Error retrieving analysis: {str(e)}")
-                    logger.error(f"Failed to fetch analysis status: {str(e)}")
-                    # Mark analysis as failed (exception during status fetch)
-                    ui_analysis_id = st.session_state.get('current_ui_analysis_id')
-                    if ui_analysis_id:
-                        analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message=str(e))
-                    clear_job_from_url()
-                
-                return
-                
-            elif job_status == 'failed':
-                # Job failed
-                progress_bar.empty()
-                status_container.error("❌ Analysis failed")
-                
-                error_msg = status_info.get('error', 'Unknown error')
-                st.error(f"❌ **Analysis Failed**: {error_msg}")
-                
-                logger.error(f"Job {job_id} failed: {error_msg}")
-                
-                # Mark analysis as failed
-                ui_analysis_id = st.session_state.get('current_ui_analysis_id')
-                if ui_analysis_id:
-                    analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message=error_msg)
-                
-                clear_job_from_url()
-                return
-                
-            elif job_status == 'started':
-                # Job is running - show progress with animated spinner
-                progress = status_info.get('progress', {})
-                current_step = progress.get('current_step', 1)
-                total_steps = progress.get('total_steps', 5)
-                step_name = progress.get('step_name', f'Step {current_step}')
-                
-                # Update progress bar (0-100%)
-                progress_pct = int(((current_step - 0.5) / total_steps) * 100)
-                progress_bar.progress(progress_pct)
-                
-                # Show animated spinner with current step
-                with status_container:
-                    with st.spinner(f"Processing: {step_name} ({current_step}/{total_steps})"):
-                        time.sleep(10)  # Poll every 10 seconds
-                        poll_count += 1
-                        continue
-                
-            elif job_status == 'queued':
-                # Job is queued, waiting to start with animated spinner
-                with status_container:
-                    with st.spinner("Waiting in queue..."):
-                        time.sleep(10)  # Poll every 10 seconds
-                        poll_count += 1
-                        continue
-                
-            else:
-                # Unknown status - show spinner while waiting
-                with status_container:
-                    with st.spinner(f"Status: {job_status}"):
-                        time.sleep(10)  # Poll every 10 seconds
-                        poll_count += 1
-                        continue
-        
-        # If we exit the loop, job timed out
-        st.error("⏱️ **Analysis timed out** - The job took longer than expected. Please contact support.")
-        logger.error(f"Job {job_id} timed out after {max_polls * 10} seconds")
-        
-        # Mark analysis as failed due to timeout
-        ui_analysis_id = st.session_state.get('current_ui_analysis_id')
-        if ui_analysis_id:
-            analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message="Analysis timed out after 30 minutes")
-        
-        clear_job_from_url()
+        _job_progress_fragment(job_id, db_analysis_id, session_id, auth_token, asc_prefix, analysis_type)
         
     except Exception as e:
         logger.error(f"Error in job monitoring: {str(e)}")
@@ -393,3 +396,83 @@ def monitor_job_progress(
             analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message=str(e))
         
         clear_job_from_url()
+
+
+def _fail_monitored_job(state: Dict[str, Any], job_id: str, error_msg: str):
+    """Record a terminal failure once; later fragment runs only redisplay it"""
+    state['error'] = error_msg
+    logger.error(f"Job {job_id} failed: {error_msg}")
+    ui_analysis_id = st.session_state.get('current_ui_analysis_id')
+    if ui_analysis_id:
+        analysis_manager.complete_analysis(ui_analysis_id, success=False, error_message=error_msg)
+    clear_job_from_url()
+
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def _job_progress_fragment(job_id: str, db_analysis_id: int, session_id: str, auth_token: str,
+                           asc_prefix: str, analysis_type: str):
+    """
+    One progress check: apply the events pushed since the last run (shared/job_events.py)
+    and render them. Job status is checked directly only when nothing has been pushed
+    for STATUS_CHECK_SECONDS (job still queued, or an older worker).
+    """
+    state_key = f'job_monitor_{job_id}'
+    state = st.session_state.get(state_key)
+    if state is None:
+        state = st.session_state[state_key] = {
+            'last_event_id': '0-0',
+            'status_info': job_manager.get_job_status(job_id),
+            'checked_at': time.time(),
+            'deadline': time.time() + MONITOR_TIMEOUT_SECONDS,
+            'error': None
+        }
+    
+    if state['error']:
+        st.error(f"❌ **Analysis Failed**: {state['error']}")
+        return
+    
+    events = job_manager.get_job_events(job_id, state['last_event_id'])
+    if events:
+        state['last_event_id'] = events[-1]['id']
+        state['status_info'] = _apply_job_events(state['status_info'], events)
+        state['checked_at'] = time.time()
+    elif time.time() - state['checked_at'] >= STATUS_CHECK_SECONDS:
+        state['status_info'] = job_manager.get_job_status(job_id)
+        state['checked_at'] = time.time()
+    
+    status_info = state['status_info']
+    job_status = status_info['status']
+    
+    if job_status == 'finished':
+        st.progress(100)
+        st.success("✅ Analysis complete!")
+        st.session_state.pop(state_key, None)
+        # Reruns the whole app to show the memo; returns only if it could not be fetched
+        state['error'] = _handle_job_finished(db_analysis_id, session_id, auth_token, asc_prefix, analysis_type)
+        st.session_state[state_key] = state
+        return
+    
+    if job_status in ('failed', 'stopped'):
+        error_msg = status_info.get('error') or ('Analysis was stopped' if job_status == 'stopped' else 'Unknown error')
+        _fail_monitored_job(state, job_id, error_msg)
+        st.error(f"❌ **Analysis Failed**: {error_msg}")
+        return
+    
+    if time.time() > state['deadline']:
+        _fail_monitored_job(state, job_id, "Analysis timed out after 30 minutes")
+        st.error("⏱️ **Analysis timed out** - The job took longer than expected. Please contact support.")
+        return
+    
+    if job_status == 'started':
+        progress = status_info.get('progress', {})
+        current_step = progress.get('current_step', 1)
+        total_steps = progress.get('total_steps', 5)
+        step_name = progress.get('step_name', f'Step {current_step}')
+        st.progress(int(((current_step - 0.5) / total_steps) * 100))
+        st.caption(f"⏳ Processing: {step_name} ({current_step}/{total_steps})")
+    elif job_status == 'queued':
+        st.progress(0)
+        st.caption("⏳ Waiting in queue...")
+    else:
+        st.progress(0)
+        st.caption(f"⏳ Status: {job_status}")
@@ -0,0 +1,294 @@
+"""
+Fair Job Scheduler over RQ
+Jobs are held in Redis per scheduling class and released into RQ a few at a time, so
+one organization submitting 30 large contracts cannot block everyone else.
+
+- Classes: 'fast' (total_words <= SCHEDULER_FAST_LANE_WORDS), 'memo_review' and
+  'standard'. Each has its own RQ queue and workers drain them in priority order:
+  close sync first, then fast, memo review, standard and offline batch jobs.
+- Within a class, self-clocked weighted fair queuing orders tenants (organization, or
+  user without one): a job's finish tag is max(class virtual time, tenant's last tag)
+  + cost / weight, with cost in thousands of words. A tenant with a backlog of large
+  jobs therefore takes turns with others instead of running ahead of them.
+- A tenant may have at most SCHEDULER_ORG_MAX_CONCURRENT jobs dispatched or running.
+  This is enforced with a Redis semaphore of leases that expire, so a crashed worker
+  cannot hold a slot forever. A lease lasts the job's timeout plus
+  SCHEDULER_LEASE_MARGIN_SECONDS (time spent waiting in RQ), so it outlives any run.
+- Only SCHEDULER_DISPATCH_DEPTH jobs per class wait in RQ at once, so ordering is
+  decided as late as possible. Dispatch runs on submit, when a job finishes (RQ
+  callbacks), on worker start and on status polls of waiting jobs.
+- Queue wait (submit -> start) is recorded per class; wait_stats() returns percentiles.
+- The completion callbacks also publish the job's terminal event (shared/job_events.py).
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from datetime import timezone
+from typing import Any, Callable, Dict, List, Optional
+from rq import Queue, Callback
+from rq.job import Job, JobStatus
+from redis.exceptions import WatchError
+from rq.exceptions import NoSuchJobError
+from shared.job_events import publish_job_event
+
+logger = logging.getLogger(__name__)
+
+# Scheduling class -> RQ queue, in worker priority order
+CLASS_QUEUES = {
+    'fast': 'analysis-fast',
+    'memo_review': 'memo-review',
+    'standard': 'analysis'
+}
+
+# Queues a worker listens on, highest priority first ('close' sync jobs come from another service)
+WORKER_QUEUES = ['close', 'analysis-fast', 'memo-review', 'analysis', 'batch']
+
+_WAIT_SAMPLES = 1000  # Recent waits kept per class for percentiles
+_SCAN_WINDOW = 200    # Pending jobs examined per class and dispatch
+
+
+def on_job_finished(job, connection, *args, **kwargs):
+    """RQ success/failure/stopped callback: free the tenant's slot and dispatch the next job"""
+    try:
+        scheduler = FairScheduler(connection)
+        scheduler.release(job)
+        scheduler.dispatch()
+    except Exception as e:
+        # Never let scheduling bookkeeping fail the job itself
+        logger.error(f"Scheduler release failed for job {job.id}: {e}")
+
+
+def on_job_succeeded(job, connection, result, *args, **kwargs):
+    publish_job_event(connection, job.id, 'finished')
+    on_job_finished(job, connection)
+
+
+def on_job_failed(job, connection, exc_type=None, exc_value=None, *args, **kwargs):
+    publish_job_event(connection, job.id, 'failed', error=str(exc_value)[:500] if exc_value else None)
+    on_job_finished(job, connection)
+
+
+def on_job_stopped(job, connection, *args, **kwargs):
+    publish_job_event(connection, job.id, 'stopped')
+    on_job_finished(job, connection)
+
+
+class FairScheduler:
+    """Weighted fair queuing with per-tenant concurrency caps on top of RQ queues"""
+
+    def __init__(self, redis_conn, prefix: str = 'sched:'):
+        self.redis_conn = redis_conn
+        self.prefix = prefix
+        self.fast_lane_words = int(os.getenv('SCHEDULER_FAST_LANE_WORDS', '8000'))
+        self.max_concurrent = max(1, int(os.getenv('SCHEDULER_ORG_MAX_CONCURRENT', '2')))
+        self.dispatch_depth = max(1, int(os.getenv('SCHEDULER_DISPATCH_DEPTH', '2')))
+        self.lease_margin = int(os.getenv('SCHEDULER_LEASE_MARGIN_SECONDS', str(15 * 60)))
+
+    def _key(self, *parts) -> str:
+        return self.prefix + ':'.join(str(p) for p in parts)
+
+    @staticmethod
+    def tenant_for(org_id: Optional[int], user_id: Optional[int]) -> str:
+        return f"org:{org_id}" if org_id is not None else f"user:{user_id}"
+
+    def classify(self, total_words: Optional[int], memo_review: bool = False) -> str:
+        if memo_review:
+            return 'memo_review'
+        if total_words is not None and total_words <= self.fast_lane_words:
+            return 'fast'
+        return 'standard'
+
+    def set_tenant_policy(self, tenant: str, weight: Optional[float] = None, max_concurrent: Optional[int] = None):
+        """Override a tenant's fair-share weight (default 1) or concurrency cap"""
+        policy = self._policy(tenant)
+        if weight is not None:
+            policy['weight'] = weight
+        if max_concurrent is not None:
+            policy['max_concurrent'] = max_concurrent
+        self.redis_conn.hset(self._key('policy'), tenant, json.dumps(policy))
+
+    @contextmanager
+    def _lock(self, timeout: float = 10.0):
+        """
+        Mutex for scheduling decisions (SET NX with expiry, released by token)
+        Plain commands rather than redis-py's Lua lock, so fakeredis works in local dev
+        """
+        key = self._key('lock')
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self.redis_conn.set(key, token, nx=True, px=int(timeout * 1000)):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Scheduler lock is busy")
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            # Delete only our own lock - it may have expired and been taken by another process
+            with self.redis_conn.pipeline() as pipe:
+                try:
+                    pipe.watch(key)
+                    if pipe.get(key) == token.encode():
+                        pipe.multi()
+                        pipe.delete(key)
+                        pipe.execute()
+                except WatchError:
+                    pass
+
+    def _policy(self, tenant: str) -> Dict[str, Any]:
+        raw = self.redis_conn.hget(self._key('policy'), tenant)
+        return json.loads(raw) if raw else {}
+
+    def submit(self, func: Callable, job_data: Dict[str, Any], job_class: str, tenant: str,
+               total_words: Optional[int] = None, **job_kwargs) -> Job:
+        """
+        Create an RQ job and hold it until its tenant's fair turn
+
+        Args:
+            func: Worker function, called with job_data
+            job_class: 'fast', 'memo_review' or 'standard'
+            tenant: Fair-share and concurrency key (see tenant_for)
+            total_words: Job size; cost is max(1, total_words / 1000)
+            **job_kwargs: Passed to Queue.create_job (timeout, result_ttl, job_id, ...)
+        """
+        queue = Queue(CLASS_QUEUES[job_class], connection=self.redis_conn)
+        job = queue.create_job(func, args=(job_data,), on_success=Callback(on_job_succeeded),
+                               on_failure=Callback(on_job_failed), on_stopped=Callback(on_job_stopped),
+                               **job_kwargs)
+        job.save()
+
+        cost = max(1.0, (total_words or 0) / 1000)
+        with self._lock():
+            weight = float(self._policy(tenant).get('weight', 1)) or 1.0
+            virtual_time = float(self.redis_conn.get(self._key('vtime', job_class)) or 0)
+            last_finish = float(self.redis_conn.hget(self._key('finish', job_class), tenant) or 0)
+            finish_tag = max(virtual_time, last_finish) + cost / weight
+
+            pipe = self.redis_conn.pipeline()
+            pipe.hset(self._key('finish', job_class), tenant, finish_tag)
+            pipe.hset(self._key('jobs'), job.id, json.dumps({
+                'class': job_class, 'tenant': tenant, 'cost': cost, 'submitted_at': time.time()
+            }))
+            pipe.zadd(self._key('pending', job_class), {job.id: finish_tag})
+            pipe.execute()
+
+        logger.info(f"Scheduled job {job.id} ({job_class}, {tenant}, cost {cost:.1f}, tag {finish_tag:.1f})")
+        self.dispatch()
+        return job
+
+    def _lease_seconds(self, job: Job) -> int:
+        """How long a dispatched job may hold its slot: its timeout (RQ's default without one) plus the margin"""
+        return int(job.timeout or Queue.DEFAULT_TIMEOUT) + self.lease_margin
+
+    def _active_leases(self, tenant: str) -> int:
+        key = self._key('leases', tenant)
+        self.redis_conn.zremrangebyscore(key, '-inf', time.time())  # Expired leases (lost workers)
+        return self.redis_conn.zcard(key)
+
+    def dispatch(self) -> int:
+        """Move the next fair jobs into their RQ queues; returns how many were released"""
+        released = 0
+        with self._lock():
+            for job_class, queue_name in CLASS_QUEUES.items():
+                queue = Queue(queue_name, connection=self.redis_conn)
+                room = self.dispatch_depth - queue.count
+                if room <= 0:
+                    continue
+                pending_key = self._key('pending', job_class)
+                blocked = set()
+                for raw_id, finish_tag in self.redis_conn.zrange(pending_key, 0, _SCAN_WINDOW - 1, withscores=True):
+                    job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+                    raw_info = self.redis_conn.hget(self._key('jobs'), job_id)
+                    if raw_info is None:
+                        self.redis_conn.zrem(pending_key, job_id)
+                        continue
+                    info = json.loads(raw_info)
+                    tenant = info['tenant']
+                    if tenant in blocked:
+                        continue
+                    cap = int(self._policy(tenant).get('max_concurrent', self.max_concurrent))
+                    if self._active_leases(tenant) >= cap:
+                        blocked.add(tenant)
+                        continue
+                    try:
+                        job = Job.fetch(job_id, connection=self.redis_conn)
+                    except NoSuchJobError:
+                        self._forget(job_id, job_class, tenant)
+                        continue
+                    if job.get_status(refresh=False) == JobStatus.CANCELED:
+                        self._forget(job_id, job_class, tenant)
+                        continue
+
+                    pipe = self.redis_conn.pipeline()
+                    pipe.zadd(self._key('leases', tenant), {job_id: time.time() + self._lease_seconds(job)})
+                    pipe.zrem(pending_key, job_id)
+                    pipe.set(self._key('vtime', job_class), finish_tag)
+                    pipe.execute()
+                    queue.enqueue_job(job)
+                    released += 1
+                    room -= 1
+                    if room <= 0:
+                        break
+        return released
+
+    def _forget(self, job_id: str, job_class: str, tenant: str):
+        pipe = self.redis_conn.pipeline()
+        pipe.zrem(self._key('pending', job_class), job_id)
+        pipe.zrem(self._key('leases', tenant), job_id)
+        pipe.hdel(self._key('jobs'), job_id)
+        pipe.execute()
+
+    def release(self, job: Job):
+        """Free the job's concurrency slot and record how long it waited to start"""
+        raw_info = self.redis_conn.hget(self._key('jobs'), job.id)
+        if raw_info is None:
+            return
+        info = json.loads(raw_info)
+        self._forget(job.id, info['class'], info['tenant'])
+        if job.started_at:
+            started_at = job.started_at
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)  # RQ stores naive UTC
+            wait = max(0.0, started_at.timestamp() - info['submitted_at'])
+            pipe = self.redis_conn.pipeline()
+            pipe.lpush(self._key('waits', info['class']), round(wait, 3))
+            pipe.ltrim(self._key('waits', info['class']), 0, _WAIT_SAMPLES - 1)
+            pipe.execute()
+
+    def cancel(self, job_id: str):
+        """Drop a job that has not been dispatched (and its slot, if it was)"""
+        raw_info = self.redis_conn.hget(self._key('jobs'), job_id)
+        if raw_info is not None:
+            info = json.loads(raw_info)
+            self._forget(job_id, info['class'], info['tenant'])
+
+    def is_pending(self, job_id: str) -> bool:
+        raw_info = self.redis_conn.hget(self._key('jobs'), job_id)
+        if raw_info is None:
+            return False
+        return self.redis_conn.zscore(self._key('pending', json.loads(raw_info)['class']), job_id) is not None
+
+    def wait_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue wait percentiles (seconds) over recent jobs, and the backlog, per class"""
+        stats = {}
+        for job_class in CLASS_QUEUES:
+            waits = sorted(float(w) for w in self.redis_conn.lrange(self._key('waits', job_class), 0, -1))
+            stats[job_class] = {
+                'samples': len(waits),
+                'pending': self.redis_conn.zcard(self._key('pending', job_class)),
+                'p50': _percentile(waits, 50),
+                'p90': _percentile(waits, 90),
+                'p99': _percentile(waits, 99)
+            }
+        return stats
+
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
@@ -0,0 +1,205 @@
+"""
+Job Heartbeats and Stuck-Analysis Reaper
+A work horse that is OOM-killed, or a worker container that restarts, never runs the
+job's failure path: the analysis stays 'processing' and its session waits out the
+30-minute monitor timeout. Jobs therefore send heartbeats while they run, and a
+watchdog reaps jobs whose heartbeats stop.
+
+- JobHeartbeat (entered by the worker around every job) records the job's last beat,
+  every JOB_HEARTBEAT_INTERVAL seconds, from a daemon thread in the process running it.
+  Beats go to a sorted set next to the job rather than into job.meta: progress updates
+  save the whole meta, which would race a second writer.
+- A job whose last beat is older than JOB_HEARTBEAT_TIMEOUT is dead. Workers mark a job
+  dead at once when they see its process die (RQ's horse-killed handler, the warm-mode
+  supervisor), so the watchdog process picks it up on its next pass.
+- A dead job is requeued up to JOB_WATCHDOG_MAX_REQUEUES times (e.g. a deploy restart),
+  then failed: its analyses are marked failed in the database, its 'failed' event is
+  published and its scheduler slot is released.
+
+Reaping is claimed per job (ZREM), so the watchdog process and status polls
+(JobManager.get_job_status) can both check a job without reaping it twice.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Optional
+from rq import Queue
+from rq.job import Job, JobStatus
+from rq.registry import StartedJobRegistry, FailedJobRegistry
+from rq.results import Result
+from rq.exceptions import NoSuchJobError
+from shared.job_events import publish_job_event
+
+logger = logging.getLogger(__name__)
+
+HEARTBEATS_KEY = 'watchdog:heartbeats'  # job_id -> last beat (epoch seconds)
+OWNERS_KEY = 'watchdog:owners'          # job_id -> pid of the process running it
+LOCK_KEY = 'watchdog:lock'
+
+INTERRUPTED_MESSAGE = "Analysis was interrupted because its worker stopped unexpectedly. Please try again."
+
+
+def _heartbeat_interval() -> float:
+    return float(os.getenv('JOB_HEARTBEAT_INTERVAL', '5'))
+
+
+class JobHeartbeat:
+    """Context manager beating for a job from a daemon thread while the job runs"""
+
+    def __init__(self, redis_conn, job_id: str, interval: Optional[float] = None):
+        self.redis_conn = redis_conn
+        self.job_id = job_id
+        self.interval = interval if interval is not None else _heartbeat_interval()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def beat(self):
+        try:
+            pipe = self.redis_conn.pipeline()
+            pipe.zadd(HEARTBEATS_KEY, {self.job_id: time.time()})
+            pipe.hset(OWNERS_KEY, self.job_id, os.getpid())
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Heartbeat failed for job {self.job_id}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.beat()
+
+    def __enter__(self):
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name=f'heartbeat-{self.job_id}', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        try:
+            pipe = self.redis_conn.pipeline()
+            pipe.zrem(HEARTBEATS_KEY, self.job_id)
+            pipe.hdel(OWNERS_KEY, self.job_id)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to clear heartbeat for job {self.job_id}: {e}")
+        return False
+
+
+class JobWatchdog:
+    """Finds jobs whose heartbeats stopped and requeues or fails them"""
+
+    def __init__(self, redis_conn):
+        self.redis_conn = redis_conn
+        self.interval = _heartbeat_interval()
+        self.timeout = float(os.getenv('JOB_HEARTBEAT_TIMEOUT', '30'))
+        self.max_requeues = int(os.getenv('JOB_WATCHDOG_MAX_REQUEUES', '1'))
+
+    def last_heartbeat(self, job_id: str) -> Optional[float]:
+        return self.redis_conn.zscore(HEARTBEATS_KEY, job_id)
+
+    def mark_dead(self, job_id: str):
+        """The job's process is known to be gone: reap it on the next pass"""
+        self.redis_conn.zadd(HEARTBEATS_KEY, {job_id: 0}, xx=True)
+
+    def mark_process_dead(self, pid: int):
+        """Mark every job the given process was running as dead"""
+        for raw_id, raw_pid in self.redis_conn.hgetall(OWNERS_KEY).items():
+            if int(raw_pid) == pid:
+                self.mark_dead(raw_id.decode() if isinstance(raw_id, bytes) else raw_id)
+
+    def check(self, job_id: str) -> bool:
+        """Reap one job if its heartbeat has stopped; True if it was reaped"""
+        last = self.last_heartbeat(job_id)
+        if last is None or last > time.time() - self.timeout:
+            return False
+        return self._reap(job_id)
+
+    def reap(self) -> int:
+        """Reap every dead job; returns how many were requeued or failed"""
+        # One pass per interval across all watchdogs
+        if not self.redis_conn.set(LOCK_KEY, os.getpid(), nx=True, px=max(1, int(self.interval * 1000))):
+            return 0
+        reaped = 0
+        for raw_id in self.redis_conn.zrangebyscore(HEARTBEATS_KEY, '-inf', time.time() - self.timeout):
+            try:
+                if self._reap(raw_id.decode() if isinstance(raw_id, bytes) else raw_id):
+                    reaped += 1
+            except Exception as e:
+                logger.error(f"Watchdog failed to reap job {raw_id}: {e}")
+        return reaped
+
+    def run(self):
+        """Reap forever (the worker's watchdog process)"""
+        logger.info(f"🐕 Job watchdog started (heartbeat timeout {self.timeout:.0f}s)")
+        while True:
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"Watchdog pass failed: {e}")
+            time.sleep(self.interval)
+
+    def _reap(self, job_id: str) -> bool:
+        # Claim the job; another watchdog or a status poll may already have it
+        if not self.redis_conn.zrem(HEARTBEATS_KEY, job_id):
+            return False
+        self.redis_conn.hdel(OWNERS_KEY, job_id)
+        try:
+            job = Job.fetch(job_id, connection=self.redis_conn)
+        except NoSuchJobError:
+            return False
+
+        # Started: the whole worker is gone. Failed: RQ saw the work horse die, but the
+        # job's own failure path (database, events, scheduler slot) never ran.
+        if job.get_status() not in (JobStatus.STARTED, JobStatus.FAILED):
+            return False
+
+        requeues = job.meta.get('watchdog_requeues', 0)
+        if requeues < self.max_requeues:
+            self._requeue(job, requeues + 1)
+        else:
+            self._fail(job)
+        return True
+
+    def _requeue(self, job: Job, requeues: int):
+        logger.warning(f"🐕 Job {job.id} lost its worker, requeueing ({requeues}/{self.max_requeues})")
+        job.meta['watchdog_requeues'] = requeues
+        job.meta['progress'] = {
+            'current_step': 0,
+            'total_steps': job.meta.get('progress', {}).get('total_steps', 0),
+            'step_name': 'Restarting after a worker interruption'
+        }
+        job.save_meta()
+        pipe = self.redis_conn.pipeline()
+        StartedJobRegistry(job.origin, connection=self.redis_conn).remove_executions(job, pipeline=pipe)
+        FailedJobRegistry(job.origin, connection=self.redis_conn).remove(job, pipeline=pipe)
+        pipe.execute()
+        # Its scheduler slot is still held, so it goes straight back to the front of its queue
+        Queue(job.origin, connection=self.redis_conn).enqueue_job(job, at_front=True)
+        publish_job_event(self.redis_conn, job.id, 'requeued', requeues=requeues)
+
+    def _fail(self, job: Job):
+        from shared.job_scheduler import on_job_finished
+
+        logger.error(f"🐕 Job {job.id} lost its worker, marking it failed")
+        job_data = job.args[0] if job.args else None
+        if isinstance(job_data, dict):
+            try:
+                from workers.analysis_worker import save_job_failure
+                save_job_failure(job_data, INTERRUPTED_MESSAGE)
+            except Exception as e:
+                logger.critical(f"🔥 CRITICAL: Failed to mark analyses of job {job.id} failed: {e}")
+
+        if job.get_status() != JobStatus.FAILED:
+            pipe = self.redis_conn.pipeline()
+            StartedJobRegistry(job.origin, connection=self.redis_conn).remove_executions(job, pipeline=pipe)
+            job.set_status(JobStatus.FAILED, pipeline=pipe)
+            FailedJobRegistry(job.origin, connection=self.redis_conn).add(
+                job, ttl=job.failure_ttl, exc_string=INTERRUPTED_MESSAGE, pipeline=pipe)
+            Result.create_failure(job, job.failure_ttl, exc_string=INTERRUPTED_MESSAGE, pipeline=pipe)
+            pipe.execute()
+
+        publish_job_event(self.redis_conn, job.id, 'failed', error=INTERRUPTED_MESSAGE)
+        on_job_finished(job, self.redis_conn)
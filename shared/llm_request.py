@@ -0,0 +1,381 @@
+"""
+Shared LLM Request Layer - Hedged requests with latency-aware model fallback
+
+Long GPT-5.1 step calls occasionally stall for many minutes or come back empty.
+Instead of waiting for the slow call and then sending the identical request again,
+this layer tracks a rolling p95 latency per request type. When an in-flight call
+passes that p95, a second (hedge) request is sent - optionally to a fallback model -
+and whichever acceptable response arrives first wins.
+
+Configuration (environment variables):
+    LLM_HEDGE_ENABLED           "true"/"false" (default: true)
+    LLM_HEDGE_PERCENTILE        Latency percentile that triggers the hedge (default: 0.95)
+    LLM_HEDGE_MIN_SAMPLES       Samples required before the percentile is trusted (default: 20)
+    LLM_HEDGE_DEFAULT_DELAY     Hedge delay in seconds until enough samples exist (default: 240)
+    LLM_HEDGE_MIN_DELAY         Lower bound for the hedge delay in seconds (default: 5)
+    LLM_HEDGE_MAX_DELAY         Upper bound for the hedge delay in seconds (default: 600)
+    LLM_HEDGE_BUDGET_RATIO      Max fraction of recent requests that may be hedged (default: 0.10);
+                                shared through Redis across workers when REDIS_URL is set
+    LLM_HEDGE_CANCEL_LOSERS     "true" returns as soon as a winner exists and abandons the loser;
+                                "false" waits for the loser to finish (default: true)
+    LLM_HEDGE_FALLBACK_MODELS   Comma-separated primary=fallback pairs,
+                                e.g. "gpt-5.1=gpt-5,gpt-4o=gpt-4o-mini" (default: same model)
+    LLM_HEDGE_REQUEST_TYPES     Comma-separated request types to hedge (default: all)
+    LLM_LATENCY_WINDOW          Latency samples kept per request type (default: 200)
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+def _default_accept(result: Any) -> bool:
+    """A response is acceptable if it contains non-whitespace text."""
+    return bool(result and str(result).strip())
+
+
+class HedgePolicy:
+    """Hedging configuration, loaded from environment variables by default"""
+
+    def __init__(self,
+                 enabled: Optional[bool] = None,
+                 percentile: Optional[float] = None,
+                 min_samples: Optional[int] = None,
+                 default_delay: Optional[float] = None,
+                 min_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None,
+                 budget_ratio: Optional[float] = None,
+                 cancel_losers: Optional[bool] = None,
+                 fallback_models: Optional[Dict[str, str]] = None,
+                 request_types: Optional[set] = None):
+        self.enabled = _env_bool('LLM_HEDGE_ENABLED', True) if enabled is None else enabled
+        self.percentile = _env_float('LLM_HEDGE_PERCENTILE', 0.95) if percentile is None else percentile
+        self.min_samples = int(_env_float('LLM_HEDGE_MIN_SAMPLES', 20)) if min_samples is None else min_samples
+        self.default_delay = _env_float('LLM_HEDGE_DEFAULT_DELAY', 240) if default_delay is None else default_delay
+        self.min_delay = _env_float('LLM_HEDGE_MIN_DELAY', 5) if min_delay is None else min_delay
+        self.max_delay = _env_float('LLM_HEDGE_MAX_DELAY', 600) if max_delay is None else max_delay
+        self.budget_ratio = _env_float('LLM_HEDGE_BUDGET_RATIO', 0.10) if budget_ratio is None else budget_ratio
+        self.cancel_losers = _env_bool('LLM_HEDGE_CANCEL_LOSERS', True) if cancel_losers is None else cancel_losers
+
+        if fallback_models is None:
+            fallback_models = {}
+            for pair in os.getenv('LLM_HEDGE_FALLBACK_MODELS', '').split(','):
+                if '=' in pair:
+                    primary, fallback = pair.split('=', 1)
+                    if primary.strip() and fallback.strip():
+                        fallback_models[primary.strip()] = fallback.strip()
+        self.fallback_models = fallback_models
+
+        if request_types is None:
+            raw_types = os.getenv('LLM_HEDGE_REQUEST_TYPES', '')
+            request_types = {t.strip() for t in raw_types.split(',') if t.strip()}
+        self.request_types = request_types  # Empty set means "hedge every request type"
+
+    def applies_to(self, request_type: str) -> bool:
+        """Check whether hedging is enabled for this request type"""
+        if not self.enabled:
+            return False
+        return not self.request_types or request_type in self.request_types
+
+    def fallback_for(self, model: str) -> str:
+        """Model used for the hedge request (same model unless a fallback is configured)"""
+        return self.fallback_models.get(model, model)
+
+
+class LatencyTracker:
+    """
+    Rolling latency window per request type.
+
+    Uses Redis lists when a connection is available so samples survive RQ's
+    fork-per-job work horses; falls back to in-process deques otherwise.
+    """
+
+    KEY_PREFIX = 'llm_latency:'
+
+    def __init__(self, window: Optional[int] = None, redis_conn=None):
+        self.window = int(_env_float('LLM_LATENCY_WINDOW', 200)) if window is None else window
+        self.redis_conn = redis_conn
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, request_type: str, seconds: float):
+        """Record the latency of a completed request"""
+        if self.redis_conn is not None:
+            try:
+                key = f"{self.KEY_PREFIX}{request_type}"
+                pipe = self.redis_conn.pipeline()
+                pipe.lpush(key, f"{seconds:.3f}")
+                pipe.ltrim(key, 0, self.window - 1)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Latency sample not stored in Redis, using local window: {e}")
+        with self._lock:
+            samples = self._samples.setdefault(request_type, deque(maxlen=self.window))
+            samples.append(seconds)
+
+    def samples(self, request_type: str) -> list:
+        """Return the current latency samples for a request type"""
+        if self.redis_conn is not None:
+            try:
+                raw = self.redis_conn.lrange(f"{self.KEY_PREFIX}{request_type}", 0, self.window - 1)
+                return [float(v) for v in raw]
+            except Exception as e:
+                logger.warning(f"Latency samples not readable from Redis, using local window: {e}")
+        with self._lock:
+            return list(self._samples.get(request_type, ()))
+
+    def percentile(self, request_type: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        """Return the latency percentile, or None if there are fewer than min_samples"""
+        values = sorted(self.samples(request_type))
+        if len(values) < max(1, min_samples):
+            return None
+        index = min(len(values) - 1, int(round(pct * (len(values) - 1))))
+        return values[index]
+
+
+class HedgeBudget:
+    """
+    Rolling record of which recent requests were hedged.
+
+    Kept in a Redis list next to the latency samples, so the budget holds across
+    work horses and worker processes; falls back to an in-process window otherwise.
+    A hedge is recorded when it is reserved, so concurrent requests see it at once
+    (processes reserving at the same instant can still overshoot slightly).
+    """
+
+    KEY = 'llm_hedge:recent'
+
+    def __init__(self, window: int = 200, redis_conn=None):
+        self.window = window
+        self.redis_conn = redis_conn
+        self._recent = deque(maxlen=window)  # True if the call was hedged
+        self._lock = threading.Lock()
+
+    def _calls(self) -> list:
+        if self.redis_conn is not None:
+            try:
+                return [v in (b'1', '1') for v in self.redis_conn.lrange(self.KEY, 0, self.window - 1)]
+            except Exception as e:
+                logger.warning(f"Hedge budget not readable from Redis, using local window: {e}")
+        return list(self._recent)
+
+    def record(self, hedged: bool):
+        """Record one request (a hedged request is recorded by reserve)"""
+        if self.redis_conn is not None:
+            try:
+                pipe = self.redis_conn.pipeline()
+                pipe.lpush(self.KEY, '1' if hedged else '0')
+                pipe.ltrim(self.KEY, 0, self.window - 1)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Hedge budget not stored in Redis, using local window: {e}")
+        self._recent.append(hedged)
+
+    def reserve(self, ratio: float) -> bool:
+        """Check the budget and record a hedged request if it allows one"""
+        with self._lock:
+            calls = self._calls()
+            if not calls:
+                allowed = ratio > 0
+            else:
+                allowed = (sum(calls) + 1) / (len(calls) + 1) <= ratio
+            if allowed:
+                self.record(True)
+            return allowed
+
+
+class HedgedRequester:
+    """Runs LLM calls with a latency-triggered hedge request"""
+
+    def __init__(self,
+                 policy: Optional[HedgePolicy] = None,
+                 tracker: Optional[LatencyTracker] = None,
+                 budget: Optional[HedgeBudget] = None):
+        self.policy = policy or HedgePolicy()
+        self.tracker = tracker
+        self.budget = budget
+        self._tracker_lock = threading.Lock()
+
+        self.stats = {
+            'requests': 0,
+            'hedges_sent': 0,
+            'hedge_wins': 0,
+            'empty_primary': 0,
+            'budget_denied': 0
+        }
+
+    def _init_shared_state(self):
+        """Lazily create the latency tracker and hedge budget (Redis-backed when REDIS_URL is configured)"""
+        with self._tracker_lock:
+            if self.tracker is not None and self.budget is not None:
+                return
+            redis_conn = None
+            if os.getenv('REDIS_URL'):
+                try:
+                    from shared.redis_connection import get_redis_connection
+                    redis_conn = get_redis_connection()
+                except Exception as e:
+                    logger.warning(f"Latency tracker and hedge budget using in-process windows: {e}")
+            if self.tracker is None:
+                self.tracker = LatencyTracker(redis_conn=redis_conn)
+            if self.budget is None:
+                self.budget = HedgeBudget(redis_conn=redis_conn)
+
+    def _get_tracker(self) -> LatencyTracker:
+        if self.tracker is None:
+            self._init_shared_state()
+        return self.tracker
+
+    def _get_budget(self) -> HedgeBudget:
+        if self.budget is None:
+            self._init_shared_state()
+        return self.budget
+
+    def hedge_delay(self, request_type: str) -> float:
+        """Seconds to wait on the primary call before sending a hedge"""
+        p = self._get_tracker().percentile(request_type, self.policy.percentile, self.policy.min_samples)
+        delay = self.policy.default_delay if p is None else p
+        return max(self.policy.min_delay, min(self.policy.max_delay, delay))
+
+    def _reserve_hedge(self) -> bool:
+        """Check the hedge budget and reserve a slot if available"""
+        allowed = self._get_budget().reserve(self.policy.budget_ratio)
+        if allowed:
+            self.stats['hedges_sent'] += 1
+        else:
+            self.stats['budget_denied'] += 1
+        return allowed
+
+    def request(self,
+                send: Callable[[str], Any],
+                model: str,
+                request_type: str = "default",
+                accept: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, str]:
+        """
+        Execute send(model), hedging with send(fallback_model) if the call is slow or empty.
+
+        Args:
+            send: Callable that performs the LLM call for a given model and returns its output
+            model: Primary model name
+            request_type: Request type used for latency tracking (e.g., "step_analysis")
+            accept: Predicate deciding whether a response is usable (default: non-empty text)
+
+        Returns:
+            Tuple of (response, model that produced it). If no response is accepted,
+            the last non-empty one (or the last one) is returned for the caller to handle.
+        """
+        accept = accept or _default_accept
+        self.stats['requests'] += 1
+
+        if not self.policy.applies_to(request_type):
+            return self._timed(send, model, request_type), model
+
+        delay = self.hedge_delay(request_type)
+        # Calls run in the caller's context, so their usage lands on the caller's cost tracker
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"llm-{request_type}")
+        futures = {executor.submit(contextvars.copy_context().run, self._timed, send, model, request_type): model}
+        hedged = False
+        last_result = None
+        last_error = None
+
+        try:
+            pending = set(futures)
+            timeout = delay
+            while pending:
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # Primary passed the latency percentile - send the hedge
+                    timeout = None
+                    if not hedged and self._reserve_hedge():
+                        hedged = True
+                        hedge_model = self.policy.fallback_for(model)
+                        logger.warning(f"⏱️ {request_type} exceeded {delay:.1f}s (p{int(self.policy.percentile * 100)}), sending hedge request to {hedge_model}")
+                        future = executor.submit(contextvars.copy_context().run, self._timed, send, hedge_model, request_type)
+                        futures[future] = hedge_model
+                        pending.add(future)
+                    continue
+
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if last_result is None or _default_accept(result) or not _default_accept(last_result):
+                        last_result = result
+                    if accept(result):
+                        winner_model = futures[future]
+                        if hedged and future is not next(iter(futures)):
+                            self.stats['hedge_wins'] += 1
+                            logger.info(f"✓ Hedge request won for {request_type} ({winner_model})")
+                        return result, winner_model
+
+                # Nothing usable yet - an empty primary triggers the hedge immediately
+                if not pending and not hedged:
+                    if last_error is not None:
+                        raise last_error
+                    self.stats['empty_primary'] += 1
+                    if self._reserve_hedge():
+                        hedged = True
+                        hedge_model = self.policy.fallback_for(model)
+                        logger.warning(f"⚠️ {request_type} returned an empty response, sending hedge request to {hedge_model}")
+                        future = executor.submit(contextvars.copy_context().run, self._timed, send, hedge_model, request_type)
+                        futures[future] = hedge_model
+                        pending.add(future)
+                        timeout = None
+
+            if last_result is None and last_error is not None:
+                raise last_error
+            return last_result, model
+
+        finally:
+            if not hedged:
+                self._get_budget().record(False)
+            executor.shutdown(wait=not self.policy.cancel_losers, cancel_futures=self.policy.cancel_losers)
+
+    def _timed(self, send: Callable[[str], Any], model: str, request_type: str) -> Any:
+        start = time.time()
+        result = send(model)
+        self._get_tracker().record(request_type, time.time() - start)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hedging counters for logging and monitoring"""
+        return dict(self.stats)
+
+
+# Global instance for use across the application
+hedged_requester = HedgedRequester()
+
+
+def hedged_request(send: Callable[[str], Any],
+                   model: str,
+                   request_type: str = "default",
+                   accept: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, str]:
+    """Execute an LLM call through the shared hedging policy (see HedgedRequester.request)"""
+    return hedged_requester.request(send, model, request_type, accept)
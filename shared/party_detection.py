@@ -0,0 +1,301 @@
+"""
+Rule-based contract party detection
+
+Most contracts name both parties in a recognizable way, so the light-model call in
+extract_party_names_llm is usually unnecessary. This module tries, in order:
+
+- Preamble definitions: 'by and between Acme Corp. ("Licensor") and Beta LLC ("Licensee")'
+- Neutral definitions: 'Acme Corp. ("Party A")' / 'Beta LLC ("Party B")'
+- Role labels and signature headings: 'Customer: Beta LLC' or 'LICENSOR:' above a name
+- Unlabeled 'between X and Y' preambles and signature blocks (low confidence)
+
+Generic labels that name different sides in different contracts ('the Company' may be
+the vendor, the customer, the issuer or the target) are scored like an unlabeled
+preamble, so they never skip the LLM on their own.
+
+Each result carries a confidence score. detect_parties returns a result only when
+the confidence is at least PARTY_DETECTION_MIN_CONFIDENCE (default 0.8), so callers
+fall back to the LLM for ambiguous documents. Fast path hit counts are kept per process.
+"""
+
+import os
+import re
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Role vocabularies per standard: (first party roles, second party roles).
+# First/second follow the order the analyzers return (vendor/customer, lessor/lessee, ...)
+PARTY_ROLES = {
+    'ASC 606': (
+        {'vendor', 'supplier', 'seller', 'licensor', 'service provider', 'provider',
+         'contractor', 'consultant', 'reseller', 'company'},
+        {'customer', 'client', 'buyer', 'purchaser', 'licensee', 'subscriber',
+         'end user', 'end-user', 'bill to', 'sold to'}
+    ),
+    'ASC 842': (
+        {'lessor', 'landlord', 'owner', 'sublessor'},
+        {'lessee', 'tenant', 'sublessee', 'renter'}
+    ),
+    'ASC 718': (
+        {'company', 'employer', 'grantor', 'issuer', 'corporation'},
+        {'grantee', 'participant', 'employee', 'optionee', 'holder', 'recipient',
+         'executive', 'director', 'awardee'}
+    ),
+    'ASC 805': (
+        {'buyer', 'purchaser', 'acquirer', 'acquiror', 'parent'},
+        {'target', 'company', 'acquired company'}
+    ),
+    'ASC 340-40': (
+        {'company', 'employer', 'principal'},
+        {'employee', 'sales representative', 'representative', 'agent', 'contractor',
+         'consultant', 'participant', 'reseller', 'referral partner', 'partner'}
+    ),
+}
+
+# Roles that are only a guess at the side: 'the Company' can be either party of a
+# commercial contract, and of a stock purchase as well as a merger
+GENERIC_ROLES = {'company'}
+
+# Confidence per detection method (a side found by several methods keeps the highest)
+_METHOD_CONFIDENCE = {
+    'preamble': 0.95,
+    'labeled': 0.85,
+    'party_ab': 0.8,
+    'between': 0.6,
+    'generic_role': 0.6,
+    'signature': 0.5,
+}
+
+_PREAMBLE_CHARS = 6000
+_SIGNATURE_CHARS = 4000
+
+# ("Licensor"), (the "Customer"), (hereinafter referred to as "Tenant"), ("Acme" or "Licensor")
+_DEFINED_TERM = re.compile(
+    r'\(\s*(?:hereinafter\s+(?:referred\s+to\s+as\s+)?|referred\s+to\s+(?:herein\s+)?as\s+)?'
+    r'(?:the\s+)?"(?P<role>[^"\n]{2,40})"(?P<rest>[^()\n]{0,80})\)',
+    re.IGNORECASE
+)
+_OR_TERM = re.compile(r'"([^"\n]{2,40})"')
+# Words that end the text in front of a party name
+_NAME_START = re.compile(r'(?:\bby\s+and\s+between|\bbetween|\bamong|\band|\bby|\)\s*,?|[;:\n])\s*', re.IGNORECASE)
+# Descriptors after a name: ', a Delaware corporation', ', having its principal office at'
+_DESCRIPTOR = re.compile(
+    r',?\s+(?:an?|the|having|with|whose|located|organized|incorporated|doing|residing|an individual)\b.*$',
+    re.IGNORECASE | re.DOTALL
+)
+_BETWEEN = re.compile(
+    r'\b(?:by\s+and\s+)?between\s+(?P<first>[^\n;()]{2,200}?)\s*,?\s+and\s+(?P<second>[^\n;()]{2,200}?)\s*(?:[.;(\n]|$)',
+    re.IGNORECASE
+)
+_SIGNATURE_BY = re.compile(r'^[ \t]*(?P<name>[A-Z][^\n]{1,100}?)[ \t]*:?[ \t]*\n(?:[ \t]*\n)?[ \t]*By\s*:', re.MULTILINE)
+_LEGAL_SUFFIX = re.compile(
+    r'\b(?:Inc|Incorporated|LLC|L\.L\.C|Ltd|Limited|Corp|Corporation|Co|Company|PLC|LP|L\.P|LLP|'
+    r'GmbH|AG|S\.?A|SAS|BV|NV|N\.A|Pty|PC|P\.C|Trust|Partners|Holdings|Group)\b\.?',
+    re.IGNORECASE
+)
+_ABBREVIATION_END = re.compile(r'\b(?:Inc|Corp|Co|Ltd|L\.L\.C|L\.P|N\.A|S\.A|P\.C|Jr|Sr)\.$', re.IGNORECASE)
+_ADDRESS_TOKENS = {"street", "st.", "road", "rd.", "avenue", "ave.", "suite", "ste.", "floor", "fl.",
+                   "drive", "dr.", "blvd", "boulevard", "lane", "ln.", "p.o.", "po box"}
+_GENERIC_NAMES = {'party', 'parties', 'the parties', 'each party', 'both parties', 'agreement',
+                  'this agreement', 'effective date', 'the company', 'company', 'signature',
+                  'name', 'title', 'date', 'witness'}
+
+# Smart quotes to ASCII; line breaks are kept for labels and signature blocks
+_QUOTES = str.maketrans({'\u201C': '"', '\u201D': '"', '\u2018': "'", '\u2019': "'"})
+_SPACES = re.compile(r'[ \t\u00A0]+')
+
+_stats_lock = threading.Lock()
+_stats = {'fast_path': 0, 'llm_fallback': 0}
+
+
+def _clean_name(name: str) -> str:
+    """Trim quotes, descriptors and trailing punctuation; keep periods of abbreviations"""
+    n = re.sub(r'\s+', ' ', name).strip().strip('"\'').strip()
+    n = _DESCRIPTOR.sub('', n)
+    n = re.sub(r'[\s,;:)\]]+$', '', n)
+    if n.endswith('.') and not _ABBREVIATION_END.search(n):
+        n = n[:-1].rstrip()
+    return n
+
+
+def _prepare(text: str) -> str:
+    return _SPACES.sub(' ', text.translate(_QUOTES).replace('\u00AD', ''))
+
+
+def _plausible_name(name: str) -> bool:
+    if not name or not 2 <= len(name) <= 120 or len(name.split()) > 12:
+        return False
+    if not name[0].isupper() and not name[0].isdigit():
+        return False
+    lname = name.lower()
+    if lname in _GENERIC_NAMES or lname.startswith(('by', 'party ')):
+        return False
+    words = lname.split()
+    if any((t in lname) if not t.isalpha() else (t in words) for t in _ADDRESS_TOKENS):
+        return False
+    if '_' in name or not re.search(r'[A-Za-z]{2}', name):
+        return False
+    return True
+
+
+def _role_side(role: str, roles: Tuple[set, set]) -> Optional[str]:
+    role = re.sub(r'\s+', ' ', role.strip().lower())
+    if role in ('party a', 'first party'):
+        return 'party_a'
+    if role in ('party b', 'second party'):
+        return 'party_b'
+    if role in roles[0]:
+        return 'first'
+    if role in roles[1]:
+        return 'second'
+    return None
+
+
+def _role_method(role: str, side: Optional[str], method: str) -> str:
+    """Detection method for a role match: generic roles score below the LLM threshold"""
+    if side and side.startswith('party_'):
+        return 'party_ab'
+    if re.sub(r'\s+', ' ', role.strip().lower()) in GENERIC_ROLES:
+        return 'generic_role'
+    return method
+
+
+def _name_before(text: str, end: int) -> str:
+    """Text between the nearest name-start boundary and a defined-term parenthetical"""
+    window = text[max(0, end - 250):end]
+    start = 0
+    for m in _NAME_START.finditer(window):
+        start = m.end()
+    return _clean_name(window[start:])
+
+
+def has_legal_suffix(name: Optional[str]) -> bool:
+    """True when the name looks like an entity (Inc., LLC, Corp., ...) rather than a person"""
+    return bool(name and _LEGAL_SUFFIX.search(name))
+
+
+def extract_parties_rule_based(contract_text: str, asc_standard: str) -> Dict[str, Any]:
+    """
+    Find the two contracting parties without an LLM call.
+
+    Args:
+        contract_text: Contract text (the first and last pages are examined)
+        asc_standard: Standard whose role vocabulary to use (e.g., "ASC 606")
+
+    Returns:
+        Dict with first, second (names or None), confidence (0-1) and method
+    """
+    roles = PARTY_ROLES[asc_standard]
+    if not contract_text:
+        return {'first': None, 'second': None, 'confidence': 0.0, 'method': None}
+
+    head = _prepare(contract_text[:_PREAMBLE_CHARS])
+    tail = _prepare(contract_text[-_SIGNATURE_CHARS:]) if len(contract_text) > _PREAMBLE_CHARS else ''
+    candidates = {'first': [], 'second': [], 'party_a': [], 'party_b': []}
+
+    def add(side, name, method):
+        if side and _plausible_name(name):
+            candidates[side].append((_METHOD_CONFIDENCE[method], name, method))
+
+    # Defined terms: 'Acme Corp., a Delaware corporation ("Licensor")'
+    for m in _DEFINED_TERM.finditer(head):
+        terms = [m.group('role')] + _OR_TERM.findall(m.group('rest'))
+        for term in terms:
+            side = _role_side(term, roles)
+            if side:
+                add(side, _name_before(head, m.start()), _role_method(term, side, 'preamble'))
+                break
+
+    # Role labels and signature headings: 'Customer: Beta LLC' / 'LICENSOR:\nAcme Corp.'
+    role_words = sorted(roles[0] | roles[1], key=len, reverse=True)
+    labeled = re.compile(
+        r'^[ \t]*(?P<role>' + '|'.join(re.escape(r) for r in role_words) + r')[ \t]*:[ \t]*\n?[ \t]*(?P<name>[^\n]{2,120})$',
+        re.IGNORECASE | re.MULTILINE
+    )
+    for section in (head, tail):
+        for m in labeled.finditer(section):
+            side = _role_side(m.group('role'), roles)
+            add(side, _clean_name(m.group('name')), _role_method(m.group('role'), side, 'labeled'))
+
+    # Unlabeled preamble: 'between Acme Corp. and Beta LLC'
+    m = _BETWEEN.search(head)
+    if m:
+        add('first', _clean_name(m.group('first')), 'between')
+        add('second', _clean_name(m.group('second')), 'between')
+
+    # Signature blocks: company name line followed by 'By:'
+    signature_names = []
+    for m in _SIGNATURE_BY.finditer(tail or head):
+        name = _clean_name(m.group('name'))
+        if _plausible_name(name) and _role_side(name, roles) is None and name not in signature_names:
+            signature_names.append(name)
+    if len(signature_names) == 2:
+        add('first', signature_names[0], 'signature')
+        add('second', signature_names[1], 'signature')
+
+    def best(side):
+        return max(candidates[side], key=lambda c: c[0]) if candidates[side] else None
+
+    first, second = best('first'), best('second')
+    # Neutral Party A/B terms follow the prompt convention: Party A provides, Party B receives
+    if first is None or first[0] < _METHOD_CONFIDENCE['party_ab']:
+        first = best('party_a') or first
+    if second is None or second[0] < _METHOD_CONFIDENCE['party_ab']:
+        second = best('party_b') or second
+
+    if first and second and first[1].lower() != second[1].lower():
+        confidence = min(first[0], second[0])
+        method = first[2] if first[0] <= second[0] else second[2]
+        return {'first': first[1], 'second': second[1], 'confidence': confidence, 'method': method}
+
+    found = first or second
+    return {
+        'first': first[1] if first else None,
+        'second': second[1] if second else None,
+        'confidence': round(found[0] * 0.5, 2) if found else 0.0,
+        'method': found[2] if found else None
+    }
+
+
+def detect_parties(contract_text: str, asc_standard: str,
+                   min_confidence: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Return rule-based parties when confident enough, otherwise None (caller uses the LLM).
+    Every call is counted toward the fast path statistics.
+    """
+    if min_confidence is None:
+        min_confidence = float(os.getenv('PARTY_DETECTION_MIN_CONFIDENCE', '0.8'))
+
+    try:
+        result = extract_parties_rule_based(contract_text, asc_standard)
+    except Exception as e:
+        logger.warning(f"Rule-based party detection failed: {e}")
+        result = {'confidence': 0.0, 'method': None}
+
+    hit = result['confidence'] >= min_confidence
+    with _stats_lock:
+        _stats['fast_path' if hit else 'llm_fallback'] += 1
+        fast_path, total = _stats['fast_path'], _stats['fast_path'] + _stats['llm_fallback']
+
+    if hit:
+        logger.info(f"⚡ Parties detected without LLM via {result['method']} "
+                    f"(confidence {result['confidence']:.2f}) - fast path {fast_path}/{total}")
+        return result
+
+    logger.info(f"Party detection confidence {result['confidence']:.2f} below {min_confidence:.2f}, "
+                f"using LLM - fast path {fast_path}/{total}")
+    return None
+
+
+def get_detection_stats() -> Dict[str, Any]:
+    """How often the rule-based fast path avoided the LLM call in this process"""
+    with _stats_lock:
+        total = _stats['fast_path'] + _stats['llm_fallback']
+        return {
+            'fast_path': _stats['fast_path'],
+            'llm_fallback': _stats['llm_fallback'],
+            'fast_path_rate': _stats['fast_path'] / total if total else 0.0
+        }
@@ -0,0 +1,233 @@
+"""
+Portfolio Analysis - many contracts for one ASC standard in a single job
+
+Analyzing 50 leases as 50 separate jobs re-opens the knowledge base, re-creates the
+OpenAI clients and re-runs the same retrievals 50 times. A portfolio job instead:
+
+- Builds one analyzer and one knowledge search for the standard and shares them
+  across every contract (the OpenAI client and Chroma collection are thread-safe)
+- Caches knowledge base retrievals by query, so contracts that produce the same
+  step query hit the cache instead of re-embedding and re-searching
+- Runs per-contract pipelines concurrently, bounded by PORTFOLIO_MAX_CONCURRENCY
+- Produces a memo per contract plus a roll-up summary of the portfolio
+- Tracks API cost per contract, each on its own cost tracker
+"""
+
+import os
+import copy
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from shared.standard_registry import get_standard_config, load_component, get_shared_component
+from shared.api_cost_tracker import APITracker, cost_tracking_scope, get_usage_totals
+from shared.analysis_pipeline import (
+    AnalysisContext, AnalysisPipeline, Stage, LoggingHook, build_step_stages, finalize, render, stage_summary
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CachedKnowledgeBase:
+    """
+    Wraps a knowledge base so identical searches run once per portfolio.
+
+    Concurrent misses for the same query wait on the first search instead of
+    running it again.
+    """
+
+    def __init__(self, knowledge_base):
+        self._knowledge_base = knowledge_base
+        self._results: Dict[Tuple[str, int], Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, query: str, max_results: int = 10) -> str:
+        key = (query, max_results)
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._results[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if owner:
+            try:
+                future.set_result(self._knowledge_base.search(query, max_results=max_results))
+            except Exception as e:
+                future.set_exception(e)
+                with self._lock:
+                    self._results.pop(key, None)  # Don't cache failures
+        return future.result()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'unique_queries': len(self._results)}
+
+    def __getattr__(self, name):
+        return getattr(self._knowledge_base, name)
+
+
+class _ContractProgressHook:
+    """Reports a contract's progress when a stage with progress starts"""
+
+    def __init__(self, runner: 'PortfolioAnalysisRunner', analysis_id):
+        self.runner = runner
+        self.analysis_id = analysis_id
+
+    def on_stage_start(self, context: AnalysisContext, stage: Stage):
+        if stage.progress:
+            current_step, total_steps, step_name = stage.progress
+            self.runner._report(self.analysis_id, status='processing', current_step=current_step,
+                                total_steps=total_steps, step_name=step_name)
+
+
+class PortfolioAnalysisRunner:
+    """Runs per-contract analysis pipelines concurrently with shared components"""
+
+    def __init__(self,
+                 asc_standard: str,
+                 analyzer=None,
+                 knowledge_search=None,
+                 memo_generator_class=None,
+                 max_concurrency: Optional[int] = None,
+                 progress_callback: Optional[Callable[[Any, Dict[str, Any]], None]] = None):
+        self.asc_standard = asc_standard
+        self.config = get_standard_config(asc_standard)
+        self.analyzer = analyzer or get_shared_component(asc_standard, 'analyzer')
+        # A copy, so wrapping its knowledge base below leaves the process-wide instance untouched
+        self.knowledge_search = knowledge_search or copy.copy(get_shared_component(asc_standard, 'knowledge'))
+        self.memo_generator_class = memo_generator_class or load_component(asc_standard, 'memo')
+        self.max_concurrency = max(1, max_concurrency or int(os.getenv('PORTFOLIO_MAX_CONCURRENCY', '4')))
+        self.progress_callback = progress_callback
+
+        # Share retrievals across contracts
+        self.retrieval_cache = CachedKnowledgeBase(self.knowledge_search.knowledge_base)
+        self.knowledge_search.knowledge_base = self.retrieval_cache
+
+    def _report(self, analysis_id, **progress):
+        if self.progress_callback:
+            try:
+                self.progress_callback(analysis_id, progress)
+            except Exception as e:
+                logger.warning(f"Portfolio progress callback failed: {e}")
+
+    def _run_contract(self, item: Dict[str, Any], tracker: Optional[APITracker] = None) -> Dict[str, Any]:
+        """Run the full step pipeline and memo generation for one contract, tracking its cost on tracker"""
+        with cost_tracking_scope(tracker):
+            return self._run_contract_pipeline(item)
+
+    def _run_contract_pipeline(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        analysis_id = item['analysis_id']
+        step_count = self.config['step_count']
+
+        context = AnalysisContext(
+            self.asc_standard,
+            analysis_id,
+            item['combined_text'],
+            additional_context=item.get('additional_context', ''),
+            uploaded_filenames=item.get('uploaded_filenames')
+        )
+        context.analyzer = self.analyzer
+        context.knowledge_search = self.knowledge_search
+        context.memo_generator_class = self.memo_generator_class
+
+        stages = build_step_stages(
+            step_count,
+            chain_prior_steps=True,
+            progress=lambda step_num: (step_num, step_count + 1, f'Step {step_num}')
+        )
+        stages += [
+            Stage('finalize', finalize, (step_count + 1, step_count + 1, 'Generating memo')),
+            Stage('render', render)
+        ]
+        AnalysisPipeline(stages, hooks=[_ContractProgressHook(self, analysis_id), LoggingHook()],
+                         usage=get_usage_totals).run(context)
+
+        return {
+            'success': True,
+            'memo_content': context.memo_content,
+            'filename': context.results['filename'],
+            'executive_summary': context.results['executive_summary'],
+            'stages': stage_summary(context.metrics),
+            'error': None
+        }
+
+    def run(self, contracts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run every contract in the portfolio
+
+        Args:
+            contracts: List of dicts with analysis_id, combined_text, additional_context
+                       and uploaded_filenames
+
+        Returns:
+            Dict with 'results' keyed by analysis_id (each with its 'api_cost'), the total
+            'api_cost', 'rollup_summary' markdown and 'retrieval_stats'
+        """
+        start = time.time()
+        logger.info(f"🚀 Portfolio {self.asc_standard}: {len(contracts)} contracts, concurrency {self.max_concurrency}")
+
+        for item in contracts:
+            self._report(item['analysis_id'], status='queued', current_step=0,
+                         total_steps=self.config['step_count'] + 1, step_name='Queued')
+
+        results = {}
+        trackers = {item['analysis_id']: APITracker() for item in contracts}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="portfolio") as executor:
+            futures = {executor.submit(self._run_contract, item, trackers[item['analysis_id']]): item
+                       for item in contracts}
+            for future in as_completed(futures):
+                item = futures[future]
+                analysis_id = item['analysis_id']
+                try:
+                    results[analysis_id] = future.result()
+                    self._report(analysis_id, status='completed', step_name='Completed')
+                except Exception as e:
+                    logger.error(f"❌ Portfolio contract {analysis_id} failed: {e}", exc_info=True)
+                    filenames = item.get('uploaded_filenames') or []
+                    results[analysis_id] = {
+                        'success': False,
+                        'filename': ", ".join(filenames) if filenames else "Uploaded Documents",
+                        'error': str(e)
+                    }
+                    self._report(analysis_id, status='failed', step_name='Failed', error=str(e)[:200])
+                results[analysis_id]['api_cost'] = trackers[analysis_id].get_total_cost()
+
+        stats = self.retrieval_cache.get_stats()
+        logger.info(f"✓ Portfolio complete in {time.time() - start:.1f}s - retrieval cache "
+                    f"{stats['hits']} hits / {stats['misses']} misses")
+
+        ordered = {item['analysis_id']: results[item['analysis_id']] for item in contracts}
+        return {
+            'results': ordered,
+            'api_cost': sum(result['api_cost'] for result in ordered.values()),
+            'rollup_summary': self.build_rollup_summary(ordered),
+            'retrieval_stats': stats
+        }
+
+    def build_rollup_summary(self, results: Dict[Any, Dict[str, Any]]) -> str:
+        """Build a markdown roll-up of the portfolio from per-contract results"""
+        succeeded = [r for r in results.values() if r['success']]
+        lines = [
+            f"# {self.asc_standard} Portfolio Summary",
+            "",
+            f"**Date:** {time.strftime('%B %d, %Y')}",
+            f"**Contracts analyzed:** {len(succeeded)} of {len(results)}",
+            "",
+            "| Contract | Status |",
+            "|---|---|"
+        ]
+        for result in results.values():
+            status = "Completed" if result['success'] else f"Failed: {(result.get('error') or '')[:80]}"
+            lines.append(f"| {result.get('filename', 'Uploaded Documents')} | {status} |")
+
+        for result in succeeded:
+            lines.extend(["", f"## {result['filename']}", "", (result.get('executive_summary') or '').strip()])
+
+        return "\n".join(lines)
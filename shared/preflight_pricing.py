@@ -3,26 +3,39 @@ Preflight Pricing System for VeritasLogic Analysis Platform
 Handles multi-file word counting and subscription allowance checking before analysis
 """
 
+import os
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from utils.document_extractor import DocumentExtractor
 from shared.pricing_config import get_price_tier
-from shared.subscription_manager import SubscriptionManager
 
 logger = logging.getLogger(__name__)
 
+
+def get_preflight_workers(file_count: int) -> int:
+    """Concurrent file extractions for preflight (PREFLIGHT_MAX_WORKERS, default 4)"""
+    try:
+        limit = int(os.getenv('PREFLIGHT_MAX_WORKERS', '4'))
+    except ValueError:
+        limit = 4
+    return max(1, min(limit, file_count))
+
+
 class PreflightPricing:
     """Handles preflight document processing and pricing calculation"""
     
     def __init__(self):
         self.document_extractor = DocumentExtractor()
     
-    def process_files_for_pricing(self, uploaded_files) -> Dict[str, Any]:
+    def process_files_for_pricing(self, uploaded_files,
+                                  progress_callback: Optional[Callable[[int, str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """
         Process multiple uploaded files to calculate total words and pricing
         
         Args:
             uploaded_files: List of Streamlit uploaded file objects
+            progress_callback: Optional per-file callback (see extract_files)
             
         Returns:
             Dict containing total word count, tier info, price, and file details
@@ -36,59 +49,8 @@ class PreflightPricing:
                 'file_details': []
             }
         
-        # Process all uploaded files (no limit - charge for all contracts)
-        logger.info(f"Processing {len(uploaded_files)} uploaded files")
-        
-        file_details = []
-        total_words = 0
-        errors = []
-        
-        # Process each file
-        for i, uploaded_file in enumerate(uploaded_files, 1):
-            try:
-                # Reset file pointer
-                uploaded_file.seek(0)
-                
-                # Extract text and metadata
-                extraction_result = self.document_extractor.extract_text(uploaded_file)
-                
-                if extraction_result.get('error'):
-                    # Handle scanned PDF detection with detailed user message
-                    if extraction_result.get('error') == 'scanned_pdf_detected':
-                        # Create filename-aware message for scanned PDFs
-                        reasons = extraction_result.get('detection_reasons', [])
-                        filename_msg = self._create_scanned_pdf_message(uploaded_file.name, reasons)
-                        errors.append(filename_msg)
-                        logger.error(f"File {i} ({uploaded_file.name}): scanned_pdf_detected")
-                    else:
-                        # Handle other errors normally
-                        error_msg = f"File {i} ({uploaded_file.name}): {extraction_result['error']}"
-                        errors.append(error_msg)
-                        logger.error(error_msg)
-                    continue
-                
-                file_word_count = extraction_result.get('word_count', 0)
-                total_words += file_word_count
-                
-                # Store file details
-                file_details.append({
-                    'filename': uploaded_file.name,
-                    'file_number': i,
-                    'word_count': file_word_count,
-                    'estimated_pages': extraction_result.get('estimated_pages', 1),
-                    'file_size_mb': extraction_result.get('file_size_mb', 0),
-                    'extraction_method': extraction_result.get('extraction_method', 'unknown'),
-                    'is_likely_scanned': extraction_result.get('is_likely_scanned', False),
-                    'text_content': extraction_result.get('text', '')  # Store extracted text
-                })
-                
-                logger.info(f"Processed file {i}: {uploaded_file.name} - {file_word_count} words")
-                
-            except Exception as e:
-                error_msg = f"File {i} ({uploaded_file.name}): Failed to process - {str(e)}"
-                errors.append(error_msg)
-                logger.error(error_msg)
-                continue
+        file_details, errors = self.extract_files(uploaded_files, progress_callback)
+        total_words = sum(detail['word_count'] for detail in file_details)
         
         # Check if we have any successful extractions
         if total_words == 0:
@@ -138,6 +100,95 @@ class PreflightPricing:
             logger.info(f"Preflight pricing complete: {total_words} words, {tier_info['name']} tier, ${tier_info['price']}")
         return result
     
+    def extract_files(self, uploaded_files,
+                      progress_callback: Optional[Callable[[int, str, Dict[str, Any]], None]] = None
+                      ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Extract uploaded files concurrently (PREFLIGHT_MAX_WORKERS)
+        
+        Results are assembled in upload order so file numbering and error messages
+        match a sequential run.
+        
+        Args:
+            uploaded_files: List of Streamlit uploaded file objects
+            progress_callback: Optional callback(file_number, filename, outcome) invoked on
+                               the calling thread as each file finishes; outcome holds either
+                               'file_detail' or 'error'
+            
+        Returns:
+            Tuple of (file details, user-facing error messages), both in upload order
+        """
+        max_workers = get_preflight_workers(len(uploaded_files))
+        logger.info(f"Processing {len(uploaded_files)} uploaded files with {max_workers} workers")
+        
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(uploaded_files)
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='preflight') as pool:
+            futures = {
+                pool.submit(self._extract_file, uploaded_file): i
+                for i, uploaded_file in enumerate(uploaded_files, 1)
+            }
+            # Collect on the calling thread so callbacks can safely update Streamlit
+            for future in as_completed(futures):
+                i = futures[future]
+                uploaded_file = uploaded_files[i - 1]
+                try:
+                    outcome = self._file_outcome(i, uploaded_file, future.result())
+                except Exception as e:
+                    error_msg = f"File {i} ({uploaded_file.name}): Failed to process - {str(e)}"
+                    logger.error(error_msg)
+                    outcome = {'error': error_msg}
+                outcomes[i - 1] = outcome
+                
+                if progress_callback:
+                    try:
+                        progress_callback(i, uploaded_file.name, outcome)
+                    except Exception as e:
+                        logger.warning(f"Preflight progress callback failed: {e}")
+        
+        file_details = [outcome['file_detail'] for outcome in outcomes if 'file_detail' in outcome]
+        errors = [outcome['error'] for outcome in outcomes if 'error' in outcome]
+        return file_details, errors
+    
+    def _extract_file(self, uploaded_file) -> Dict[str, Any]:
+        """Extract one uploaded file (runs on a preflight worker thread)"""
+        uploaded_file.seek(0)
+        return self.document_extractor.extract_text(uploaded_file)
+    
+    def _file_outcome(self, i: int, uploaded_file, extraction_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn one extraction result into a file detail or a user-facing error message"""
+        if extraction_result.get('error'):
+            # Handle scanned PDF detection with detailed user message
+            if extraction_result.get('error') == 'scanned_pdf_detected':
+                # Create filename-aware message for scanned PDFs
+                reasons = extraction_result.get('detection_reasons', [])
+                logger.error(f"File {i} ({uploaded_file.name}): scanned_pdf_detected")
+                return {'error': self._create_scanned_pdf_message(uploaded_file.name, reasons)}
+            # Handle other errors normally
+            error_msg = f"File {i} ({uploaded_file.name}): {extraction_result['error']}"
+            logger.error(error_msg)
+            return {'error': error_msg}
+        
+        file_word_count = extraction_result.get('word_count', 0)
+        
+        # Store file details with the text - the extraction cache only saves re-extraction, and its
+        # entries can be evicted or live on another replica before the analysis is submitted
+        file_detail = {
+            'filename': uploaded_file.name,
+            'file_number': i,
+            'word_count': file_word_count,
+            'estimated_pages': extraction_result.get('estimated_pages', 1),
+            'file_size_mb': extraction_result.get('file_size_mb', 0),
+            'extraction_method': extraction_result.get('extraction_method', 'unknown'),
+            'is_likely_scanned': extraction_result.get('is_likely_scanned', False),
+            'content_hash': extraction_result.get('content_hash'),
+            'file_extension': uploaded_file.name.lower().split('.')[-1],
+            'text_content': extraction_result.get('text', '')
+        }
+        
+        logger.info(f"Processed file {i}: {uploaded_file.name} - {file_word_count} words")
+        return {'file_detail': file_detail}
+    
     def _format_billing_summary(self, tier_info: Dict[str, Any], total_words: int, estimated_pages: int, file_count: int) -> str:
         
         """Format billing summary for user display"""
@@ -0,0 +1,282 @@
+"""
+Span Index for extracted document text
+
+Extraction flattens a document into one cleaned string. The span index keeps the
+structure alongside it: one entry per block (paragraph, heading or table row) with
+its character offsets into the cleaned text, page number, block type and heading
+level. Downstream steps (chunking large contracts on section boundaries, linking memo
+statements back to "page 37, 12.3", re-analysing one section) read the index instead
+of parsing the document again.
+
+Entries live in parallel typed arrays, so an index costs ~17 bytes per block and
+serializes to a small JSON-safe payload (base64 of the raw arrays) for the extraction
+cache.
+
+Offsets match DocumentExtractor._clean_text: every line is stripped, empty lines are
+dropped and the remaining lines are joined with a single newline.
+"""
+
+import re
+import sys
+import base64
+import bisect
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Block types
+PARAGRAPH = 0
+HEADING = 1
+TABLE_ROW = 2
+BLOCK_TYPES = ('paragraph', 'heading', 'table_row')
+
+SPAN_INDEX_VERSION = 1
+
+# (field, typecode) - 'I' is 4 bytes on every supported platform
+_FIELDS = (('starts', 'I'), ('ends', 'I'), ('pages', 'I'), ('kinds', 'B'), ('levels', 'B'))
+
+_DIVISION_HEADING = re.compile(
+    r'^(?:ARTICLE|Article|PART|Part|EXHIBIT|Exhibit|SCHEDULE|Schedule|APPENDIX|Appendix|ANNEX|Annex)'
+    r'\s+(?:[0-9]+|[IVXLC]+|[A-Z])\b'
+)
+_SECTION_HEADING = re.compile(r'^(?:SECTION|Section|§)\s*(\d+(?:\.\d+)*)\b')
+_NUMBERED_HEADING = re.compile(r'^(\d+(?:\.\d+)*)\.?\s+(\S.*)$')
+_CLAUSE_NUMBER = re.compile(r'^(?:(?:SECTION|Section|§)\s*)?(\d+(?:\.\d+)*)\b')
+_SENTENCE_END = re.compile(r'[.;:!?]$')
+
+
+def heading_level(line: str) -> int:
+    """
+    Heading level of a stripped line from its numbering and shape (0 = not a heading).
+
+    "ARTICLE IV" / "Exhibit A" -> 1, "Section 12.3" / "12.3 Payment Terms" -> depth of
+    the clause number, short all-caps lines ("PAYMENT TERMS") -> 1. Numbered lines that
+    read as sentences are clauses, not headings.
+    """
+    if not line or len(line) > 120:
+        return 0
+    if _DIVISION_HEADING.match(line):
+        return 1
+    match = _SECTION_HEADING.match(line)
+    if match:
+        return min(match.group(1).count('.') + 1, 9)
+    match = _NUMBERED_HEADING.match(line)
+    if match:
+        # A title is short and mostly capitalized ("Payment Terms", "Term and Termination")
+        words = match.group(2).rstrip('.').split()
+        significant = [w for w in words if len(w) > 3]
+        capitalized = sum(1 for w in significant if w[0].isupper())
+        if (len(words) <= 10 and words[0][0].isupper() and not _SENTENCE_END.search(words[-1])
+                and capitalized * 2 >= len(significant)):
+            return min(match.group(1).count('.') + 1, 9)
+        return 0
+    words = line.split()
+    letters = [c for c in line if c.isalpha()]
+    if 1 <= len(words) <= 8 and len(letters) >= 4 and all(c.isupper() for c in letters):
+        return 1
+    return 0
+
+
+class SpanIndex:
+    """Array-backed block index over a cleaned document text"""
+
+    def __init__(self):
+        self.starts = array('I')
+        self.ends = array('I')
+        self.pages = array('I')
+        self.kinds = array('B')
+        self.levels = array('B')
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, start: int, end: int, page: int = 0, kind: int = PARAGRAPH, level: int = 0):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.pages.append(page)
+        self.kinds.append(kind)
+        self.levels.append(level)
+
+    def block(self, index: int) -> Dict[str, Any]:
+        return {
+            'start': self.starts[index],
+            'end': self.ends[index],
+            'page': self.pages[index],
+            'type': BLOCK_TYPES[self.kinds[index]],
+            'level': self.levels[index]
+        }
+
+    def locate(self, offset: int) -> Optional[int]:
+        """Index of the block containing a character offset (the newline after a block counts as its own)"""
+        i = bisect.bisect_right(self.starts, offset) - 1
+        if i < 0 or offset > self.ends[i]:
+            return None
+        return i
+
+    def page_at(self, offset: int) -> Optional[int]:
+        i = self.locate(offset)
+        return None if i is None else self.pages[i]
+
+    def heading_for(self, offset: int) -> Optional[int]:
+        """Index of the nearest heading at or before an offset"""
+        i = bisect.bisect_right(self.starts, offset) - 1
+        while i >= 0:
+            if self.kinds[i] == HEADING:
+                return i
+            i -= 1
+        return None
+
+    def cite(self, text: str, offset: int) -> Dict[str, Any]:
+        """
+        Where an offset sits in the source: page, enclosing heading and clause number.
+
+        Args:
+            text: The cleaned text the index was built for
+            offset: Character offset into text
+        """
+        i = self.locate(offset)
+        heading = self.heading_for(offset)
+        clause = None
+        for candidate in (i, heading):
+            if candidate is not None:
+                match = _CLAUSE_NUMBER.match(text[self.starts[candidate]:self.ends[candidate]])
+                if match:
+                    clause = match.group(1)
+                    break
+        return {
+            'page': None if i is None else self.pages[i],
+            'heading': None if heading is None else text[self.starts[heading]:self.ends[heading]],
+            'clause': clause
+        }
+
+    def sections(self, max_level: int = 1) -> List[Tuple[int, int]]:
+        """
+        (start, end) character ranges split before every heading of level <= max_level.
+        Text before the first such heading is its own section.
+        """
+        if not len(self):
+            return []
+        bounds = [self.starts[0]]
+        for i in range(1, len(self)):
+            if self.kinds[i] == HEADING and self.levels[i] <= max_level:
+                bounds.append(self.starts[i])
+        bounds.append(self.ends[-1])
+        return [(bounds[k], bounds[k + 1]) for k in range(len(bounds) - 1) if bounds[k + 1] > bounds[k]]
+
+    def chunks(self, max_chars: int) -> List[Tuple[int, int]]:
+        """
+        (start, end) ranges of at most max_chars (unless one block is longer), cut only at
+        block boundaries and preferably before a heading.
+        """
+        result = []
+        count = len(self)
+        i = 0
+        while i < count:
+            start = self.starts[i]
+            j = i
+            last_heading = None
+            while j + 1 < count and self.ends[j + 1] - start <= max_chars:
+                j += 1
+                if self.kinds[j] == HEADING:
+                    last_heading = j
+            # Cut before the last heading in the window when it leaves the chunk at least half full
+            if j + 1 < count and last_heading is not None and self.starts[last_heading] - start >= max_chars // 2:
+                j = last_heading - 1
+            result.append((start, self.ends[j]))
+            i = j + 1
+        return result
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Compact JSON-safe form: base64 of the little-endian arrays"""
+        payload = {'version': SPAN_INDEX_VERSION, 'count': len(self)}
+        for name, _ in _FIELDS:
+            values = getattr(self, name)
+            if sys.byteorder == 'big':
+                values = array(values.typecode, values)
+                values.byteswap()
+            payload[name] = base64.b64encode(values.tobytes()).decode('ascii')
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> 'SpanIndex':
+        """
+        Raises:
+            ValueError: If the payload is from another index version or inconsistent
+        """
+        if payload.get('version') != SPAN_INDEX_VERSION:
+            raise ValueError(f"Unsupported span index version: {payload.get('version')}")
+        index = cls()
+        for name, typecode in _FIELDS:
+            values = array(typecode)
+            values.frombytes(base64.b64decode(payload[name]))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            if len(values) != payload['count']:
+                raise ValueError(f"Span index field {name} has {len(values)} entries, expected {payload['count']}")
+            setattr(index, name, values)
+        return index
+
+
+def build_span_index(blocks: Iterable[Tuple[str, int, int, int]]) -> Tuple[str, SpanIndex]:
+    """
+    Cleaned text and its span index from raw blocks in document order.
+
+    Args:
+        blocks: (raw text, page, block type, heading level) tuples
+
+    Returns:
+        (text identical to DocumentExtractor._clean_text("\\n\\n".join(raw texts)), index)
+    """
+    index = SpanIndex()
+    parts = []
+    offset = 0
+    for raw_text, page, kind, level in blocks:
+        lines = [line.strip() for line in raw_text.split('\n')]
+        block_text = '\n'.join(line for line in lines if line)
+        if not block_text:
+            continue
+        if parts:
+            offset += 1  # Newline between blocks
+        parts.append(block_text)
+        index.add(offset, offset + len(block_text), page, kind, level)
+        offset += len(block_text)
+    return '\n'.join(parts), index
+
+
+def iter_page_blocks(page_text: str, page: int):
+    """
+    Split one PDF page's text into paragraph and heading blocks.
+
+    PDF text has no paragraph markup, so a paragraph ends at a blank line, before a
+    heading line, or after a short line ending in sentence punctuation (the last line
+    of a wrapped paragraph is shorter than the others).
+
+    Yields:
+        (raw text, page, block type, heading level) tuples for build_span_index
+    """
+    lines = [line.strip() for line in page_text.split('\n')]
+    lengths = sorted(len(line) for line in lines if line)
+    if not lengths:
+        return
+    short_line = lengths[len(lengths) // 2] * 0.85
+
+    current = []
+    for line in lines:
+        if not line:
+            if current:
+                yield '\n'.join(current), page, PARAGRAPH, 0
+                current = []
+            continue
+        level = heading_level(line)
+        if level:
+            if current:
+                yield '\n'.join(current), page, PARAGRAPH, 0
+                current = []
+            yield line, page, HEADING, level
+            continue
+        current.append(line)
+        if len(line) < short_line and _SENTENCE_END.search(line):
+            yield '\n'.join(current), page, PARAGRAPH, 0
+            current = []
+    if current:
+        yield '\n'.join(current), page, PARAGRAPH, 0
+
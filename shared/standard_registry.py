@@ -0,0 +1,177 @@
+"""
+Standard Registry for VeritasLogic Analysis Platform
+Describes the per-standard components and naming used by background analysis paths
+"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Components are referenced by module/class name so importing the registry stays cheap
+STANDARD_REGISTRY = {
+    'ASC 606': {
+        'key': 'asc606',
+        'analyzer_module': 'asc606.step_analyzer',
+        'analyzer_class': 'ASC606StepAnalyzer',
+        'knowledge_module': 'asc606.knowledge_search',
+        'knowledge_class': 'ASC606KnowledgeSearch',
+        'memo_module': 'asc606.clean_memo_generator',
+        'memo_class': 'CleanMemoGenerator',
+        'step_count': 5,
+        'party_kwarg': 'customer_name',      # Keyword used by the analyzer's step methods
+        'party_name': 'the Customer',         # De-identified counterparty name
+        'results_party_key': 'customer_name', # Key read by the memo generator
+        'analysis_title': 'Contract Analysis',
+        'chain_prior_steps': True,       # Single-job runs pass earlier steps' output to later steps
+        'review_step_count': 5,          # Steps run for a memo review
+        'deduct_words_on_save': True     # Single-job saves send org_id/total_words for word deduction
+    },
+    'ASC 842': {
+        'key': 'asc842',
+        'analyzer_module': 'asc842.step_analyzer',
+        'analyzer_class': 'ASC842StepAnalyzer',
+        'knowledge_module': 'asc842.knowledge_search',
+        'knowledge_class': 'ASC842KnowledgeSearch',
+        'memo_module': 'asc842.clean_memo_generator',
+        'memo_class': 'CleanMemoGenerator',
+        'step_count': 5,
+        'party_kwarg': 'entity_name',
+        'party_name': 'the Entity',
+        'results_party_key': 'entity_name',
+        'analysis_title': 'Lease Analysis',
+        'chain_prior_steps': False,
+        'review_step_count': 2,
+        'deduct_words_on_save': False
+    },
+    'ASC 718': {
+        'key': 'asc718',
+        'analyzer_module': 'asc718.step_analyzer',
+        'analyzer_class': 'ASC718StepAnalyzer',
+        'knowledge_module': 'asc718.knowledge_search',
+        'knowledge_class': 'ASC718KnowledgeSearch',
+        'memo_module': 'asc718.clean_memo_generator',
+        'memo_class': 'CleanMemoGenerator',
+        'step_count': 5,
+        'party_kwarg': 'entity_name',
+        'party_name': 'the Entity',
+        'results_party_key': 'entity_name',
+        'analysis_title': 'Stock Compensation Analysis',
+        'chain_prior_steps': False,
+        'review_step_count': 2,
+        'deduct_words_on_save': False
+    },
+    'ASC 805': {
+        'key': 'asc805',
+        'analyzer_module': 'asc805.step_analyzer',
+        'analyzer_class': 'ASC805StepAnalyzer',
+        'knowledge_module': 'asc805.knowledge_search',
+        'knowledge_class': 'ASC805KnowledgeSearch',
+        'memo_module': 'asc805.clean_memo_generator',
+        'memo_class': 'CleanMemoGenerator',
+        'step_count': 5,
+        'party_kwarg': 'customer_name',
+        'party_name': 'the Target Company',
+        'results_party_key': 'target_company',
+        'analysis_title': 'Business Combination Analysis',
+        'chain_prior_steps': False,
+        'review_step_count': 2,
+        'deduct_words_on_save': False
+    },
+    'ASC 340-40': {
+        'key': 'asc340',
+        'analyzer_module': 'asc340.step_analyzer',
+        'analyzer_class': 'ASC340StepAnalyzer',
+        'knowledge_module': 'asc340.knowledge_search',
+        'knowledge_class': 'ASC340KnowledgeSearch',
+        'memo_module': 'asc340.clean_memo_generator',
+        'memo_class': 'CleanMemoGenerator',
+        'step_count': 2,
+        'party_kwarg': 'customer_name',
+        'party_name': 'the Company',
+        'results_party_key': 'company_name',
+        'analysis_title': 'Contract Cost Analysis',
+        'chain_prior_steps': False,
+        'review_step_count': 2,
+        'deduct_words_on_save': False
+    }
+}
+
+
+def get_standard_config(asc_standard: str) -> Dict[str, Any]:
+    """Get registry entry for an ASC standard (e.g., 'ASC 606')"""
+    config = STANDARD_REGISTRY.get(asc_standard)
+    if not config:
+        raise ValueError(f"Unknown ASC standard: {asc_standard}")
+    return config
+
+
+def load_component(asc_standard: str, component: str):
+    """
+    Import and return a component class for a standard
+
+    Args:
+        asc_standard: ASC standard name (e.g., 'ASC 842')
+        component: 'analyzer', 'knowledge' or 'memo'
+    """
+    config = get_standard_config(asc_standard)
+    module = importlib.import_module(config[f'{component}_module'])
+    return getattr(module, config[f'{component}_class'])
+
+
+# Analyzers and knowledge searches hold only clients, prompts and the KB handle after
+# __init__, so one instance per process serves every job (memo generators are per job)
+SHARED_COMPONENTS = ('analyzer', 'knowledge')
+_shared_instances: Dict[tuple, Any] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_component(asc_standard: str, component: str):
+    """
+    Process-wide instance of a standard's analyzer or knowledge search, built on first use
+
+    Args:
+        asc_standard: ASC standard name (e.g., 'ASC 842')
+        component: 'analyzer' or 'knowledge'
+    """
+    key = (asc_standard, component)
+    instance = _shared_instances.get(key)
+    if instance is None:
+        with _shared_lock:
+            instance = _shared_instances.get(key)
+            if instance is None:
+                instance = load_component(asc_standard, component)()
+                _shared_instances[key] = instance
+    return instance
+
+
+def is_component_loaded(asc_standard: str, component: str) -> bool:
+    return (asc_standard, component) in _shared_instances
+
+
+def preload_standards(standards: Optional[Iterable[str]] = None) -> Dict[str, Optional[float]]:
+    """
+    Build the shared components of each standard ahead of the first job (worker warm-up)
+
+    A standard that fails to load (e.g. knowledge base not built) is logged and skipped;
+    its jobs load it on demand and report the error there.
+
+    Returns:
+        Seconds spent per standard (None if it failed)
+    """
+    timings = {}
+    for asc_standard in standards or STANDARD_REGISTRY:
+        start = time.perf_counter()
+        try:
+            for component in SHARED_COMPONENTS:
+                get_shared_component(asc_standard, component)
+            load_component(asc_standard, 'memo')  # Import only - memo generators are built per job
+            timings[asc_standard] = time.perf_counter() - start
+            logger.info(f"✓ Preloaded {asc_standard} in {timings[asc_standard]:.2f}s")
+        except Exception as e:
+            timings[asc_standard] = None
+            logger.warning(f"⚠️ Could not preload {asc_standard}: {e}")
+    return timings
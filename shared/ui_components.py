@@ -8,8 +8,9 @@ Author: Accounting Platform Team
 """
 
 import streamlit as st
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import logging
+from shared.extraction_cache import get_file_text
 
 logger = logging.getLogger(__name__)
 
@@ -85,6 +86,39 @@ class SharedUIComponents:
         for error in errors:
             st.write(f"• {error}")
     
+    @staticmethod
+    def extract_uploaded_files(uploaded_files) -> Tuple[List[str], List[str]]:
+        """
+        Extract uploaded files concurrently (preflight pool), listing each file in a
+        status box as soon as it finishes.
+        
+        Args:
+            uploaded_files: List of Streamlit uploaded file objects
+            
+        Returns:
+            Tuple of (extracted texts in upload order, names of files that could not be processed)
+        """
+        from shared.preflight_pricing import preflight_pricing
+        
+        texts = {}
+        failed = {}
+        status = st.status(f"Extracting {len(uploaded_files)} file{'s' if len(uploaded_files) != 1 else ''}...", expanded=True)
+        
+        def on_file_done(file_number: int, filename: str, outcome: Dict[str, Any]):
+            file_detail = outcome.get('file_detail')
+            text = get_file_text(file_detail) if file_detail else ''
+            if text:
+                texts[file_number] = text
+                status.write(f"✅ {filename} - {file_detail['word_count']:,} words")
+            else:
+                failed[file_number] = filename
+                status.write(f"⚠️ {filename} - could not be processed")
+        
+        preflight_pricing.extract_files(uploaded_files, progress_callback=on_file_done)
+        status.update(label=f"Extracted {len(texts)} of {len(uploaded_files)} files",
+                      state="complete" if texts else "error", expanded=False)
+        return [texts[i] for i in sorted(texts)], [failed[i] for i in sorted(failed)]
+    
     @staticmethod
     def display_knowledge_base_stats(kb_info: Dict[str, str]) -> None:
         """
@@ -190,7 +224,7 @@ class SharedUIComponents:
                         st.write(f"• {reason}")
             
             # Debugging feature - show extracted text preview
-            extracted_text = result.get('text_content', '')
+            extracted_text = get_file_text(result)
             if extracted_text and st.checkbox(f"🔍 Show extracted text preview (first 2,000 characters only)", key=f"debug_preview_file_{idx}"):
                 with st.expander(f"📝 Extracted Text Preview: {filename}", expanded=True):
                     # Show first 500 words
@@ -6,4 +6,4 @@ PORT="${PORT:-8080}"
 echo "Starting Flask marketing website with Gunicorn on port: $PORT"
 
 # Start Flask backend with Gunicorn (production server)
-exec gunicorn backend_api:app --bind 0.0.0.0:$PORT --workers 4 --access-logfile - --error-logfile -
\ No newline at end of file
+exec gunicorn backend_api:app --bind 0.0.0.0:$PORT --workers 4 --worker-class gthread --threads 16 --timeout 120 --access-logfile - --error-logfile -
\ No newline at end of file
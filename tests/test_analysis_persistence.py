@@ -0,0 +1,144 @@
+"""
+Tests for analysis result persistence.
+Covers the gzip save payload, idempotent and unverified saves, legacy credit billing,
+and per-analysis savepoints in a direct batch save, against a scripted fake connection.
+"""
+
+import os
+import unittest
+from decimal import Decimal
+from unittest import mock
+from shared import analysis_persistence
+from shared.analysis_persistence import (
+    DirectResultStore, decode_save_payload, encode_save_payload, get_result_store, persist_analysis_result
+)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.last = None
+
+    def execute(self, sql, params=None):
+        statement = ' '.join(sql.split())
+        self.conn.statements.append((statement, params))
+        if statement.startswith('SELECT analysis_id'):
+            self.last = self.conn.analyses.get(params[0])
+        elif statement.startswith('SELECT email_verified'):
+            self.last = self.conn.user
+        elif statement.startswith('UPDATE analyses') and params[-2] in self.conn.fail_update_for:
+            raise RuntimeError("deadlock detected")
+
+    def fetchone(self):
+        return self.last
+
+
+class FakeConnection:
+    """Answers the persistence queries from in-memory rows and records every statement"""
+
+    def __init__(self, analyses, email_verified=True):
+        self.analyses = analyses
+        self.user = {'email_verified': email_verified, 'credits_balance': Decimal('100')}
+        self.statements = []
+        self.fail_update_for = set()
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def executed(self, prefix):
+        return [s for s, _ in self.statements if s.startswith(prefix)]
+
+
+def analysis_row(analysis_id, status='processing', charged=Decimal('0')):
+    return {'analysis_id': analysis_id, 'user_id': 5, 'memo_uuid': f'memo-{analysis_id}', 'asc_standard': 'ASC 606',
+            'words_count': 1000, 'tier_name': 'tier_1', 'file_count': 1, 'final_charged_credits': charged,
+            'billed_credits': 0, 'status': status}
+
+
+class TestAnalysisPersistence(unittest.TestCase):
+    """Test shared/analysis_persistence.py."""
+
+    def test_payload_round_trip(self):
+        """Gzip bodies decode to the original save data; plain JSON still works."""
+        save_data = {'analysis_id': 12, 'memo_content': 'memo ' * 1000, 'success': True}
+        body = encode_save_payload(save_data)
+        self.assertLess(len(body), len(save_data['memo_content']))
+        self.assertEqual(decode_save_payload(body, 'gzip'), save_data)
+        self.assertEqual(decode_save_payload(b'{"analysis_id": 12}'), {'analysis_id': 12})
+
+    def test_save_locks_record_and_marks_completed(self):
+        """The record is locked, updated with the memo, and nothing is committed by the function."""
+        conn = FakeConnection({12: analysis_row(12)})
+        result = persist_analysis_result(conn, 5, {'analysis_id': 12, 'success': True, 'memo_content': 'memo'})
+
+        self.assertEqual(result['outcome'], 'saved')
+        self.assertEqual(result['memo_uuid'], 'memo-12')
+        self.assertTrue(conn.executed('SELECT analysis_id')[0].endswith('FOR UPDATE'))
+        update_params = next(p for s, p in conn.statements if s.startswith('UPDATE analyses'))
+        self.assertEqual(update_params[0], 'completed')
+        self.assertEqual(update_params[2], 'memo')
+        self.assertEqual(conn.commits, 0)
+
+    def test_finished_analysis_is_not_saved_again(self):
+        """A repeated save returns the existing memo without updating or billing."""
+        conn = FakeConnection({12: analysis_row(12, status='completed', charged=Decimal('10'))})
+        result = persist_analysis_result(conn, 5, {'analysis_id': 12, 'success': True, 'memo_content': 'memo'})
+
+        self.assertEqual(result['outcome'], 'duplicate')
+        self.assertEqual(conn.executed('UPDATE'), [])
+        self.assertEqual(conn.executed('INSERT'), [])
+
+    def test_missing_and_unverified(self):
+        """Unknown analyses return None; unverified users get a failed, uncharged analysis."""
+        conn = FakeConnection({12: analysis_row(12, charged=Decimal('10'))}, email_verified=False)
+        self.assertIsNone(persist_analysis_result(conn, 5, {'analysis_id': 99, 'success': True}))
+
+        result = persist_analysis_result(conn, 5, {'analysis_id': 12, 'success': True, 'memo_content': 'memo'})
+        self.assertEqual(result['outcome'], 'unverified')
+        self.assertIn("SET status = 'failed'", conn.executed('UPDATE analyses')[0])
+        self.assertEqual(conn.executed('UPDATE users'), [])
+
+    def test_legacy_credits_charged(self):
+        """Without subscription details, the record's server-side price is charged in credits."""
+        conn = FakeConnection({12: analysis_row(12, charged=Decimal('10'))})
+        result = persist_analysis_result(conn, 5, {'analysis_id': 12, 'success': True, 'memo_content': 'memo'})
+
+        self.assertEqual(result['balance_remaining'], 90.0)
+        self.assertEqual(len(conn.executed('INSERT INTO credit_transactions')), 1)
+
+    def test_direct_batch_uses_savepoints(self):
+        """A failing analysis is rolled back to its savepoint; the rest commit together."""
+        conn = FakeConnection({1: analysis_row(1), 2: analysis_row(2), 3: analysis_row(3)})
+        conn.fail_update_for.add(2)
+        store = DirectResultStore('postgresql://example')
+        store._conn = conn
+
+        results = store.save_many(5, [{'analysis_id': i, 'success': True, 'memo_content': 'memo'} for i in (1, 2, 3)])
+
+        self.assertEqual(results[0]['outcome'], 'saved')
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(results[2]['outcome'], 'saved')
+        self.assertEqual(conn.executed('ROLLBACK TO SAVEPOINT'), ['ROLLBACK TO SAVEPOINT analysis_save'])
+        self.assertEqual(conn.commits, 1)
+
+    def test_direct_saves_off_by_default(self):
+        """Workers use the save endpoint unless ANALYSIS_DIRECT_SAVE and DATABASE_URL are both set."""
+        with mock.patch.dict(os.environ, {'DATABASE_URL': 'postgresql://example'}, clear=False):
+            os.environ.pop('ANALYSIS_DIRECT_SAVE', None)
+            self.assertIsNone(get_result_store())
+        with mock.patch.dict(os.environ, {'ANALYSIS_DIRECT_SAVE': 'true'}, clear=False):
+            os.environ.pop('DATABASE_URL', None)
+            self.assertIsNone(get_result_store())
+        analysis_persistence._result_store = None
+
+
+if __name__ == '__main__':
+    unittest.main()
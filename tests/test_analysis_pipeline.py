@@ -0,0 +1,178 @@
+"""
+Tests for the analysis pipeline engine.
+Covers stage order and arguments per standard, prior-step chaining, progress and
+metrics hooks, failing stages, and the portfolio runner on top of the engine.
+"""
+
+import unittest
+from shared.analysis_pipeline import (
+    AnalysisContext, AnalysisPipeline, Stage, build_step_stages, finalize, render, stage_summary
+)
+from shared.portfolio_analysis import PortfolioAnalysisRunner
+
+
+class FakeAnalyzer:
+    """Stand-in step analyzer recording the keyword arguments of every step."""
+
+    def __init__(self, fail_step=None):
+        self.calls = []
+        self.fail_step = fail_step
+
+    def _analyze_step_with_retry(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs['step_num'] == self.fail_step:
+            raise RuntimeError("model timeout")
+        return {'markdown_content': f"step {kwargs['step_num']} output"}
+
+    def _extract_conclusions_from_steps(self, steps):
+        return "conclusions"
+
+    def generate_executive_summary(self, conclusions_text, party_name):
+        return f"summary for {party_name}"
+
+    def generate_background_section(self, conclusions_text, party_name):
+        return "background"
+
+    def generate_final_conclusion(self, steps):
+        return "conclusion"
+
+
+class FakeKnowledgeSearch:
+    knowledge_base = None
+
+    def search_for_step(self, step_num, contract_text):
+        return f"guidance {step_num}"
+
+
+class FakeMemoGenerator:
+    def combine_clean_steps(self, analysis_results, analysis_id=None):
+        return f"memo {analysis_id}: {len(analysis_results['steps'])} steps"
+
+
+class RecordingHook:
+    def __init__(self):
+        self.events = []
+
+    def on_stage_start(self, context, stage):
+        self.events.append(('start', stage.name, stage.progress))
+
+    def on_stage_end(self, context, stage, metrics):
+        self.events.append(('end', stage.name, metrics['status']))
+
+
+def make_context(asc_standard, analyzer):
+    context = AnalysisContext(asc_standard, 7, "contract text", uploaded_filenames=['lease.pdf'])
+    context.analyzer = analyzer
+    context.knowledge_search = FakeKnowledgeSearch()
+    context.memo_generator_class = FakeMemoGenerator
+    return context
+
+
+class TestAnalysisPipeline(unittest.TestCase):
+    """Test shared/analysis_pipeline.py with fake components."""
+
+    def test_stages_run_in_order_with_standard_arguments(self):
+        """Steps get retrieved guidance and the standard's party keyword; the memo is rendered."""
+        analyzer = FakeAnalyzer()
+        context = make_context('ASC 842', analyzer)
+        hook = RecordingHook()
+        stages = build_step_stages(5, chain_prior_steps=False) + [Stage('finalize', finalize), Stage('render', render)]
+        AnalysisPipeline(stages, hooks=[hook]).run(context)
+
+        started = [name for event, name, _ in hook.events if event == 'start']
+        self.assertEqual(started[:4], ['retrieve_1', 'analyze_1', 'retrieve_2', 'analyze_2'])
+        self.assertEqual(started[-2:], ['finalize', 'render'])
+        self.assertEqual(analyzer.calls[2]['authoritative_context'], 'guidance 3')
+        self.assertEqual(analyzer.calls[0]['entity_name'], 'the Entity')
+        self.assertNotIn('prior_steps_context', analyzer.calls[4])
+        self.assertEqual(context.results['executive_summary'], 'summary for the Entity')
+        self.assertEqual(context.results['filename'], 'lease.pdf')
+        self.assertEqual(context.memo_content, 'memo 7: 5 steps')
+        self.assertIn(('start', 'retrieve_2', (2, 5, 'Step 2')), hook.events)
+
+    def test_prior_steps_chained(self):
+        """With chaining, each step sees every earlier step's output."""
+        analyzer = FakeAnalyzer()
+        AnalysisPipeline(build_step_stages(3)).run(make_context('ASC 606', analyzer))
+
+        self.assertNotIn('prior_steps_context', analyzer.calls[0])
+        self.assertEqual(analyzer.calls[2]['prior_steps_context'], "step 1 output\n\nstep 2 output")
+        self.assertEqual(analyzer.calls[2]['customer_name'], 'the Customer')
+
+    def test_metrics_record_duration_and_usage(self):
+        """Each stage records its share of the running usage totals."""
+        totals = {'cost': 0.0, 'input_tokens': 0}
+
+        def spend(context):
+            totals['cost'] += 0.25
+            totals['input_tokens'] += 1000
+
+        context = make_context('ASC 606', FakeAnalyzer())
+        stages = [Stage('first', spend), Stage('second', lambda c: None), Stage('third', spend)]
+        AnalysisPipeline(stages, usage=lambda: dict(totals)).run(context)
+
+        self.assertEqual([m['stage'] for m in context.metrics], ['first', 'second', 'third'])
+        self.assertEqual(context.metrics[0]['input_tokens'], 1000)
+        self.assertEqual(context.metrics[1]['input_tokens'], 0)
+        self.assertAlmostEqual(context.metrics[2]['cost'], 0.25)
+        self.assertTrue(all(m['seconds'] >= 0 and m['status'] == 'completed' for m in context.metrics))
+
+    def test_failing_stage_stops_pipeline(self):
+        """A failed step is recorded and raised; later stages (e.g. save) never run."""
+        saved = []
+        context = make_context('ASC 606', FakeAnalyzer(fail_step=2))
+        stages = build_step_stages(5) + [Stage('save', lambda c: saved.append(True))]
+
+        with self.assertRaisesRegex(Exception, "Step 2 failed: model timeout"):
+            AnalysisPipeline(stages).run(context)
+        self.assertEqual(context.metrics[-1]['stage'], 'analyze_2')
+        self.assertEqual(context.metrics[-1]['status'], 'failed')
+        self.assertEqual(saved, [])
+
+    def test_hook_errors_do_not_fail_analysis(self):
+        """A broken hook is logged and the pipeline carries on."""
+        class BrokenHook:
+            def on_stage_end(self, context, stage, metrics):
+                raise ValueError("metrics sink down")
+
+        context = make_context('ASC 606', FakeAnalyzer())
+        with self.assertLogs('shared.analysis_pipeline', level='WARNING'):
+            AnalysisPipeline(build_step_stages(1), hooks=[BrokenHook()]).run(context)
+        self.assertIn('step_1', context.results['steps'])
+
+    def test_stage_summary_groups_steps(self):
+        """Numbered stages are totalled by type."""
+        metrics = [
+            {'stage': 'retrieve_1', 'status': 'completed', 'started_at': 1.0, 'seconds': 0.5},
+            {'stage': 'analyze_1', 'status': 'completed', 'started_at': 1.5, 'seconds': 2.0},
+            {'stage': 'analyze_2', 'status': 'completed', 'started_at': 3.5, 'seconds': 3.0},
+            {'stage': 'render', 'status': 'completed', 'started_at': 6.5, 'seconds': 0.1}
+        ]
+        summary = stage_summary(metrics)
+        self.assertEqual(summary['analyze'], {'count': 2, 'seconds': 5.0})
+        self.assertEqual(summary['render']['count'], 1)
+
+    def test_portfolio_contracts_run_through_engine(self):
+        """Portfolio contracts produce memos and per-contract progress from stage hooks."""
+        progress = []
+        runner = PortfolioAnalysisRunner(
+            'ASC 340-40',
+            analyzer=FakeAnalyzer(),
+            knowledge_search=FakeKnowledgeSearch(),
+            memo_generator_class=FakeMemoGenerator,
+            max_concurrency=2,
+            progress_callback=lambda analysis_id, p: progress.append((analysis_id, p.get('step_name')))
+        )
+        portfolio = runner.run([
+            {'analysis_id': 1, 'combined_text': 'contract one', 'uploaded_filenames': ['one.pdf']},
+            {'analysis_id': 2, 'combined_text': 'contract two', 'uploaded_filenames': ['two.pdf']}
+        ])
+
+        self.assertEqual(portfolio['results'][1]['memo_content'], 'memo 1: 2 steps')
+        self.assertEqual(portfolio['results'][2]['stages']['analyze']['count'], 2)
+        self.assertIn((2, 'Generating memo'), progress)
+        self.assertIn((1, 'Completed'), progress)
+
+
+if __name__ == '__main__':
+    unittest.main()
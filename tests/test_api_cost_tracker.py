@@ -0,0 +1,150 @@
+"""
+Tests for API cost accounting.
+Covers costs from reported usage (cached and reasoning tokens), the tokenizer fallback
+with cached encoders, per-context trackers across threads and hedged requests, and
+per-contract costs in portfolio runs.
+"""
+
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from shared import api_cost_tracker
+from shared.api_cost_tracker import (
+    APITracker, cost_tracking_scope, get_total_estimated_cost, get_usage_totals, record_response_usage,
+    reset_cost_tracking, track_openai_request, usage_tokens
+)
+from shared.llm_request import HedgedRequester, HedgePolicy
+from shared.portfolio_analysis import PortfolioAnalysisRunner
+
+
+def responses_api_response(model='gpt-5.1-2025-11-13', input_tokens=10_000, cached=4_000, output=2_000, reasoning=1_500):
+    usage = SimpleNamespace(input_tokens=input_tokens, output_tokens=output,
+                            input_tokens_details=SimpleNamespace(cached_tokens=cached),
+                            output_tokens_details=SimpleNamespace(reasoning_tokens=reasoning))
+    return SimpleNamespace(model=model, usage=usage, output_text='ok')
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+
+class TestApiCostTracker(unittest.TestCase):
+    """Test shared/api_cost_tracker.py."""
+
+    def setUp(self):
+        reset_cost_tracking()
+
+    def test_cost_from_reported_usage(self):
+        """Cached input is priced at the cached rate; reasoning tokens are part of output."""
+        with mock.patch.object(api_cost_tracker, '_encoding', side_effect=AssertionError("tokenized")):
+            record_response_usage(responses_api_response(), 'gpt-5')
+            cost = track_openai_request([{'role': 'user', 'content': 'prompt'}], 'ok', 'gpt-5', 'step_1_analysis')
+
+        # gpt-5 pricing: 6,000 input at $10, 4,000 cached at $1, 2,000 output at $30 per 1M
+        self.assertAlmostEqual(cost, 0.06 + 0.004 + 0.06)
+        self.assertAlmostEqual(get_total_estimated_cost(), cost)
+        totals = get_usage_totals()
+        self.assertEqual((totals['cached_tokens'], totals['reasoning_tokens'], totals['requests']), (4000, 1500, 1))
+
+    def test_chat_usage_dict(self):
+        """Chat Completions usage names map onto the same counts."""
+        tokens = usage_tokens({'prompt_tokens': 900, 'completion_tokens': 100,
+                               'prompt_tokens_details': {'cached_tokens': 0}})
+        self.assertEqual(tokens, {'input_tokens': 900, 'cached_tokens': 0, 'output_tokens': 100, 'reasoning_tokens': 0})
+        self.assertIs(APITracker.pricing_for('gpt-4o-mini-2024-07-18'), APITracker.MODEL_PRICING['gpt-4o-mini'])
+
+    def test_tokenizer_fallback_uses_cached_encoder(self):
+        """Without usage the request is tokenized, building each model's encoder once."""
+        api_cost_tracker._encoding.cache_clear()
+        with mock.patch('tiktoken.encoding_for_model', return_value=FakeEncoding()) as encoding_for_model:
+            for _ in range(3):
+                track_openai_request([{'role': 'user', 'content': 'four words of prompt'}], 'two words', 'gpt-4o')
+        api_cost_tracker._encoding.cache_clear()
+
+        self.assertEqual(encoding_for_model.call_count, 1)
+        self.assertEqual(get_usage_totals()['input_tokens'], 12)
+        self.assertEqual(get_usage_totals()['requests'], 3)
+
+    def test_concurrent_contexts_do_not_mix(self):
+        """Threads with their own scope keep separate totals; the caller's tracker is untouched."""
+        totals = {}
+
+        def analysis(name, requests):
+            with cost_tracking_scope() as tracker:
+                for _ in range(requests):
+                    record_response_usage(responses_api_response(), 'gpt-5')
+                    track_openai_request([], '', 'gpt-5')
+                totals[name] = tracker.get_usage()['requests']
+
+        threads = [threading.Thread(target=analysis, args=(name, n)) for name, n in (('a', 2), ('b', 5))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(totals, {'a': 2, 'b': 5})
+        self.assertEqual(get_usage_totals()['requests'], 0)
+
+    def test_hedged_request_usage_reaches_caller(self):
+        """LLM calls run in executor threads but record on the calling context's tracker."""
+        requester = HedgedRequester(policy=HedgePolicy())
+
+        def send(model):
+            record_response_usage(responses_api_response(), model)
+            return 'answer'
+
+        with cost_tracking_scope() as tracker:
+            requester.request(send, 'gpt-5', 'step_analysis')
+        self.assertEqual(tracker.get_usage()['requests'], 1)
+        self.assertEqual(get_usage_totals()['requests'], 0)
+
+    def test_portfolio_costs_per_contract(self):
+        """Each portfolio contract reports the cost of its own requests."""
+        class SpendingAnalyzer:
+            def _analyze_step_with_retry(self, **kwargs):
+                # The longer contract makes more requests
+                for _ in range(len(kwargs['contract_text'].split())):
+                    record_response_usage(responses_api_response(), 'gpt-5')
+                    track_openai_request([], '', 'gpt-5')
+                return {'markdown_content': 'step'}
+
+            def _extract_conclusions_from_steps(self, steps):
+                return ''
+
+            def generate_executive_summary(self, conclusions_text, party_name):
+                return ''
+
+            def generate_background_section(self, conclusions_text, party_name):
+                return ''
+
+            def generate_final_conclusion(self, steps):
+                return ''
+
+        class Knowledge:
+            knowledge_base = None
+
+            def search_for_step(self, step_num, contract_text):
+                return ''
+
+        class Memo:
+            def combine_clean_steps(self, analysis_results, analysis_id=None):
+                return 'memo'
+
+        runner = PortfolioAnalysisRunner('ASC 340-40', analyzer=SpendingAnalyzer(), knowledge_search=Knowledge(),
+                                         memo_generator_class=Memo, max_concurrency=2)
+        portfolio = runner.run([
+            {'analysis_id': 1, 'combined_text': 'one'},
+            {'analysis_id': 2, 'combined_text': 'one two three'}
+        ])
+
+        per_request = APITracker.usage_cost('gpt-5', responses_api_response().usage)
+        self.assertAlmostEqual(portfolio['results'][1]['api_cost'], 2 * per_request)
+        self.assertAlmostEqual(portfolio['results'][2]['api_cost'], 6 * per_request)
+        self.assertAlmostEqual(portfolio['api_cost'], 8 * per_request)
+        self.assertEqual(portfolio['results'][2]['stages']['analyze']['requests'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
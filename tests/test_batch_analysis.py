@@ -0,0 +1,191 @@
+"""
+Tests for offline batch analysis.
+Drives BatchAnalysisRunner through LocalBatchStub with fake analyzer, knowledge and
+memo components: batch rounds per step for chained standards, a single batch for
+independent steps, non-blocking polls, real-time fallback for missing or empty batch
+responses, and per-analysis costs that include every real-time call.
+"""
+
+import json
+import unittest
+from types import SimpleNamespace
+from shared.api_cost_tracker import (
+    APITracker, get_usage_totals, record_response_usage, reset_cost_tracking, track_openai_request
+)
+from shared.batch_analysis import BatchAnalysisRunner, LocalBatchStub, estimate_batch_cost
+
+REALTIME_USAGE = {'input_tokens': 1000, 'output_tokens': 200}
+
+
+def realtime_call(request_type):
+    """What the analyzers do for every real-time request"""
+    record_response_usage(SimpleNamespace(model='gpt-4o', usage=REALTIME_USAGE), 'gpt-4o')
+    track_openai_request([], '', 'gpt-4o', request_type)
+
+
+def echo_prompt(custom_id, endpoint, body):
+    return body['messages'][-1]['content']
+
+
+class FakeAnalyzer:
+    main_model = 'gpt-4o'
+
+    def __init__(self):
+        self.realtime_steps = []
+
+    def _is_gpt5_model(self, model):
+        return False
+
+    def _get_temperature(self, model):
+        return 0.3
+
+    def _get_max_tokens_param(self, request_type, model):
+        return {'max_tokens': 2000}
+
+    def _get_markdown_system_prompt(self):
+        return 'system'
+
+    def _get_step_markdown_prompt(self, step_num, contract_text, authoritative_context, additional_context,
+                                  prior_steps_context, **party):
+        return f"step {step_num} for {contract_text} after {prior_steps_context}"
+
+    def _get_step_title(self, step_num):
+        return f"Step {step_num}"
+
+    def _analyze_step_with_retry(self, step_num, contract_text, **kwargs):
+        self.realtime_steps.append((contract_text, step_num))
+        realtime_call(f'step_{step_num}_analysis')
+        return {'title': f"Step {step_num}", 'markdown_content': f"realtime {contract_text} step {step_num}",
+                'step_num': str(step_num)}
+
+    def _extract_conclusions_from_steps(self, steps):
+        return 'conclusions'
+
+    def generate_executive_summary(self, conclusions_text, party_name):
+        realtime_call('executive_summary')
+        return 'summary'
+
+    def generate_background_section(self, conclusions_text, party_name):
+        realtime_call('background')
+        return 'background'
+
+    def generate_final_conclusion(self, steps):
+        realtime_call('conclusion')
+        return 'conclusion'
+
+
+class FakeKnowledge:
+    def search_for_step(self, step_num, contract_text):
+        return 'guidance'
+
+
+class FakeMemo:
+    def combine_clean_steps(self, analysis_results, analysis_id=None):
+        return "\n".join(step['markdown_content'] for step in analysis_results['steps'].values())
+
+
+class TestBatchAnalysis(unittest.TestCase):
+    """Test shared/batch_analysis.py."""
+
+    def setUp(self):
+        reset_cost_tracking()
+
+    def test_batch_rounds_with_realtime_fallback(self):
+        """Missing or empty batch responses run in real time; each analysis is billed for its own calls."""
+        def responder(custom_id, endpoint, body):
+            if custom_id == '2:step_3':
+                return ''
+            if custom_id == '1:step_5':
+                raise RuntimeError('request expired')
+            return f"batch {custom_id}"
+
+        stub = LocalBatchStub(responder)
+        analyzer = FakeAnalyzer()
+        runner = BatchAnalysisRunner('ASC 606', backend=stub, analyzer=analyzer, knowledge_search=FakeKnowledge(),
+                                     memo_generator=FakeMemo(), poll_interval=0)
+        results = runner.run([
+            {'analysis_id': 1, 'combined_text': 'contract one'},
+            {'analysis_id': 2, 'combined_text': 'contract two'}
+        ])
+
+        # One batch round per step, each covering both analyses
+        self.assertEqual(len(stub.batches), 5)
+        self.assertTrue(all(len(batch['output']) == 2 for batch in stub.batches.values()))
+        self.assertEqual(sorted(analyzer.realtime_steps), [('contract one', 5), ('contract two', 3)])
+
+        self.assertTrue(results[1]['success'] and results[2]['success'])
+        self.assertIn('batch 1:step_4', results[1]['memo_content'])
+        self.assertIn('realtime contract one step 5', results[1]['memo_content'])
+        self.assertIn('realtime contract two step 3', results[2]['memo_content'])
+
+        realtime_cost = APITracker.usage_cost('gpt-4o', REALTIME_USAGE)
+        for analysis_id in (1, 2):
+            batch_cost = sum(estimate_batch_cost('gpt-4o', line['response']['body']['usage'])
+                             for batch in stub.batches.values() for line in batch['output']
+                             if line['custom_id'].startswith(f'{analysis_id}:') and line['response']
+                             and line['response']['body']['choices'][0]['message']['content'])
+            # Batch usage at the discount, plus one real-time step and three final sections
+            self.assertAlmostEqual(results[analysis_id]['api_cost'], batch_cost + 4 * realtime_cost)
+        # Nothing is left on the job-wide tracker
+        self.assertEqual(get_usage_totals()['requests'], 0)
+
+    def test_failed_realtime_fallback_fails_only_that_analysis(self):
+        """An analysis whose fallback call raises fails; the others still get memos."""
+        class FailingAnalyzer(FakeAnalyzer):
+            def _analyze_step_with_retry(self, step_num, contract_text, **kwargs):
+                raise RuntimeError('model unavailable')
+
+        stub = LocalBatchStub(lambda custom_id, endpoint, body: '' if custom_id == '1:step_2' else f"batch {custom_id}")
+        runner = BatchAnalysisRunner('ASC 606', backend=stub, analyzer=FailingAnalyzer(),
+                                     knowledge_search=FakeKnowledge(), memo_generator=FakeMemo(), poll_interval=0)
+        results = runner.run([
+            {'analysis_id': 1, 'combined_text': 'contract one'},
+            {'analysis_id': 2, 'combined_text': 'contract two'}
+        ])
+
+        self.assertFalse(results[1]['success'])
+        self.assertIn('Step 2 failed', results[1]['error'])
+        self.assertTrue(results[2]['success'])
+        # Analysis 1 drops out of later rounds
+        self.assertEqual([len(batch['output']) for batch in stub.batches.values()], [2, 2, 1, 1, 1])
+
+    def test_independent_steps_share_one_batch(self):
+        """Without chain_prior_steps every step of every analysis goes in one batch, with no prior context."""
+        stub = LocalBatchStub(echo_prompt)
+        runner = BatchAnalysisRunner('ASC 842', backend=stub, analyzer=FakeAnalyzer(), knowledge_search=FakeKnowledge(),
+                                     memo_generator=FakeMemo(), poll_interval=0)
+        results = runner.run([
+            {'analysis_id': 1, 'combined_text': 'lease one'},
+            {'analysis_id': 2, 'combined_text': 'lease two'}
+        ])
+
+        self.assertEqual(len(stub.batches), 1)
+        (batch,) = stub.batches.values()
+        self.assertEqual(len(batch['output']), 10)
+        self.assertTrue(results[1]['success'] and results[2]['success'])
+        self.assertIn('step 5 for lease two after None', results[2]['memo_content'])
+
+    def test_advance_returns_while_batch_pending(self):
+        """A pending batch is checked once and left for a later job; the state survives JSON."""
+        stub = LocalBatchStub(echo_prompt)
+        runner = BatchAnalysisRunner('ASC 606', backend=stub, analyzer=FakeAnalyzer(), knowledge_search=FakeKnowledge(),
+                                     memo_generator=FakeMemo(), poll_interval=3600)
+        analyses = [{'analysis_id': 7, 'combined_text': 'contract seven'}]
+        state = runner.start(analyses)
+        (batch,) = stub.batches.values()
+        batch['status'] = 'in_progress'
+
+        self.assertFalse(runner.advance(analyses, state))
+        self.assertEqual(state['round'], 0)
+
+        batch['status'] = 'completed'
+        state = json.loads(json.dumps(state))
+        self.assertTrue(runner.advance(analyses, state))
+        self.assertEqual(len(stub.batches), 5)
+        results = runner.finish(analyses, state)
+        self.assertTrue(results[7]['success'])
+        self.assertIn('step 4 for contract seven after step 1 for contract seven', results[7]['memo_content'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests for the content-addressed blob store used for large job inputs.
+Covers Redis and disk backends, inline small texts and expired blobs.
+"""
+
+import os
+import time
+import pickle
+import tempfile
+import unittest
+from unittest.mock import patch
+from fakeredis import FakeStrictRedis
+from shared.blob_store import (
+    DiskBlobStore, RedisBlobStore, store_job_text, load_job_text, store_job_texts, load_job_texts, is_blob_ref
+)
+
+CONTRACT = "The Licensor shall provide the Services to the Licensee under Schedule A. " * 2000
+
+
+class TestBlobStore(unittest.TestCase):
+    """Test shared/blob_store.py."""
+
+    def test_redis_reference_round_trip(self):
+        """Large texts become small references; identical text is stored once."""
+        redis_conn = FakeStrictRedis()
+        store = RedisBlobStore(redis_conn, ttl_seconds=60)
+
+        ref = store_job_text(CONTRACT, store)
+        self.assertTrue(is_blob_ref(ref))
+        self.assertLess(len(pickle.dumps({'combined_text': ref})), 200)
+        self.assertEqual(load_job_text(ref, store), CONTRACT)
+
+        self.assertEqual(store_job_text(CONTRACT, store), ref)
+        self.assertEqual(len(redis_conn.keys('blob:*')), 1)
+        self.assertLess(redis_conn.strlen(f"blob:{ref['blob_sha256']}"), len(CONTRACT) // 10)
+
+    def test_small_and_disabled_stay_inline(self):
+        """Short texts, and any text without a store, are kept in the payload."""
+        store = RedisBlobStore(FakeStrictRedis(), ttl_seconds=60)
+        self.assertEqual(store_job_text("Short memo.", store), "Short memo.")
+        self.assertEqual(store_job_text(CONTRACT, None), CONTRACT)
+        self.assertEqual(load_job_text("Short memo.", store), "Short memo.")
+
+    def test_store_failure_keeps_text_inline(self):
+        """A failing store does not block job submission."""
+        store = RedisBlobStore(FakeStrictRedis(), ttl_seconds=60)
+        with patch.object(store, 'put', side_effect=ConnectionError("down")):
+            self.assertEqual(store_job_text(CONTRACT, store), CONTRACT)
+
+    def test_disk_expiry(self):
+        """Disk blobs past their TTL are reported missing."""
+        with tempfile.TemporaryDirectory() as directory:
+            store = DiskBlobStore(directory, ttl_seconds=60)
+            items = store_job_texts([{'analysis_id': 1, 'combined_text': CONTRACT}], store)
+            self.assertEqual(load_job_texts(items, store)[0]['combined_text'], CONTRACT)
+
+            old = time.time() - 120
+            os.utime(store._path(items[0]['combined_text']['blob_sha256']), (old, old))
+            with self.assertRaises(RuntimeError):
+                load_job_texts(items, store)
+
+
+if __name__ == '__main__':
+    unittest.main()
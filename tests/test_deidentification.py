@@ -0,0 +1,121 @@
+"""
+Tests for the shared single-pass de-identification engine.
+Covers name variants, longest-match precedence, reversible maps, streaming
+and a single scan over a 100-page contract.
+"""
+
+import random
+import unittest
+from unittest.mock import patch
+from shared.deidentification import (
+    DeidentificationEngine, deidentify_parties, extract_base_company_name, deidentify_with_map,
+    reidentify_text, reidentify_memo, normalize_text, StreamingDeidentifier
+)
+
+
+class TestDeidentification(unittest.TestCase):
+    """Test party name replacement in shared/deidentification.py."""
+
+    def setUp(self):
+        """Set up party specs matching the ASC 606 analyzer."""
+        self.parties = [
+            {'key': 'vendor', 'label': 'vendor', 'name': 'Netflix, Inc.', 'replacement': 'the Company'},
+            {'key': 'customer', 'label': 'customer', 'name': 'Acme Corp.', 'replacement': 'the Customer'}
+        ]
+
+    def test_names_base_names_and_aliases(self):
+        """Full names, base names, aliases and line-wrapped names are all replaced."""
+        text = ('This Agreement is between Netflix, Inc. ("Streamer") and Acme Corp. '
+                'Netflix and the Streamer agree that ACME-\n CORP pays.')
+        result = deidentify_parties(text, self.parties)
+
+        self.assertTrue(result['success'])
+        self.assertNotIn('Netflix', result['text'])
+        self.assertNotIn('Streamer', result['text'])
+        self.assertNotIn('Acme', result['text'].title())
+        self.assertEqual(result['replacement_count'], {'vendor': 1, 'customer': 2})
+
+    def test_longest_variant_wins(self):
+        """A party name containing the other party's base name is not partially replaced."""
+        parties = [
+            {'key': 'vendor', 'label': 'vendor', 'name': 'Acme Inc.', 'replacement': 'the Company'},
+            {'key': 'customer', 'label': 'customer', 'name': 'Acme Holdings LLC', 'replacement': 'the Customer'}
+        ]
+        result = deidentify_parties("Acme Inc sells to Acme Holdings LLC.", parties)
+        self.assertEqual(result['text'], "the Company sells to the Customer.")
+
+    def test_names_not_found(self):
+        """Original text is returned when no full party name is found."""
+        text = "No party names appear here."
+        result = deidentify_parties(text, self.parties)
+        self.assertFalse(result['success'])
+        self.assertEqual(result['text'], text)
+        self.assertIn("were not found", result['error'])
+
+    def test_base_company_name(self):
+        """Legal suffixes are stripped, generic results are rejected."""
+        self.assertEqual(extract_base_company_name("Netflix, Inc."), "Netflix")
+        self.assertEqual(extract_base_company_name("Smith & Associates LLC"), "Smith & Associates")
+        self.assertIsNone(extract_base_company_name("AB Ltd"))
+        self.assertIsNone(extract_base_company_name("Acme"))
+
+    def test_map_round_trip(self):
+        """The stored map restores the exact normalized source text."""
+        text = ('This Agreement is between Netflix, Inc. ("Streamer") and Acme Corp. '
+                'Netflix and the Streamer agree that ACME-\n CORP pays.')
+        result = deidentify_parties(text, self.parties)
+        deid_map = result['deidentification_map']
+
+        self.assertEqual(reidentify_text(result['text'], deid_map), normalize_text(text))
+        with self.assertRaises(ValueError):
+            reidentify_text(result['text'][5:], deid_map)
+
+    def test_memo_scrubbed_and_reidentified_with_map(self):
+        """A memo is scrubbed with the contract's variants and re-identified by token."""
+        contract = 'Netflix, Inc. ("Streamer") licenses content to Acme Corp.'
+        deid_map = deidentify_parties(contract, self.parties)['deidentification_map']
+
+        memo = deidentify_with_map("Streamer bills Acme Corp monthly.", deid_map)
+        self.assertEqual(memo['text'], "the Company bills the Customer monthly.")
+        self.assertEqual(memo['replacement_count'], {'vendor': 1, 'customer': 1})
+        self.assertEqual(reidentify_memo("The Company bills the Customer monthly.", deid_map),
+                         "Netflix, Inc. bills Acme Corp. monthly.")
+
+    def test_streaming_matches_single_pass(self):
+        """Chunked input produces the same text and map as the one-shot pass."""
+        text = ('Netflix, Inc. ("Streamer") shall provide the Services to Acme Corp. '
+                'Streamer may subcontract; Netf-\n lix pays ACME CORP. ') * 30
+        expected = deidentify_parties(text, self.parties)
+        rng = random.Random(7)
+
+        for _ in range(20):
+            cuts = sorted(rng.sample(range(1, len(text)), 15))
+            chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+            stream = StreamingDeidentifier(parties=self.parties)
+            output = ''.join(stream.feed(chunk) for chunk in chunks) + stream.close()
+
+            self.assertEqual(output, expected['text'])
+            self.assertEqual(reidentify_text(output, stream.deidentification_map), normalize_text(text))
+
+    def test_100_page_contract_single_pass(self):
+        """A ~100-page contract is scrubbed by one scan of one compiled pattern."""
+        page = ('Netflix, Inc. ("Streamer") shall provide the Services to Acme Corp. ("Buyer"). '
+                'Buyer shall pay all fees within thirty days and Streamer may subcontract. ') * 20
+        text = "\n".join(f"Page {i}\n{page}" for i in range(100))
+
+        with patch.object(DeidentificationEngine, 'scrub', autospec=True,
+                          side_effect=DeidentificationEngine.scrub) as scrub:
+            result = deidentify_parties(text, self.parties)
+
+        self.assertEqual(result['replacement_count'], {'vendor': 2000, 'customer': 2000})
+        self.assertNotIn('Streamer', result['text'])
+        # One scan over the whole text, with every variant of both parties in its pattern
+        self.assertEqual(scrub.call_count, 1)
+        engine, scanned, pos, limit = scrub.call_args.args[:4]
+        self.assertEqual((pos, limit), (0, len(scanned)))
+        self.assertEqual(engine.pattern.groups, len(engine.variants))
+        self.assertEqual({v[0] for v in engine.variants}, {0, 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
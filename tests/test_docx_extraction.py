@@ -0,0 +1,117 @@
+"""
+Tests for streaming DOCX extraction.
+The iterparse reader must produce exactly the python-docx text, including
+merged table cells, content controls, hyperlinks and breaks.
+"""
+
+import glob
+import io
+import os
+import unittest
+from unittest.mock import patch
+import docx
+from docx.enum.text import WD_BREAK
+from docx.oxml import parse_xml
+from shared.span_index import SpanIndex
+from utils.document_extractor import DocumentExtractor
+
+W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+FIXTURES = glob.glob(os.path.join(os.path.dirname(__file__), '..', 'attached_assets', '*.docx'))
+
+
+def make_docx():
+    """Build a document exercising the structures python-docx special-cases."""
+    document = docx.Document()
+    document.add_paragraph("Master Services Agreement\tEffective Date")
+    paragraph = document.add_paragraph("Line one")
+    run = paragraph.add_run()
+    run.add_break()
+    run.add_text("line two")
+    paragraph.add_run().add_break(WD_BREAK.PAGE)
+    paragraph.add_run("after the page break")
+    document.add_paragraph("")
+
+    table = document.add_table(rows=4, cols=4)
+    for i, row in enumerate(table.rows):
+        for j, cell in enumerate(row.cells):
+            cell.text = f"Fee {i}-{j}"
+    table.cell(0, 0).merge(table.cell(0, 1))  # Horizontal span
+    table.cell(1, 2).merge(table.cell(3, 2))  # Vertical span
+    table.cell(2, 0).merge(table.cell(3, 1))  # Block span
+    table.cell(1, 3).text = "Two\nparagraphs"
+    table.cell(3, 3).add_table(rows=1, cols=1).cell(0, 0).text = "Nested"
+
+    paragraph = document.add_paragraph("See ")
+    paragraph._p.append(parse_xml(f'<w:hyperlink {W_NS}><w:r><w:t>Schedule A</w:t></w:r></w:hyperlink>'))
+    document.element.body.insert(len(document.element.body) - 1, parse_xml(
+        f'<w:sdt {W_NS}><w:sdtContent><w:p><w:r><w:t>Non</w:t><w:noBreakHyphen/><w:t>refundable</w:t></w:r></w:p>'
+        f'<w:sdt><w:sdtContent><w:p><w:r><w:t>Inner control</w:t></w:r></w:p></w:sdtContent></w:sdt>'
+        f'</w:sdtContent></w:sdt>'))
+    for i in range(60):
+        document.add_paragraph(f"Clause {i}: the Customer shall pay all fees when due.")
+
+    upload = io.BytesIO()
+    document.save(upload)
+    return upload.getvalue()
+
+
+class TestDocxExtraction(unittest.TestCase):
+    """Test the streaming reader against the python-docx fallback."""
+
+    def setUp(self):
+        self.extractor = DocumentExtractor(use_cache=False)
+
+    def extract_both(self, docx_bytes):
+        streamed = self.extractor._extract_word_text(memoryview(docx_bytes))
+        with patch('utils.document_extractor.iter_docx_blocks', side_effect=ValueError("disabled")):
+            fallback = self.extractor._extract_word_text(memoryview(docx_bytes))
+        return streamed, fallback
+
+    def test_matches_python_docx(self):
+        """Merged cells, content controls, hyperlinks and breaks match python-docx."""
+        streamed, fallback = self.extract_both(make_docx())
+
+        self.assertEqual(streamed['extraction_method'], 'docx-stream')
+        self.assertEqual(fallback['extraction_method'], 'python-docx')
+        self.assertEqual(streamed['text'], fallback['text'])
+        self.assertEqual(streamed['span_index'], fallback['span_index'])
+        self.assertEqual(streamed['pages'], fallback['pages'])
+        self.assertIn("Fee 0-0\nFee 0-1 | Fee 0-0\nFee 0-1 | Fee 0-2", streamed['text'])
+        self.assertIn("Non-refundable", streamed['text'])
+
+    def test_matches_python_docx_on_fixtures(self):
+        """Sample contracts extract to identical text."""
+        for path in FIXTURES:
+            with self.subTest(path=os.path.basename(path)):
+                with open(path, 'rb') as f:
+                    streamed, fallback = self.extract_both(f.read())
+                self.assertEqual(streamed['text'], fallback['text'])
+                self.assertEqual(streamed['span_index'], fallback['span_index'])
+
+    def test_span_index_styles_rows_and_pages(self):
+        """Heading styles set the level, rows are typed and Word's rendered page breaks count."""
+        document = docx.Document()
+        document.add_heading("Fees", level=1)
+        document.add_paragraph("The Customer pays monthly.")
+        document.add_table(rows=1, cols=2).rows[0].cells[0].text = "Setup fee"
+        document.add_heading("Payment Terms", level=2)._p.r_lst[0].insert(
+            0, parse_xml(f'<w:lastRenderedPageBreak {W_NS}/>'))
+        upload = io.BytesIO()
+        document.save(upload)
+
+        result = self.extractor._extract_word_text(memoryview(upload.getvalue()))
+        index = SpanIndex.from_payload(result['span_index'])
+        self.assertEqual([index.block(i)['type'] for i in range(len(index))],
+                         ['heading', 'paragraph', 'table_row', 'heading'])
+        self.assertEqual(list(index.levels), [1, 0, 0, 2])
+        self.assertEqual(list(index.pages), [1, 1, 1, 2])
+        self.assertEqual(result['text'][index.starts[2]:index.ends[2]], "Setup fee")
+
+    def test_invalid_archive_falls_back(self):
+        """Unreadable documents go through python-docx and report its error."""
+        result = self.extractor._extract_word_text(memoryview(b"not a docx"))
+        self.assertEqual(result['extraction_method'], 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests for the extraction benchmark (benchmark_extraction.py).
+Covers corpus generation, a single in-process case and the regression checks;
+the full multi-process run is `python benchmark_extraction.py`.
+"""
+
+import tempfile
+import unittest
+from benchmark_extraction import build_corpus, run_case, check_results, compare_with_baseline
+
+
+def make_case(**overrides):
+    case = {'fixture': 'text_10p', 'backend': 'pymupdf', 'pages_per_second': 100.0, 'peak_rss_mb': 100.0,
+            'word_count': 5600, 'word_count_stable': True, 'quality_state': 'good', 'expected_state': 'good'}
+    case.update(overrides)
+    return case
+
+
+class TestExtractionBenchmark(unittest.TestCase):
+    """Test the benchmark corpus and report checks."""
+
+    def test_corpus_and_case(self):
+        """Generated fixtures extract to their expected word counts."""
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            fixtures = {f['name']: f for f in build_corpus(corpus_dir, quick=True)}
+            self.assertEqual(set(fixtures), {'text_1p', 'text_10p', 'text_50p', 'tables_300r',
+                                             'scanned_20p', 'garbled_5p'})
+
+            case = run_case(fixtures['text_10p'], 'pymupdf', repeats=1)
+            self.assertEqual(case['word_count_error_pct'], 0.0)
+            self.assertGreater(case['pages_per_second'], 0)
+
+            case = run_case(fixtures['scanned_20p'], 'pymupdf', repeats=1)
+            self.assertEqual(case['error'], 'scanned_pdf_detected')
+            self.assertEqual(case['quality_state'], 'blocked')
+
+            case = run_case(fixtures['tables_300r'], 'docx-stream', repeats=1)
+            self.assertEqual(case['word_count_error_pct'], 0.0)
+
+    def test_expectation_failures(self):
+        """Wrong quality states and backends disagreeing on word counts are reported."""
+        failures = check_results([make_case(), make_case(backend='pdfplumber', word_count=5590),
+                                  make_case(fixture='garbled_5p', quality_state='good', expected_state='blocked')])
+        self.assertEqual(len(failures), 2)
+        self.assertIn('garbled_5p/pymupdf: quality state good', failures[0])
+        self.assertIn('backends disagree', failures[1])
+
+    def test_baseline_regressions(self):
+        """Slower, larger or changed results against a baseline are regressions."""
+        baseline = {'results': [make_case()]}
+        self.assertEqual(compare_with_baseline([make_case(pages_per_second=80.0)], baseline), [])
+        regressions = compare_with_baseline(
+            [make_case(pages_per_second=50.0, peak_rss_mb=200.0, word_count=5000)], baseline)
+        self.assertEqual(len(regressions), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
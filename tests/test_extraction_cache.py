@@ -0,0 +1,68 @@
+"""
+Tests for the content-hash extraction cache.
+Covers disk LRU eviction and cache hits in DocumentExtractor.
+"""
+
+import io
+import os
+import time
+import tempfile
+import unittest
+from unittest.mock import patch
+from shared.extraction_cache import DiskExtractionCache, cache_key, content_hash
+from utils.document_extractor import DocumentExtractor, fitz
+
+
+class NamedBytes(io.BytesIO):
+    """Minimal stand-in for a Streamlit uploaded file."""
+    name = 'contract.pdf'
+
+
+class TestExtractionCache(unittest.TestCase):
+    """Test shared/extraction_cache.py."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_disk_lru_eviction(self):
+        """The least recently used entry is evicted once the size limit is exceeded."""
+        cache = DiskExtractionCache(self.tmp.name, max_bytes=10 ** 9)
+        for key in ('a', 'b'):
+            cache.set(key, {'text': os.urandom(2000).hex(), 'word_count': 1})
+        old = time.time() - 60
+        os.utime(cache._path('a'), (old, old))
+        os.utime(cache._path('b'), (old - 60, old - 60))
+        self.assertIsNotNone(cache.get('b'))  # Touch 'b' so 'a' is least recently used
+
+        cache.max_bytes = os.path.getsize(cache._path('b')) * 2 + 100
+        cache.set('c', {'text': os.urandom(2000).hex(), 'word_count': 1})
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+        self.assertEqual(cache.get('c')['word_count'], 1)
+
+    @unittest.skipIf(fitz is None, "PyMuPDF not installed")
+    def test_extractor_reuses_identical_bytes(self):
+        """A second upload of the same bytes is served from the cache."""
+        doc = fitz.open()
+        doc.new_page().insert_text((40, 60), "The Licensor grants the Licensee a license to the Software.")
+        pdf_bytes = doc.tobytes()
+        doc.close()
+
+        cache = DiskExtractionCache(self.tmp.name, max_bytes=10 ** 9)
+        with patch('utils.document_extractor.get_extraction_cache', return_value=cache):
+            first = DocumentExtractor().extract_text(NamedBytes(pdf_bytes))
+            with patch('utils.document_extractor._extract_pdf_pages') as extract_pages:
+                second = DocumentExtractor().extract_text(NamedBytes(pdf_bytes))
+                extract_pages.assert_not_called()
+
+        self.assertFalse(first['cache_hit'])
+        self.assertTrue(second['cache_hit'])
+        self.assertEqual(second['text'], first['text'])
+        self.assertEqual(second['content_hash'], content_hash(pdf_bytes))
+        self.assertIsNotNone(cache.get(cache_key(content_hash(pdf_bytes), 'pdf')))
+
+
+if __name__ == '__main__':
+    unittest.main()
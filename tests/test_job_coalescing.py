@@ -0,0 +1,114 @@
+"""
+Tests for in-flight job coalescing.
+Covers submission fingerprints, attaching to queued jobs, ignoring finished jobs,
+atomic claims by concurrent duplicates, and disabling coalescing.
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from fakeredis import FakeStrictRedis
+from rq import Queue, SimpleWorker
+from shared.job_coalescing import JobCoalescer, submission_fingerprint
+
+
+def noop(job_data):
+    return 'ok'
+
+
+class TestJobCoalescing(unittest.TestCase):
+    """Test shared/job_coalescing.py with fakeredis."""
+
+    def setUp(self):
+        self.redis_conn = FakeStrictRedis()
+        self.queue = Queue('analysis', connection=self.redis_conn)
+        self.coalescer = JobCoalescer(self.redis_conn)
+
+    def test_fingerprint_covers_submission(self):
+        """Identical submissions match; any input that changes the memo does not."""
+        base = submission_fingerprint(1, 'ASC 606', 'contract text', 'context')
+        self.assertEqual(base, submission_fingerprint(1, 'ASC 606', 'contract text', ' context '))
+        self.assertNotEqual(base, submission_fingerprint(2, 'ASC 606', 'contract text', 'context'))
+        self.assertNotEqual(base, submission_fingerprint(1, 'ASC 842', 'contract text', 'context'))
+        self.assertNotEqual(base, submission_fingerprint(1, 'ASC 606', 'contract text!', 'context'))
+        self.assertNotEqual(base, submission_fingerprint(1, 'ASC 606', 'contract text', 'other'))
+        self.assertNotEqual(base, submission_fingerprint(1, 'ASC 606', 'contract text', 'context', 'memo'))
+        # Field boundaries are unambiguous
+        self.assertNotEqual(submission_fingerprint(1, 'ASC 606', 'ab', 'c'),
+                            submission_fingerprint(1, 'ASC 606', 'a', 'bc'))
+        with patch('shared.job_coalescing.ANALYSIS_PIPELINE_VERSION', 99):
+            self.assertNotEqual(base, submission_fingerprint(1, 'ASC 606', 'contract text', 'context'))
+
+    def test_duplicate_attaches_while_job_is_queued(self):
+        """A registered queued job is found with its details and expires with the TTL."""
+        job = self.queue.enqueue(noop, {}, job_id='101')
+        fingerprint = submission_fingerprint(1, 'ASC 606', 'contract text')
+        self.coalescer.register(fingerprint, job.id, db_analysis_id=101, total_words=5000)
+
+        inflight = self.coalescer.find(fingerprint)
+        self.assertEqual(inflight['job_id'], '101')
+        self.assertEqual(inflight['db_analysis_id'], 101)
+        self.assertGreater(self.redis_conn.ttl('coalesce:' + fingerprint), 0)
+        self.assertIsNone(self.coalescer.find(submission_fingerprint(1, 'ASC 606', 'other text')))
+
+    def test_finished_job_does_not_attach(self):
+        """Once the job has finished, the same submission runs again."""
+        job = self.queue.enqueue(noop, {}, job_id='102')
+        fingerprint = submission_fingerprint(1, 'ASC 606', 'contract text')
+        self.coalescer.register(fingerprint, job.id, db_analysis_id=102)
+        SimpleWorker([self.queue], connection=self.redis_conn).work(burst=True)
+
+        self.assertIsNone(self.coalescer.find(fingerprint))
+        self.assertFalse(self.redis_conn.exists('coalesce:' + fingerprint))
+
+    def test_concurrent_duplicates_attach_to_one_claim(self):
+        """Of simultaneous identical submissions, one claims the fingerprint and the rest attach to its job."""
+        fingerprint = submission_fingerprint(1, 'ASC 606', 'contract text')
+        barrier = threading.Barrier(4)
+        results = []
+
+        def submit():
+            barrier.wait()
+            inflight = self.coalescer.claim(fingerprint)
+            if inflight is None:
+                time.sleep(0.3)  # Creating the analysis record
+                job = self.queue.enqueue(noop, {}, job_id='104')
+                self.coalescer.register(fingerprint, job.id, db_analysis_id=104)
+            results.append(inflight)
+
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(None), 1)
+        self.assertEqual([r['db_analysis_id'] for r in results if r], [104, 104, 104])
+
+    def test_released_claim_can_be_taken_again(self):
+        """A claimant that fails before submitting releases the fingerprint; a registered job is kept."""
+        fingerprint = submission_fingerprint(1, 'ASC 606', 'contract text')
+        self.assertIsNone(self.coalescer.claim(fingerprint))
+        self.assertEqual(self.coalescer.find(fingerprint), {'pending': True})
+        self.coalescer.release(fingerprint)
+        self.assertIsNone(self.coalescer.find(fingerprint))
+
+        self.assertIsNone(self.coalescer.claim(fingerprint))
+        job = self.queue.enqueue(noop, {}, job_id='105')
+        self.coalescer.register(fingerprint, job.id, db_analysis_id=105)
+        self.coalescer.release(fingerprint)
+        self.assertEqual(self.coalescer.claim(fingerprint)['job_id'], '105')
+
+    def test_disabled_with_zero_ttl(self):
+        """JOB_COALESCE_TTL=0 turns coalescing off."""
+        with patch.dict('os.environ', {'JOB_COALESCE_TTL': '0'}):
+            coalescer = JobCoalescer(self.redis_conn)
+        job = self.queue.enqueue(noop, {}, job_id='103')
+        fingerprint = submission_fingerprint(1, 'ASC 606', 'contract text')
+        coalescer.register(fingerprint, job.id, db_analysis_id=103)
+        self.assertIsNone(coalescer.find(fingerprint))
+
+
+if __name__ == '__main__':
+    unittest.main()
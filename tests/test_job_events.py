@@ -0,0 +1,90 @@
+"""
+Tests for pushed job events.
+Covers publishing and reading a job's event stream, resuming after an event ID,
+following until a terminal event, the SSE wire format, and the terminal events
+published by the scheduler's RQ callbacks.
+"""
+
+import json
+import unittest
+from fakeredis import FakeStrictRedis
+from rq import SimpleWorker
+from shared.job_events import publish_job_event, read_job_events, iter_job_events, format_sse, job_events_key
+from shared.job_scheduler import FairScheduler, WORKER_QUEUES
+
+
+def succeed(job_data):
+    return 'ok'
+
+
+def fail(job_data):
+    raise ValueError("contract text is empty")
+
+
+class TestJobEvents(unittest.TestCase):
+    """Test shared/job_events.py with fakeredis."""
+
+    def setUp(self):
+        self.redis_conn = FakeStrictRedis()
+
+    def test_publish_and_read(self):
+        """Events come back in order with their data, and reading resumes after an ID."""
+        publish_job_event(self.redis_conn, '42', 'progress', progress={'current_step': 1, 'total_steps': 5})
+        publish_job_event(self.redis_conn, '42', 'progress', progress={'current_step': 2, 'total_steps': 5})
+
+        events = read_job_events(self.redis_conn, '42')
+        self.assertEqual([e['event'] for e in events], ['progress', 'progress'])
+        self.assertEqual(events[1]['progress']['current_step'], 2)
+        self.assertGreater(self.redis_conn.ttl(job_events_key('42')), 0)
+
+        publish_job_event(self.redis_conn, '42', 'finished')
+        newer = read_job_events(self.redis_conn, '42', last_id=events[-1]['id'])
+        self.assertEqual([e['event'] for e in newer], ['finished'])
+
+    def test_publish_never_raises(self):
+        """A Redis failure while publishing is logged, not raised into the job."""
+        class BrokenRedis:
+            def pipeline(self):
+                raise ConnectionError("Redis is down")
+
+        with self.assertLogs('shared.job_events', level='WARNING'):
+            publish_job_event(BrokenRedis(), '42', 'progress')
+
+    def test_iter_stops_at_terminal_event(self):
+        """Following a job ends after its terminal event; later entries are not read."""
+        publish_job_event(self.redis_conn, '7', 'progress', progress={'current_step': 3})
+        publish_job_event(self.redis_conn, '7', 'failed', error='boom')
+        publish_job_event(self.redis_conn, '7', 'progress')
+
+        events = list(iter_job_events(self.redis_conn, '7', timeout=5, heartbeat=0.1))
+        self.assertEqual([e['event'] for e in events], ['progress', 'failed'])
+        self.assertEqual(events[-1]['error'], 'boom')
+
+    def test_format_sse(self):
+        """Events carry their stream ID for Last-Event-ID; None is a keep-alive comment."""
+        publish_job_event(self.redis_conn, '9', 'progress', progress={'current_step': 4})
+        event = read_job_events(self.redis_conn, '9')[0]
+
+        message = format_sse(event)
+        lines = message.strip().split('\n')
+        self.assertEqual(lines[0], f"id: {event['id']}")
+        self.assertEqual(lines[1], 'event: progress')
+        self.assertEqual(json.loads(lines[2][len('data: '):])['progress'], {'current_step': 4})
+        self.assertTrue(message.endswith('\n\n'))
+        self.assertEqual(format_sse(None), ": keep-alive\n\n")
+
+    def test_scheduler_callbacks_publish_terminal_events(self):
+        """Jobs submitted through the scheduler end their stream with finished or failed."""
+        scheduler = FairScheduler(self.redis_conn)
+        ok_job = scheduler.submit(succeed, {}, 'fast', 'org:1', total_words=100)
+        bad_job = scheduler.submit(fail, {}, 'fast', 'org:2', total_words=100)
+        SimpleWorker(WORKER_QUEUES, connection=self.redis_conn).work(burst=True)
+
+        self.assertEqual([e['event'] for e in read_job_events(self.redis_conn, ok_job.id)], ['finished'])
+        failed = read_job_events(self.redis_conn, bad_job.id)
+        self.assertEqual([e['event'] for e in failed], ['failed'])
+        self.assertIn('contract text is empty', failed[0]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
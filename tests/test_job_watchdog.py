@@ -0,0 +1,92 @@
+"""
+Tests for job heartbeats and the stuck-analysis reaper.
+Covers heartbeats while a job runs, requeueing a job whose worker died, failing it
+once requeues are used up (database, event, scheduler slot), and leaving live jobs alone.
+"""
+
+import sys
+import time
+import types
+import unittest
+from unittest import mock
+from fakeredis import FakeStrictRedis
+from rq.job import JobStatus
+from shared.job_events import read_job_events
+from shared.job_scheduler import FairScheduler
+from shared.job_watchdog import HEARTBEATS_KEY, INTERRUPTED_MESSAGE, JobHeartbeat, JobWatchdog
+
+
+def analyze(job_data):
+    return 'ok'
+
+
+class TestJobWatchdog(unittest.TestCase):
+    """Test shared/job_watchdog.py with fakeredis."""
+
+    def setUp(self):
+        self.redis_conn = FakeStrictRedis()
+        self.scheduler = FairScheduler(self.redis_conn)
+        self.watchdog = JobWatchdog(self.redis_conn)
+        self.watchdog.max_requeues = 1
+
+    def start_job(self, analysis_id=11):
+        """A dispatched job that a worker picked up and then died running"""
+        job = self.scheduler.submit(analyze, {'analysis_id': analysis_id, 'user_id': 5, 'user_token': 't'},
+                                    'standard', 'org:1', total_words=20000)
+        job.set_status(JobStatus.STARTED)
+        self.redis_conn.zadd(HEARTBEATS_KEY, {job.id: time.time() - 120})
+        return job
+
+    def test_heartbeat_while_running(self):
+        """A running job has a fresh heartbeat; it is cleared when the job ends."""
+        with JobHeartbeat(self.redis_conn, 'job-1', interval=0.01):
+            time.sleep(0.05)
+            self.assertGreater(self.watchdog.last_heartbeat('job-1'), time.time() - 1)
+            self.assertFalse(self.watchdog.check('job-1'))
+        self.assertIsNone(self.watchdog.last_heartbeat('job-1'))
+
+    def test_dead_job_requeued_first(self):
+        """A job whose heartbeat stopped goes back to the front of its queue."""
+        job = self.start_job()
+        self.assertEqual(self.watchdog.reap(), 1)
+
+        job.refresh()
+        self.assertEqual(job.get_status(), JobStatus.QUEUED)
+        self.assertEqual(job.meta['watchdog_requeues'], 1)
+        self.assertEqual(self.scheduler._active_leases('org:1'), 1)
+        self.assertEqual([e['event'] for e in read_job_events(self.redis_conn, job.id)], ['requeued'])
+
+    def test_dead_job_failed_after_requeues(self):
+        """Once requeues are used up the analysis is failed and the tenant's slot freed."""
+        job = self.start_job()
+        job.meta['watchdog_requeues'] = 1
+        job.save_meta()
+
+        saved = []
+        fake_worker = types.ModuleType('workers.analysis_worker')
+        fake_worker.save_job_failure = lambda job_data, error: saved.append((job_data['analysis_id'], error))
+        with mock.patch.dict(sys.modules, {'workers.analysis_worker': fake_worker}):
+            self.assertTrue(self.watchdog.check(job.id))
+
+        job.refresh()
+        self.assertEqual(job.get_status(), JobStatus.FAILED)
+        self.assertEqual(saved, [(11, INTERRUPTED_MESSAGE)])
+        self.assertEqual(self.scheduler._active_leases('org:1'), 0)
+        events = read_job_events(self.redis_conn, job.id)
+        self.assertEqual(events[-1]['event'], 'failed')
+        self.assertEqual(events[-1]['error'], INTERRUPTED_MESSAGE)
+
+    def test_mark_process_dead(self):
+        """Jobs of a process known to be dead are reaped without waiting for the timeout."""
+        job = self.start_job()
+        self.redis_conn.zadd(HEARTBEATS_KEY, {job.id: time.time()})
+        self.redis_conn.hset('watchdog:owners', job.id, 4242)
+        self.assertFalse(self.watchdog.check(job.id))
+
+        self.watchdog.mark_process_dead(4242)
+        self.assertTrue(self.watchdog.check(job.id))
+        self.assertFalse(self.watchdog.check(job.id))  # Already reaped
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Tests for hedged LLM requests.
+Covers hedging a slow or empty primary call, the hedge budget (local and shared
+through Redis), and error propagation, using fake send functions.
+"""
+
+import time
+import unittest
+from fakeredis import FakeStrictRedis
+from shared.llm_request import HedgeBudget, HedgedRequester, HedgePolicy, LatencyTracker
+
+
+def policy(**overrides):
+    settings = dict(enabled=True, percentile=0.95, min_samples=1000, default_delay=5.0, min_delay=0.0,
+                    max_delay=600.0, budget_ratio=1.0, cancel_losers=True,
+                    fallback_models={'primary': 'fallback'}, request_types=set())
+    settings.update(overrides)
+    return HedgePolicy(**settings)
+
+
+def requester(budget=None, **overrides):
+    return HedgedRequester(policy=policy(**overrides), tracker=LatencyTracker(window=50), budget=budget or HedgeBudget())
+
+
+class TestHedgedRequester(unittest.TestCase):
+    """Test shared/llm_request.py."""
+
+    def test_slow_primary_triggers_hedge(self):
+        """A primary call past the hedge delay is raced by the fallback model, which wins."""
+        def send(model):
+            if model == 'primary':
+                time.sleep(1)
+                return 'slow answer'
+            return 'fast answer'
+
+        hedger = requester(default_delay=0.05)
+        start = time.time()
+        result, model = hedger.request(send, 'primary', 'step_analysis')
+
+        self.assertEqual((result, model), ('fast answer', 'fallback'))
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual(hedger.get_stats()['hedge_wins'], 1)
+
+    def test_empty_primary_triggers_hedge(self):
+        """A response the accept predicate rejects sends the hedge without waiting for the delay."""
+        def send(model):
+            return 'short' if model == 'primary' else 'a long enough answer'
+
+        hedger = requester(default_delay=30)
+        result, model = hedger.request(send, 'primary', 'step_analysis', accept=lambda text: len(text) > 10)
+
+        self.assertEqual((result, model), ('a long enough answer', 'fallback'))
+        self.assertEqual(hedger.get_stats()['empty_primary'], 1)
+
+    def test_unaccepted_responses_return_non_empty_one(self):
+        """If neither response is accepted, a non-empty one is returned for the caller to handle."""
+        def send(model):
+            return 'no conclusion' if model == 'primary' else ''
+
+        result, model = requester().request(send, 'primary', 'step_analysis', accept=lambda text: False)
+        self.assertEqual((result, model), ('no conclusion', 'primary'))
+
+    def test_budget_limits_hedging(self):
+        """Once the recent hedge ratio reaches the budget, empty responses are returned unhedged."""
+        calls = []
+
+        def send(model):
+            calls.append(model)
+            return '' if model == 'primary' else 'answer'
+
+        hedger = requester(budget_ratio=0.5)
+        self.assertEqual(hedger.request(send, 'primary')[0], 'answer')
+        self.assertEqual(hedger.request(send, 'primary')[0], '')
+        self.assertEqual(calls, ['primary', 'fallback', 'primary'])
+        self.assertEqual(hedger.get_stats()['budget_denied'], 1)
+
+    def test_budget_shared_through_redis(self):
+        """Requesters in different processes draw on one budget kept in Redis."""
+        redis_conn = FakeStrictRedis()
+        first = requester(budget=HedgeBudget(redis_conn=redis_conn), budget_ratio=0.5)
+        second = requester(budget=HedgeBudget(redis_conn=redis_conn), budget_ratio=0.5)
+
+        def send(model):
+            return '' if model == 'primary' else 'answer'
+
+        self.assertEqual(first.request(send, 'primary')[0], 'answer')
+        self.assertEqual(second.request(send, 'primary')[0], '')
+        self.assertEqual(redis_conn.lrange(HedgeBudget.KEY, 0, -1), [b'0', b'1'])
+
+    def test_errors_propagate(self):
+        """A failing primary raises; a failed hedge leaves the primary's result, or its error if it failed too."""
+        def failing(model):
+            raise RuntimeError(f"{model} failed")
+
+        with self.assertRaisesRegex(RuntimeError, 'primary failed'):
+            requester().request(failing, 'primary', 'step_analysis')
+
+        def slow_primary_failing_hedge(model):
+            if model == 'primary':
+                time.sleep(0.2)
+                return 'primary answer'
+            raise RuntimeError("fallback failed")
+
+        result = requester(default_delay=0.05).request(slow_primary_failing_hedge, 'primary', 'step_analysis')
+        self.assertEqual(result, ('primary answer', 'primary'))
+
+        def both_failing(model):
+            if model == 'primary':
+                time.sleep(0.2)
+            raise RuntimeError(f"{model} failed")
+
+        with self.assertRaises(RuntimeError):
+            requester(default_delay=0.05).request(both_failing, 'primary', 'step_analysis')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests for rule-based contract party detection.
+Covers preamble roles, Party A/B terms, labeled fields, generic roles and the LLM
+fallback threshold.
+"""
+
+import unittest
+from shared.party_detection import (
+    extract_parties_rule_based, detect_parties, get_detection_stats, has_legal_suffix
+)
+
+
+class TestPartyDetection(unittest.TestCase):
+    """Test shared/party_detection.py."""
+
+    def test_preamble_with_roles(self):
+        """Defined roles map parties to the right side regardless of order."""
+        text = ('This Lease is made between Tiny Startup, Inc. (hereinafter referred to as "Tenant") '
+                'and Big Towers LLC, a Delaware limited liability company (the "Landlord").')
+        result = extract_parties_rule_based(text, 'ASC 842')
+        self.assertEqual(result['first'], 'Big Towers LLC')
+        self.assertEqual(result['second'], 'Tiny Startup, Inc.')
+        self.assertEqual(result['method'], 'preamble')
+
+    def test_party_a_b_and_labeled_fields(self):
+        """Neutral Party A/B terms and 'Role: Name' labels are recognized."""
+        result = extract_parties_rule_based(
+            'Agreement between Alpha Systems Ltd ("Party A") and Beta Widgets LLC ("Party B").', 'ASC 606')
+        self.assertEqual((result['first'], result['second']), ('Alpha Systems Ltd', 'Beta Widgets LLC'))
+
+        result = extract_parties_rule_based('SOW\nCustomer: Orion Holdings LLC\nVendor: Stellar Inc.\n', 'ASC 606')
+        self.assertEqual((result['first'], result['second']), ('Stellar Inc.', 'Orion Holdings LLC'))
+
+    def test_low_confidence_falls_back_to_llm(self):
+        """Unlabeled preambles are below the threshold and counted as LLM fallbacks."""
+        before = get_detection_stats()
+        self.assertIsNone(detect_parties('This agreement is between Alpha Ltd and Beta LLC.', 'ASC 606'))
+        self.assertIsNotNone(detect_parties(
+            'By and between TechCo, Inc. (the "Employer") and Jane Q. Smith (the "Participant").', 'ASC 718'))
+
+        after = get_detection_stats()
+        self.assertEqual(after['llm_fallback'] - before['llm_fallback'], 1)
+        self.assertEqual(after['fast_path'] - before['fast_path'], 1)
+
+    def test_generic_roles_fall_back_to_llm(self):
+        """'the Company' may name either side, so it never skips the LLM on its own."""
+        text = 'Agreement between Orion Holdings LLC (the "Company") and Stellar Inc. (the "Customer").'
+        result = extract_parties_rule_based(text, 'ASC 606')
+        self.assertEqual(result['method'], 'generic_role')
+        self.assertIsNone(detect_parties(text, 'ASC 606'))
+        self.assertIsNone(detect_parties(
+            'By and between TechCo, Inc. (the "Company") and Jane Q. Smith (the "Participant").', 'ASC 718'))
+        self.assertIsNone(detect_parties('BUYER:\nAcquireCo LLC\nCOMPANY:\nTarget Corp.\n', 'ASC 805'))
+
+        # A selling shareholder is not the acquired company
+        result = extract_parties_rule_based(
+            'Purchase agreement among AcquireCo LLC (the "Buyer") and Jane Q. Smith (the "Seller").', 'ASC 805')
+        self.assertIsNone(result['second'])
+
+    def test_legal_suffix(self):
+        """Entities are told apart from individuals."""
+        self.assertTrue(has_legal_suffix('Orion Holdings LLC'))
+        self.assertFalse(has_legal_suffix('Jane Q. Smith'))
+
+
+if __name__ == '__main__':
+    unittest.main()
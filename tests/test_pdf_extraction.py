@@ -0,0 +1,196 @@
+"""
+Tests for page-level PDF extraction.
+Covers PyMuPDF-first extraction, per-page method/timing details, the
+process-pool parallel mode, single-buffer ingestion memory, early
+scanned-PDF rejection, the optional OCR stage and the span index.
+"""
+
+import io
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+import docx
+from shared.span_index import SpanIndex
+from utils.document_extractor import DocumentExtractor, _extract_pdf_pages, fitz
+
+
+def make_pdf(page_lines):
+    """Build a PDF with one page per entry (None = blank page)."""
+    doc = fitz.open()
+    for lines in page_lines:
+        page = doc.new_page()
+        for i, line in enumerate(lines or []):
+            page.insert_text((40, 60 + i * 18), line)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+def make_scanned_pdf(page_count):
+    """Build an image-only PDF, like a scan without OCR."""
+    doc = fitz.open()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 200), 0)
+    pixmap.clear_with(200)
+    for _ in range(page_count):
+        doc.new_page().insert_image(fitz.Rect(40, 40, 540, 740), pixmap=pixmap)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+class NamedBytes(io.BytesIO):
+    """Minimal stand-in for a Streamlit uploaded file."""
+    name = 'contract.pdf'
+
+
+@unittest.skipIf(fitz is None, "PyMuPDF not installed")
+class TestPdfExtraction(unittest.TestCase):
+    """Test _extract_pdf_pages and the PDF path of DocumentExtractor."""
+
+    def setUp(self):
+        line = "The Licensor shall provide the Services to the Licensee under Schedule A."
+        self.pdf_bytes = make_pdf([[line] * 30, None, [line] * 30])
+
+    def test_page_details(self):
+        """Each page records its method, timing and size."""
+        result = _extract_pdf_pages(self.pdf_bytes)
+        self.assertEqual(result['page_count'], 3)
+        self.assertEqual([d['method'] for d in result['page_details']], ['pymupdf', 'none', 'pymupdf'])
+        self.assertTrue(all(d['seconds'] >= 0 for d in result['page_details']))
+        self.assertIn('Licensor', result['page_texts'][0])
+
+    def test_page_range(self):
+        """A page range extracts only those pages, keeping absolute page numbers."""
+        result = _extract_pdf_pages(self.pdf_bytes, 2, 3)
+        self.assertEqual([d['page'] for d in result['page_details']], [3])
+
+    def test_extract_text_uses_pymupdf(self):
+        """The full extractor reports PyMuPDF as the method."""
+        result = DocumentExtractor(use_cache=False).extract_text(NamedBytes(self.pdf_bytes))
+        self.assertEqual(result['extraction_method'], 'pymupdf')
+        self.assertEqual(result['pages'], 3)
+        self.assertEqual(len(result['page_details']), 3)
+
+    def test_parallel_matches_sequential(self):
+        """Page ranges extracted in the process pool merge back in page order."""
+        pdf_bytes = make_pdf([[f"Page {i} of the Master Services Agreement between the parties."] * 5
+                              for i in range(12)])
+        sequential = DocumentExtractor(pdf_workers=1, use_cache=False).extract_text(NamedBytes(pdf_bytes))
+        parallel = DocumentExtractor(pdf_workers=2, parallel_min_pages=2, use_cache=False).extract_text(NamedBytes(pdf_bytes))
+
+        self.assertEqual(parallel['text'], sequential['text'])
+        self.assertEqual([d['page'] for d in parallel['page_details']], list(range(1, 13)))
+        self.assertEqual(parallel['quality_state'], sequential['quality_state'])
+
+    def test_ingestion_peak_memory(self):
+        """Uploads are parsed from one buffer - no Python-side copies of the file."""
+        doc = fitz.open()
+        doc.new_page().insert_text((40, 60), "The Licensor grants the Licensee a license to the Software.")
+        doc.embfile_add("exhibit", os.urandom(10 * 1024 * 1024))  # Large, text-free payload
+        pdf_bytes = doc.tobytes()
+        doc.close()
+
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+            tmp.write(pdf_bytes)
+            tmp.flush()
+            for upload in (NamedBytes(pdf_bytes), open(tmp.name, 'rb')):
+                with upload:
+                    tracemalloc.start()
+                    try:
+                        result = DocumentExtractor(use_cache=False).extract_text(upload)
+                        peak = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+                self.assertEqual(result['extraction_method'], 'pymupdf')
+                self.assertLess(peak, len(pdf_bytes) // 10)
+
+    def test_docx_from_buffer(self):
+        """Word documents are parsed from the shared buffer as well."""
+        document = docx.Document()
+        document.add_paragraph("The Customer shall pay the fees within thirty days.")
+        upload = NamedBytes()
+        document.save(upload)
+        upload.name = 'contract.docx'
+
+        result = DocumentExtractor(use_cache=False).extract_text(upload)
+        self.assertEqual(result['extraction_method'], 'docx-stream')
+        self.assertEqual(result['word_count'], 9)
+
+    def test_scanned_pdf_rejected_early(self):
+        """Image-only pages stop extraction after the first few pages."""
+        pdf_bytes = make_scanned_pdf(200)
+        for extractor in (DocumentExtractor(pdf_workers=1, use_cache=False),
+                          DocumentExtractor(pdf_workers=2, parallel_min_pages=2, use_cache=False)):
+            result = extractor.extract_text(NamedBytes(pdf_bytes))
+
+            self.assertEqual(result['error'], 'scanned_pdf_detected')
+            self.assertEqual(result['pages'], 200)
+            self.assertEqual(len(result['page_details']), 3)
+            self.assertIn('No text layer', result['detection_reasons'][0])
+
+    def test_leading_blank_pages_not_rejected(self):
+        """Blank cover pages without images do not trigger the early decision."""
+        line = "The Licensor shall provide the Services to the Licensee under Schedule A."
+        result = DocumentExtractor(use_cache=False).extract_text(
+            NamedBytes(make_pdf([None, None, None, [line] * 30, [line] * 30])))
+        self.assertIsNone(result['error'])
+        self.assertEqual(len(result['page_details']), 5)
+
+    def test_span_index_pages_and_headings(self):
+        """Blocks keep their page, headings their clause depth, offsets point into the cleaned text."""
+        line = "The Licensor shall provide the Services to the Licensee under Schedule A."
+        pdf_bytes = make_pdf([["ARTICLE I", "1.1 Services"] + [line] * 10, None, ["12.3 Payment Terms", line]])
+        extractor = DocumentExtractor(use_cache=False)
+        result = extractor.extract_text(NamedBytes(pdf_bytes))
+        index = SpanIndex.from_payload(result['span_index'])
+        text = result['text']
+
+        raw_pages = [t for t in _extract_pdf_pages(pdf_bytes)['page_texts'] if t]
+        self.assertEqual(text, extractor._clean_text("\n\n".join(raw_pages)))
+        headings = [(text[index.starts[i]:index.ends[i]], index.pages[i], index.levels[i])
+                    for i in range(len(index)) if index.block(i)['type'] == 'heading']
+        self.assertEqual(headings, [("ARTICLE I", 1, 1), ("1.1 Services", 1, 2), ("12.3 Payment Terms", 3, 2)])
+        self.assertEqual(index.cite(text, text.rindex("Licensor")),
+                         {'page': 3, 'heading': "12.3 Payment Terms", 'clause': '12.3'})
+
+    def fake_ocr(self, pdf_bytes, page_indexes, dpi, language):
+        text = "The Licensor shall provide the Services to the Licensee under Schedule A. " * 12
+        return [(page_index, text, 0.01) for page_index in page_indexes]
+
+    def test_ocr_fills_pages_without_text(self):
+        """With OCR enabled, image-only pages are OCR'd and pass the quality checks."""
+        line = "The Licensor shall provide the Services to the Licensee under Schedule A."
+        doc = fitz.open(stream=make_scanned_pdf(3), filetype="pdf")
+        doc.insert_pdf(fitz.open(stream=make_pdf([[line] * 30]), filetype="pdf"))
+        pdf_bytes = doc.tobytes()
+        doc.close()
+
+        with patch('utils.document_extractor.ocr_available', return_value=True), \
+                patch('utils.document_extractor._ocr_pdf_pages', side_effect=self.fake_ocr) as ocr:
+            result = DocumentExtractor(pdf_workers=1, use_cache=False, ocr_enabled=True).extract_text(
+                NamedBytes(pdf_bytes))
+
+        self.assertEqual(ocr.call_args[0][1], [0, 1, 2])
+        self.assertIsNone(result['error'])
+        self.assertEqual([d['method'] for d in result['page_details']], ['ocr', 'ocr', 'ocr', 'pymupdf'])
+        self.assertEqual(result['extraction_method'], 'ocr+pymupdf')
+        self.assertEqual(result['ocr']['pages'], 3)
+        self.assertIn('pages_per_second', result['ocr'])
+
+    def test_ocr_page_budget(self):
+        """Documents needing more OCR pages than the budget are rejected without OCR."""
+        with patch.dict(os.environ, {'OCR_MAX_PAGES': '5'}), \
+                patch('utils.document_extractor.ocr_available', return_value=True), \
+                patch('utils.document_extractor._ocr_pdf_pages', side_effect=self.fake_ocr) as ocr:
+            result = DocumentExtractor(pdf_workers=1, use_cache=False, ocr_enabled=True).extract_text(
+                NamedBytes(make_scanned_pdf(8)))
+
+        ocr.assert_not_called()
+        self.assertEqual(result['error'], 'scanned_pdf_detected')
+        self.assertIn('8 pages need OCR', result['detection_reasons'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
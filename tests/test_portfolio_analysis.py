@@ -0,0 +1,142 @@
+"""
+Tests for portfolio analysis.
+Covers the shared retrieval cache under concurrent identical queries, isolation of a
+failing contract, and the roll-up summary, with fake analyzer, knowledge and memo
+components.
+"""
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from shared.portfolio_analysis import CachedKnowledgeBase, PortfolioAnalysisRunner
+
+
+class FakeKnowledgeBase:
+    """Counts embeddings and searches; slow enough for concurrent callers to overlap"""
+
+    def __init__(self):
+        self.embedded = []
+        self.searched = []
+        self.collection_name = 'asc842'
+
+    def search(self, query, max_results=10):
+        self.embedded.append(query)
+        time.sleep(0.05)
+        self.searched.append(query)
+        return f"guidance for {query}"
+
+
+class FakeKnowledgeSearch:
+    def __init__(self):
+        self.knowledge_base = FakeKnowledgeBase()
+
+    def search_for_step(self, step_num, contract_text):
+        # Step queries don't depend on the contract, so every contract shares them
+        return self.knowledge_base.search(f"step {step_num} guidance")
+
+
+class FakeAnalyzer:
+    def _analyze_step_with_retry(self, step_num, contract_text, **kwargs):
+        if 'corrupt' in contract_text and step_num == 3:
+            raise RuntimeError("model refused the document")
+        return {'title': f"Step {step_num}", 'markdown_content': f"{contract_text} step {step_num}"}
+
+    def _extract_conclusions_from_steps(self, steps):
+        return ''
+
+    def generate_executive_summary(self, conclusions_text, party_name):
+        return f"Summary for {party_name}"
+
+    def generate_background_section(self, conclusions_text, party_name):
+        return ''
+
+    def generate_final_conclusion(self, steps):
+        return ''
+
+
+class FakeMemo:
+    def combine_clean_steps(self, analysis_results, analysis_id=None):
+        return f"memo {analysis_id}"
+
+
+def lease(analysis_id, text='lease'):
+    return {'analysis_id': analysis_id, 'combined_text': text, 'uploaded_filenames': [f'lease-{analysis_id}.pdf']}
+
+
+class TestPortfolioAnalysis(unittest.TestCase):
+    """Test shared/portfolio_analysis.py."""
+
+    def test_concurrent_identical_queries_search_once(self):
+        """Callers racing on one query wait for the first search instead of repeating it."""
+        knowledge_base = FakeKnowledgeBase()
+        cache = CachedKnowledgeBase(knowledge_base)
+        barrier = threading.Barrier(8)
+
+        def search(_):
+            barrier.wait()
+            return cache.search('operating lease classification', max_results=5)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(search, range(8)))
+
+        self.assertEqual(set(results), {'guidance for operating lease classification'})
+        self.assertEqual(knowledge_base.embedded, ['operating lease classification'])
+        self.assertEqual(knowledge_base.searched, ['operating lease classification'])
+        self.assertEqual(cache.get_stats(), {'hits': 7, 'misses': 1, 'unique_queries': 1})
+        self.assertEqual(cache.collection_name, 'asc842')  # Other attributes pass through
+
+    def test_failed_search_is_not_cached(self):
+        """A failing search raises to its callers and is retried by the next one."""
+        class FlakyKnowledgeBase(FakeKnowledgeBase):
+            def search(self, query, max_results=10):
+                if not self.embedded:
+                    self.embedded.append(query)
+                    raise ConnectionError("chroma unavailable")
+                return super().search(query, max_results)
+
+        cache = CachedKnowledgeBase(FlakyKnowledgeBase())
+        with self.assertRaises(ConnectionError):
+            cache.search('query')
+        self.assertEqual(cache.search('query'), 'guidance for query')
+
+    def test_failing_contract_does_not_fail_others(self):
+        """One contract's failure is reported on it alone; the rest share the retrieval cache."""
+        knowledge_search = FakeKnowledgeSearch()
+        progress = {}
+        runner = PortfolioAnalysisRunner('ASC 842', analyzer=FakeAnalyzer(), knowledge_search=knowledge_search,
+                                         memo_generator_class=FakeMemo, max_concurrency=3,
+                                         progress_callback=lambda analysis_id, p: progress.__setitem__(analysis_id, p))
+        portfolio = runner.run([lease(1), lease(2, 'corrupt lease'), lease(3)])
+        results = portfolio['results']
+
+        self.assertEqual(list(results), [1, 2, 3])
+        self.assertTrue(results[1]['success'] and results[3]['success'])
+        self.assertEqual(results[1]['memo_content'], 'memo 1')
+        self.assertFalse(results[2]['success'])
+        self.assertIn('model refused the document', results[2]['error'])
+        self.assertEqual({analysis_id: p['status'] for analysis_id, p in progress.items()},
+                         {1: 'completed', 2: 'failed', 3: 'completed'})
+
+        # Five step queries across three contracts: each searched once
+        self.assertEqual(sorted(set(knowledge_search.knowledge_base.searched)), [f"step {n} guidance" for n in range(1, 6)])
+        self.assertEqual(len(knowledge_search.knowledge_base.searched), 5)
+
+    def test_rollup_covers_every_contract(self):
+        """The roll-up lists every contract with its status and summarizes the completed ones."""
+        runner = PortfolioAnalysisRunner('ASC 842', analyzer=FakeAnalyzer(), knowledge_search=FakeKnowledgeSearch(),
+                                         memo_generator_class=FakeMemo, max_concurrency=2)
+        portfolio = runner.run([lease(1), lease(2, 'corrupt lease'), lease(3), lease(4)])
+        rollup = portfolio['rollup_summary']
+
+        self.assertIn('**Contracts analyzed:** 3 of 4', rollup)
+        for analysis_id in (1, 3, 4):
+            self.assertIn(f"| lease-{analysis_id}.pdf | Completed |", rollup)
+            self.assertIn(f"## lease-{analysis_id}.pdf", rollup)
+        self.assertIn("| lease-2.pdf | Failed: ", rollup)
+        self.assertNotIn("## lease-2.pdf", rollup)
+        self.assertEqual(rollup.count('Summary for the Entity'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
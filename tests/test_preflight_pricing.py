@@ -0,0 +1,92 @@
+"""
+Tests for concurrent preflight extraction.
+Files finish out of order on the preflight pool; results, error messages and the
+scanned-PDF message must still come back in upload order, and each file is reported
+to the progress callback as it finishes. File details carry their text even when an
+extraction cache is configured.
+"""
+
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from shared.preflight_pricing import PreflightPricing
+from utils.document_extractor import DocumentExtractor
+
+
+def upload(name):
+    file = io.BytesIO(b'%PDF-1.4')
+    file.name = name
+    return file
+
+
+class FakeExtractor(DocumentExtractor):
+    """Finishes files after a per-file delay; the real scanned-PDF message is kept"""
+
+    DELAYS = {'long.pdf': 0.3, 'short.pdf': 0.0, 'broken.pdf': 0.1, 'scan.pdf': 0.2}
+
+    def extract_text(self, uploaded_file):
+        time.sleep(self.DELAYS.get(uploaded_file.name, 0))
+        if uploaded_file.name == 'broken.pdf':
+            raise ValueError("corrupt xref table")
+        if uploaded_file.name == 'scan.pdf':
+            return {'error': 'scanned_pdf_detected', 'detection_reasons': ['No text layer on the first 3 pages']}
+        words = 300 if uploaded_file.name == 'long.pdf' else 20
+        return {'text': 'word ' * words, 'word_count': words, 'extraction_method': 'pymupdf',
+                'content_hash': f"hash-{uploaded_file.name}"}
+
+
+class TestPreflightPricing(unittest.TestCase):
+    """Test shared/preflight_pricing.py."""
+
+    def setUp(self):
+        self.pricing = PreflightPricing()
+        self.pricing.document_extractor = FakeExtractor()
+        patcher = mock.patch.dict(os.environ, {'PREFLIGHT_MAX_WORKERS': '4', 'EXTRACTION_CACHE_BACKEND': 'none'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_out_of_order_files_assembled_in_upload_order(self):
+        """Callbacks follow completion order; details and errors follow upload order."""
+        finished = []
+        files = [upload(name) for name in ('long.pdf', 'broken.pdf', 'scan.pdf', 'short.pdf')]
+        file_details, errors = self.pricing.extract_files(
+            files, progress_callback=lambda number, name, outcome: finished.append((number, name, sorted(outcome))))
+
+        self.assertEqual(finished, [(4, 'short.pdf', ['file_detail']), (2, 'broken.pdf', ['error']),
+                                    (3, 'scan.pdf', ['error']), (1, 'long.pdf', ['file_detail'])])
+
+        self.assertEqual([(d['file_number'], d['filename'], d['word_count']) for d in file_details],
+                         [(1, 'long.pdf', 300), (4, 'short.pdf', 20)])
+        self.assertEqual(file_details[0]['text_content'], 'word ' * 300)
+
+        broken, scanned = errors
+        self.assertEqual(broken, "File 2 (broken.pdf): Failed to process - corrupt xref table")
+        self.assertTrue(scanned.startswith('🔍 **Scanned/Image-Based PDF Detected: "scan.pdf"**'))
+
+    def test_text_kept_with_cache_configured(self):
+        """The text stays in the file detail, so an evicted cache entry cannot lose it."""
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.dict(os.environ, {'EXTRACTION_CACHE_BACKEND': 'disk', 'EXTRACTION_CACHE_DIR': cache_dir}):
+            file_details, _ = self.pricing.extract_files([upload('short.pdf')])
+        self.assertEqual(file_details[0]['text_content'], 'word ' * 20)
+
+    def test_single_scanned_pdf_uses_scanned_message(self):
+        """A lone scanned PDF returns the dedicated error with its filename-aware message."""
+        result = self.pricing.process_files_for_pricing([upload('scan.pdf')])
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], 'scanned_pdf_detected')
+        self.assertIn('"scan.pdf"', result['user_message'])
+
+    def test_all_failed_lists_every_error(self):
+        """With no extractable text, every file's error is reported, in upload order."""
+        result = self.pricing.process_files_for_pricing([upload('scan.pdf'), upload('broken.pdf')])
+        self.assertFalse(result['success'])
+        self.assertTrue(result['error'].startswith('No text could be extracted from any files.'))
+        self.assertLess(result['error'].index('scan.pdf'), result['error'].index('File 2 (broken.pdf)'))
+
+
+if __name__ == '__main__':
+    unittest.main()
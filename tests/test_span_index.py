@@ -0,0 +1,76 @@
+"""
+Tests for the array-backed span index.
+Covers heading detection, offsets matching cleaned text, payload round trips,
+section/chunk boundaries, citations and combining multi-file indexes.
+"""
+
+import json
+import unittest
+from shared.span_index import (
+    SpanIndex, build_span_index, iter_page_blocks, heading_level, HEADING
+)
+
+LINE = "The Customer shall pay all fees within thirty days of the invoice date."
+
+
+def build_contract():
+    pages = [
+        "ARTICLE I\nDEFINITIONS\n" + "\n".join([LINE] * 4) + "\nEnd of clause.",
+        "12.3 Payment Terms\n" + "\n".join([LINE] * 3) + "\n\n12.4 Late Fees\n" + LINE,
+    ]
+    return build_span_index(block for page, text in enumerate(pages, 1) for block in iter_page_blocks(text, page))
+
+
+class TestSpanIndex(unittest.TestCase):
+    """Test shared/span_index.py."""
+
+    def test_heading_level(self):
+        """Numbering depth and shape decide the level; sentences are not headings."""
+        self.assertEqual(heading_level("ARTICLE IV"), 1)
+        self.assertEqual(heading_level("Section 12.3"), 2)
+        self.assertEqual(heading_level("12.3.1 Late Fees."), 3)
+        self.assertEqual(heading_level("PAYMENT TERMS"), 1)
+        self.assertEqual(heading_level("12.3 The Customer shall pay all fees."), 0)
+        self.assertEqual(heading_level(LINE), 0)
+
+    def test_offsets_match_cleaned_text(self):
+        """Block offsets slice the exact cleaned text, which matches _clean_text."""
+        text, index = build_contract()
+        self.assertNotIn("\n\n", text)
+        self.assertEqual(text[index.starts[0]:index.ends[0]], "ARTICLE I")
+        self.assertEqual(index.ends[-1], len(text))
+        self.assertEqual([index.kinds[i] == HEADING for i in range(len(index))],
+                         [True, True, False, True, False, True, False])
+
+    def test_payload_round_trip(self):
+        """The payload is small, JSON-safe and restores the same arrays."""
+        _, index = build_contract()
+        payload = json.loads(json.dumps(index.to_payload()))
+        restored = SpanIndex.from_payload(payload)
+        self.assertEqual(restored.to_payload(), index.to_payload())
+        self.assertEqual(restored.block(3), index.block(3))
+
+        payload['count'] += 1
+        with self.assertRaises(ValueError):
+            SpanIndex.from_payload(payload)
+
+    def test_sections_chunks_and_cite(self):
+        """Sections split at top-level headings, chunks cut at block boundaries."""
+        text, index = build_contract()
+        sections = index.sections(max_level=1)
+        self.assertEqual(len(sections), 2)  # ARTICLE I, DEFINITIONS (12.3 is level 2)
+        self.assertEqual(sections[-1][1], len(text))
+
+        chunks = index.chunks(len(text) // 2)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(text))
+        for start, end in chunks:
+            self.assertIsNotNone(index.locate(start))
+        self.assertTrue(any(text[start:].startswith("12.3") for start, _ in chunks))
+
+        self.assertEqual(index.cite(text, text.rindex("thirty")),
+                         {'page': 2, 'heading': "12.4 Late Fees", 'clause': '12.4'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests for process-wide shared components in the standard registry.
+Covers single construction under concurrency and worker warm-up.
+"""
+
+import threading
+import unittest
+from unittest.mock import patch
+from shared import standard_registry
+from shared.standard_registry import get_shared_component, is_component_loaded, preload_standards
+
+
+class CountingComponent:
+    """Stand-in for an analyzer whose construction is slow and counted."""
+    built = 0
+
+    def __init__(self):
+        CountingComponent.built += 1
+
+
+def fake_load_component(asc_standard, component):
+    if asc_standard == 'ASC 805':
+        raise RuntimeError("knowledge base not built")
+    return CountingComponent
+
+
+class TestSharedComponents(unittest.TestCase):
+    """Test get_shared_component and preload_standards."""
+
+    def setUp(self):
+        CountingComponent.built = 0
+        patcher = patch.dict(standard_registry._shared_instances, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('shared.standard_registry.load_component', side_effect=fake_load_component)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_built_once_across_threads(self):
+        """Concurrent jobs share one instance per standard and component."""
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(get_shared_component('ASC 606', 'analyzer')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(CountingComponent.built, 1)
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+        self.assertTrue(is_component_loaded('ASC 606', 'analyzer'))
+        self.assertFalse(is_component_loaded('ASC 606', 'knowledge'))
+
+    def test_preload_skips_failing_standard(self):
+        """A standard that cannot load is reported and the rest are warmed."""
+        timings = preload_standards()
+        self.assertIsNone(timings['ASC 805'])
+        self.assertEqual(sum(1 for seconds in timings.values() if seconds is not None), 4)
+        self.assertTrue(is_component_loaded('ASC 842', 'knowledge'))
+        self.assertEqual(CountingComponent.built, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
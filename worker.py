@@ -3,17 +3,36 @@
 RQ Worker Script
 Starts a Redis Queue worker to process background analysis jobs
 Auto-detects environment: uses fakeredis locally, real Redis in production
+
+Modes (WORKER_MODE or --mode):
+- fork (default): plain RQ Worker, a fresh work horse per job builds its analyzer,
+  OpenAI and Chroma clients on every job (cold start)
+- warm: a supervised child preloads the worker module and every standard's analyzer
+  and knowledge search once, then runs jobs in-process (RQ SimpleWorker) with those
+  instances. The supervisor restarts the child if it dies and after WORKER_MAX_JOBS
+  jobs, so leaks cannot accumulate. Jobs record their setup time in job.meta['setup']
+  and the log shows "cold start" / "warm start" for comparison.
+
+In both modes jobs send heartbeats (shared/job_watchdog.py) and a watchdog process
+requeues or fails jobs whose worker died mid-run.
 """
 
 import os
 import sys
+import time
+import signal
+import contextvars
 import logging
-from rq import Worker, Queue
+import argparse
+import multiprocessing
+from rq import Worker, SimpleWorker
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared.redis_connection import get_redis_connection
+from shared.job_scheduler import FairScheduler, WORKER_QUEUES
+from shared.job_watchdog import JobHeartbeat, JobWatchdog
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,13 +40,134 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Queue order is priority order: close sync, then the scheduler's lanes (fast, memo
+# review, standard), and offline 'batch' jobs only when the others are empty
+QUEUES = WORKER_QUEUES
+
+
+class HeartbeatWorker(Worker):
+    """RQ Worker whose jobs send heartbeats from the work horse"""
+    
+    def perform_job(self, job, queue):
+        with JobHeartbeat(self.connection, job.id):
+            # A context per job, so API cost trackers never carry over between jobs
+            return contextvars.copy_context().run(super().perform_job, job, queue)
+    
+    def handle_work_horse_killed(self, job, retpid, ret_val, rusage):
+        super().handle_work_horse_killed(job, retpid, ret_val, rusage)
+        JobWatchdog(self.connection).mark_dead(job.id)  # No need to wait for the heartbeat timeout
+
+
+class HeartbeatSimpleWorker(SimpleWorker):
+    """In-process RQ worker (warm mode) whose jobs send heartbeats"""
+    
+    def perform_job(self, job, queue):
+        with JobHeartbeat(self.connection, job.id):
+            # A context per job, so API cost trackers never carry over between jobs
+            return contextvars.copy_context().run(super().perform_job, job, queue)
+
+
+def run_watchdog():
+    """Watchdog process: reap jobs whose worker died"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Stopped by the parent with SIGTERM
+    JobWatchdog(get_redis_connection()).run()
+
+
+def start_watchdog() -> multiprocessing.Process:
+    """
+    Start the watchdog in its own process, so the worker never forks with a
+    watchdog thread running
+    """
+    process = multiprocessing.Process(target=run_watchdog, name='job-watchdog', daemon=True)
+    process.start()
+    return process
+
+
+def dispatch_held_jobs(redis_conn):
+    """Release jobs held while no worker was running (the next finished job dispatches if this fails)"""
+    try:
+        FairScheduler(redis_conn).dispatch()
+    except Exception as e:
+        logger.error(f"Startup dispatch failed, continuing: {e}")
+
+
+def run_warm_worker(max_jobs: int):
+    """Preload everything jobs need, then run them in this process"""
+    # Drop the supervisor's handlers; RQ installs its own once it starts working
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    start = time.perf_counter()
+    import workers.analysis_worker  # noqa: F401 - job functions
+    from shared.standard_registry import preload_standards
+    timings = preload_standards()
+    loaded = [name for name, seconds in timings.items() if seconds is not None]
+    logger.info(f"🔥 Worker warmed in {time.perf_counter() - start:.2f}s ({len(loaded)}/{len(timings)} standards)")
+
+    redis_conn = get_redis_connection()
+    dispatch_held_jobs(redis_conn)
+    worker = HeartbeatSimpleWorker(QUEUES, connection=redis_conn)
+    logger.info(f"🚀 Warm RQ Worker started (recycles after {max_jobs} jobs). Listening on {', '.join(QUEUES)}...")
+    worker.work(max_jobs=max_jobs, with_scheduler=True)  # Runs scheduled batch follow-ups
+
+
+def supervise_warm_worker(max_jobs: int):
+    """Keep one warm worker process running, restarting it when it exits or crashes"""
+    stopping = False
+    child = None
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        if child is not None and child.is_alive():
+            os.kill(child.pid, signal.SIGTERM)  # RQ finishes the current job, then exits
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    start_watchdog()
+    watchdog = JobWatchdog(get_redis_connection())
+
+    failures = 0
+    while not stopping:
+        child = multiprocessing.Process(target=run_warm_worker, args=(max_jobs,), name='warm-worker')
+        started = time.monotonic()
+        child.start()
+        child.join()
+        if stopping:
+            break
+        if child.exitcode == 0:
+            failures = 0
+            logger.info("♻️ Warm worker recycled, starting a fresh one")
+            continue
+        try:
+            watchdog.mark_process_dead(child.pid)  # Its job is reaped on the watchdog's next pass
+        except Exception as e:
+            logger.error(f"Failed to mark jobs of worker {child.pid} dead: {e}")
+        # Crash loops back off up to a minute; a worker that ran a while resets the count
+        failures = 1 if time.monotonic() - started > 300 else failures + 1
+        delay = min(60, 2 ** failures)
+        logger.error(f"❌ Warm worker exited with code {child.exitcode}, restarting in {delay}s")
+        time.sleep(delay)
+
+
 def main():
     """Start the RQ worker"""
+    parser = argparse.ArgumentParser(description="VeritasLogic background analysis worker")
+    parser.add_argument('--mode', choices=['fork', 'warm'], default=os.getenv('WORKER_MODE', 'fork'))
+    parser.add_argument('--max-jobs', type=int, default=int(os.getenv('WORKER_MAX_JOBS', '200')),
+                        help="Jobs per warm worker process before it is recycled")
+    args = parser.parse_args()
+
+    if args.mode == 'warm':
+        supervise_warm_worker(args.max_jobs)
+        return
+
     redis_conn = get_redis_connection()
-    
-    worker = Worker(['analysis', 'close'], connection=redis_conn)
-    logger.info("🚀 RQ Worker started. Listening on 'analysis' and 'close' queues...")
-    worker.work()
+    dispatch_held_jobs(redis_conn)
+    start_watchdog()
+    worker = HeartbeatWorker(QUEUES, connection=redis_conn)
+    logger.info(f"🚀 RQ Worker started. Listening on {', '.join(QUEUES)}...")
+    worker.work(with_scheduler=True)  # Runs scheduled batch follow-ups
 
 if __name__ == '__main__':
     main()
@@ -1,44 +1,90 @@
 """
 Background Worker for ASC Analysis Processing
 This worker runs in a separate process and handles long-running analyses
+Single analyses and memo reviews run through the pipeline engine (shared/analysis_pipeline.py)
 """
 
 import logging
 import sys
 import os
 import time
-from typing import Dict, Any
-from datetime import datetime
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
 
 # Add parent directory to path to import project modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from asc606.step_analyzer import ASC606StepAnalyzer
-from asc606.knowledge_search import ASC606KnowledgeSearch
-from asc606.clean_memo_generator import CleanMemoGenerator
-from asc842.step_analyzer import ASC842StepAnalyzer
-from asc842.knowledge_search import ASC842KnowledgeSearch
-from asc842.clean_memo_generator import CleanMemoGenerator as ASC842CleanMemoGenerator
-from asc718.step_analyzer import ASC718StepAnalyzer
-from asc718.knowledge_search import ASC718KnowledgeSearch
-from asc718.clean_memo_generator import CleanMemoGenerator as ASC718CleanMemoGenerator
-from asc805.step_analyzer import ASC805StepAnalyzer
-from asc805.knowledge_search import ASC805KnowledgeSearch
-from asc805.clean_memo_generator import CleanMemoGenerator as ASC805CleanMemoGenerator
-from asc340.step_analyzer import ASC340StepAnalyzer
-from asc340.knowledge_search import ASC340KnowledgeSearch
-from asc340.clean_memo_generator import CleanMemoGenerator as ASC340CleanMemoGenerator
-from shared.api_cost_tracker import reset_cost_tracking, get_total_estimated_cost
-from rq import get_current_job
+from shared.api_cost_tracker import reset_cost_tracking, get_total_estimated_cost, get_usage_totals
+from shared.redis_connection import get_redis_connection
+from shared.blob_store import get_blob_store, load_job_text, load_job_texts, store_job_texts
+from shared.standard_registry import (
+    get_standard_config, get_shared_component, is_component_loaded, load_component, SHARED_COMPONENTS
+)
+from shared.analysis_pipeline import (
+    AnalysisContext, AnalysisPipeline, Stage, LoggingHook, build_step_stages, finalize, render, stage_summary
+)
+from shared.job_events import publish_job_event
+from shared.analysis_persistence import encode_save_payload, get_result_store
+from rq import Queue, get_current_job
 import requests
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def _save_analysis_with_retry(backend_url: str, user_token: str, save_data: Dict[str, Any], max_retries: int = 5) -> Dict[str, Any]:
+def _save_direct(user_id, items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Persist results straight to Postgres when direct saves are enabled (ANALYSIS_DIRECT_SAVE)
+    
+    Returns:
+        Per item: a response shaped like the save endpoint's (with 'error' when the
+        analysis was marked failed for an unverified email), or None when the item must
+        go through the HTTP endpoint instead (direct saves off, database unreachable,
+        record not found for this user, or the item's save failed)
+    """
+    store = get_result_store() if user_id is not None else None
+    if store is None:
+        return [None] * len(items)
+    
+    try:
+        results = store.save_many(user_id, items)
+    except Exception as e:
+        logger.warning(f"Direct save unavailable, falling back to the save endpoint: {str(e)}")
+        return [None] * len(items)
+    
+    responses = []
+    for save_data, result in zip(items, results):
+        if result is None or isinstance(result, Exception):
+            logger.warning(f"Direct save of analysis {save_data.get('analysis_id')} failed, "
+                           f"falling back to the save endpoint")
+            responses.append(None)
+            continue
+        response = {
+            'analysis_id': result['analysis_id'],
+            'memo_uuid': result['memo_uuid'],
+            'balance_remaining': result['balance_remaining']
+        }
+        if result['outcome'] == 'unverified':
+            response['error'] = 'Email verification required'
+        responses.append(response)
+    logger.info(f"✓ Saved {sum(1 for r in responses if r)} of {len(items)} result(s) directly to the database")
+    return responses
+
+
+def _direct_response_or_raise(response: Dict[str, Any]) -> Dict[str, Any]:
+    """A direct-save response, raising like the endpoint's 403 when the save was refused"""
+    if 'error' in response:
+        raise Exception(f"Access denied: {response['error']}")
+    return response
+
+
+def _save_analysis_with_retry(backend_url: str, user_token: str, save_data: Dict[str, Any], max_retries: int = 5,
+                              user_id=None) -> Dict[str, Any]:
     """
     Save analysis to database with exponential backoff retry logic
     
+    With user_id and direct saves enabled, the result is written straight to Postgres
+    first; the HTTP save endpoint (gzip-compressed body) is the fallback.
+    
     Retries up to max_retries times with exponential backoff (1s, 2s, 4s, 8s, 16s)
     Handles 401 (auth) specially as non-retryable
     
@@ -48,14 +94,23 @@ def _save_analysis_with_retry(backend_url: str, user_token: str, save_data: Dict
     Raises:
         Exception with descriptive error message on failure
     """
+    direct = _save_direct(user_id, [save_data])[0]
+    if direct is not None:
+        return _direct_response_or_raise(direct)
+    
+    body = encode_save_payload(save_data)
     for attempt in range(max_retries):
         try:
             logger.info(f"Saving analysis (attempt {attempt + 1}/{max_retries})...")
             
             response = requests.post(
                 f'{backend_url}/api/analysis/save',
-                headers={'Authorization': f'Bearer {user_token}'},
-                json=save_data,
+                headers={
+                    'Authorization': f'Bearer {user_token}',
+                    'Content-Type': 'application/json',
+                    'Content-Encoding': 'gzip'
+                },
+                data=body,
                 timeout=30
             )
             
@@ -102,904 +157,273 @@ def _save_analysis_with_retry(backend_url: str, user_token: str, save_data: Dict
     # Should never reach here, but just in case
     raise Exception(f"Save failed after {max_retries} attempts")
 
-def run_asc606_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+def _save_all(backend_url: str, user_token: str, user_id, items: List[Dict[str, Any]], label: str) -> List[Any]:
     """
-    Run ASC 606 analysis in background worker
+    Save every result of a batch or portfolio job - failures too, so none stay stuck
+    in 'processing'. Direct saves write all of them in one transaction; any not saved
+    that way go through the save endpoint one by one.
     
-    Args:
-        job_data: Dictionary containing all necessary analysis parameters
-        
     Returns:
-        Dictionary with analysis results including memo content
+        Per item, the save response or the exception that prevented saving it
     """
-    analysis_id = job_data['analysis_id']  # This is now the database INTEGER
-    user_id = job_data['user_id']
-    user_token = job_data['user_token']
-    allowance_result = job_data.get('allowance_result')  # New subscription-based data
-    pricing_result = job_data.get('pricing_result')  # Legacy fallback
-    additional_context = job_data['additional_context']
-    combined_text = job_data['combined_text']
-    uploaded_filenames = job_data['uploaded_filenames']
-    org_id = job_data.get('org_id')  # For word deduction
-    total_words = job_data.get('total_words')  # For word deduction
-    
-    logger.info(f"🚀 Worker starting ASC 606 analysis: {analysis_id}")
-    
-    # Get current job for progress updates
-    job = get_current_job()
-    
-    try:
-        # Reset cost tracking for this analysis
-        reset_cost_tracking()
-        
-        # Initialize analyzer and knowledge search
-        analyzer = ASC606StepAnalyzer()
-        knowledge_search = ASC606KnowledgeSearch()
-        
-        # Extract customer name for memo generation
-        customer_name = "the Customer"  # Default value
+    saved: List[Any] = []
+    for save_data, direct in zip(items, _save_direct(user_id, items)):
         try:
-            if "the Customer" in combined_text:
-                customer_name = "the Customer"
-        except:
-            customer_name = "the Customer"  # Fallback on error
-        
-        # Initialize results storage with proper structure matching analyze_contract
-        analysis_results = {
-            'steps': {},  # Store steps under 'steps' key like original flow
-            'customer_name': customer_name,
-            'analysis_title': 'Contract Analysis',
-            'analysis_date': datetime.now().strftime("%B %d, %Y")
-        }
-        
-        # Run 5 ASC 606 steps with progress reporting
-        # Sequential execution with accumulated context - pass full prior step outputs to each subsequent step
-        step_failures = []
-        accumulated_prior_steps = []  # Accumulate full markdown outputs from completed steps
-        
-        for step_num in range(1, 6):
-            # Update job progress
-            if job:
-                job.meta['progress'] = {
-                    'current_step': step_num,
-                    'total_steps': 5,
-                    'step_name': f'Step {step_num}',
-                    'updated_at': datetime.now().isoformat()
-                }
-                job.save_meta()
-            
-            logger.info(f"📊 Processing Step {step_num}/5")
-            
-            try:
-                # Get relevant knowledge for this step
-                authoritative_context = knowledge_search.search_for_step(step_num, combined_text)
-                
-                # Build prior steps context for Steps 2-5
-                prior_steps_context = None
-                if accumulated_prior_steps:
-                    prior_steps_context = "\n\n".join(accumulated_prior_steps)
-                    logger.info(f"   Passing {len(accumulated_prior_steps)} prior step(s) context ({len(prior_steps_context)} chars)")
-                
-                # Build step kwargs
-                step_kwargs = {
-                    'step_num': step_num,
-                    'contract_text': combined_text,
-                    'authoritative_context': authoritative_context,
-                    'customer_name': customer_name,
-                    'additional_context': additional_context,
-                    'prior_steps_context': prior_steps_context
-                }
-                
-                # Analyze the step with retry logic
-                step_result = analyzer._analyze_step_with_retry(**step_kwargs)
-                
-                # Store under 'steps' key to match original flow structure
-                analysis_results['steps'][f'step_{step_num}'] = step_result
-                logger.info(f"✓ Completed Step {step_num}")
-                
-                # Accumulate this step's output for subsequent steps
-                if 'markdown_content' in step_result:
-                    accumulated_prior_steps.append(step_result['markdown_content'])
-                
-            except Exception as e:
-                logger.error(f"Error in Step {step_num}: {str(e)}")
-                step_failures.append(f"Step {step_num}: {str(e)}")
-                # CRITICAL: If step fails, raise exception to prevent billing
-                raise Exception(f"Step {step_num} failed: {str(e)}")
-        
-        # Generate final memo
-        logger.info("📝 Generating final memo...")
-        if job:
-            job.meta['progress'] = {
-                'current_step': 5,
-                'total_steps': 5,
-                'step_name': 'Generating Memo',
-                'updated_at': datetime.now().isoformat()
-            }
-            job.save_meta()
-        
-        # Generate executive summary, background, and conclusion using analyzer's method
-        logger.info("→ Generating executive summary, background, and conclusion...")
-        conclusions_text = analyzer._extract_conclusions_from_steps(analysis_results['steps'])
-        
-        analysis_results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, customer_name)
-        analysis_results['background'] = analyzer.generate_background_section(conclusions_text, customer_name)
-        analysis_results['conclusion'] = analyzer.generate_final_conclusion(analysis_results['steps'])
-        
-        memo_generator = CleanMemoGenerator()
-        filename = ", ".join(uploaded_filenames) if uploaded_filenames else "Uploaded Documents"
-        
-        # Prepare analysis results with metadata (customer_name already set during init)
-        analysis_results['filename'] = filename
-        
-        memo_content = memo_generator.combine_clean_steps(
-            analysis_results,
-            analysis_id=analysis_id
-        )
-        
-        # Get actual API costs
-        api_cost = get_total_estimated_cost()
-        
-        # Save analysis to database WITH RETRY LOGIC
-        logger.info("💾 Saving analysis to database...")
-        backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-        
-        # NOTE: Server will look up analysis by analysis_id (database INTEGER)
-        # Worker sends analysis_id, memo_content, api_cost, success flag, and word deduction data
-        save_result = _save_analysis_with_retry(
-            backend_url=backend_url,
-            user_token=user_token,
-            save_data={
-                'analysis_id': analysis_id,  # Database INTEGER id
-                'memo_content': memo_content,
-                'api_cost': api_cost,
-                'success': True,
-                'org_id': org_id,  # For word deduction
-                'total_words': total_words  # For word deduction
-            },
-            max_retries=5
-        )
-        
-        memo_uuid = save_result.get('memo_uuid')
-        logger.info(f"✓ Analysis saved successfully: {memo_uuid}")
-        
-        # Return results
-        return {
-            'success': True,
-            'analysis_id': analysis_id,
-            'memo_uuid': memo_uuid,
-            'memo_content': memo_content,
-            'api_cost': api_cost,
-            'message': 'Analysis completed successfully'
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Analysis failed: {str(e)}", exc_info=True)
-        
-        # CRITICAL: Always save failure to database with retry logic
-        # This prevents analyses from getting stuck in 'processing' status
-        try:
-            # Get API cost even on failure for tracking
-            api_cost = get_total_estimated_cost()
-            
-            backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-            
-            # Use retry helper to ensure failure is persisted
-            # NOTE: Server will look up analysis by analysis_id (database INTEGER)
-            _save_analysis_with_retry(
-                backend_url=backend_url,
-                user_token=user_token,
-                save_data={
-                    'analysis_id': analysis_id,  # Database INTEGER id
-                    'success': False,
-                    'error_message': str(e)[:500],  # Truncate to 500 chars
-                    'api_cost': api_cost
-                },
-                max_retries=5
-            )
-            
-            logger.info(f"✓ Failure status saved to database")
-            
+            if direct is not None:
+                saved.append(_direct_response_or_raise(direct))
+            else:
+                saved.append(_save_analysis_with_retry(
+                    backend_url=backend_url,
+                    user_token=user_token,
+                    save_data=save_data,
+                    max_retries=5
+                ))
         except Exception as save_error:
-            # If we can't save failure, log it prominently
-            logger.critical(f"🔥 CRITICAL: Failed to save failure status to database: {str(save_error)}")
-            logger.critical(f"🔥 Original error: {str(e)}")
-            logger.critical(f"🔥 Analysis {analysis_id} may be stuck in 'processing' status!")
-        
-        # Re-raise exception so RQ marks job as failed
-        raise
+            logger.critical(f"🔥 CRITICAL: Failed to save {label} analysis {save_data['analysis_id']}: {str(save_error)}")
+            saved.append(save_error)
+    return saved
 
-def run_asc842_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+
+def save_job_failure(job_data: Dict[str, Any], error_message: str) -> int:
     """
-    Run ASC 842 analysis in background worker
+    Mark every analysis of a job that died mid-run as failed (job watchdog)
     
-    Args:
-        job_data: Dictionary containing all necessary analysis parameters
-        
     Returns:
-        Dictionary with analysis results including memo content
+        Number of analyses saved
     """
-    analysis_id = job_data['analysis_id']
-    user_id = job_data['user_id']
-    user_token = job_data['user_token']
-    pricing_result = job_data['pricing_result']
-    additional_context = job_data['additional_context']
-    combined_text = job_data['combined_text']
-    uploaded_filenames = job_data['uploaded_filenames']
-    
-    logger.info(f"🚀 Worker starting ASC 842 analysis: {analysis_id}")
-    
-    # Get current job for progress updates
+    items = job_data.get('analyses') or job_data.get('contracts') or [job_data]
+    save_items = [{
+        'analysis_id': item['analysis_id'],
+        'success': False,
+        'error_message': error_message[:500],
+        'api_cost': 0.0
+    } for item in items if item.get('analysis_id')]
+    if not save_items:
+        return 0
+    saved = _save_all(os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai'), job_data.get('user_token'),
+                      job_data.get('user_id'), save_items, 'interrupted')
+    return sum(1 for result in saved if not isinstance(result, Exception))
+
+
+def _job_blob_store():
+    """Blob store on the running job's Redis connection"""
     job = get_current_job()
-    
-    try:
-        # Reset cost tracking for this analysis
-        reset_cost_tracking()
-        
-        # Initialize analyzer and knowledge search
-        analyzer = ASC842StepAnalyzer()
-        knowledge_search = ASC842KnowledgeSearch()
-        
-        # Extract entity name for memo generation
-        entity_name = "the Entity"  # Default value
-        try:
-            if "the Entity" in combined_text:
-                entity_name = "the Entity"
-        except:
-            entity_name = "the Entity"  # Fallback on error
-        
-        # Initialize results storage
-        analysis_results = {
-            'steps': {},
-            'entity_name': entity_name,
-            'analysis_title': 'Lease Analysis',
-            'analysis_date': datetime.now().strftime("%B %d, %Y")
-        }
-        
-        # Run 5 ASC 842 steps with progress reporting
-        for step_num in range(1, 6):
-            # Update job progress
-            if job:
-                job.meta['progress'] = {
-                    'current_step': step_num,
-                    'total_steps': 5,
-                    'step_name': f'Step {step_num}',
-                    'updated_at': datetime.now().isoformat()
-                }
-                job.save_meta()
-            
-            logger.info(f"📊 Processing Step {step_num}/5")
-            
-            try:
-                # Get relevant knowledge for this step
-                authoritative_context = knowledge_search.search_for_step(step_num, combined_text)
-                
-                # Analyze the step with retry logic
-                step_result = analyzer._analyze_step_with_retry(
-                    step_num=step_num,
-                    contract_text=combined_text,
-                    authoritative_context=authoritative_context,
-                    entity_name=entity_name,
-                    additional_context=additional_context
-                )
-                
-                # Store under 'steps' key
-                analysis_results['steps'][f'step_{step_num}'] = step_result
-                logger.info(f"✓ Completed Step {step_num}")
-                
-            except Exception as e:
-                logger.error(f"Error in Step {step_num}: {str(e)}")
-                raise Exception(f"Step {step_num} failed: {str(e)}")
-        
-        # Generate final memo
-        logger.info("📝 Generating final memo...")
-        if job:
-            job.meta['progress'] = {
-                'current_step': 5,
-                'total_steps': 5,
-                'step_name': 'Generating Memo',
-                'updated_at': datetime.now().isoformat()
-            }
-            job.save_meta()
-        
-        # Generate executive summary, background, and conclusion
-        logger.info("→ Generating executive summary, background, and conclusion...")
-        conclusions_text = analyzer._extract_conclusions_from_steps(analysis_results['steps'])
-        
-        analysis_results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, entity_name)
-        analysis_results['background'] = analyzer.generate_background_section(conclusions_text, entity_name)
-        analysis_results['conclusion'] = analyzer.generate_final_conclusion(analysis_results['steps'])
-        
-        memo_generator = ASC842CleanMemoGenerator()
-        filename = ", ".join(uploaded_filenames) if uploaded_filenames else "Uploaded Documents"
-        analysis_results['filename'] = filename
-        
-        memo_content = memo_generator.combine_clean_steps(
-            analysis_results,
-            analysis_id=analysis_id
-        )
-        
-        # Get actual API costs
-        api_cost = get_total_estimated_cost()
-        
-        # Save analysis to database WITH RETRY LOGIC
-        logger.info("💾 Saving analysis to database...")
-        backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-        
-        save_result = _save_analysis_with_retry(
-            backend_url=backend_url,
-            user_token=user_token,
-            save_data={
-                'analysis_id': analysis_id,
-                'memo_content': memo_content,
-                'api_cost': api_cost,
-                'success': True
-            },
-            max_retries=5
-        )
-        
-        memo_uuid = save_result.get('memo_uuid')
-        logger.info(f"✓ Analysis saved successfully: {memo_uuid}")
-        
-        # Return results
-        return {
-            'success': True,
-            'analysis_id': analysis_id,
-            'memo_uuid': memo_uuid,
-            'memo_content': memo_content,
-            'api_cost': api_cost,
-            'message': 'Analysis completed successfully'
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Analysis failed: {str(e)}", exc_info=True)
-        
-        # CRITICAL: Always save failure to database
-        try:
-            api_cost = get_total_estimated_cost()
-            backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-            
-            _save_analysis_with_retry(
-                backend_url=backend_url,
-                user_token=user_token,
-                save_data={
-                    'analysis_id': analysis_id,
-                    'success': False,
-                    'error_message': str(e)[:500],
-                    'api_cost': api_cost
-                },
-                max_retries=5
-            )
-            
-            logger.info(f"✓ Failure status saved to database")
-            
-        except Exception as save_error:
-            logger.critical(f"🔥 CRITICAL: Failed to save failure status to database: {str(save_error)}")
-            logger.critical(f"🔥 Original error: {str(e)}")
-            logger.critical(f"🔥 Analysis {analysis_id} may be stuck in 'processing' status!")
-        
-        # Re-raise exception so RQ marks job as failed
-        raise
+    return get_blob_store(job.connection if job else None)
 
-def run_asc718_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+
+def _load_job_text(value):
+    """Job input text, fetched from the blob store when the payload holds a reference"""
+    return load_job_text(value, _job_blob_store())
+
+
+def _save_progress(job):
+    """Save job.meta and push the progress to the job's event stream (UI and SSE readers)"""
+    job.save_meta()
+    publish_job_event(job.connection, job.id, 'progress', progress=job.meta.get('progress', {}),
+                      contracts=job.meta.get('contracts'))
+
+
+def _standard_components(asc_standard: str, job):
     """
-    Run ASC 718 analysis in background worker
-    
-    Args:
-        job_data: Dictionary containing all necessary analysis parameters
-        
-    Returns:
-        Dictionary with analysis results including memo content
+    Shared analyzer and knowledge search for a standard, recording how long the job
+    waited for them: near zero on a pre-warmed worker, full client/KB setup when cold
     """
-    analysis_id = job_data['analysis_id']
-    user_id = job_data['user_id']
-    user_token = job_data['user_token']
-    pricing_result = job_data['pricing_result']
-    additional_context = job_data['additional_context']
-    combined_text = job_data['combined_text']
-    uploaded_filenames = job_data['uploaded_filenames']
-    
-    logger.info(f"🚀 Worker starting ASC 718 analysis: {analysis_id}")
-    
-    # Get current job for progress updates
-    job = get_current_job()
-    
+    warm = all(is_component_loaded(asc_standard, component) for component in SHARED_COMPONENTS)
+    start = time.perf_counter()
+    analyzer = get_shared_component(asc_standard, 'analyzer')
+    knowledge_search = get_shared_component(asc_standard, 'knowledge')
+    seconds = time.perf_counter() - start
+    logger.info(f"⏱️ {asc_standard} components ready in {seconds:.3f}s ({'warm' if warm else 'cold'} start)")
+    if job:
+        job.meta['setup'] = {'seconds': round(seconds, 4), 'warm': warm}  # Saved with the next progress update
+    return analyzer, knowledge_search
+
+
+def _save_failure(backend_url: str, user_token: str, analysis_id, error: Exception, user_id=None):
+    """Record a failed analysis so it never stays in 'processing' status"""
+    # CRITICAL: Always save failure to database with retry logic
     try:
-        # Reset cost tracking for this analysis
-        reset_cost_tracking()
-        
-        # Initialize analyzer and knowledge search
-        analyzer = ASC718StepAnalyzer()
-        knowledge_search = ASC718KnowledgeSearch()
-        
-        # Extract entity name for memo generation
-        entity_name = "the Entity"  # Default value
-        try:
-            if "the Entity" in combined_text:
-                entity_name = "the Entity"
-        except:
-            entity_name = "the Entity"  # Fallback on error
-        
-        # Initialize results storage
-        analysis_results = {
-            'steps': {},
-            'entity_name': entity_name,
-            'analysis_title': 'Stock Compensation Analysis',
-            'analysis_date': datetime.now().strftime("%B %d, %Y")
-        }
-        
-        # Run 5 ASC 718 steps with progress reporting
-        for step_num in range(1, 6):
-            # Update job progress
-            if job:
-                job.meta['progress'] = {
-                    'current_step': step_num,
-                    'total_steps': 5,
-                    'step_name': f'Step {step_num}',
-                    'updated_at': datetime.now().isoformat()
-                }
-                job.save_meta()
-            
-            logger.info(f"📊 Processing Step {step_num}/5")
-            
-            try:
-                # Get relevant knowledge for this step
-                authoritative_context = knowledge_search.search_for_step(step_num, combined_text)
-                
-                # Analyze the step with retry logic
-                step_result = analyzer._analyze_step_with_retry(
-                    step_num=step_num,
-                    contract_text=combined_text,
-                    authoritative_context=authoritative_context,
-                    entity_name=entity_name,
-                    additional_context=additional_context
-                )
-                
-                # Store under 'steps' key
-                analysis_results['steps'][f'step_{step_num}'] = step_result
-                logger.info(f"✓ Completed Step {step_num}")
-                
-            except Exception as e:
-                logger.error(f"Error in Step {step_num}: {str(e)}")
-                raise Exception(f"Step {step_num} failed: {str(e)}")
-        
-        # Generate final memo
-        logger.info("📝 Generating final memo...")
-        if job:
-            job.meta['progress'] = {
-                'current_step': 5,
-                'total_steps': 5,
-                'step_name': 'Generating Memo',
-                'updated_at': datetime.now().isoformat()
-            }
-            job.save_meta()
-        
-        # Generate executive summary, background, and conclusion
-        logger.info("→ Generating executive summary, background, and conclusion...")
-        conclusions_text = analyzer._extract_conclusions_from_steps(analysis_results['steps'])
-        
-        analysis_results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, entity_name)
-        analysis_results['background'] = analyzer.generate_background_section(conclusions_text, entity_name)
-        analysis_results['conclusion'] = analyzer.generate_final_conclusion(analysis_results['steps'])
-        
-        memo_generator = ASC718CleanMemoGenerator()
-        filename = ", ".join(uploaded_filenames) if uploaded_filenames else "Uploaded Documents"
-        analysis_results['filename'] = filename
-        
-        memo_content = memo_generator.combine_clean_steps(
-            analysis_results,
-            analysis_id=analysis_id
-        )
-        
-        # Get actual API costs
+        # Get API cost even on failure for tracking
         api_cost = get_total_estimated_cost()
         
-        # Save analysis to database WITH RETRY LOGIC
-        logger.info("💾 Saving analysis to database...")
-        backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-        
-        save_result = _save_analysis_with_retry(
+        # NOTE: Server will look up analysis by analysis_id (database INTEGER)
+        _save_analysis_with_retry(
             backend_url=backend_url,
             user_token=user_token,
             save_data={
-                'analysis_id': analysis_id,
-                'memo_content': memo_content,
-                'api_cost': api_cost,
-                'success': True
+                'analysis_id': analysis_id,  # Database INTEGER id
+                'success': False,
+                'error_message': str(error)[:500],  # Truncate to 500 chars
+                'api_cost': api_cost
             },
-            max_retries=5
+            max_retries=5,
+            user_id=user_id
         )
         
-        memo_uuid = save_result.get('memo_uuid')
-        logger.info(f"✓ Analysis saved successfully: {memo_uuid}")
-        
-        # Return results
-        return {
-            'success': True,
-            'analysis_id': analysis_id,
-            'memo_uuid': memo_uuid,
-            'memo_content': memo_content,
-            'api_cost': api_cost,
-            'message': 'Analysis completed successfully'
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Analysis failed: {str(e)}", exc_info=True)
-        
-        # CRITICAL: Always save failure to database
-        try:
-            api_cost = get_total_estimated_cost()
-            backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-            
-            _save_analysis_with_retry(
-                backend_url=backend_url,
-                user_token=user_token,
-                save_data={
-                    'analysis_id': analysis_id,
-                    'success': False,
-                    'error_message': str(e)[:500],
-                    'api_cost': api_cost
-                },
-                max_retries=5
-            )
-            
-            logger.info(f"✓ Failure status saved to database")
-            
-        except Exception as save_error:
-            logger.critical(f"🔥 CRITICAL: Failed to save failure status to database: {str(save_error)}")
-            logger.critical(f"🔥 Original error: {str(e)}")
-            logger.critical(f"🔥 Analysis {analysis_id} may be stuck in 'processing' status!")
+        logger.info(f"✓ Failure status saved to database")
         
-        # Re-raise exception so RQ marks job as failed
-        raise
+    except Exception as save_error:
+        # If we can't save failure, log it prominently
+        logger.critical(f"🔥 CRITICAL: Failed to save failure status to database: {str(save_error)}")
+        logger.critical(f"🔥 Original error: {str(error)}")
+        logger.critical(f"🔥 Analysis {analysis_id} may be stuck in 'processing' status!")
 
-def run_asc805_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Run ASC 805 analysis in background worker
-    
-    Args:
-        job_data: Dictionary containing all necessary analysis parameters
-        
-    Returns:
-        Dictionary with analysis results including memo content
-    """
-    analysis_id = job_data['analysis_id']
-    user_id = job_data['user_id']
-    user_token = job_data['user_token']
-    pricing_result = job_data['pricing_result']
-    additional_context = job_data['additional_context']
-    combined_text = job_data['combined_text']
-    uploaded_filenames = job_data['uploaded_filenames']
-    
-    logger.info(f"🚀 Worker starting ASC 805 analysis: {analysis_id}")
-    
-    # Get current job for progress updates
-    job = get_current_job()
-    
-    try:
-        # Reset cost tracking for this analysis
-        reset_cost_tracking()
-        
-        # Initialize analyzer and knowledge search
-        analyzer = ASC805StepAnalyzer()
-        knowledge_search = ASC805KnowledgeSearch()
-        
-        # Extract target company name for memo generation
-        target_company = "the Target Company"  # Default value
-        try:
-            if "the Target Company" in combined_text:
-                target_company = "the Target Company"
-        except:
-            target_company = "the Target Company"  # Fallback on error
-        
-        # Initialize results storage
-        analysis_results = {
-            'steps': {},
-            'target_company': target_company,
-            'analysis_title': 'Business Combination Analysis',
-            'analysis_date': datetime.now().strftime("%B %d, %Y")
-        }
-        
-        # Run 5 ASC 805 steps with progress reporting
-        for step_num in range(1, 6):
-            # Update job progress
-            if job:
-                job.meta['progress'] = {
-                    'current_step': step_num,
-                    'total_steps': 5,
-                    'step_name': f'Step {step_num}',
-                    'updated_at': datetime.now().isoformat()
-                }
-                job.save_meta()
-            
-            logger.info(f"📊 Processing Step {step_num}/5")
-            
-            try:
-                # Get relevant knowledge for this step
-                authoritative_context = knowledge_search.search_for_step(step_num, combined_text)
-                
-                # Analyze the step with retry logic
-                step_result = analyzer._analyze_step_with_retry(
-                    step_num=step_num,
-                    contract_text=combined_text,
-                    authoritative_context=authoritative_context,
-                    customer_name=target_company,
-                    additional_context=additional_context
-                )
-                
-                # Store under 'steps' key
-                analysis_results['steps'][f'step_{step_num}'] = step_result
-                logger.info(f"✓ Completed Step {step_num}")
-                
-            except Exception as e:
-                logger.error(f"Error in Step {step_num}: {str(e)}")
-                raise Exception(f"Step {step_num} failed: {str(e)}")
-        
-        # Generate final memo
-        logger.info("📝 Generating final memo...")
-        if job:
-            job.meta['progress'] = {
-                'current_step': 5,
-                'total_steps': 5,
-                'step_name': 'Generating Memo',
+
+class _JobStageHook:
+    """Pipeline hook: job progress when a stage with progress starts, stage metrics in job.meta"""
+    
+    def __init__(self, job):
+        self.job = job
+    
+    def on_stage_start(self, context, stage):
+        if self.job and stage.progress:
+            current_step, total_steps, step_name = stage.progress
+            self.job.meta['progress'] = {
+                'current_step': current_step,
+                'total_steps': total_steps,
+                'step_name': step_name,
                 'updated_at': datetime.now().isoformat()
             }
-            job.save_meta()
-        
-        # Generate executive summary, background, and conclusion
-        logger.info("→ Generating executive summary, background, and conclusion...")
-        conclusions_text = analyzer._extract_conclusions_from_steps(analysis_results['steps'])
-        
-        analysis_results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, target_company)
-        analysis_results['background'] = analyzer.generate_background_section(conclusions_text, target_company)
-        analysis_results['conclusion'] = analyzer.generate_final_conclusion(analysis_results['steps'])
-        
-        memo_generator = ASC805CleanMemoGenerator()
-        filename = ", ".join(uploaded_filenames) if uploaded_filenames else "Uploaded Documents"
-        analysis_results['filename'] = filename
-        
-        memo_content = memo_generator.combine_clean_steps(
-            analysis_results,
-            analysis_id=analysis_id
-        )
-        
-        # Get actual API costs
-        api_cost = get_total_estimated_cost()
-        
-        # Save analysis to database WITH RETRY LOGIC
-        logger.info("💾 Saving analysis to database...")
+            _save_progress(self.job)
+    
+    def on_stage_end(self, context, stage, metrics):
+        if self.job:
+            self.job.meta['stages'] = context.metrics  # Saved with the next progress update
+    
+    def flush(self):
+        """Save the final stage metrics (after the last progress update)"""
+        if self.job:
+            self.job.save_meta()
+
+
+def _setup_stage(job):
+    def setup(context):
+        context.analyzer, context.knowledge_search = _standard_components(context.asc_standard, job)
+        context.memo_generator_class = load_component(context.asc_standard, 'memo')
+    return Stage('setup', setup)
+
+
+def _save_stage(user_token: str, job_data: Dict[str, Any], deduct_words: bool, label: str = 'analysis'):
+    def save(context):
+        logger.info(f"💾 Saving {label} to database...")
         backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
+        save_data = {
+            'analysis_id': context.analysis_id,  # Database INTEGER id
+            'memo_content': context.memo_content,
+            'api_cost': get_total_estimated_cost(),
+            'success': True,
+            'deidentification_map': job_data.get('deidentification_map')  # For re-identification
+        }
+        if deduct_words:
+            save_data['org_id'] = job_data.get('org_id')  # For word deduction
+            save_data['total_words'] = job_data.get('total_words')  # For word deduction
         
-        save_result = _save_analysis_with_retry(
+        # NOTE: Server will look up analysis by analysis_id (database INTEGER)
+        context.save_result = _save_analysis_with_retry(
             backend_url=backend_url,
             user_token=user_token,
-            save_data={
-                'analysis_id': analysis_id,
-                'memo_content': memo_content,
-                'api_cost': api_cost,
-                'success': True
-            },
-            max_retries=5
+            save_data=save_data,
+            max_retries=5,
+            user_id=job_data.get('user_id')
         )
-        
-        memo_uuid = save_result.get('memo_uuid')
-        logger.info(f"✓ Analysis saved successfully: {memo_uuid}")
-        
-        # Return results
-        return {
-            'success': True,
-            'analysis_id': analysis_id,
-            'memo_uuid': memo_uuid,
-            'memo_content': memo_content,
-            'api_cost': api_cost,
-            'message': 'Analysis completed successfully'
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Analysis failed: {str(e)}", exc_info=True)
-        
-        # CRITICAL: Always save failure to database
-        try:
-            api_cost = get_total_estimated_cost()
-            backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-            
-            _save_analysis_with_retry(
-                backend_url=backend_url,
-                user_token=user_token,
-                save_data={
-                    'analysis_id': analysis_id,
-                    'success': False,
-                    'error_message': str(e)[:500],
-                    'api_cost': api_cost
-                },
-                max_retries=5
-            )
-            
-            logger.info(f"✓ Failure status saved to database")
-            
-        except Exception as save_error:
-            logger.critical(f"🔥 CRITICAL: Failed to save failure status to database: {str(save_error)}")
-            logger.critical(f"🔥 Original error: {str(e)}")
-            logger.critical(f"🔥 Analysis {analysis_id} may be stuck in 'processing' status!")
-        
-        # Re-raise exception so RQ marks job as failed
-        raise
+        logger.info(f"✓ {label.capitalize()} saved successfully: {context.save_result.get('memo_uuid')}")
+    return Stage('save', save)
 
-def run_asc340_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+
+def _run_standard_analysis(asc_standard: str, job_data: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Run ASC 340-40 analysis in background worker
+    Run one standard's analysis through the pipeline engine
     
-    NOTE: ASC 340-40 has only 2 steps (not 5)
+    Stages come from the standard's registry entry: setup, retrieve/analyze per step,
+    finalize (executive summary, background, conclusion), render and save.
     
     Args:
+        asc_standard: ASC standard name (e.g., 'ASC 606')
         job_data: Dictionary containing all necessary analysis parameters
         
     Returns:
-        Dictionary with analysis results including memo content
+        Dictionary with analysis results including memo content and stage metrics
     """
-    analysis_id = job_data['analysis_id']
-    user_id = job_data['user_id']
+    analysis_id = job_data['analysis_id']  # This is now the database INTEGER
     user_token = job_data['user_token']
-    pricing_result = job_data['pricing_result']
-    additional_context = job_data['additional_context']
-    combined_text = job_data['combined_text']
-    uploaded_filenames = job_data['uploaded_filenames']
+    config = get_standard_config(asc_standard)
+    step_count = config['step_count']
     
-    logger.info(f"🚀 Worker starting ASC 340-40 analysis: {analysis_id}")
+    logger.info(f"🚀 Worker starting {asc_standard} analysis: {analysis_id}")
     
     # Get current job for progress updates
     job = get_current_job()
+    job_hook = _JobStageHook(job)
     
     try:
         # Reset cost tracking for this analysis
         reset_cost_tracking()
         
-        # Initialize analyzer and knowledge search
-        analyzer = ASC340StepAnalyzer()
-        knowledge_search = ASC340KnowledgeSearch()
-        
-        # Extract company name for memo generation
-        company_name = "the Company"  # Default value
-        try:
-            if "the Company" in combined_text:
-                company_name = "the Company"
-        except:
-            company_name = "the Company"  # Fallback on error
-        
-        # Initialize results storage
-        analysis_results = {
-            'steps': {},
-            'company_name': company_name,
-            'analysis_title': 'Contract Cost Analysis',
-            'analysis_date': datetime.now().strftime("%B %d, %Y")
-        }
-        
-        # Run 2 ASC 340-40 steps with progress reporting (NOT 5!)
-        for step_num in range(1, 3):  # Steps 1-2 only
-            # Update job progress
-            if job:
-                job.meta['progress'] = {
-                    'current_step': step_num,
-                    'total_steps': 2,  # Only 2 steps for ASC 340-40
-                    'step_name': f'Step {step_num}',
-                    'updated_at': datetime.now().isoformat()
-                }
-                job.save_meta()
-            
-            logger.info(f"📊 Processing Step {step_num}/2")
-            
-            try:
-                # Get relevant knowledge for this step
-                authoritative_context = knowledge_search.search_for_step(step_num, combined_text)
-                
-                # Analyze the step with retry logic
-                step_result = analyzer._analyze_step_with_retry(
-                    step_num=step_num,
-                    contract_text=combined_text,
-                    authoritative_context=authoritative_context,
-                    customer_name=company_name,
-                    additional_context=additional_context
-                )
-                
-                # Store under 'steps' key
-                analysis_results['steps'][f'step_{step_num}'] = step_result
-                logger.info(f"✓ Completed Step {step_num}")
-                
-            except Exception as e:
-                logger.error(f"Error in Step {step_num}: {str(e)}")
-                raise Exception(f"Step {step_num} failed: {str(e)}")
-        
-        # Generate final memo
-        logger.info("📝 Generating final memo...")
-        if job:
-            job.meta['progress'] = {
-                'current_step': 2,
-                'total_steps': 2,
-                'step_name': 'Generating Memo',
-                'updated_at': datetime.now().isoformat()
-            }
-            job.save_meta()
-        
-        # Generate executive summary, background, and conclusion
-        logger.info("→ Generating executive summary, background, and conclusion...")
-        conclusions_text = analyzer._extract_conclusions_from_steps(analysis_results['steps'])
-        
-        analysis_results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, company_name)
-        analysis_results['background'] = analyzer.generate_background_section(conclusions_text, company_name)
-        analysis_results['conclusion'] = analyzer.generate_final_conclusion(analysis_results['steps'])
-        
-        memo_generator = ASC340CleanMemoGenerator()
-        filename = ", ".join(uploaded_filenames) if uploaded_filenames else "Uploaded Documents"
-        analysis_results['filename'] = filename
-        
-        memo_content = memo_generator.combine_clean_steps(
-            analysis_results,
-            analysis_id=analysis_id
+        context = AnalysisContext(
+            asc_standard,
+            analysis_id,
+            _load_job_text(job_data['combined_text']),
+            additional_context=job_data['additional_context'],
+            uploaded_filenames=job_data['uploaded_filenames']
         )
         
-        # Get actual API costs
-        api_cost = get_total_estimated_cost()
-        
-        # Save analysis to database WITH RETRY LOGIC
-        logger.info("💾 Saving analysis to database...")
-        backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-        
-        save_result = _save_analysis_with_retry(
-            backend_url=backend_url,
-            user_token=user_token,
-            save_data={
-                'analysis_id': analysis_id,
-                'memo_content': memo_content,
-                'api_cost': api_cost,
-                'success': True
-            },
-            max_retries=5
-        )
-        
-        memo_uuid = save_result.get('memo_uuid')
-        logger.info(f"✓ Analysis saved successfully: {memo_uuid}")
+        # CRITICAL: A failing stage raises before the save stage, so nothing is billed
+        stages = [_setup_stage(job)]
+        stages += build_step_stages(step_count, chain_prior_steps=config.get('chain_prior_steps', False))
+        stages += [
+            Stage('finalize', finalize, (step_count, step_count, 'Generating Memo')),
+            Stage('render', render),
+            _save_stage(user_token, job_data, deduct_words=config.get('deduct_words_on_save', False))
+        ]
+        AnalysisPipeline(stages, hooks=[LoggingHook(), job_hook], usage=get_usage_totals).run(context)
+        job_hook.flush()
         
         # Return results
         return {
             'success': True,
             'analysis_id': analysis_id,
-            'memo_uuid': memo_uuid,
-            'memo_content': memo_content,
-            'api_cost': api_cost,
+            'memo_uuid': context.save_result.get('memo_uuid'),
+            'memo_content': context.memo_content,
+            'api_cost': get_total_estimated_cost(),
+            'stages': stage_summary(context.metrics),
             'message': 'Analysis completed successfully'
         }
         
     except Exception as e:
         logger.error(f"❌ Analysis failed: {str(e)}", exc_info=True)
-        
-        # CRITICAL: Always save failure to database
-        try:
-            api_cost = get_total_estimated_cost()
-            backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-            
-            _save_analysis_with_retry(
-                backend_url=backend_url,
-                user_token=user_token,
-                save_data={
-                    'analysis_id': analysis_id,
-                    'success': False,
-                    'error_message': str(e)[:500],
-                    'api_cost': api_cost
-                },
-                max_retries=5
-            )
-            
-            logger.info(f"✓ Failure status saved to database")
-            
-        except Exception as save_error:
-            logger.critical(f"🔥 CRITICAL: Failed to save failure status to database: {str(save_error)}")
-            logger.critical(f"🔥 Original error: {str(e)}")
-            logger.critical(f"🔥 Analysis {analysis_id} may be stuck in 'processing' status!")
+        job_hook.flush()
+        _save_failure(os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai'), user_token, analysis_id, e,
+                      user_id=job_data.get('user_id'))
         
         # Re-raise exception so RQ marks job as failed
         raise
 
 
+def run_asc606_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run ASC 606 analysis in background worker"""
+    return _run_standard_analysis('ASC 606', job_data)
+
+
+def run_asc842_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run ASC 842 analysis in background worker"""
+    return _run_standard_analysis('ASC 842', job_data)
+
+
+def run_asc718_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run ASC 718 analysis in background worker"""
+    return _run_standard_analysis('ASC 718', job_data)
+
+
+def run_asc805_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run ASC 805 analysis in background worker"""
+    return _run_standard_analysis('ASC 805', job_data)
+
+
+def run_asc340_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run ASC 340-40 analysis in background worker (2 steps, not 5)"""
+    return _run_standard_analysis('ASC 340-40', job_data)
+
+
 def _generate_review_comments(
     vlogic_analysis: Dict[str, Any],
     uploaded_memo: str,
@@ -1192,246 +616,373 @@ def run_memo_review_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
         Dictionary with analysis results including generated memo content
     """
     analysis_id = job_data['analysis_id']
-    user_id = job_data['user_id']
     user_token = job_data['user_token']
     asc_standard = job_data.get('asc_standard', 'ASC 606')
-    combined_text = job_data['combined_text']
-    source_memo_text = job_data.get('source_memo_text', '')
     source_memo_filename = job_data.get('source_memo_filename', '')
-    uploaded_filenames = job_data['uploaded_filenames']
-    additional_context = job_data.get('additional_context', '')
-    org_id = job_data.get('org_id')
-    total_words = job_data.get('total_words')
     
     job = get_current_job()
+    job_hook = _JobStageHook(job)
     
     try:
         reset_cost_tracking()
+        try:
+            config = get_standard_config(asc_standard)
+        except ValueError:
+            raise ValueError(f"Unsupported ASC standard for memo review: {asc_standard}")
+        step_count = config['review_step_count']
+        
+        combined_text = _load_job_text(job_data['combined_text'])
+        source_memo_text = _load_job_text(job_data.get('source_memo_text')) or ''
+        
         logger.info(f"🔍 Starting Memo Review Analysis (ID: {analysis_id})")
         logger.info(f"   ASC Standard: {asc_standard}")
         logger.info(f"   Contract words: {len(combined_text.split())}")
         logger.info(f"   Source memo words: {len(source_memo_text.split())}")
         
-        # Update progress - Step 1: Initialize
-        if job:
-            job.meta['progress'] = {
-                'current_step': 1,
-                'total_steps': 3,
-                'step_name': 'Initializing analysis',
-                'updated_at': datetime.now().isoformat()
-            }
-            job.save_meta()
-        
-        # Select the appropriate analyzer and components based on ASC standard
-        if asc_standard == 'ASC 606':
-            analyzer = ASC606StepAnalyzer()
-            knowledge_search = ASC606KnowledgeSearch()
-            memo_generator = CleanMemoGenerator()
-            step_count = 5
-        elif asc_standard == 'ASC 842':
-            analyzer = ASC842StepAnalyzer()
-            knowledge_search = ASC842KnowledgeSearch()
-            memo_generator = ASC842CleanMemoGenerator()
-            step_count = 2
-        elif asc_standard == 'ASC 718':
-            analyzer = ASC718StepAnalyzer()
-            knowledge_search = ASC718KnowledgeSearch()
-            memo_generator = ASC718CleanMemoGenerator()
-            step_count = 2
-        elif asc_standard == 'ASC 805':
-            analyzer = ASC805StepAnalyzer()
-            knowledge_search = ASC805KnowledgeSearch()
-            memo_generator = ASC805CleanMemoGenerator()
-            step_count = 2
-        elif asc_standard == 'ASC 340-40':
-            analyzer = ASC340StepAnalyzer()
-            knowledge_search = ASC340KnowledgeSearch()
-            memo_generator = ASC340CleanMemoGenerator()
-            step_count = 2
-        else:
-            raise ValueError(f"Unsupported ASC standard for memo review: {asc_standard}")
-        
-        # De-identify contract text for privacy protection
-        logger.info("🔒 Applying privacy protection (de-identification)...")
-        parties = analyzer.extract_party_names_llm(combined_text)
-        vendor_name = parties.get('vendor')
-        customer_name = parties.get('customer')
-        
-        if vendor_name or customer_name:
-            deidentify_result = analyzer.deidentify_contract_text(combined_text, vendor_name, customer_name)
-            if deidentify_result.get('success'):
-                combined_text = deidentify_result['text']
-                logger.info(f"   ✓ De-identified: vendor '{vendor_name}' → 'the Company', customer '{customer_name}' → 'the Customer'")
-            else:
-                logger.warning(f"   ⚠️ De-identification failed: {deidentify_result.get('error', 'Unknown error')}")
-        else:
-            logger.warning("   ⚠️ Could not identify contract parties for de-identification")
-        
         # Use standard de-identified company name
-        company_name = "the Company"
-        logger.info(f"   Using de-identified company name: {company_name}")
-        
-        # Update progress - Step 2: Running Analysis
-        if job:
-            job.meta['progress'] = {
-                'current_step': 2,
-                'total_steps': 3,
-                'step_name': f'Analyzing contract for {asc_standard}',
-                'updated_at': datetime.now().isoformat()
-            }
-            job.save_meta()
-        
-        # Run the analysis steps
-        # Sequential execution with accumulated context - pass full prior step outputs to each subsequent step
-        analysis_results = {
-            'steps': {},
-            'asc_standard': asc_standard
-        }
-        accumulated_prior_steps = []  # Accumulate full markdown outputs from completed steps
-        
-        for step_num in range(1, step_count + 1):
-            logger.info(f"📋 Analyzing Step {step_num}/{step_count}...")
-            
-            try:
-                authoritative_context = knowledge_search.search_for_step(step_num, combined_text)
-                
-                # Build prior steps context for Steps 2+
-                prior_steps_context = None
-                if accumulated_prior_steps:
-                    prior_steps_context = "\n\n".join(accumulated_prior_steps)
-                    logger.info(f"   Passing {len(accumulated_prior_steps)} prior step(s) context ({len(prior_steps_context)} chars)")
-                
-                step_kwargs = {
-                    'step_num': step_num,
-                    'contract_text': combined_text,
-                    'authoritative_context': authoritative_context,
-                    'customer_name': company_name,
-                    'additional_context': additional_context,
-                    'prior_steps_context': prior_steps_context
-                }
-                
-                # Analyze the step with retry logic
-                step_result = analyzer._analyze_step_with_retry(**step_kwargs)
-                
-                analysis_results['steps'][f'step_{step_num}'] = step_result
-                logger.info(f"✓ Completed Step {step_num}")
-                
-                # Accumulate this step's output for subsequent steps
-                if 'markdown_content' in step_result:
-                    accumulated_prior_steps.append(step_result['markdown_content'])
-                
-            except Exception as e:
-                logger.error(f"Error in Step {step_num}: {str(e)}")
-                raise Exception(f"Step {step_num} failed: {str(e)}")
-        
-        # Update progress - Step 3: Generating Memo
-        if job:
-            job.meta['progress'] = {
-                'current_step': 3,
-                'total_steps': 3,
-                'step_name': 'Generating memo',
-                'updated_at': datetime.now().isoformat()
-            }
-            job.save_meta()
-        
-        logger.info("📝 Generating memo sections...")
-        conclusions_text = analyzer._extract_conclusions_from_steps(analysis_results['steps'])
-        
-        analysis_results['executive_summary'] = analyzer.generate_executive_summary(conclusions_text, company_name)
-        analysis_results['background'] = analyzer.generate_background_section(conclusions_text, company_name)
-        analysis_results['conclusion'] = analyzer.generate_final_conclusion(analysis_results['steps'])
+        context = AnalysisContext(
+            asc_standard,
+            analysis_id,
+            combined_text,
+            additional_context=job_data.get('additional_context', ''),
+            uploaded_filenames=job_data['uploaded_filenames'],
+            party_name="the Company",
+            results={'steps': {}, 'asc_standard': asc_standard}
+        )
         
-        filename = ", ".join(uploaded_filenames) if uploaded_filenames else "Uploaded Documents"
-        analysis_results['filename'] = filename
+        def deidentify(context):
+            # De-identify contract text for privacy protection
+            # A de-identification map means the page already scrubbed the text - no LLM or regex rescan needed
+            if job_data.get('deidentification_map'):
+                logger.info("🔒 Contract text already de-identified (map provided)")
+                return
+            logger.info("🔒 Applying privacy protection (de-identification)...")
+            parties = context.analyzer.extract_party_names_llm(context.combined_text)
+            vendor_name = parties.get('vendor')
+            customer_name = parties.get('customer')
+            
+            if vendor_name or customer_name:
+                deidentify_result = context.analyzer.deidentify_contract_text(context.combined_text, vendor_name, customer_name)
+                if deidentify_result.get('success'):
+                    context.combined_text = deidentify_result['text']
+                    job_data['deidentification_map'] = deidentify_result.get('deidentification_map')
+                    logger.info(f"   ✓ De-identified: vendor '{vendor_name}' → 'the Company', customer '{customer_name}' → 'the Customer'")
+                else:
+                    logger.warning(f"   ⚠️ De-identification failed: {deidentify_result.get('error', 'Unknown error')}")
+            else:
+                logger.warning("   ⚠️ Could not identify contract parties for de-identification")
         
-        # Phase 2: Generate review comments comparing uploaded memo with vLogic analysis
-        if source_memo_text:
+        def review(context):
+            # Phase 2: Generate review comments comparing uploaded memo with vLogic analysis
             logger.info("🔍 Generating review comments (comparing with uploaded memo)...")
-            if job:
-                job.meta['progress'] = {
-                    'current_step': 3,
-                    'total_steps': 4,
-                    'step_name': 'Generating review comments',
-                    'updated_at': datetime.now().isoformat()
-                }
-                job.save_meta()
-            
             review_comments = _generate_review_comments(
-                vlogic_analysis=analysis_results,
+                vlogic_analysis=context.results,
                 uploaded_memo=source_memo_text,
                 asc_standard=asc_standard,
-                analyzer=analyzer
+                analyzer=context.analyzer
             )
-            analysis_results['review_comments'] = review_comments
+            context.results['review_comments'] = review_comments
             logger.info(f"✓ Generated {len(review_comments)} review comment categories")
         
-        memo_content = memo_generator.combine_clean_steps(
-            analysis_results,
-            analysis_id=analysis_id
-        )
-        
-        # Append review comments section if available
-        if source_memo_text and analysis_results.get('review_comments'):
-            review_section = _format_review_comments_section(analysis_results['review_comments'], source_memo_filename)
-            memo_content = memo_content + "\n\n" + review_section
-        
-        api_cost = get_total_estimated_cost()
-        
-        # Save analysis to database
-        logger.info("💾 Saving memo review analysis to database...")
-        backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-        
-        save_result = _save_analysis_with_retry(
-            backend_url=backend_url,
-            user_token=user_token,
-            save_data={
-                'analysis_id': analysis_id,
-                'memo_content': memo_content,
-                'api_cost': api_cost,
-                'success': True,
-                'org_id': org_id,
-                'total_words': total_words
-            },
-            max_retries=5
+        def render_with_review(context):
+            render(context)
+            # Append review comments section if available
+            if source_memo_text and context.results.get('review_comments'):
+                review_section = _format_review_comments_section(context.results['review_comments'], source_memo_filename)
+                context.memo_content = context.memo_content + "\n\n" + review_section
+        
+        setup = _setup_stage(job)
+        setup.progress = (1, 3, 'Initializing analysis')
+        stages = [setup, Stage('deidentify', deidentify)]
+        stages += build_step_stages(
+            step_count,
+            chain_prior_steps=True,
+            progress=lambda step_num: (2, 3, f'Analyzing contract for {asc_standard}') if step_num == 1 else None
         )
-        
-        memo_uuid = save_result.get('memo_uuid')
-        logger.info(f"✓ Memo Review analysis saved successfully: {memo_uuid}")
+        stages.append(Stage('finalize', finalize, (3, 3, 'Generating memo')))
+        if source_memo_text:
+            stages.append(Stage('review', review, (3, 4, 'Generating review comments')))
+        stages += [
+            Stage('render', render_with_review),
+            _save_stage(user_token, job_data, deduct_words=True, label='memo review analysis')
+        ]
+        AnalysisPipeline(stages, hooks=[LoggingHook(), job_hook], usage=get_usage_totals).run(context)
+        job_hook.flush()
         
         return {
             'success': True,
             'analysis_id': analysis_id,
-            'memo_uuid': memo_uuid,
-            'memo_content': memo_content,
-            'api_cost': api_cost,
+            'memo_uuid': context.save_result.get('memo_uuid'),
+            'memo_content': context.memo_content,
+            'api_cost': get_total_estimated_cost(),
             'asc_standard': asc_standard,
+            'stages': stage_summary(context.metrics),
             'message': 'Memo Review analysis completed successfully'
         }
         
     except Exception as e:
         logger.error(f"❌ Memo Review analysis failed: {str(e)}", exc_info=True)
+        job_hook.flush()
+        _save_failure(os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai'), user_token, analysis_id, e,
+                      user_id=job_data.get('user_id'))
+        raise
+
+def run_batch_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run many analyses for one ASC standard through the OpenAI Batch API
+    
+    Each job checks the pending batch once. While a round is still running it
+    re-enqueues itself, with the run state in job_data['batch_state'], to check again
+    after the runner's poll interval - the worker is free for other jobs in between.
+    
+    Args:
+        job_data: Dictionary with asc_standard, user_token and an 'analyses' list, each
+                  entry holding analysis_id, combined_text, additional_context,
+                  uploaded_filenames, org_id and total_words; follow-up jobs also
+                  carry batch_state
         
-        try:
-            api_cost = get_total_estimated_cost()
-            backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
-            
-            _save_analysis_with_retry(
-                backend_url=backend_url,
-                user_token=user_token,
-                save_data={
-                    'analysis_id': analysis_id,
-                    'success': False,
-                    'error_message': str(e)[:500],
-                    'api_cost': api_cost
-                },
-                max_retries=5
+    Returns:
+        Dictionary with per-analysis outcomes, or the follow-up job while batches are pending
+    """
+    from shared.batch_analysis import BatchAnalysisRunner, BATCH_STAGE_TIMEOUT
+    
+    asc_standard = job_data['asc_standard']
+    user_token = job_data['user_token']
+    blob_store = _job_blob_store()
+    analyses = load_job_texts(job_data['analyses'], blob_store)
+    backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
+    state = job_data.get('batch_state')
+    
+    if state is None:
+        logger.info(f"🚀 Worker starting batch {asc_standard} analysis: {len(analyses)} analyses")
+    else:
+        logger.info(f"🔁 Worker checking batch {asc_standard} analysis: round {state['round'] + 1}/{len(state['rounds'])}")
+    
+    # Results arrive after the user's token has expired - only the direct save path can
+    # store them, so fail now (while the save endpoint still accepts the token) without it
+    if state is None and get_result_store() is None:
+        error = "Batch analysis requires direct result saves (ANALYSIS_DIRECT_SAVE and DATABASE_URL) on the worker"
+        logger.error(f"❌ {error}")
+        _save_all(backend_url, user_token, job_data.get('user_id'), [{
+            'analysis_id': item['analysis_id'],
+            'success': False,
+            'error_message': error,
+            'api_cost': 0.0
+        } for item in analyses], 'batch')
+        return {
+            'success': False,
+            'asc_standard': asc_standard,
+            'analyses': [{'analysis_id': item['analysis_id'], 'success': False, 'memo_uuid': None, 'error': error}
+                         for item in analyses],
+            'message': error
+        }
+    
+    # Get current job for progress updates
+    job = get_current_job()
+    
+    def report_progress(current_step: int, total_steps: int, step_name: str):
+        if job:
+            job.meta['progress'] = {
+                'current_step': current_step,
+                'total_steps': total_steps,
+                'step_name': step_name,
+                'updated_at': datetime.now().isoformat()
+            }
+            _save_progress(job)
+    
+    try:
+        runner = BatchAnalysisRunner(asc_standard, progress_callback=report_progress)
+        if state is None:
+            state = runner.start(analyses)
+        if not runner.advance(analyses, state):
+            # Texts are stored again so their blobs outlive the wait
+            next_job = Queue('batch', connection=job.connection if job else get_redis_connection()).enqueue_in(
+                timedelta(seconds=runner.poll_interval),
+                run_batch_analysis,
+                {**job_data, 'analyses': store_job_texts(analyses, blob_store), 'batch_state': state},
+                job_timeout=BATCH_STAGE_TIMEOUT,
+                result_ttl=86400,
+                failure_ttl=86400
             )
-            
-            logger.info(f"✓ Failure status saved to database")
-            
-        except Exception as save_error:
-            logger.critical(f"🔥 CRITICAL: Failed to save failure status: {str(save_error)}")
-            logger.critical(f"🔥 Original error: {str(e)}")
-            logger.critical(f"🔥 Analysis {analysis_id} may be stuck in 'processing' status!")
+            logger.info(f"⏳ Batch round {state['round'] + 1} pending, next check in job {next_job.id}")
+            return {
+                'success': True,
+                'pending': True,
+                'asc_standard': asc_standard,
+                'next_job_id': next_job.id,
+                'message': f"Batch round {state['round'] + 1} of {len(state['rounds'])} pending"
+            }
+        results = runner.finish(analyses, state)
+    except Exception as e:
+        logger.error(f"❌ Batch analysis failed: {str(e)}", exc_info=True)
+        results = {item['analysis_id']: {'success': False, 'error': str(e), 'api_cost': 0.0} for item in analyses}
+    
+    save_items = []
+    item_results = []
+    for item in analyses:
+        analysis_id = item['analysis_id']
+        result = results.get(analysis_id) or {'success': False, 'error': 'No batch result', 'api_cost': 0.0}
         
-        raise
+        if result['success']:
+            save_data = {
+                'analysis_id': analysis_id,  # Database INTEGER id
+                'memo_content': result['memo_content'],
+                'api_cost': result['api_cost'],
+                'success': True,
+                'org_id': item.get('org_id'),  # For word deduction
+                'total_words': item.get('total_words')  # For word deduction
+            }
+        else:
+            save_data = {
+                'analysis_id': analysis_id,
+                'success': False,
+                'error_message': str(result.get('error'))[:500],
+                'api_cost': result.get('api_cost', 0.0)
+            }
+        
+        save_items.append(save_data)
+        item_results.append(result)
+    
+    outcomes = []
+    for save_data, result, saved in zip(save_items, item_results,
+                                        _save_all(backend_url, user_token, job_data.get('user_id'), save_items, 'batch')):
+        if isinstance(saved, Exception):
+            outcomes.append({
+                'analysis_id': save_data['analysis_id'],
+                'success': False,
+                'memo_uuid': None,
+                'error': str(saved)
+            })
+        else:
+            outcomes.append({
+                'analysis_id': save_data['analysis_id'],
+                'success': result['success'],
+                'memo_uuid': saved.get('memo_uuid'),
+                'error': result.get('error')
+            })
+    
+    succeeded = sum(1 for o in outcomes if o['success'])
+    logger.info(f"✓ Batch {asc_standard} analysis finished: {succeeded}/{len(outcomes)} succeeded")
+    
+    return {
+        'success': succeeded == len(outcomes),
+        'asc_standard': asc_standard,
+        'analyses': outcomes,
+        'message': f'{succeeded} of {len(outcomes)} analyses completed'
+    }
+
+def run_portfolio_analysis(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run a portfolio of contracts for one ASC standard in a single job
+    
+    Args:
+        job_data: Dictionary with asc_standard, user_token and a 'contracts' list, each
+                  entry holding analysis_id, combined_text, additional_context,
+                  uploaded_filenames, org_id and total_words
+        
+    Returns:
+        Dictionary with per-contract outcomes and the portfolio roll-up summary
+    """
+    import threading
+    from shared.portfolio_analysis import PortfolioAnalysisRunner
+    
+    asc_standard = job_data['asc_standard']
+    user_token = job_data['user_token']
+    contracts = load_job_texts(job_data['contracts'], _job_blob_store())
+    backend_url = os.getenv('WEBSITE_URL', 'https://www.veritaslogic.ai')
+    
+    logger.info(f"🚀 Worker starting {asc_standard} portfolio: {len(contracts)} contracts")
+    
+    # Get current job for per-contract progress updates
+    job = get_current_job()
+    meta_lock = threading.Lock()
+    
+    def report_progress(analysis_id, progress: Dict[str, Any]):
+        if not job:
+            return
+        with meta_lock:
+            contracts_progress = job.meta.setdefault('contracts', {})
+            entry = contracts_progress.setdefault(str(analysis_id), {})
+            entry.update(progress)
+            entry['updated_at'] = datetime.now().isoformat()
+            done = sum(1 for c in contracts_progress.values() if c.get('status') in ('completed', 'failed'))
+            job.meta['progress'] = {
+                'current_step': done,
+                'total_steps': len(contracts),
+                'step_name': f'{done} of {len(contracts)} contracts complete',
+                'updated_at': datetime.now().isoformat()
+            }
+            _save_progress(job)
+    
+    try:
+        runner = PortfolioAnalysisRunner(asc_standard, progress_callback=report_progress)
+        portfolio = runner.run(contracts)
+    except Exception as e:
+        logger.error(f"❌ Portfolio analysis failed: {str(e)}", exc_info=True)
+        portfolio = {
+            'results': {item['analysis_id']: {'success': False, 'error': str(e), 'api_cost': 0.0} for item in contracts},
+            'api_cost': 0.0,
+            'rollup_summary': None,
+            'retrieval_stats': {}
+        }
+    
+    # Each contract is tracked on its own cost tracker by the runner
+    total_cost = portfolio['api_cost']
+    
+    save_items = []
+    item_results = []
+    for item in contracts:
+        analysis_id = item['analysis_id']
+        result = portfolio['results'][analysis_id]
+        api_cost = result['api_cost']
+        
+        if result['success']:
+            save_data = {
+                'analysis_id': analysis_id,  # Database INTEGER id
+                'memo_content': result['memo_content'],
+                'api_cost': api_cost,
+                'success': True,
+                'org_id': item.get('org_id'),  # For word deduction
+                'total_words': item.get('total_words')  # For word deduction
+            }
+        else:
+            save_data = {
+                'analysis_id': analysis_id,
+                'success': False,
+                'error_message': str(result.get('error'))[:500],
+                'api_cost': api_cost
+            }
+        
+        save_items.append(save_data)
+        item_results.append(result)
+    
+    outcomes = []
+    for save_data, result, saved in zip(save_items, item_results,
+                                        _save_all(backend_url, user_token, job_data.get('user_id'), save_items, 'portfolio')):
+        if isinstance(saved, Exception):
+            outcomes.append({
+                'analysis_id': save_data['analysis_id'],
+                'success': False,
+                'memo_uuid': None,
+                'error': str(saved)
+            })
+        else:
+            outcomes.append({
+                'analysis_id': save_data['analysis_id'],
+                'success': result['success'],
+                'memo_uuid': saved.get('memo_uuid'),
+                'error': result.get('error')
+            })
+    
+    succeeded = sum(1 for o in outcomes if o['success'])
+    logger.info(f"✓ Portfolio {asc_standard} finished: {succeeded}/{len(outcomes)} succeeded")
+    
+    return {
+        'success': succeeded == len(outcomes),
+        'asc_standard': asc_standard,
+        'analyses': outcomes,
+        'rollup_summary': portfolio['rollup_summary'],
+        'retrieval_stats': portfolio['retrieval_stats'],
+        'api_cost': total_cost,
+        'message': f'{succeeded} of {len(outcomes)} contracts completed'
+    }